@@ -15,4 +15,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 需要在 django 初始化后导入
+from backend.core.status_stream.asgi import StatusStreamRouter  # noqa
+
+application = StatusStreamRouter(django_application)
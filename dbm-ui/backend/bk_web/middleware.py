@@ -11,15 +11,20 @@ specific language governing permissions and limitations under the License.
 import json
 import logging
 import re
+import time
+from contextlib import ExitStack
 
 import wrapt
 from blueapps.account.middlewares import LoginRequiredMiddleware
 from blueapps.account.models import User
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import connections
 from django.http import JsonResponse
 from django.urls import resolve
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.translation import ugettext as _
+from prometheus_client import Counter, Histogram
 
 from backend import env
 from backend.bk_web.constants import (
@@ -32,10 +37,22 @@ from backend.bk_web.exceptions import ExternalProxyBaseException, ExternalRouteI
 from backend.bk_web.handlers import _error
 from backend.ticket.views import TicketViewSet
 from backend.utils.local import local
+from backend.utils.request_stats import RequestStats
 from backend.utils.string import str2bool
 
 logger = logging.getLogger("root")
 
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+REQUEST_SECONDS = Histogram("dbm_request_seconds", "接口耗时", ["endpoint"])
+REQUEST_SQL_QUERIES = Histogram("dbm_request_sql_queries", "单次请求的 SQL 次数", ["endpoint"], buckets=COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("dbm_request_sql_seconds", "单次请求的 SQL 总耗时", ["endpoint"])
+REQUEST_DATAAPI_CALLS = Histogram(
+    "dbm_request_dataapi_calls", "单次请求的 DataAPI 调用次数", ["endpoint"], buckets=COUNT_BUCKETS
+)
+REQUEST_DATAAPI_SECONDS = Histogram("dbm_request_dataapi_seconds", "单次请求的 DataAPI 总耗时", ["endpoint"])
+REQUEST_CACHE_REQUESTS = Counter("dbm_request_cache_requests_total", "接口的 DataAPI 缓存访问次数", ["endpoint", "hit"])
+REQUEST_BUDGET_EXCEEDED = Counter("dbm_request_budget_exceeded_total", "接口超出资源预算的次数", ["endpoint", "metric"])
+
 
 class DisableCSRFCheckMiddleware:
     """本地开发，去掉 django rest framework 强制的 csrf 检查"""
@@ -234,3 +251,83 @@ class ExternalProxyMiddleware(MiddlewareMixin):
     @staticmethod
     def replace_ip(text):
         return re.sub(IP_RE, "*.*.*.*", text)
+
+
+class RequestStatsMiddleware:
+    """
+    接口资源消耗统计中间件，用于发现 N+1 查询等性能退化
+    - 统计单次请求的 SQL 次数/耗时、DataAPI 次数/耗时(按模块)、DataAPI 缓存命中率
+    - 按接口(url view_name)上报 Prometheus 指标
+    - 超出 settings.REQUEST_STATS_BUDGETS 预算的请求输出结构化告警日志
+    注意：SQL 只统计请求线程内执行的语句，子线程中的查询不计入
+    """
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REQUEST_STATS_ENABLED:
+            return self.get_response(request)
+
+        stats = request.dbm_stats = RequestStats()
+
+        def sql_wrapper(execute, sql, params, many, context):
+            start_time = time.time()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats.record_sql(time.time() - start_time)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql_wrapper))
+            response = self.get_response(request)
+
+        try:
+            self.report(request, response, stats)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning("[request_stats] report failed: %s", err)
+        return response
+
+    @staticmethod
+    def get_endpoint(request) -> str:
+        resolver_match = getattr(request, "resolver_match", None)
+        # 未匹配路由的请求统一归类，避免指标的维度爆炸
+        return resolver_match.view_name if resolver_match else "unresolved"
+
+    @staticmethod
+    def get_budget(endpoint: str) -> dict:
+        budgets = settings.REQUEST_STATS_BUDGETS
+        return {**budgets.get("default", {}), **budgets.get(endpoint, {})}
+
+    def report(self, request, response, stats: RequestStats):
+        endpoint = self.get_endpoint(request)
+        summary = stats.summary()
+
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(summary["duration"])
+        REQUEST_SQL_QUERIES.labels(endpoint=endpoint).observe(summary["sql_count"])
+        REQUEST_SQL_SECONDS.labels(endpoint=endpoint).observe(summary["sql_time"])
+        REQUEST_DATAAPI_CALLS.labels(endpoint=endpoint).observe(summary["dataapi_count"])
+        REQUEST_DATAAPI_SECONDS.labels(endpoint=endpoint).observe(summary["dataapi_time"])
+        if stats.cache_hits:
+            REQUEST_CACHE_REQUESTS.labels(endpoint=endpoint, hit=True).inc(stats.cache_hits)
+        if stats.cache_misses:
+            REQUEST_CACHE_REQUESTS.labels(endpoint=endpoint, hit=False).inc(stats.cache_misses)
+
+        exceeded = [metric for metric, limit in self.get_budget(endpoint).items() if summary.get(metric, 0) > limit]
+        for metric in exceeded:
+            REQUEST_BUDGET_EXCEEDED.labels(endpoint=endpoint, metric=metric).inc()
+
+        log_info = {
+            "endpoint": endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status_code": response.status_code,
+            "request_id": getattr(request, "request_id", ""),
+            "exceeded": exceeded,
+            **summary,
+        }
+        if exceeded:
+            logger.warning("[request_stats] request over budget: %s", json.dumps(log_info))
+        else:
+            logger.debug("[request_stats] %s", json.dumps(log_info))
@@ -9,7 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
 
 
 class AuditedLimitOffsetPagination(LimitOffsetPagination):
@@ -25,3 +25,15 @@ class AuditedLimitOffsetPagination(LimitOffsetPagination):
             pass
 
         return page_data
+
+
+class AuditedCursorPagination(CursorPagination):
+    """
+    游标(keyset)分页，按创建时间倒序，翻页时通过 create_at 定位，不需要 count 和 offset 扫描
+    第一页传入空的 cursor 参数，之后使用返回的 next/previous 链接翻页
+    """
+
+    # 第一个字段用于定位游标，id 保证相同创建时间的记录顺序稳定
+    ordering = ("-create_at", "-id")
+    page_size_query_param = "limit"
+    max_page_size = 1000
@@ -8,6 +8,9 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import asyncio
+import copy
+import functools
 import hashlib
 import json
 import logging
@@ -19,18 +22,21 @@ from urllib import parse
 
 import requests
 from django.conf import settings
-from django.core.cache import cache
 from django.utils import translation
 from django.utils.translation import ugettext as _
 from urllib3.exceptions import ConnectTimeoutError
 
 from backend import env
+from backend.components.cache import dataapi_cache
 from backend.components.constants import CLIENT_CRT_PATH, SSL_KEY, SSLEnum
 from backend.components.domains import ESB_PREFIX
 from backend.components.exception import DataAPIException
+from backend.components.transport import DATAAPI_REQUEST_SECONDS, session_pool, upstream_executor_pool
 from backend.configuration.models.system import SystemSettings
+from backend.core.translation.context import RespectsLanguage
 from backend.exceptions import ApiError, ApiRequestError, ApiResultError, AppBaseException
-from backend.utils.local import local
+from backend.utils.local import inject_request, local
+from backend.utils.request_stats import get_request_stats
 
 logger = logging.getLogger("root")
 
@@ -107,8 +113,10 @@ class DataAPI(object):
         method_override: str = None,
         url_keys: List[str] = None,
         cache_time: int = 0,
+        stale_time: int = 0,
         default_timeout: int = 30,
         max_retry_times: int = 3,
+        module_code: str = "",
     ):
         """
         初始化一个请求句柄
@@ -126,12 +134,15 @@ class DataAPI(object):
         @param {string} method_override 重载请求方法，注入到 header（X-HTTP-METHOD-OVERRIDE）
         @param {array.<string>} url_keys 请求地址中存在未赋值的 KEYS
         @param {int} cache_time 缓存时间
+        @param {int} stale_time 缓存过期后仍可返回旧数据并后台刷新的时间，仅适用于只读接口
         @param {int} default_timeout 默认超时时间
         @param {int} max_retry_times 最大自动重试次数
+        @param {string} module_code 模块标识，用于指标统计，默认为 base 地址
         """
         self.base = base
         self.url = f'{base.rstrip("/")}/{url.lstrip("/")}'
         self.module = module
+        self.module_code = module_code or base
         self.method = method
         self.ssl = ssl
         self.default_return_value = default_return_value
@@ -148,6 +159,7 @@ class DataAPI(object):
         self.url_keys = url_keys
 
         self.cache_time = cache_time
+        self.stale_time = stale_time
         self.default_timeout = default_timeout
         self.max_retry_times = max_retry_times
 
@@ -221,6 +233,17 @@ class DataAPI(object):
             elif isinstance(error, Exception):
                 raise DataAPIException(error_message=error_message)
 
+    async def acall(self, params=None, **kwargs):
+        """
+        异步调用，参数同 __call__。
+        请求提交到该上游(base)在进程内共享的有界线程池中执行，线程池大小即对该上游的全局并发限制，
+        因此在一个事件循环中并发发起大量请求也不会为每个请求单独创建线程
+        """
+        loop = asyncio.get_running_loop()
+        func = RespectsLanguage(language=translation.get_language())(inject_request(self.__call__))
+        executor = upstream_executor_pool.get_executor(self.base)
+        return await loop.run_in_executor(executor, functools.partial(func, params, **kwargs))
+
     @staticmethod
     def is_backend_request():
         is_backend = False
@@ -259,16 +282,37 @@ class DataAPI(object):
             return DataResponse(self.default_return_value, self.request_id)
 
         # 缓存
-        try:
-            cache_key = self._build_cache_key(params)
-            if self.cache_time:
-                result = self._get_cache(cache_key)
-                if result is not None:
-                    # 有缓存时返回
-                    return DataResponse(result, self.request_id)
-        except (TypeError, AttributeError):
-            pass
+        cache_key = None
+        if self.cache_time:
+            try:
+                cache_key = self._build_cache_key(params)
+            except (TypeError, AttributeError):
+                pass
+        if not cache_key:
+            return self._request_upstream(params, headers, use_admin=use_admin)
+
+        # 后台刷新时原始参数已被消费(鉴权参数会被pop)，因此需要保留一份副本
+        fetch_params = copy.deepcopy(params) if self.stale_time else params
+
+        def fetch():
+            return self._request_upstream(fetch_params, headers, use_admin=use_admin).response
+
+        # 缓存 key 不区分用户，后台刷新需要沿用当前调用方的身份，避免以平台身份的结果覆盖缓存；执行完成后恢复线程的请求上下文
+        refresh = inject_request(fetch)
+
+        result = dataapi_cache.get_or_fetch(
+            key=cache_key,
+            fetch=fetch,
+            refresh=refresh,
+            module=self.module_code,
+            cache_time=self.cache_time,
+            stale_time=self.stale_time,
+            executor=upstream_executor_pool.get_executor(self.base),
+        )
+        return DataResponse(result, self.request_id)
 
+    def _request_upstream(self, params, headers, use_admin=False):
+        """请求上游接口，并记录流水日志"""
         response = None
         error_message = ""
 
@@ -312,9 +356,6 @@ class DataAPI(object):
                     if self.after_request is not None:
                         response_result = self.after_request(response_result)
 
-                if self.cache_time and "cache_key" in locals():
-                    self._set_cache(locals()["cache_key"], response_result)
-
                 response = DataResponse(response_result, self.request_id)
                 return response
         finally:
@@ -378,6 +419,12 @@ class DataAPI(object):
                 logger.debug(_log)
             else:
                 logger.exception(_log)
+            DATAAPI_REQUEST_SECONDS.labels(module=self.module_code, result=response_result).observe(
+                end_time - start_time
+            )
+            request_stats = get_request_stats()
+            if request_stats:
+                request_stats.record_dataapi(self.module_code, end_time - start_time)
 
     def _build_cache_key(self, params):
         """
@@ -386,36 +433,28 @@ class DataAPI(object):
         :return:
         """
         # 缓存
-        cache_str = "url_{url}__params_{params}".format(url=self.build_actual_url(params), params=json.dumps(params))
+        cache_str = "url_{url}__params_{params}".format(
+            url=self.build_actual_url(params), params=json.dumps(params, sort_keys=True)
+        )
         hash_md5 = hashlib.new("md5")
         hash_md5.update(cache_str.encode("utf-8"))
         cache_key = hash_md5.hexdigest()
         return cache_key
 
-    def _set_cache(self, cache_key, data):
-        """
-        获取缓存
-        :param cache_key:
-        :return:
-        """
-        cache.set(cache_key, data, self.cache_time)
-
-    def _set_session_headers(self, session, local_request, headers: Dict, params: Dict, use_admin: bool = False):
+    def _build_request_headers(self, local_request, headers: Dict, params: Dict, use_admin: bool = False) -> Dict:
         """
-        设置session的headers
+        构造本次请求的headers。session在进程内共享，因此headers不能写入session，只能随请求传递
         @param headers: 用户自定义headers
         @param params: 请求参数
         """
-        session.headers.update(headers)
-        session.headers.update(
-            {
-                "X-Bkapi-Request-Id": self.request_id,
-                "blueking-language": translation.get_language(),
-            }
-        )
+        request_headers = {
+            **headers,
+            "X-Bkapi-Request-Id": self.request_id,
+            "blueking-language": translation.get_language(),
+        }
         # 增加鉴权信息
         if not isinstance(params, dict):
-            return
+            return request_headers
         bkapi_auth_headers = {
             "bk_app_code": params.pop("bk_app_code", env.APP_CODE),
             "bk_app_secret": params.pop("bk_app_secret", env.SECRET_KEY),
@@ -429,7 +468,7 @@ class DataAPI(object):
             for key, value in oath_cookies_params.items():
                 if value in local_request.COOKIES:
                     bkapi_auth_headers.update({key: local_request.COOKIES[value]})
-        session.headers.update(
+        request_headers.update(
             {
                 "X-Bkapi-Authorization": json.dumps(
                     {
@@ -442,19 +481,22 @@ class DataAPI(object):
         )
         # headers 申明重载请求方法
         if self.method_override is not None:
-            session.headers.update({"X-METHOD-OVERRIDE": self.method_override})
+            request_headers.update({"X-METHOD-OVERRIDE": self.method_override})
+        return request_headers
 
-    def _set_session_cookies(self, session, local_request, cookies: Dict = None, use_admin: bool = False):
+    def _build_request_cookies(self, local_request, cookies: Dict = None, use_admin: bool = False) -> Dict:
         """
-        设置session的cookies
+        构造本次请求的cookies
         @param cookies: 用户自定义cookies
         @param use_admin: 是否以admin请求
         """
+        request_cookies = {}
         if local_request and local_request.COOKIES and not use_admin:
-            session.cookies.update(local_request.COOKIES)
+            request_cookies.update(local_request.COOKIES)
 
         if cookies:
-            session.cookies.update(cookies)
+            request_cookies.update(cookies)
+        return request_cookies
 
     def _send(self, params: Any, headers: Dict, use_admin: bool = False):
         """
@@ -462,35 +504,34 @@ class DataAPI(object):
         @param params: 请求的参数,预期是一个字典
         @return: requests response
         """
-        session = requests.session()
+        # 复用进程内按 base 共享的长连接 session，https 的客户端证书在创建 session 时加载
+        session = session_pool.get_session(self.base, ssl=self.ssl, cert_loader=self._fetch_client_crt)
         try:
             local_request = local.request
         except AppBaseException:
             local_request = None
 
-        self._set_session_headers(session, local_request, headers, params, use_admin=use_admin)
-        self._set_session_cookies(session, local_request, use_admin=use_admin)
+        request_headers = self._build_request_headers(local_request, headers, params, use_admin=use_admin)
+        request_cookies = self._build_request_cookies(local_request, use_admin=use_admin)
+        request_kwargs = {"headers": request_headers, "cookies": request_cookies, "verify": False}
 
         url = self.build_actual_url(params)
         non_file_data, file_data = self._split_file_data(params)
         request_method = self.method.upper()
 
-        # 如果是https链接，则需要带上client证书
-        if self.ssl:
-            client_crt, client_key = self._fetch_client_crt()
-            session.cert = (client_crt, client_key)
-
         # 发出请求并返回结果
         if request_method == "GET":
-            result = session.request(method=self.method, url=url, params=params, verify=False, timeout=self.timeout)
+            result = session.request(
+                method=self.method, url=url, params=params, timeout=self.timeout, **request_kwargs
+            )
         elif request_method == "DELETE":
-            session.headers.update({"Content-Type": "application/json; charset=utf-8"})
+            request_headers.update({"Content-Type": "application/json; charset=utf-8"})
             result = session.request(
-                method=self.method, url=url, data=json.dumps(non_file_data), verify=False, timeout=self.timeout
+                method=self.method, url=url, data=json.dumps(non_file_data), timeout=self.timeout, **request_kwargs
             )
         elif request_method in ["PUT", "PATCH", "POST"]:
             if not file_data:
-                session.headers.update({"Content-Type": "application/json; charset=utf-8"})
+                request_headers.update({"Content-Type": "application/json; charset=utf-8"})
                 params = json.dumps(non_file_data)
             else:
                 params = non_file_data
@@ -498,10 +539,17 @@ class DataAPI(object):
             # PUT 方法上传文件时，data需作为
             if request_method == "PUT" and file_data:
                 data = list(file_data.values())[0]
-                result = session.request(method=self.method, url=url, data=data, verify=False, timeout=self.timeout)
+                result = session.request(
+                    method=self.method, url=url, data=data, timeout=self.timeout, **request_kwargs
+                )
             else:
                 result = session.request(
-                    method=self.method, url=url, data=params, files=file_data, verify=False, timeout=self.timeout
+                    method=self.method,
+                    url=url,
+                    data=params,
+                    files=file_data,
+                    timeout=self.timeout,
+                    **request_kwargs,
                 )
         else:
             raise ApiRequestError(_("异常请求方式，{method}").format(method=self.method))
@@ -563,16 +611,6 @@ class DataAPI(object):
                 non_file_data[key] = value
         return non_file_data, file_data
 
-    @staticmethod
-    def _get_cache(cache_key):
-        """
-        获取缓存
-        :param cache_key:
-        :return:
-        """
-        if cache.get(cache_key):
-            return cache.get(cache_key)
-
 
 class BaseApi(object):
     """
@@ -590,4 +628,5 @@ class BaseApi(object):
         """
         生成 DataAPI，使用类变量 BASE，MODULE 作为统一参数
         """
+        kwargs.setdefault("module_code", self.__class__.__name__.lstrip("_"))
         return DataAPI(method=method, base=self.BASE, url=url, module=self.MODULE, description=description, **kwargs)
@@ -25,6 +25,11 @@ class _BKLogApi(BaseApi):
             url="esquery_search/",
             description=_("查询索引"),
         )
+        self.esquery_scroll = self.generate_data_api(
+            method="POST",
+            url="esquery_scroll/",
+            description=_("滚动查询索引"),
+        )
         self.fast_create = self.generate_data_api(
             method="POST",
             url="databus/collectors/fast_create/" if is_esb else "databus_collectors/fast_create/",
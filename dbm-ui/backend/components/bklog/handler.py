@@ -11,8 +11,9 @@ specific language governing permissions and limitations under the License.
 
 import json
 import logging
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Callable, Dict, Iterator, List
 
 from backend import env
 from backend.components import BKLogApi
@@ -21,6 +22,12 @@ from backend.utils.time import datetime2str
 
 logger = logging.getLogger("root")
 
+# scroll 查询每页的日志条数
+BKLOG_SCROLL_PAGE_SIZE = 2000
+# scroll 上下文的保留时间，需要覆盖处理一页日志的耗时
+BKLOG_SCROLL_KEEP_ALIVE = "1m"
+BKLOG_SORT_LIST = [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]]
+
 
 class BKLogHandler(object):
     """封装bklog查询的通用函数"""
@@ -45,13 +52,79 @@ class BKLogHandler(object):
                 "query_string": query_string,
                 "start": 0,
                 "size": size,
-                "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
+                "sort_list": BKLOG_SORT_LIST,
             },
             use_admin=True,
         )
-        backup_logs = []
-        for hit in resp["hits"]["hits"]:
-            raw_log = json.loads(hit["_source"]["log"])
-            backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
+        return [cls.parse_log(hit) for hit in resp["hits"]["hits"]]
+
+    @staticmethod
+    def parse_log(hit: Dict, snake_case: bool = True) -> Dict:
+        """解析日志内容，snake_case 为 True 时将字段名转为蛇形"""
+        raw_log = json.loads(hit["_source"]["log"])
+        if not snake_case:
+            return raw_log
+        return {pascal_to_snake(key): value for key, value in raw_log.items()}
 
-        return backup_logs
+    @classmethod
+    def iter_logs(
+        cls,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string: str = "*",
+        snake_case: bool = True,
+        use_admin: bool = True,
+        page_size: int = BKLOG_SCROLL_PAGE_SIZE,
+    ) -> Iterator[Dict]:
+        """
+        以 scroll 的方式流式读取采集项的全部日志，不受单次查询 10000 条的限制，内存中只保留一页日志
+        @param collector: 采集项名称
+        @param start_time: 开始时间
+        @param end_time: 结束时间
+        @param query_string: 过滤条件
+        @param snake_case: 是否将日志字段名转为蛇形
+        @param use_admin: 是否使用平台账号查询
+        @param page_size: 每页条数
+        """
+        indices = f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}"
+        resp = BKLogApi.esquery_search(
+            {
+                "indices": indices,
+                "start_time": datetime2str(start_time),
+                "end_time": datetime2str(end_time),
+                "query_string": query_string,
+                "start": 0,
+                "size": page_size,
+                "sort_list": BKLOG_SORT_LIST,
+                "scroll": BKLOG_SCROLL_KEEP_ALIVE,
+            },
+            use_admin=use_admin,
+        )
+        while True:
+            hits = resp["hits"]["hits"]
+            for hit in hits:
+                yield cls.parse_log(hit, snake_case)
+
+            scroll_id = resp.get("_scroll_id")
+            # 不足一页说明已经读取完毕
+            if len(hits) < page_size or not scroll_id:
+                return
+
+            resp = BKLogApi.esquery_scroll(
+                {"indices": indices, "scroll_id": scroll_id, "scroll": BKLOG_SCROLL_KEEP_ALIVE}, use_admin=use_admin
+            )
+
+    @classmethod
+    def group_logs(cls, key: Callable[[Dict], Any], logs: Iterator[Dict]) -> Dict[Any, List[Dict]]:
+        """
+        单次遍历将日志按 key 分组，适合与 iter_logs 配合使用
+        @param key: 分组函数，返回 None 的日志会被忽略
+        @param logs: 日志迭代器
+        """
+        grouped_logs: Dict[Any, List[Dict]] = defaultdict(list)
+        for log in logs:
+            group_key = key(log)
+            if group_key is not None:
+                grouped_logs[group_key].append(log)
+        return grouped_logs
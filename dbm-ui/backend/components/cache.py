@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Counter
+
+from backend.utils.request_stats import get_request_stats
+
+logger = logging.getLogger("root")
+
+DATAAPI_CACHE_REQUESTS = Counter(
+    "dbm_dataapi_cache_requests_total",
+    "DataAPI 缓存访问次数，result: local_hit/shared_hit/stale_hit/coalesced/miss",
+    ["module", "result"],
+)
+
+
+class CacheResult:
+    LOCAL_HIT = "local_hit"
+    SHARED_HIT = "shared_hit"
+    STALE_HIT = "stale_hit"
+    COALESCED = "coalesced"
+    MISS = "miss"
+
+
+def record_cache_result(module: str, result: str):
+    """记录缓存访问结果，同时计入当前请求的统计"""
+    DATAAPI_CACHE_REQUESTS.labels(module=module, result=result).inc()
+    stats = get_request_stats()
+    if stats:
+        stats.record_cache(hit=result != CacheResult.MISS)
+
+
+class LocalLRUCache:
+    """
+    进程内有界 LRU 缓存，值以 pickle 字节存储，读取时反序列化出新对象，避免调用方修改返回值污染缓存
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            evict_at, value = item
+            if evict_at <= time.time():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any, timeout: int):
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.time() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SingleFlight:
+    """
+    进程内请求合并：同一个 key 同时只有一个调用真正执行，其余调用等待并共享其结果(或异常)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, func: Callable) -> Tuple[Any, bool]:
+        """
+        执行 func，返回 (结果, 是否复用了其他调用的结果)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+
+        if not is_leader:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+
+class DataAPICache:
+    """
+    DataAPI 两级响应缓存：进程内 LRU + Django 共享缓存
+    - 缓存未命中时按 key 合并请求(single-flight)，N 个并发的相同请求只会访问一次上游
+    - 开启 stale_time 的只读接口，在缓存过期后的 stale_time 内直接返回旧数据，并在后台异步刷新
+    缓存值的格式为 {"data": 接口返回, "expire_at": 过期时间戳}
+    """
+
+    KEY_PREFIX = "dataapi"
+
+    def __init__(self, local_maxsize: int):
+        self.local = LocalLRUCache(maxsize=local_maxsize)
+        self.single_flight = SingleFlight()
+
+    def _get_entry(self, key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry, CacheResult.LOCAL_HIT
+
+        entry = cache.get(key)
+        if entry is not None:
+            return entry, CacheResult.SHARED_HIT
+
+        return None, None
+
+    def _set_entry(self, key: str, data: Any, cache_time: int, stale_time: int):
+        entry = {"data": data, "expire_at": time.time() + cache_time}
+        self.local.set(key, entry, cache_time + stale_time)
+        cache.set(key, entry, cache_time + stale_time)
+
+    def _fetch(self, key: str, fetch: Callable, cache_time: int, stale_time: int):
+        data = fetch()
+        self._set_entry(key, data, cache_time, stale_time)
+        return data
+
+    def _refresh_in_background(self, key: str, fetch: Callable, cache_time: int, stale_time: int, executor: Executor):
+        # 已经有请求在刷新该 key 时不再重复提交
+        if self.single_flight.in_flight(key):
+            return
+
+        def _refresh():
+            try:
+                self.single_flight.do(key, lambda: self._fetch(key, fetch, cache_time, stale_time))
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning("[DataAPICache] refresh stale cache failed, key: %s, error: %s", key, err)
+
+        executor.submit(_refresh)
+
+    def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable,
+        module: str,
+        cache_time: int,
+        stale_time: int = 0,
+        executor: Executor = None,
+        refresh: Callable = None,
+    ) -> Any:
+        """
+        获取缓存数据，未命中时调用 fetch 获取并写入缓存
+        @param key: 缓存 key
+        @param fetch: 上游请求函数
+        @param module: 模块名，用于统计
+        @param cache_time: 缓存时间
+        @param stale_time: 过期后仍可返回旧数据的时间，为 0 表示不开启 stale-while-revalidate
+        @param executor: 后台刷新使用的线程池
+        @param refresh: 后台刷新使用的请求函数，默认为 fetch。后台线程中没有调用方的请求上下文，需要由 refresh 自行携带
+        """
+        key = f"{self.KEY_PREFIX}:{key}"
+        entry, result = self._get_entry(key)
+        if entry is not None:
+            if entry["expire_at"] > time.time():
+                if result == CacheResult.SHARED_HIT:
+                    self.local.set(key, entry, int(entry["expire_at"] - time.time()) + stale_time)
+                record_cache_result(module, result)
+                return entry["data"]
+
+            if stale_time and executor:
+                self._refresh_in_background(key, refresh or fetch, cache_time, stale_time, executor)
+                record_cache_result(module, CacheResult.STALE_HIT)
+                return entry["data"]
+
+        data, shared = self.single_flight.do(key, lambda: self._fetch(key, fetch, cache_time, stale_time))
+        record_cache_result(module, CacheResult.COALESCED if shared else CacheResult.MISS)
+        # 合并请求的结果被多个调用方共享，需要拷贝一份，避免互相修改
+        return copy.deepcopy(data) if shared else data
+
+    def delete(self, key: str):
+        key = f"{self.KEY_PREFIX}:{key}"
+        self.local.delete(key)
+        cache.delete(key)
+
+
+dataapi_cache = DataAPICache(local_maxsize=settings.DATAAPI_LOCAL_CACHE_MAXSIZE)
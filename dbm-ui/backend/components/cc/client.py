@@ -32,7 +32,7 @@ class _CCApi(BaseApi):
             description=_("没有业务信息的主机查询"),
         )
         self.search_business = self.generate_data_api(
-            method="POST", url="search_business/", description=_("查询业务"), cache_time=30
+            method="POST", url="search_business/", description=_("查询业务"), cache_time=30, stale_time=60 * 5
         )
         self.search_module = self.generate_data_api(
             method="POST",
@@ -122,6 +122,7 @@ class _CCApi(BaseApi):
             method="POST",
             url="search_cloud_area/",
             cache_time=60,
+            stale_time=60 * 10,
             description=_("查询云区域"),
         )
         self.list_host_total_mainline_topo = self.generate_data_api(
@@ -209,6 +210,11 @@ class _CCApi(BaseApi):
             url="find_module_batch/",
             description=_("批量查询某业务的模块详情"),
         )
+        self.resource_watch = self.generate_data_api(
+            method="POST",
+            url="resource_watch/",
+            description=_("监听资源变化事件"),
+        )
 
 
 CCApi = _CCApi()
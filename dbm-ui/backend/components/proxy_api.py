@@ -70,6 +70,6 @@ class ExternalProxyAPI(DataAPI):
 
         return self._send(params, headers, use_admin)
 
-    def _set_session_cookies(self, session, cookies=None, use_admin=False):
-        # 转发路由要设置session为空，否则网关会优先以session的用户认证，而忽略headers的bk_username
-        session.cookies.clear()
+    def _build_request_cookies(self, local_request, cookies=None, use_admin=False):
+        # 转发路由要设置cookies为空，否则网关会优先以session的用户认证，而忽略headers的bk_username
+        return {}
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from django.conf import settings
+from prometheus_client import Counter, Histogram
+from requests import adapters
+from requests.cookies import RequestsCookieJar
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger("root")
+
+DATAAPI_POOL_REQUESTS = Counter(
+    "dbm_dataapi_pool_requests_total", "DataAPI 连接池取连接次数，reused 表示是否复用了已有连接", ["host", "reused"]
+)
+DATAAPI_POOL_WAITS = Counter("dbm_dataapi_pool_waits_total", "DataAPI 连接池已满，等待空闲连接的次数", ["host"])
+DATAAPI_POOL_WAIT_SECONDS = Histogram("dbm_dataapi_pool_wait_seconds", "DataAPI 等待空闲连接的耗时", ["host"])
+DATAAPI_POOL_NEW_CONNECTIONS = Counter("dbm_dataapi_pool_new_connections_total", "DataAPI 新建连接次数", ["host"])
+DATAAPI_POOL_DISCARDED_CONNECTIONS = Counter(
+    "dbm_dataapi_pool_discarded_connections_total", "DataAPI 连接池已满被丢弃的连接数", ["host"]
+)
+DATAAPI_REQUEST_SECONDS = Histogram("dbm_dataapi_request_seconds", "DataAPI 请求上游的耗时", ["module", "result"])
+
+
+class _InstrumentedPoolMixin:
+    """
+    为 urllib3 连接池增加连接复用/等待/新建/丢弃的统计，并支持等待空闲连接的超时时间
+    """
+
+    def _get_conn(self, timeout=None):
+        if timeout is None:
+            timeout = settings.DATAAPI_POOL_TIMEOUT
+
+        # 连接槽位全部被借出，需要等待其他请求归还连接
+        waiting = self.pool is not None and self.pool.empty()
+        if waiting:
+            DATAAPI_POOL_WAITS.labels(host=self.host).inc()
+
+        start_time = time.time()
+        num_connections = self.num_connections
+        try:
+            return super()._get_conn(timeout=timeout)
+        finally:
+            if waiting:
+                DATAAPI_POOL_WAIT_SECONDS.labels(host=self.host).observe(time.time() - start_time)
+            # _get_conn 只有在拿到空槽位时才会新建连接，连接数不变即为复用
+            reused = self.num_connections == num_connections
+            DATAAPI_POOL_REQUESTS.labels(host=self.host, reused=reused).inc()
+
+    def _new_conn(self):
+        DATAAPI_POOL_NEW_CONNECTIONS.labels(host=self.host).inc()
+        return super()._new_conn()
+
+    def _put_conn(self, conn):
+        # 非阻塞模式下连接池已满时 urllib3 会直接关闭连接，这部分即为连接抖动
+        if self.pool is not None and self.pool.full():
+            DATAAPI_POOL_DISCARDED_CONNECTIONS.labels(host=self.host).inc()
+        return super()._put_conn(conn)
+
+
+class InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(adapters.HTTPAdapter):
+    """带统计能力的连接池适配器，连接池按 host 隔离，每个 host 最多保持 pool_maxsize 个长连接"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": InstrumentedHTTPConnectionPool,
+            "https": InstrumentedHTTPSConnectionPool,
+        }
+
+
+class NonPersistentCookieJar(RequestsCookieJar):
+    """
+    共享 session 不能保存响应中的 cookies，否则会把某个用户的登录态泄露给同进程的其他请求
+    请求级别的 cookies 通过 session.request(cookies=...) 传入，不受影响
+    """
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        return None
+
+
+class SessionPool:
+    """
+    进程级别的 requests session 池，按 (base, ssl) 共享给所有的 DataAPI 实例
+    - 每个 session 挂载同一套连接池参数，保持 keep-alive 长连接
+    - https 的客户端证书只在创建 session 时加载一次
+    - 进程 fork 后（celery/gunicorn worker）会自动重建，避免父子进程共享 socket
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str, bool], requests.Session] = {}
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _create_session(cert: Optional[Tuple[str, str]] = None) -> requests.Session:
+        session = requests.Session()
+        session.cookies = NonPersistentCookieJar()
+        adapter = PooledHTTPAdapter(
+            pool_connections=settings.DATAAPI_POOL_CONNECTIONS,
+            pool_maxsize=settings.DATAAPI_POOL_MAXSIZE,
+            pool_block=settings.DATAAPI_POOL_BLOCK,
+            # DataAPI 自身有超时重试逻辑，连接层不做重试
+            max_retries=0,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if cert:
+            session.cert = cert
+        return session
+
+    def get_session(self, base: str, ssl: bool = False, cert_loader: Callable = None) -> requests.Session:
+        """
+        获取 base 对应的共享 session
+        @param base: 接口的 base 地址
+        @param ssl: 是否需要带上客户端证书
+        @param cert_loader: 客户端证书加载函数，返回 (client_crt, client_key)
+        """
+        key = (base, ssl)
+        session = self._sessions.get(key)
+        if session is not None and self._pid == os.getpid():
+            return session
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._sessions, self._pid = {}, os.getpid()
+
+            session = self._sessions.get(key)
+            if session is None:
+                cert = cert_loader() if ssl and cert_loader else None
+                session = self._sessions[key] = self._create_session(cert)
+                logger.info("[SessionPool] create pooled session for base: %s, ssl: %s", base, ssl)
+            return session
+
+    def clear(self):
+        """关闭所有 session，证书轮换或者测试场景下使用"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+session_pool = SessionPool()
+
+
+class UpstreamExecutorPool:
+    """
+    进程级别的上游并发限制器，每个上游(base)独占一个有界线程池
+    - 异步调用(DataAPI.acall)通过 run_in_executor 提交到对应上游的线程池，线程在请求之间复用
+    - 线程池大小即该上游在本进程内的最大并发数，超出部分在线程池队列中排队
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._pid = os.getpid()
+
+    @staticmethod
+    def get_concurrency(base: str) -> int:
+        return settings.DATAAPI_UPSTREAM_CONCURRENCY.get(base, settings.CONCURRENT_NUMBER)
+
+    def get_executor(self, base: str) -> ThreadPoolExecutor:
+        executor = self._executors.get(base)
+        if executor is not None and self._pid == os.getpid():
+            return executor
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executors, self._pid = {}, os.getpid()
+
+            executor = self._executors.get(base)
+            if executor is None:
+                executor = self._executors[base] = ThreadPoolExecutor(
+                    max_workers=self.get_concurrency(base), thread_name_prefix="dataapi-async"
+                )
+            return executor
+
+
+upstream_executor_pool = UpstreamExecutorPool()
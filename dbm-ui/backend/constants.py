@@ -70,7 +70,3 @@ class CommonHostDBMeta:
     db_type: str
     instance_role: str
     instance_port: str
-
-
-# 集群状态数据缓存key
-CACHE_CLUSTER_STATS = "cluster_stats"
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict
+from urllib.parse import parse_qs
+
+from backend.core.status_stream.constants import STATUS_STREAM_HEARTBEAT_INTERVAL, STATUS_STREAM_PATH
+from backend.core.status_stream.handlers import StatusStreamHandler
+from backend.core.status_stream.hub import StatusStreamHub, status_stream_hub
+
+logger = logging.getLogger("root")
+
+
+def format_sse(event: Dict) -> bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+class StatusStreamApp:
+    """
+    状态推送的 SSE 接口：GET /stream/status/?token=<订阅凭证>
+    连接建立后只推送凭证中频道的状态变化，客户端断线重连后应先通过普通接口拉取一次状态，再继续接收推送
+    """
+
+    def __init__(self, hub: StatusStreamHub = status_stream_hub):
+        self.hub = hub
+
+    @staticmethod
+    async def send_error(send, status: int, message: str):
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": message.encode()})
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            continue
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] != "GET":
+            return await self.send_error(send, 405, "method not allowed")
+
+        token = parse_qs(scope["query_string"].decode()).get("token", [""])[0]
+        payload = StatusStreamHandler.verify_token(token)
+        if not payload:
+            return await self.send_error(send, 403, "invalid or expired token")
+
+        headers = [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            # 关闭网关的响应缓冲，保证消息实时送达
+            (b"x-accel-buffering", b"no"),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+        subscription = self.hub.subscribe(payload["channels"])
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            while not disconnect.done() and not subscription.overflowed and time.time() < payload["expire_at"]:
+                get_event = asyncio.ensure_future(subscription.queue.get())
+                done, __ = await asyncio.wait(
+                    [get_event, disconnect],
+                    timeout=STATUS_STREAM_HEARTBEAT_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if get_event in done:
+                    body = format_sse(get_event.result())
+                else:
+                    get_event.cancel()
+                    body = b": heartbeat\n\n"
+                if not disconnect.done():
+                    await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            disconnect.cancel()
+            self.hub.unsubscribe(subscription)
+
+        if not disconnect.done():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class StatusStreamRouter:
+    """ASGI 入口路由：状态推送走 SSE 长连接，其余请求交给 django 处理"""
+
+    def __init__(self, django_application, stream_application: StatusStreamApp = None):
+        self.django_application = django_application
+        self.stream_application = stream_application or StatusStreamApp()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == STATUS_STREAM_PATH:
+            return await self.stream_application(scope, receive, send)
+        return await self.django_application(scope, receive, send)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List
+
+from backend import env
+from backend.core.status_stream.constants import STATUS_STREAM_CHANNEL_PREFIX, STATUS_STREAM_RECONNECT_INTERVAL
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
+
+EventCallback = Callable[[str, Dict], None]
+
+
+class BaseStatusBroker:
+    """
+    状态消息的分发层：发布方(flow 信号处理、单据状态更新)发布消息，每个推送进程只需要订阅一次，再由进程内的 hub 分发给各个连接
+    """
+
+    def publish(self, channel: str, event: Dict):
+        raise NotImplementedError
+
+    def start(self, callback: EventCallback):
+        """开始接收所有频道的消息，callback 可能在其他线程中被调用"""
+        raise NotImplementedError
+
+
+class LocalStatusBroker(BaseStatusBroker):
+    """进程内分发，发布方与推送连接需要在同一个进程"""
+
+    def __init__(self):
+        self._callbacks: List[EventCallback] = []
+
+    def publish(self, channel: str, event: Dict):
+        for callback in self._callbacks:
+            callback(channel, event)
+
+    def start(self, callback: EventCallback):
+        self._callbacks.append(callback)
+
+
+class RedisStatusBroker(BaseStatusBroker):
+    """通过 redis pub/sub 跨进程分发，每个推送进程使用一个后台线程订阅所有状态频道"""
+
+    def __init__(self, redis=RedisConn, prefix: str = STATUS_STREAM_CHANNEL_PREFIX):
+        self.redis = redis
+        self.prefix = prefix
+
+    def publish(self, channel: str, event: Dict):
+        self.redis.publish(f"{self.prefix}{channel}", json.dumps(event))
+
+    def _listen(self, callback: EventCallback):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{self.prefix}*")
+                for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    callback(message["channel"][len(self.prefix) :], json.loads(message["data"]))
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning("[RedisStatusBroker] subscribe failed, retry later: %s", err)
+            finally:
+                pubsub.close()
+            time.sleep(STATUS_STREAM_RECONNECT_INTERVAL)
+
+    def start(self, callback: EventCallback):
+        threading.Thread(target=self._listen, args=(callback,), name="status-stream-broker", daemon=True).start()
+
+
+def get_status_broker() -> BaseStatusBroker:
+    if env.STATUS_STREAM_BROKER == "local":
+        return LocalStatusBroker()
+    return RedisStatusBroker()
+
+
+status_broker = get_status_broker()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.utils.translation import ugettext_lazy as _
+
+from blue_krill.data_types.enum import EnumField, StructuredEnum
+
+# SSE 接口的路径，由 backend/asgi.py 路由
+STATUS_STREAM_PATH = "/stream/status/"
+# redis 频道的前缀
+STATUS_STREAM_CHANNEL_PREFIX = "dbm:status_stream:"
+# 订阅凭证的签名盐值和有效期(s)，凭证过期后连接会被关闭，客户端需要重新获取凭证
+STATUS_STREAM_TOKEN_SALT = "dbm.status_stream"
+STATUS_STREAM_TOKEN_EXPIRE = 60 * 60
+# 单个凭证最多订阅的频道数
+STATUS_STREAM_MAX_CHANNELS = 500
+# 心跳间隔(s)，避免连接被网关判定为空闲而断开
+STATUS_STREAM_HEARTBEAT_INTERVAL = 15
+# 单个连接的待发送消息上限，超出后关闭连接，由客户端重连后重新拉取全量状态
+STATUS_STREAM_QUEUE_SIZE = 1000
+# redis 订阅断开后的重连间隔(s)
+STATUS_STREAM_RECONNECT_INTERVAL = 3
+
+
+class StatusEventType(str, StructuredEnum):
+    FLOW_NODE = EnumField("flow_node", _("流程节点状态变化"))
+    FLOW_TREE = EnumField("flow_tree", _("流程状态变化"))
+    TICKET_FLOW = EnumField("ticket_flow", _("单据流程状态变化"))
+    TICKET = EnumField("ticket", _("单据状态变化"))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.db import transaction
+
+from backend.core.status_stream.broker import status_broker
+from backend.core.status_stream.constants import (
+    STATUS_STREAM_PATH,
+    STATUS_STREAM_TOKEN_EXPIRE,
+    STATUS_STREAM_TOKEN_SALT,
+    StatusEventType,
+)
+
+logger = logging.getLogger("root")
+
+
+class StatusStreamHandler:
+    """状态推送：发布状态变化，签发/校验订阅凭证"""
+
+    @staticmethod
+    def flow_channel(root_id: str) -> str:
+        return f"flow:{root_id}"
+
+    @staticmethod
+    def ticket_channel(ticket_id: int) -> str:
+        return f"ticket:{ticket_id}"
+
+    @classmethod
+    def publish(cls, channels: List[str], event_type: StatusEventType, **data):
+        """
+        发布状态变化，发布失败只影响推送，不能影响状态的流转
+        @param channels: 发布的频道
+        @param event_type: 消息类型
+        @param data: 消息内容
+        """
+        event = {"type": event_type.value, "timestamp": time.time(), **data}
+        for channel in channels:
+            try:
+                status_broker.publish(channel, event)
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning("[StatusStreamHandler] publish to %s failed: %s", channel, err)
+
+    @classmethod
+    def publish_on_commit(cls, channels: List[str], event_type: StatusEventType, **data):
+        """事务提交后再发布，避免客户端收到消息后查询到旧数据"""
+        transaction.on_commit(lambda: cls.publish(channels, event_type, **data))
+
+    @staticmethod
+    def create_token(username: str, channels: List[str]) -> Dict[str, Any]:
+        """
+        签发订阅凭证，凭证中包含已经鉴权的频道，推送连接只需要校验签名，不需要查询数据库
+        @param username: 订阅用户
+        @param channels: 订阅的频道
+        """
+        expire_at = int(time.time()) + STATUS_STREAM_TOKEN_EXPIRE
+        token = signing.dumps(
+            {"username": username, "channels": channels, "expire_at": expire_at}, salt=STATUS_STREAM_TOKEN_SALT
+        )
+        return {"token": token, "url": f"{STATUS_STREAM_PATH}?{urlencode({'token': token})}", "expire_at": expire_at}
+
+    @staticmethod
+    def verify_token(token: str) -> Optional[Dict[str, Any]]:
+        """校验订阅凭证，凭证无效或已过期时返回 None"""
+        try:
+            payload = signing.loads(token, salt=STATUS_STREAM_TOKEN_SALT, max_age=STATUS_STREAM_TOKEN_EXPIRE)
+        except signing.BadSignature:
+            return None
+        return payload
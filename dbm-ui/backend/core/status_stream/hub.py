@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from prometheus_client import Counter, Gauge
+
+from backend.core.status_stream.broker import BaseStatusBroker, status_broker
+from backend.core.status_stream.constants import STATUS_STREAM_QUEUE_SIZE
+
+logger = logging.getLogger("root")
+
+STATUS_STREAM_CONNECTIONS = Gauge("dbm_status_stream_connections", "状态推送的当前连接数")
+STATUS_STREAM_EVENTS = Counter("dbm_status_stream_events_total", "状态推送分发给连接的消息数", ["result"])
+
+
+class Subscription:
+    """单个连接的订阅，overflowed 表示消息积压超出上限，连接需要关闭"""
+
+    def __init__(self, channels: List[str]):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=STATUS_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class StatusStreamHub:
+    """
+    进程内的状态消息分发中心
+    - 首次订阅时才开始接收 broker 的消息，同一进程只订阅一次
+    - 消息按频道分发给订阅了该频道的连接，没有连接订阅的频道直接丢弃，不会产生任何数据库查询
+    """
+
+    def __init__(self, broker: BaseStatusBroker = status_broker):
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, channels: List[str]) -> Subscription:
+        """订阅频道，需要在事件循环中调用"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.get_event_loop()
+                self.broker.start(self.dispatch)
+
+        subscription = Subscription(channels)
+        for channel in channels:
+            self._subscriptions[channel].add(subscription)
+        STATUS_STREAM_CONNECTIONS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscriptions.get(channel)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscriptions.pop(channel, None)
+        STATUS_STREAM_CONNECTIONS.dec()
+
+    def dispatch(self, channel: str, event: Dict):
+        """接收 broker 的消息，可以在任意线程调用"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, channel, event)
+
+    def _dispatch(self, channel: str, event: Dict):
+        for subscription in list(self._subscriptions.get(channel, [])):
+            if subscription.overflowed:
+                continue
+            try:
+                subscription.queue.put_nowait({"channel": channel, **event})
+                STATUS_STREAM_EVENTS.labels(result="sent").inc()
+            except asyncio.QueueFull:
+                # 客户端消费过慢，关闭连接，重连后重新拉取全量状态
+                subscription.overflowed = True
+                STATUS_STREAM_EVENTS.labels(result="overflow").inc()
+                logger.warning("[StatusStreamHub] subscription overflowed, channels: %s", subscription.channels)
+
+
+status_stream_hub = StatusStreamHub()
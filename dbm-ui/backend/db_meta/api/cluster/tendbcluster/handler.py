@@ -305,6 +305,9 @@ class TenDBClusterClusterHandler(ClusterHandler):
                 labels_dict={"instance_role": InstanceRole.REMOTE_SLAVE.value},
             )
 
+        # 批量 update 不会触发实例信号，主从角色互换后需要重算集群状态标志位
+        Cluster.refresh_status_flags([cluster])
+
     def get_remote_address(self, role=TenDBBackUpLocation.REMOTE) -> str:
         """
         查询DRS访问远程数据库的地址，你默认查询remote的db
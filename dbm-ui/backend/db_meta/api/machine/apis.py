@@ -18,6 +18,7 @@ from backend.components import CCApi
 from backend.db_meta import request_validator
 from backend.db_meta.enums import MachineTypeAccessLayerMap, machine_type_to_cluster_type
 from backend.db_meta.models import BKCity, Machine
+from backend.db_meta.signals import machines_created
 from backend.flow.utils.cc_manage import CcManage
 
 logger = logging.getLogger("root")
@@ -129,6 +130,7 @@ def create(
     """
     to_create_machines = get_create_machines(bk_cloud_id, machines, creator)
     Machine.objects.bulk_create(to_create_machines)
+    machines_created.send(sender=Machine, machines=to_create_machines)
 
 
 @transaction.atomic
@@ -142,6 +144,7 @@ def get_or_create(
     """
     to_create_machines = get_create_machines(bk_cloud_id, machines, creator)
     Machine.objects.bulk_create(to_create_machines, ignore_conflicts=True)
+    machines_created.send(sender=Machine, machines=to_create_machines)
 
 
 @transaction.atomic
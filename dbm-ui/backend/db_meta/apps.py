@@ -12,7 +12,7 @@ import logging
 
 from django.apps import AppConfig
 from django.db import IntegrityError
-from django.db.models.signals import m2m_changed, post_migrate, post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
 
 logger = logging.getLogger("root")
 
@@ -43,8 +43,8 @@ class DBMeta(AppConfig):
     name = "backend.db_meta"
 
     def ready(self):
-        from backend.db_meta.models import ProxyInstance, StorageInstance
-        from backend.db_meta.signals import update_cluster_status
+        from backend.db_meta.models import ProxyInstance, StorageInstance, TenDBClusterSpiderExt
+        from backend.db_meta.signals import update_cluster_access_port, update_cluster_status
 
         post_migrate.connect(init_db_meta, sender=self)
         # 当实例进行修改或者删除时，更新集群状态
@@ -54,3 +54,10 @@ class DBMeta(AppConfig):
         pre_delete.connect(update_cluster_status, sender=ProxyInstance)
         m2m_changed.connect(update_cluster_status, sender=StorageInstance.cluster.through)
         m2m_changed.connect(update_cluster_status, sender=ProxyInstance.cluster.through)
+        # 当集群的实例关系、实例端口/角色或者 spider 角色变更时，更新集群访问端口
+        m2m_changed.connect(update_cluster_access_port, sender=StorageInstance.cluster.through)
+        m2m_changed.connect(update_cluster_access_port, sender=ProxyInstance.cluster.through)
+        post_save.connect(update_cluster_access_port, sender=StorageInstance)
+        post_save.connect(update_cluster_access_port, sender=ProxyInstance)
+        post_save.connect(update_cluster_access_port, sender=TenDBClusterSpiderExt)
+        post_delete.connect(update_cluster_access_port, sender=TenDBClusterSpiderExt)
@@ -0,0 +1,90 @@
+# Generated by Django 3.2.25 on 2024-07-10 10:00
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# 迁移中固化集群状态标志位的计算规则(对应 db_meta.enums.cluster_status 中的标志位定义)，不依赖后续可能变化的模型和枚举
+UNAVAILABLE = "unavailable"
+TEMPORARY, NORMAL, ABNORMAL = "temporary", "normal", "abnormal"
+MASTER, SLAVE = "master", "slave"
+# 接入层/master/slave 分别占用一个标志位的集群类型
+PROXY_BACKEND_CLUSTER_TYPES = ["tendbha", "tendbcluster"]
+# 存在不可用存储实例即异常的集群类型：tendbsingle 和 redis 各集群类型
+STORAGE_ONLY_CLUSTER_TYPES = [
+    "tendbsingle",
+    "redis",
+    "PredixyRedisCluster",
+    "PredixyTendisplusCluster",
+    "TwemproxyRedisInstance",
+    "TwemproxyTendisSSDInstance",
+    "TwemproxyTendisplusInstance",
+    "RedisInstance",
+    "TendisSSDInstance",
+    "TendisplusInstance",
+    "RedisCluster",
+    "TendisplusCluster",
+]
+
+
+def calc_status_flag(cluster_type, proxy_unavailable, unavailable_storage_roles):
+    flag = 0
+    if cluster_type in PROXY_BACKEND_CLUSTER_TYPES:
+        if proxy_unavailable:
+            flag |= 1
+        if MASTER in unavailable_storage_roles:
+            flag |= 2
+        if SLAVE in unavailable_storage_roles:
+            flag |= 4
+    elif cluster_type in STORAGE_ONLY_CLUSTER_TYPES and unavailable_storage_roles:
+        flag |= 1
+    return flag
+
+
+def backfill_status_flag_value(apps, schema_editor):
+    Cluster = apps.get_model("db_meta", "Cluster")
+
+    # 历史集群的状态标志位按当前实例状态初始化一次，只有存在不可用实例的集群才需要计算
+    proxy_unavailable_cluster_ids = set(
+        Cluster.objects.filter(proxyinstance__status=UNAVAILABLE).values_list("id", flat=True).order_by().distinct()
+    )
+    cluster_id__unavailable_storage_roles = defaultdict(set)
+    for cluster_id, inner_role in (
+        Cluster.objects.filter(storageinstance__status=UNAVAILABLE)
+        .values_list("id", "storageinstance__instance_inner_role")
+        .order_by()
+        .distinct()
+    ):
+        cluster_id__unavailable_storage_roles[cluster_id].add(inner_role)
+
+    changed_clusters = []
+    clusters = Cluster.objects.only("id", "cluster_type", "status", "status_flag_value").order_by("id")
+    for cluster in clusters.iterator(chunk_size=1000):
+        flag = calc_status_flag(
+            cluster.cluster_type,
+            cluster.id in proxy_unavailable_cluster_ids,
+            cluster_id__unavailable_storage_roles.get(cluster.id, set()),
+        )
+        status = cluster.status if cluster.status == TEMPORARY else (ABNORMAL if flag else NORMAL)
+        # 只更新计算结果与当前值不一致的集群
+        if (flag, status) != (cluster.status_flag_value, cluster.status):
+            cluster.status_flag_value, cluster.status = flag, status
+            changed_clusters.append(cluster)
+
+    Cluster.objects.bulk_update(changed_clusters, fields=["status_flag_value", "status"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("db_meta", "0040_auto_20240702_0757"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cluster",
+            name="status_flag_value",
+            field=models.IntegerField(default=0, help_text="集群状态标志位(冗余字段，随实例状态变更维护)"),
+        ),
+        migrations.RunPython(backfill_status_flag_value, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 3.2.25 on 2024-07-11 10:00
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# 迁移中固化集群访问端口的计算规则(对应 Cluster.compute_access_port)，不依赖后续可能变化的模型和枚举
+REDIS_CLUSTER_TYPES = [
+    "redis",
+    "PredixyRedisCluster",
+    "PredixyTendisplusCluster",
+    "TwemproxyRedisInstance",
+    "TwemproxyTendisSSDInstance",
+    "TwemproxyTendisplusInstance",
+    "TendisSSDInstance",
+    "TendisplusInstance",
+    "RedisCluster",
+    "TendisplusCluster",
+]
+# 集群类型 -> 按实例角色取端口的存储实例角色
+STORAGE_ROLE_CLUSTER_TYPES = {
+    "es": "es_master",
+    "kafka": "broker",
+    "hdfs": "hdfs_namenode",
+    "pulsar": "pulsar_broker",
+    "doris": "doris_follower",
+}
+DEFAULT_RIAK_PORT = 8087
+BATCH_SIZE = 500
+
+
+def calc_access_port(cluster_type, proxies, storages):
+    """
+    @param proxies: 按 id 排序的接入层实例 (port, machine_type, spider_role)
+    @param storages: 按 id 排序的存储实例 (port, instance_role, machine_type)
+    """
+    ports = []
+    if cluster_type in ["tendbsingle", "RedisInstance"]:
+        ports = [port for port, __, __ in storages]
+    elif cluster_type == "tendbha" or cluster_type in REDIS_CLUSTER_TYPES:
+        ports = [port for port, __, __ in proxies]
+    elif cluster_type == "tendbcluster":
+        ports = [port for port, __, spider_role in proxies if spider_role == "spider_master"]
+    elif cluster_type in STORAGE_ROLE_CLUSTER_TYPES:
+        ports = [port for port, role, __ in storages if role == STORAGE_ROLE_CLUSTER_TYPES[cluster_type]]
+    elif cluster_type == "riak":
+        ports = [DEFAULT_RIAK_PORT]
+    elif cluster_type == "MongoShardedCluster":
+        ports = [port for port, machine_type, __ in proxies if machine_type == "mongos"]
+    elif cluster_type == "MongoReplicaSet":
+        ports = [port for port, __, machine_type in storages if machine_type == "mongodb"]
+    return ports[0] if ports else 0
+
+
+def backfill_access_port(apps, schema_editor):
+    Cluster = apps.get_model("db_meta", "Cluster")
+    ProxyInstance = apps.get_model("db_meta", "ProxyInstance")
+    StorageInstance = apps.get_model("db_meta", "StorageInstance")
+
+    # 历史集群的访问端口按当前实例信息回填一次，只更新计算结果与当前值不一致的集群
+    clusters = list(Cluster.objects.only("id", "cluster_type", "access_port").order_by("id"))
+    for offset in range(0, len(clusters), BATCH_SIZE):
+        batch = clusters[offset : offset + BATCH_SIZE]
+        cluster_ids = [cluster.id for cluster in batch]
+        cluster_id__proxies, cluster_id__storages = defaultdict(list), defaultdict(list)
+        for cluster_id, *proxy in (
+            ProxyInstance.objects.filter(cluster__id__in=cluster_ids)
+            .values_list("cluster__id", "port", "machine_type", "tendbclusterspiderext__spider_role")
+            .order_by("id")
+        ):
+            cluster_id__proxies[cluster_id].append(proxy)
+        for cluster_id, *storage in (
+            StorageInstance.objects.filter(cluster__id__in=cluster_ids)
+            .values_list("cluster__id", "port", "instance_role", "machine_type")
+            .order_by("id")
+        ):
+            cluster_id__storages[cluster_id].append(storage)
+
+        changed_clusters = []
+        for cluster in batch:
+            access_port = calc_access_port(
+                cluster.cluster_type, cluster_id__proxies[cluster.id], cluster_id__storages[cluster.id]
+            )
+            if cluster.access_port != access_port:
+                cluster.access_port = access_port
+                changed_clusters.append(cluster)
+        Cluster.objects.bulk_update(changed_clusters, fields=["access_port"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("db_meta", "0041_cluster_status_flag_value"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cluster",
+            name="access_port",
+            field=models.PositiveIntegerField(default=0, help_text="集群访问端口(冗余字段，随实例变更维护)"),
+        ),
+        migrations.RunPython(backfill_access_port, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 3.2.25 on 2024-07-12 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("db_meta", "0042_cluster_access_port"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClusterStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bk_biz_id", models.IntegerField(help_text="业务ID")),
+                (
+                    "cluster_type",
+                    models.CharField(
+                        choices=[
+                            ("tendbsingle", "MySQL单节点集群"),
+                            ("tendbha", "MySQL高可用集群"),
+                            ("tendbcluster", "TendbCluster集群"),
+                            ("redis", "Redis"),
+                            ("PredixyRedisCluster", "RedisCluster集群"),
+                            ("PredixyTendisplusCluster", "Tendisplus存储版集群"),
+                            ("TwemproxyRedisInstance", "TendisCache集群"),
+                            ("TwemproxyTendisSSDInstance", "TendisSSD集群"),
+                            ("TwemproxyTendisplusInstance", "Tendis存储版集群"),
+                            ("RedisInstance", "RedisCache主从版"),
+                            ("TendisSSDInstance", "TendisSSD主从版"),
+                            ("TendisplusInstance", "Tendisplus主从版"),
+                            ("RedisCluster", "RedisCluster集群"),
+                            ("TendisplusCluster", "TendisplusCluster集群"),
+                            ("TendisplusInstance", "Tendisplus存储版集群"),
+                            ("RedisInstance", "TendisCache集群"),
+                            ("TendisSSDInstance", "TendisSSD集群"),
+                            ("es", "ES集群"),
+                            ("kafka", "Kafka集群"),
+                            ("hdfs", "Hdfs集群"),
+                            ("influxdb", "Influxdb实例"),
+                            ("pulsar", "Pulsar集群"),
+                            ("doris", "Doris集群"),
+                            ("vm", "vm集群"),
+                            ("dbmon", "redis监控"),
+                            ("MongoReplicaSet", "Mongo副本集"),
+                            ("MongoShardedCluster", "Mongo分片集群"),
+                            ("riak", "Riak集群"),
+                            ("sqlserver_single", "sqlserver单节点版"),
+                            ("sqlserver_ha", "sqlserver主从版"),
+                        ],
+                        help_text="集群类型",
+                        max_length=64,
+                    ),
+                ),
+                ("immute_domain", models.CharField(help_text="集群域名", max_length=255, unique=True)),
+                ("used", models.BigIntegerField(help_text="已用容量(bytes)", null=True)),
+                ("total", models.BigIntegerField(help_text="总容量(bytes)", null=True)),
+                ("in_use", models.FloatField(help_text="使用率(%)", null=True)),
+                ("update_at", models.DateTimeField(auto_now=True, help_text="更新时间")),
+            ],
+            options={
+                "verbose_name": "集群容量(ClusterStats)",
+                "verbose_name_plural": "集群容量(ClusterStats)",
+                "index_together": {("bk_biz_id", "cluster_type")},
+            },
+        ),
+        migrations.CreateModel(
+            name="ClusterStatsHistory",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bk_biz_id", models.IntegerField(help_text="业务ID")),
+                (
+                    "cluster_type",
+                    models.CharField(
+                        choices=[
+                            ("tendbsingle", "MySQL单节点集群"),
+                            ("tendbha", "MySQL高可用集群"),
+                            ("tendbcluster", "TendbCluster集群"),
+                            ("redis", "Redis"),
+                            ("PredixyRedisCluster", "RedisCluster集群"),
+                            ("PredixyTendisplusCluster", "Tendisplus存储版集群"),
+                            ("TwemproxyRedisInstance", "TendisCache集群"),
+                            ("TwemproxyTendisSSDInstance", "TendisSSD集群"),
+                            ("TwemproxyTendisplusInstance", "Tendis存储版集群"),
+                            ("RedisInstance", "RedisCache主从版"),
+                            ("TendisSSDInstance", "TendisSSD主从版"),
+                            ("TendisplusInstance", "Tendisplus主从版"),
+                            ("RedisCluster", "RedisCluster集群"),
+                            ("TendisplusCluster", "TendisplusCluster集群"),
+                            ("TendisplusInstance", "Tendisplus存储版集群"),
+                            ("RedisInstance", "TendisCache集群"),
+                            ("TendisSSDInstance", "TendisSSD集群"),
+                            ("es", "ES集群"),
+                            ("kafka", "Kafka集群"),
+                            ("hdfs", "Hdfs集群"),
+                            ("influxdb", "Influxdb实例"),
+                            ("pulsar", "Pulsar集群"),
+                            ("doris", "Doris集群"),
+                            ("vm", "vm集群"),
+                            ("dbmon", "redis监控"),
+                            ("MongoReplicaSet", "Mongo副本集"),
+                            ("MongoShardedCluster", "Mongo分片集群"),
+                            ("riak", "Riak集群"),
+                            ("sqlserver_single", "sqlserver单节点版"),
+                            ("sqlserver_ha", "sqlserver主从版"),
+                        ],
+                        help_text="集群类型",
+                        max_length=64,
+                    ),
+                ),
+                ("immute_domain", models.CharField(help_text="集群域名", max_length=255)),
+                ("used", models.BigIntegerField(help_text="已用容量(bytes)", null=True)),
+                ("total", models.BigIntegerField(help_text="总容量(bytes)", null=True)),
+                ("in_use", models.FloatField(help_text="使用率(%)", null=True)),
+                ("create_at", models.DateTimeField(auto_now_add=True, db_index=True, help_text="记录时间")),
+            ],
+            options={
+                "verbose_name": "集群容量历史(ClusterStatsHistory)",
+                "verbose_name_plural": "集群容量历史(ClusterStatsHistory)",
+                "index_together": {("immute_domain", "create_at")},
+            },
+        ),
+    ]
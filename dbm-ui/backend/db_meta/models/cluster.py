@@ -9,22 +9,21 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-import json
 import logging
+from collections import defaultdict
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Dict, Iterable, List, Set, Type
 
-from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
-from django.db.models import Count, Q, QuerySet
+from django.db import DatabaseError, models
+from django.db.models import Count, Prefetch, Q, QuerySet
 from django.forms import model_to_dict
 from django.utils.translation import ugettext_lazy as _
 
 from backend.bk_web.models import AuditedModel
 from backend.components.db_remote_service.client import DRSApi
 from backend.configuration.constants import AffinityEnum, DBType
-from backend.constants import CACHE_CLUSTER_STATS, DEFAULT_BK_CLOUD_ID, DEFAULT_TIME_ZONE, IP_PORT_DIVIDER
+from backend.constants import DEFAULT_BK_CLOUD_ID, DEFAULT_TIME_ZONE, IP_PORT_DIVIDER
 from backend.db_meta.enums import (
     ClusterDBHAStatusFlags,
     ClusterPhase,
@@ -41,8 +40,10 @@ from backend.db_meta.enums.cluster_status import (
     ClusterCommonStatusFlags,
     ClusterDBSingleStatusFlags,
     ClusterRedisStatusFlags,
+    ClusterStatusFlags,
 )
 from backend.db_meta.exceptions import ClusterExclusiveOperateException, DBMetaException
+from backend.db_meta.models.cluster_stats import ClusterStats
 from backend.db_services.version.constants import LATEST, PredixyVersion, TwemproxyVersion
 from backend.flow.consts import DEFAULT_RIAK_PORT
 from backend.ticket.constants import TicketType
@@ -67,14 +68,40 @@ class Cluster(AuditedModel):
         max_length=128, help_text=_("容灾要求"), choices=AffinityEnum.get_choices(), default=AffinityEnum.NONE.value
     )
     time_zone = models.CharField(max_length=16, default=DEFAULT_TIME_ZONE, help_text=_("集群所在的时区"))
+    status_flag_value = models.IntegerField(default=0, help_text=_("集群状态标志位(冗余字段，随实例状态变更维护)"))
+    access_port = models.PositiveIntegerField(default=0, help_text=_("集群访问端口(冗余字段，随实例变更维护)"))
 
     class Meta:
         unique_together = ("bk_biz_id", "name", "cluster_type", "db_module_id")
         verbose_name = verbose_name_plural = _("集群(Cluster)")
 
+    # 冗余字段，只能通过 refresh_status_flags/refresh_access_ports 维护
+    DERIVED_FIELDS = ("status_flag_value", "access_port")
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # 调用方指定了保存字段，或者是新建/强制插入/强制更新时，保持 Django 的默认行为
+        if self._state.adding or args or set(kwargs) & {"update_fields", "force_insert", "force_update"}:
+            super().save(*args, **kwargs)
+            return
+
+        # 已存在的集群全量保存时跳过冗余字段，避免过期的集群对象覆盖信号中刚刷新的值；未加载的延迟字段同样跳过
+        deferred_fields = self.get_deferred_fields()
+        update_fields = [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.DERIVED_FIELDS and field.attname not in deferred_fields
+        ]
+        try:
+            super().save(update_fields=update_fields, **kwargs)
+        except DatabaseError as err:
+            # 集群记录已被删除时 update_fields 不会更新任何行，与默认行为一致，重新插入该集群
+            if "did not affect any rows" not in str(err):
+                raise
+            super().save(**kwargs)
+
     def to_dict(self):
         """将集群所有字段转为字段"""
         return {**model_to_dict(self), "cluster_type_name": str(ClusterType.get_choice_label(self.cluster_type))}
@@ -131,24 +158,30 @@ class Cluster(AuditedModel):
         """
         处理当前的动作是否和集群正在运行的动作存在执行互斥
         """
-        for cluster_id in cluster_ids:
-            exclusive_infos = cls.is_exclusive(cluster_id, ticket_type, **kwargs)
-            if not exclusive_infos:
-                continue
-
-            # 存在互斥操作，则抛出错误让用户后续重试该inner flow
-            exclusive_infos = [
-                (
-                    f'{TicketType.get_choice_label(info["exclusive_ticket"].ticket_type)}'
-                    f'(ticket_id:{info["exclusive_ticket"].id})'
-                )
-                for info in exclusive_infos
-            ]
-            raise ClusterExclusiveOperateException(
-                _("当前操作「{}」与集群(id:{})的操作「{}」存在执行互斥").format(
-                    TicketType.get_choice_label(ticket_type), cluster_id, ",".join(exclusive_infos)
-                )
+        # 一次查询得到所有集群的互斥操作
+        cluster_exclusive_infos = ClusterOperateRecord.objects.get_exclusive_operations(
+            ticket_type, cluster_ids, **kwargs
+        )
+        exclusive_cluster_ids = [cluster_id for cluster_id in cluster_ids if cluster_exclusive_infos.get(cluster_id)]
+        if not exclusive_cluster_ids:
+            return
+
+        # 存在互斥操作，则抛出错误让用户后续重试该inner flow，错误信息展示第一个互斥的集群
+        cluster_id = exclusive_cluster_ids[0]
+        exclusive_infos = [
+            (
+                f'{TicketType.get_choice_label(info["exclusive_ticket"].ticket_type)}'
+                f'(ticket_id:{info["exclusive_ticket"].id})'
             )
+            for info in cluster_exclusive_infos[cluster_id]
+        ]
+        raise ClusterExclusiveOperateException(
+            _("当前操作「{}」与集群(id:{})的操作「{}」存在执行互斥").format(
+                TicketType.get_choice_label(ticket_type), cluster_id, ",".join(exclusive_infos)
+            ),
+            # 所有存在互斥操作的集群，用于互斥等待
+            data={"exclusive_cluster_ids": exclusive_cluster_ids},
+        )
 
     def can_access(self) -> (bool, str):
         # 判断集群的状态是否正常
@@ -175,58 +208,135 @@ class Cluster(AuditedModel):
             return TwemproxyVersion.TwemproxyLatest
         return LATEST
 
-    @property
-    def __status_flag(self):
+    @classmethod
+    def get_status_flag_class(cls, cluster_type: str) -> Type[ClusterStatusFlags]:
+        """获取集群类型对应的状态标志位枚举"""
+        if cluster_type == ClusterType.TenDBHA.value:
+            return ClusterDBHAStatusFlags
+        elif cluster_type == ClusterType.TenDBCluster.value:
+            return ClusterTenDBClusterStatusFlag
+        elif cluster_type == ClusterType.TenDBSingle.value:
+            return ClusterDBSingleStatusFlags
+        elif cluster_type in ClusterType.redis_cluster_types():
+            return ClusterRedisStatusFlags
+        return ClusterCommonStatusFlags
+
+    def _calc_status_flag(self, proxy_unavailable: bool, unavailable_storage_roles: Set[str]) -> ClusterStatusFlags:
+        """
+        根据不可用的实例情况计算集群状态标志位
+        @param proxy_unavailable: 是否存在不可用的接入层实例
+        @param unavailable_storage_roles: 不可用存储实例的 instance_inner_role 集合
+        """
+        flag_class = self.get_status_flag_class(self.cluster_type)
+        flag_obj = flag_class(0)
         # tendb ha
-        if self.cluster_type == ClusterType.TenDBHA.value:
-            flag_obj = ClusterDBHAStatusFlags(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+        if flag_class == ClusterDBHAStatusFlags:
+            if proxy_unavailable:
                 flag_obj |= ClusterDBHAStatusFlags.ProxyUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
+            if InstanceInnerRole.MASTER.value in unavailable_storage_roles:
                 flag_obj |= ClusterDBHAStatusFlags.BackendMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
+            if InstanceInnerRole.SLAVE.value in unavailable_storage_roles:
                 flag_obj |= ClusterDBHAStatusFlags.BackendSlaveUnavailable
         # tendbcluster
-        elif self.cluster_type == ClusterType.TenDBCluster.value:
-            flag_obj = ClusterTenDBClusterStatusFlag(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+        elif flag_class == ClusterTenDBClusterStatusFlag:
+            if proxy_unavailable:
                 flag_obj |= ClusterTenDBClusterStatusFlag.SpiderUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
+            if InstanceInnerRole.MASTER.value in unavailable_storage_roles:
                 flag_obj |= ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
+            if InstanceInnerRole.SLAVE.value in unavailable_storage_roles:
                 flag_obj |= ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable
         # tendb single
-        elif self.cluster_type == ClusterType.TenDBSingle.value:
-            flag_obj = ClusterDBSingleStatusFlags(0)
-            if self.storageinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+        elif flag_class == ClusterDBSingleStatusFlags:
+            if unavailable_storage_roles:
                 flag_obj |= ClusterDBSingleStatusFlags.SingleUnavailable
         # redis
-        elif self.cluster_type in ClusterType.redis_cluster_types():
-            flag_obj = ClusterRedisStatusFlags(0)
-            if self.storageinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
+        elif flag_class == ClusterRedisStatusFlags:
+            if unavailable_storage_roles:
                 flag_obj |= ClusterRedisStatusFlags.RedisUnavailable
         # 默认
         else:
             logger.debug(_("{} 未实现 status flag, 认为实例异常会导致集群异常".format(self.cluster_type)))
-            flag_obj = ClusterCommonStatusFlags(0)
 
         return flag_obj
 
+    @classmethod
+    def bulk_compute_status_flags(cls, clusters: Iterable["Cluster"]) -> Dict[int, int]:
+        """
+        批量根据实例状态实时计算集群状态标志位，查询次数固定为两次，与集群数量无关
+        @param clusters: 集群列表
+        """
+        clusters = list(clusters)
+        cluster_ids = [cluster.id for cluster in clusters]
+
+        proxy_unavailable_cluster_ids = set(
+            cls.objects.filter(id__in=cluster_ids, proxyinstance__status=InstanceStatus.UNAVAILABLE.value)
+            .values_list("id", flat=True)
+            .order_by()
+            .distinct()
+        )
+        cluster_id__unavailable_storage_roles: Dict[int, Set[str]] = defaultdict(set)
+        for cluster_id, inner_role in (
+            cls.objects.filter(id__in=cluster_ids, storageinstance__status=InstanceStatus.UNAVAILABLE.value)
+            .values_list("id", "storageinstance__instance_inner_role")
+            .order_by()
+            .distinct()
+        ):
+            cluster_id__unavailable_storage_roles[cluster_id].add(inner_role)
+
+        return {
+            cluster.id: cluster._calc_status_flag(
+                proxy_unavailable=cluster.id in proxy_unavailable_cluster_ids,
+                unavailable_storage_roles=cluster_id__unavailable_storage_roles[cluster.id],
+            ).value
+            for cluster in clusters
+        }
+
+    def compute_status_flag(self) -> int:
+        """根据实例状态实时计算集群状态标志位，不读取冗余字段"""
+        return self.bulk_compute_status_flags([self])[self.id]
+
+    @classmethod
+    def refresh_status_flags(cls, clusters: Iterable["Cluster"]) -> List["Cluster"]:
+        """
+        重新计算集群状态标志位，并同步更新冗余字段 status_flag_value 和集群状态，返回发生变更的集群
+        实例状态变更后(信号或者 queryset.update 批量修改)需要调用，也用于修复冗余字段与实例状态的漂移
+        @param clusters: 集群列表
+        """
+        clusters = list(clusters)
+        if not clusters:
+            return []
+
+        id__status_flag = cls.bulk_compute_status_flags(clusters)
+        changed_clusters: List[Cluster] = []
+        for cluster in clusters:
+            origin_flag, origin_status = cluster.status_flag_value, cluster.status
+            cluster.status_flag_value = id__status_flag[cluster.id]
+            # 忽略临时集群的状态，只维护状态标志位
+            if cluster.status != ClusterStatus.TEMPORARY.value:
+                cluster.status = (
+                    ClusterStatus.ABNORMAL.value if cluster.status_flag_value else ClusterStatus.NORMAL.value
+                )
+            if (origin_flag, origin_status) != (cluster.status_flag_value, cluster.status):
+                logger.info(
+                    "[refresh_status_flags] update cluster(%s) status_flag: %s -> %s, status: %s -> %s",
+                    cluster.id,
+                    origin_flag,
+                    cluster.status_flag_value,
+                    origin_status,
+                    cluster.status,
+                )
+                changed_clusters.append(cluster)
+
+        cls.objects.bulk_update(changed_clusters, fields=["status_flag_value", "status"], batch_size=500)
+        return changed_clusters
+
     @property
-    def status_flag(self):
-        return self.__status_flag.value
+    def status_flag(self) -> int:
+        return self.status_flag_value
 
     @property
     def status_flag_text(self) -> List[str]:
-        return self.__status_flag.flag_text()
+        return self.get_status_flag_class(self.cluster_type)(self.status_flag_value).flag_text()
 
     def main_storage_instances(self) -> QuerySet:
         if self.cluster_type == ClusterType.TenDBSingle.value:
@@ -238,11 +348,9 @@ class Cluster(AuditedModel):
         else:
             raise DBMetaException(message=_("{} 未实现 main_storage_instance".format(self.cluster_type)))
 
-    @property
-    def access_port(self) -> int:
+    def compute_access_port(self) -> int:
         """
-        获取集群的访问端口，如果要批量查询，请使用prefetch预存instance得queryset
-        TODO: 是否考虑将此字段作为表字段，而不是实时计算
+        根据实例实时计算集群的访问端口，结果冗余存储在 access_port 字段中，如果要批量计算，请使用 bulk_compute_access_ports
         tendbsingle: 只有一台机器，直接取那个port
         tendbha, redis: 取proxy的一台port
         tendbcluster: 主域名取spider master的port   从域名取spider slave的port
@@ -283,8 +391,9 @@ class Cluster(AuditedModel):
                 return self.storageinstance_set.filter(machine_type=MachineType.MONGODB).first().port
             elif self.cluster_type == ClusterType.Doris:
                 return self.storageinstance_set.filter(instance_role=InstanceRole.DORIS_FOLLOWER).first().port
-        except (AttributeError, IndexError, Exception):
-            logger.warning(_("无法访问集群[]的访问端口，请检查实例信息").format(self.name))
+            return 0
+        except (AttributeError, IndexError, StopIteration, Exception):
+            logger.warning(_("无法访问集群[{}]的访问端口，请检查实例信息").format(self.name))
             return 0
 
     @property
@@ -315,12 +424,65 @@ class Cluster(AuditedModel):
         elif self.cluster_type == ClusterType.MongoShardedCluster:
             return next(inst.port for inst in self.proxies if inst.machine_type == MachineType.MONGOS)
         elif self.cluster_type == ClusterType.MongoReplicaSet:
-            return next(inst.port for inst in self.proxies if inst.machine_type == MachineType.MONGODB)
+            return next(inst.port for inst in self.storages if inst.machine_type == MachineType.MONGODB)
         elif self.cluster_type == ClusterType.Doris:
             return next(inst.port for inst in self.storages if inst.instance_role == InstanceRole.DORIS_FOLLOWER)
         else:
             return 0
 
+    @classmethod
+    def bulk_compute_access_ports(cls, clusters: Iterable["Cluster"]) -> Dict[int, int]:
+        """
+        批量根据实例实时计算集群的访问端口，通过预取实例避免N+1查询
+        @param clusters: 集群列表
+        """
+        from backend.db_meta.models.instance import ProxyInstance, StorageInstance
+
+        cluster_ids = [cluster.id for cluster in clusters]
+        # 只查询计算端口需要的字段，数据迁移中回填时也不会依赖后续新增的字段
+        proxy_queryset = ProxyInstance.objects.select_related("tendbclusterspiderext").only(
+            "id", "port", "machine_type", "tendbclusterspiderext__spider_role"
+        )
+        storage_queryset = StorageInstance.objects.only("id", "port", "instance_role", "machine_type")
+        prefetched_clusters = (
+            cls.objects.filter(id__in=cluster_ids)
+            .only("id", "name", "cluster_type")
+            .prefetch_related(
+                Prefetch("proxyinstance_set", queryset=proxy_queryset.order_by("id"), to_attr="proxies"),
+                Prefetch("storageinstance_set", queryset=storage_queryset.order_by("id"), to_attr="storages"),
+            )
+        )
+        return {cluster.id: cluster.compute_access_port() for cluster in prefetched_clusters}
+
+    @classmethod
+    def refresh_access_ports(cls, clusters: Iterable["Cluster"], save: bool = True) -> List["Cluster"]:
+        """
+        重新计算集群的访问端口，并同步更新冗余字段 access_port，返回发生变更的集群
+        @param clusters: 集群列表
+        @param save: 为 False 时只更新集群对象，不写入数据库
+        """
+        clusters = list(clusters)
+        if not clusters:
+            return []
+
+        id__access_port = cls.bulk_compute_access_ports(clusters)
+        changed_clusters: List[Cluster] = []
+        for cluster in clusters:
+            access_port = id__access_port.get(cluster.id, 0)
+            if cluster.access_port != access_port:
+                logger.info(
+                    "[refresh_access_ports] update cluster(%s) access_port: %s -> %s",
+                    cluster.id,
+                    cluster.access_port,
+                    access_port,
+                )
+                cluster.access_port = access_port
+                changed_clusters.append(cluster)
+
+        if save:
+            cls.objects.bulk_update(changed_clusters, fields=["access_port"], batch_size=500)
+        return changed_clusters
+
     def get_partition_port(self):
         """
         获取集群在分区管理的端口号
@@ -377,12 +539,9 @@ class Cluster(AuditedModel):
             return ctl_address
 
     @classmethod
-    def get_cluster_stats(cls, bk_biz_id, cluster_types) -> dict:
-        cluster_stats = {}
-        for cluster_type in cluster_types:
-            cluster_stats.update(json.loads(cache.get(f"{CACHE_CLUSTER_STATS}_{bk_biz_id}_{cluster_type}", "{}")))
-
-        return cluster_stats
+    def get_cluster_stats(cls, immute_domains: List[str]) -> Dict[str, Dict]:
+        """按域名批量获取集群容量信息"""
+        return ClusterStats.get_stats_map(immute_domains)
 
     def is_dbha_disabled(self) -> bool:
         try:
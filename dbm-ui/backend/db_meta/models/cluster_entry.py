@@ -10,7 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
 from django.db import models
 from django.forms import model_to_dict
@@ -66,8 +66,16 @@ class ClusterEntry(AuditedModel):
         }
         ToDo ClusterEntry 添加了专门的角色信息, 这里的逻辑可以简化掉了
         """
+        return cls.build_cluster_entry_map(cls.objects.filter(cluster_id__in=cluster_ids).select_related("cluster"))
+
+    @classmethod
+    def build_cluster_entry_map(cls, entries: Iterable["ClusterEntry"]) -> Dict[int, Dict[str, str]]:
+        """
+        根据已查询的访问入口构造集群与访问入口的映射，格式同 get_cluster_entry_map
+        entries 需要预先关联 cluster(select_related 或者从集群 prefetch 得到)，避免逐条查询集群
+        """
         cluster_entry_map = defaultdict(dict)
-        for entry in cls.objects.filter(cluster_id__in=cluster_ids).select_related("cluster"):
+        for entry in entries:
             access_entry = entry.entry
             # 这里假设非DNS只有一个入口，无需额外区分
             if entry.cluster_entry_type != ClusterEntryType.DNS:
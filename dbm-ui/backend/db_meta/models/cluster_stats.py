@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from backend.db_meta.enums import ClusterType
+
+logger = logging.getLogger("root")
+
+STATS_FIELDS = ("used", "total", "in_use")
+
+
+class ClusterStats(models.Model):
+    """
+    集群容量的最新快照，每个集群域名一行，列表页按当前页的域名批量查询
+    """
+
+    bk_biz_id = models.IntegerField(help_text=_("业务ID"))
+    cluster_type = models.CharField(max_length=64, choices=ClusterType.get_choices(), help_text=_("集群类型"))
+    immute_domain = models.CharField(max_length=255, unique=True, help_text=_("集群域名"))
+    used = models.BigIntegerField(null=True, help_text=_("已用容量(bytes)"))
+    total = models.BigIntegerField(null=True, help_text=_("总容量(bytes)"))
+    in_use = models.FloatField(null=True, help_text=_("使用率(%)"))
+    update_at = models.DateTimeField(auto_now=True, help_text=_("更新时间"))
+
+    class Meta:
+        verbose_name = verbose_name_plural = _("集群容量(ClusterStats)")
+        index_together = [("bk_biz_id", "cluster_type")]
+
+    @property
+    def stats(self) -> Dict:
+        # 兼容查不到数据的情况，缺失的指标不返回
+        return {field: getattr(self, field) for field in STATS_FIELDS if getattr(self, field) is not None}
+
+    @staticmethod
+    def normalize(cap: Dict) -> Dict:
+        """容量取整到字节，使用率保留两位小数，避免浮点误差导致无效的增量写入"""
+        used, total, in_use = cap.get("used"), cap.get("total"), cap.get("in_use")
+        return {
+            "used": None if used is None else int(used),
+            "total": None if total is None else int(total),
+            "in_use": None if in_use is None else round(in_use, 2),
+        }
+
+    @classmethod
+    def get_stats_map(cls, immute_domains: List[str]) -> Dict[str, Dict]:
+        """
+        按域名批量获取集群容量
+        @param immute_domains: 集群域名列表
+        """
+        stats_list = cls.objects.filter(immute_domain__in=immute_domains).only("immute_domain", *STATS_FIELDS)
+        return {stats.immute_domain: stats.stats for stats in stats_list}
+
+    @classmethod
+    def sync_stats(cls, bk_biz_id: int, cluster_type: str, cluster_stats: Dict[str, Dict]) -> Dict[str, int]:
+        """
+        增量同步某个业务某类集群的容量，只写入有变化的集群，并为变化的集群追加一条历史记录
+        @param bk_biz_id: 业务ID
+        @param cluster_type: 集群类型
+        @param cluster_stats: 集群域名 -> {"used": xx, "total": xx, "in_use": xx}
+        """
+        existing = {stats.immute_domain: stats for stats in cls.objects.filter(immute_domain__in=cluster_stats)}
+        to_create: List[ClusterStats] = []
+        to_update: List[ClusterStats] = []
+        for domain, cap in cluster_stats.items():
+            values = {"bk_biz_id": bk_biz_id, "cluster_type": cluster_type, **cls.normalize(cap)}
+            stats = existing.get(domain)
+            if not stats:
+                to_create.append(cls(immute_domain=domain, **values))
+            elif any(getattr(stats, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                stats.update_at = timezone.now()
+                to_update.append(stats)
+
+        with transaction.atomic():
+            # 本次没有查到容量的集群(已下架或者无监控数据)不再展示
+            deleted, __ = (
+                cls.objects.filter(bk_biz_id=bk_biz_id, cluster_type=cluster_type)
+                .exclude(immute_domain__in=cluster_stats)
+                .delete()
+            )
+            cls.objects.bulk_create(to_create, batch_size=500)
+            cls.objects.bulk_update(
+                to_update, fields=["bk_biz_id", "cluster_type", *STATS_FIELDS, "update_at"], batch_size=500
+            )
+            ClusterStatsHistory.objects.bulk_create(
+                [
+                    ClusterStatsHistory(
+                        bk_biz_id=bk_biz_id,
+                        cluster_type=cluster_type,
+                        immute_domain=stats.immute_domain,
+                        **{field: getattr(stats, field) for field in STATS_FIELDS},
+                    )
+                    for stats in to_create + to_update
+                ],
+                batch_size=500,
+            )
+
+        return {"created": len(to_create), "updated": len(to_update), "deleted": deleted}
+
+
+class ClusterStatsHistory(models.Model):
+    """
+    集群容量的历史记录，只在容量变化时写入，用于容量趋势查询
+    """
+
+    bk_biz_id = models.IntegerField(help_text=_("业务ID"))
+    cluster_type = models.CharField(max_length=64, choices=ClusterType.get_choices(), help_text=_("集群类型"))
+    immute_domain = models.CharField(max_length=255, help_text=_("集群域名"))
+    used = models.BigIntegerField(null=True, help_text=_("已用容量(bytes)"))
+    total = models.BigIntegerField(null=True, help_text=_("总容量(bytes)"))
+    in_use = models.FloatField(null=True, help_text=_("使用率(%)"))
+    create_at = models.DateTimeField(auto_now_add=True, db_index=True, help_text=_("记录时间"))
+
+    class Meta:
+        verbose_name = verbose_name_plural = _("集群容量历史(ClusterStatsHistory)")
+        index_together = [("immute_domain", "create_at")]
+
+    @classmethod
+    def get_trend(cls, immute_domain: str, start_time: datetime, end_time: Optional[datetime] = None) -> List[Dict]:
+        """
+        查询集群的容量趋势，由于只记录变化点，相邻两点之间的容量等于前一个点
+        @param immute_domain: 集群域名
+        @param start_time: 开始时间
+        @param end_time: 结束时间，默认为当前时间
+        """
+        end_time = end_time or timezone.now()
+        # 补充开始时间之前的最后一个变化点，作为趋势的起点
+        last_before_start = (
+            cls.objects.filter(immute_domain=immute_domain, create_at__lt=start_time).order_by("-create_at").first()
+        )
+        records = list(
+            cls.objects.filter(
+                immute_domain=immute_domain, create_at__gte=start_time, create_at__lte=end_time
+            ).order_by("create_at")
+        )
+        if last_before_start:
+            records.insert(0, last_before_start)
+
+        return [
+            {"time": record.create_at, **{field: getattr(record, field) for field in STATS_FIELDS}}
+            for record in records
+        ]
+
+    @classmethod
+    def clean_expired(cls, retention_days: int) -> int:
+        """清理超过保留天数的历史记录"""
+        deleted, __ = cls.objects.filter(create_at__lt=timezone.now() - timedelta(days=retention_days)).delete()
+        return deleted
@@ -11,13 +11,19 @@ specific language governing permissions and limitations under the License.
 import logging
 from typing import Union
 
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import Signal
 
-from backend.db_meta.enums import ClusterStatus
-from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance
+from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance, TenDBClusterSpiderExt
 
 logger = logging.getLogger("root")
 
+# 批量创建主机(bulk_create 不会触发 post_save)后发送，参数 machines 为创建的主机列表
+machines_created = Signal()
+
+# 参与集群访问端口计算的实例字段
+ACCESS_PORT_FIELDS = {"port", "instance_role", "machine_type"}
+
 
 def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance, Cluster], **kwargs):
     """
@@ -34,22 +40,40 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
         elif cluster and sender == ProxyInstance:
             cluster.proxyinstance_set.remove(instance)
 
-    # 仅在实例状态变更时，同步更新集群状态
+    # m2m 变更前关联关系尚未生效，只需要在变更后计算
+    if kwargs.get("action", "").startswith("pre_"):
+        return
+
+    # 仅在实例状态变更时，同步更新集群状态标志位和集群状态
     if isinstance(instance, Cluster):
         clusters = [instance]
     else:
         clusters = instance.cluster.all()
 
-    for cluster in clusters:
-        # 忽略临时集群
-        if cluster.status == ClusterStatus.TEMPORARY.value:
+    Cluster.refresh_status_flags(clusters)
+
+
+def update_cluster_access_port(
+    sender, instance: Union[StorageInstance, ProxyInstance, Cluster, TenDBClusterSpiderExt], **kwargs
+):
+    """
+    集群实例关系、实例端口/角色或者 spider 角色变更时，同步更新集群的访问端口
+    """
+    # m2m 变更前关联关系尚未生效，只需要在变更后计算
+    if kwargs.get("action", "").startswith("pre_"):
+        return
+
+    if kwargs.get("signal") == post_save and isinstance(instance, (StorageInstance, ProxyInstance)):
+        # 新建的实例尚未关联集群，关联时由 m2m 信号处理；只修改了无关字段时不需要重新计算
+        update_fields = kwargs.get("update_fields")
+        if kwargs.get("created") or (update_fields and not ACCESS_PORT_FIELDS & set(update_fields)):
             return
-        origin_status = cluster.status
-        if cluster.status_flag:
-            target_status = ClusterStatus.ABNORMAL.value
-        else:
-            target_status = ClusterStatus.NORMAL.value
-        if origin_status != target_status:
-            cluster.status = target_status
-            logger.info("[signals] update cluster status, origin: %s, target: %s", origin_status, target_status)
-            cluster.save(update_fields=["status"])
+
+    if isinstance(instance, Cluster):
+        clusters = [instance]
+    elif isinstance(instance, TenDBClusterSpiderExt):
+        clusters = Cluster.objects.filter(proxyinstance__id=instance.instance_id)
+    else:
+        clusters = instance.cluster.all()
+
+    Cluster.refresh_access_ports(clusters)
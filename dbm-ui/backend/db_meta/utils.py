@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import logging
 import os.path
 from collections import defaultdict
+from typing import Dict, List
 
 from django.conf import settings
 from django.utils.translation import ugettext as _
@@ -176,13 +177,12 @@ def clean_cc_topo(bk_biz_id=env.DBA_APP_BK_BIZ_ID):
 
     # 排除default非0的模块(内置模块）
     res = CCApi.search_module({"bk_biz_id": bk_biz_id, "condition": {"default": 0}})
-    # 查询模块下的主机数量
-    host_topo_relations = resource.ResourceQueryHelper.fetch_host_topo_relations(env.DBA_APP_BK_BIZ_ID)
-
+    # 查询模块下的主机数量，按页流式统计
     bk_module_ip_counts = defaultdict(int)
-    for host_topo_relation in host_topo_relations:
-        # 暂不统计非缓存数据，遇到不一致的情况需要触发缓存更新
-        bk_module_ip_counts[host_topo_relation["bk_module_id"]] += 1
+    for host_topo_relations in resource.ResourceQueryHelper.iter_host_topo_relations(env.DBA_APP_BK_BIZ_ID):
+        for host_topo_relation in host_topo_relations:
+            # 暂不统计非缓存数据，遇到不一致的情况需要触发缓存更新
+            bk_module_ip_counts[host_topo_relation["bk_module_id"]] += 1
 
     bk_modules = res["info"]
     for bk_module in bk_modules:
@@ -201,3 +201,66 @@ def clean_cc_topo(bk_biz_id=env.DBA_APP_BK_BIZ_ID):
                 "bk_module_id": bk_module["bk_module_id"],
             }
         )
+
+
+def _iter_cluster_batches(bk_biz_id: int = None, cluster_types: List[str] = None, batch_size: int = 500, fields=None):
+    """按主键分批遍历集群，用于冗余字段的全量重算"""
+    clusters = Cluster.objects.order_by("id")
+    if fields:
+        clusters = clusters.only(*fields)
+    if bk_biz_id:
+        clusters = clusters.filter(bk_biz_id=bk_biz_id)
+    if cluster_types:
+        clusters = clusters.filter(cluster_type__in=cluster_types)
+
+    last_id = 0
+    while True:
+        batch = list(clusters.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        yield batch
+        last_id = batch[-1].id
+
+
+def refresh_cluster_status_flags(bk_biz_id: int = None, cluster_types: List[str] = None, batch_size: int = 500) -> int:
+    """
+    全量重算集群状态标志位，修复冗余字段 status_flag_value 与实例状态的漂移，返回发生变更的集群数
+    @param bk_biz_id: 业务ID，为空表示所有业务
+    @param cluster_types: 集群类型列表，为空表示所有类型
+    @param batch_size: 每批重算的集群数
+    """
+    changed_count = 0
+    fields = ["id", "cluster_type", "status", "status_flag_value"]
+    for batch in _iter_cluster_batches(bk_biz_id, cluster_types, batch_size, fields):
+        changed_count += len(Cluster.refresh_status_flags(batch))
+
+    logger.info("refresh cluster status flags finished, changed count: %s", changed_count)
+    return changed_count
+
+
+def refresh_cluster_access_ports(
+    bk_biz_id: int = None, cluster_types: List[str] = None, batch_size: int = 500, verify: bool = False
+) -> List[Dict]:
+    """
+    全量重算集群访问端口，回填/修复冗余字段 access_port，返回存在差异的集群
+    @param bk_biz_id: 业务ID，为空表示所有业务
+    @param cluster_types: 集群类型列表，为空表示所有类型
+    @param batch_size: 每批重算的集群数
+    @param verify: 为 True 时只校验差异，不写入
+    """
+    diffs: List[Dict] = []
+    fields = ["id", "immute_domain", "cluster_type", "access_port"]
+    for batch in _iter_cluster_batches(bk_biz_id, cluster_types, batch_size, fields):
+        id__stored_port = {cluster.id: cluster.access_port for cluster in batch}
+        for cluster in Cluster.refresh_access_ports(batch, save=not verify):
+            diffs.append(
+                {
+                    "cluster_id": cluster.id,
+                    "immute_domain": cluster.immute_domain,
+                    "stored": id__stored_port[cluster.id],
+                    "computed": cluster.access_port,
+                }
+            )
+
+    logger.info("refresh cluster access ports finished, verify: %s, diff count: %s", verify, len(diffs))
+    return diffs
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from celery.schedules import crontab
+
+from backend import env
+from backend.db_periodic_task.local_tasks import register_periodic_task
+from backend.db_services.ipchooser.query.agent_status import agent_status_cache
+
+
+@register_periodic_task(run_every=crontab(minute="*/1"))
+def refresh_hot_biz_agent_status():
+    """刷新最近访问过的业务的主机 Agent 状态缓存"""
+    if env.AGENT_STATUS_REFRESH_ENABLED:
+        agent_status_cache.refresh_hot_biz()
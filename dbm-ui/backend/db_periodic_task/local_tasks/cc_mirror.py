@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+
+from celery.schedules import crontab
+
+from backend import env
+from backend.db_periodic_task.local_tasks import register_periodic_task
+from backend.db_services.ipchooser.constants import CCWatchResource
+from backend.db_services.ipchooser.tools.cc_mirror_sync import cc_mirror_syncer
+
+logger = logging.getLogger("celery")
+
+
+@register_periodic_task(run_every=crontab(minute="*/1"))
+def watch_cc_resource_events():
+    """监听 CMDB 主机和主机关系的变更事件，增量更新本地镜像"""
+    if not env.CC_MIRROR_ENABLED:
+        return
+    for resource in CCWatchResource.get_values():
+        applied = cc_mirror_syncer.watch(resource)
+        logger.info("[watch_cc_resource_events] apply %s events of %s", applied, resource)
+
+
+@register_periodic_task(run_every=crontab(minute="30"))
+def reconcile_cc_mirror():
+    """对账超过同步周期或者游标发生过重置的镜像业务"""
+    if not env.CC_MIRROR_ENABLED:
+        return
+    for bk_biz_id in cc_mirror_syncer.get_stale_biz_ids():
+        try:
+            cc_mirror_syncer.reconcile_biz(bk_biz_id)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("[reconcile_cc_mirror] reconcile biz %s failed: %s", bk_biz_id, err)
@@ -9,5 +9,5 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from .db_meta_check import db_meta_check_task
-from .sync_cluster_stat import sync_cluster_stat_from_monitor
+from .sync_cluster_stat import clean_cluster_stat_history, sync_cluster_stat_from_monitor
 from .update_app_cache import update_app_cache
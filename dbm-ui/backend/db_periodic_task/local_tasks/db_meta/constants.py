@@ -11,6 +11,17 @@ specific language governing permissions and limitations under the License.
 
 from backend.db_meta.enums import ClusterType
 
+# 集群容量历史记录的保留天数
+CLUSTER_STATS_HISTORY_RETENTION_DAYS = 90
+# 容量同步：单次查询合并的业务的集群总数上限，用于控制返回的 series 数
+CAPACITY_QUERY_MAX_SERIES = 2000
+# 容量同步：单次查询合并的业务数上限，避免 PromQL 过长
+CAPACITY_QUERY_MAX_BIZ = 100
+# 容量同步：并发查询数
+CAPACITY_QUERY_CONCURRENCY = 5
+# 容量同步：每秒最多发起的查询数
+CAPACITY_QUERY_RATE = 5
+
 UNIFY_QUERY_PARAMS = {
     "bk_biz_id": 3,
     "query_configs": [
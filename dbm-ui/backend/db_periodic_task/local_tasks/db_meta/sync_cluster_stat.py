@@ -10,22 +10,29 @@ specific language governing permissions and limitations under the License.
 """
 import copy
 import datetime
-import json
 import logging
+import threading
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
 
 from celery import current_app
 from celery.schedules import crontab
-from django.core.cache import cache
 from django.utils import timezone
+from prometheus_client import Counter, Histogram
 
 from backend import env
 from backend.components import BKMonitorV3Api
-from backend.constants import CACHE_CLUSTER_STATS
 from backend.db_meta.enums import ClusterType
-from backend.db_meta.models import Cluster
+from backend.db_meta.models import Cluster, ClusterStats, ClusterStatsHistory
 from backend.db_periodic_task.local_tasks import register_periodic_task
 from backend.db_periodic_task.local_tasks.db_meta.constants import (
+    CAPACITY_QUERY_CONCURRENCY,
+    CAPACITY_QUERY_MAX_BIZ,
+    CAPACITY_QUERY_MAX_SERIES,
+    CAPACITY_QUERY_RATE,
+    CLUSTER_STATS_HISTORY_RETENTION_DAYS,
     QUERY_TEMPLATE,
     SAME_QUERY_TEMPLATE_CLUSTER_TYPE_MAP,
     UNIFY_QUERY_PARAMS,
@@ -34,14 +41,51 @@ from backend.db_periodic_task.utils import TimeUnit, calculate_countdown
 
 logger = logging.getLogger("celery")
 
+CAPACITY_SYNC_QUERIES = Counter(
+    "dbm_capacity_sync_queries_total", "容量同步的 unify_query 查询次数", ["template", "cap_key", "result"]
+)
+CAPACITY_SYNC_QUERY_SECONDS = Histogram("dbm_capacity_sync_query_seconds", "容量同步单次查询耗时", ["template"])
+CAPACITY_SYNC_CLUSTERS = Counter("dbm_capacity_sync_clusters_total", "容量同步处理的集群数", ["template"])
+CAPACITY_SYNC_SECONDS = Histogram("dbm_capacity_sync_seconds", "容量同步单个查询模板的总耗时", ["template"])
+
+# 集群域名 -> (业务ID, 集群类型)
+DomainInfos = Dict[str, Tuple[int, str]]
+
+
+class RateLimiter:
+    """匀速限流，保证两次查询之间至少间隔 1/rate 秒，多线程共享"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def get_template_type(cluster_type: str) -> str:
+    """获取集群类型对应的查询模板类型"""
+    return SAME_QUERY_TEMPLATE_CLUSTER_TYPE_MAP.get(cluster_type, cluster_type)
+
 
-def query_cap(bk_biz_id, cluster_type, cap_key="used"):
-    """查询某类集群的某种容量: used/total"""
+def query_cap(bk_biz_ids: List[int], template_type: str, cap_key="used", slimit: int = None) -> Dict[str, float]:
+    """
+    查询多个业务下某类集群的某种容量: used/total，多个业务合并为一个 PromQL 查询
+    @param bk_biz_ids: 业务ID列表
+    @param template_type: 查询模板类型
+    @param cap_key: used/total
+    @param slimit: 最大返回的 series 数
+    """
 
-    cluster_type = SAME_QUERY_TEMPLATE_CLUSTER_TYPE_MAP.get(cluster_type, cluster_type)
-    query_template = QUERY_TEMPLATE.get(cluster_type)
+    query_template = QUERY_TEMPLATE.get(template_type)
     if not query_template:
-        logger.error("No query template for cluster type: %s", cluster_type)
+        logger.error("No query template for cluster type: %s", template_type)
         return {}
 
     # now-5/15m ~ now
@@ -51,14 +95,16 @@ def query_cap(bk_biz_id, cluster_type, cap_key="used"):
     params = copy.deepcopy(UNIFY_QUERY_PARAMS)
 
     # mysql 的指标不连续，使用 "type": "instant" 会导致查询结果为空
-    if cluster_type in [ClusterType.TenDBSingle.value, ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]:
+    if template_type in [ClusterType.TenDBSingle.value, ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]:
         params.pop("type", "")
 
     params["bk_biz_id"] = env.DBA_APP_BK_BIZ_ID
     params["start_time"] = int(start_time.timestamp())
     params["end_time"] = int(end_time.timestamp())
+    params["slimit"] = max(params["slimit"], slimit or 0)
 
-    params["query_configs"][0]["promql"] = query_template[cap_key] % f'appid="{bk_biz_id}"'
+    appids = "|".join(str(bk_biz_id) for bk_biz_id in sorted(bk_biz_ids))
+    params["query_configs"][0]["promql"] = query_template[cap_key] % f'appid=~"{appids}"'
     series = BKMonitorV3Api.unify_query(params)["series"]
 
     cluster_bytes = {}
@@ -75,74 +121,151 @@ def query_cap(bk_biz_id, cluster_type, cap_key="used"):
     return cluster_bytes
 
 
-def query_cluster_capacity(bk_biz_id, cluster_type):
-    """查询集群容量"""
+def chunk_biz_ids(biz_domain_counts: Dict[int, int]) -> List[Tuple[List[int], int]]:
+    """
+    将业务分组，每组合并为一次查询，单组的集群数不超过 series 上限，业务数不超过 PromQL 长度限制
+    返回 [(业务ID列表, 集群数), ...]
+    """
+    chunks, chunk, series = [], [], 0
+    for bk_biz_id, count in sorted(biz_domain_counts.items()):
+        if chunk and (series + count > CAPACITY_QUERY_MAX_SERIES or len(chunk) >= CAPACITY_QUERY_MAX_BIZ):
+            chunks.append((chunk, series))
+            chunk, series = [], 0
+        chunk.append(bk_biz_id)
+        series += count
+    if chunk:
+        chunks.append((chunk, series))
+    return chunks
 
-    cluster_cap_bytes = defaultdict(dict)
 
-    domains = list(
-        Cluster.objects.filter(bk_biz_id=bk_biz_id, cluster_type=cluster_type)
-        .values_list("immute_domain", flat=True)
-        .distinct()
-    )
+def collect_cluster_capacity(
+    template_type: str, domain_infos: DomainInfos
+) -> Tuple[Dict[Tuple[int, str], Dict[str, Dict]], Set[int]]:
+    """
+    批量采集使用同一查询模板的集群容量，按业务分组并发查询，查询结果在本地按集群拆分
+    返回 ({(业务ID, 集群类型): {集群域名: 容量}}, 查询失败的业务ID)
+    @param template_type: 查询模板类型
+    @param domain_infos: 集群域名 -> (业务ID, 集群类型)
+    """
+    biz_domain_counts: Dict[int, int] = defaultdict(int)
+    for bk_biz_id, __ in domain_infos.values():
+        biz_domain_counts[bk_biz_id] += 1
 
-    used_data = query_cap(bk_biz_id, cluster_type, "used")
-    for cluster, used in used_data.items():
-        # 排除无效集群
-        if cluster not in domains:
-            continue
-        cluster_cap_bytes[cluster]["used"] = used
+    rate_limiter = RateLimiter(CAPACITY_QUERY_RATE)
+
+    def _query(bk_biz_ids: List[int], series: int, cap_key: str) -> Dict[str, float]:
+        rate_limiter.acquire()
+        start_time = time.time()
+        try:
+            data = query_cap(bk_biz_ids, template_type, cap_key, slimit=series * 2)
+        except Exception:
+            CAPACITY_SYNC_QUERIES.labels(template=template_type, cap_key=cap_key, result="failed").inc()
+            raise
+        finally:
+            CAPACITY_SYNC_QUERY_SECONDS.labels(template=template_type).observe(time.time() - start_time)
+        CAPACITY_SYNC_QUERIES.labels(template=template_type, cap_key=cap_key, result="success").inc()
+        return data
 
-    total_data = query_cap(bk_biz_id, cluster_type, "total")
-    for cluster, used in total_data.items():
-        # 排除无效集群
-        if cluster not in domains:
+    chunks = chunk_biz_ids(biz_domain_counts)
+    with ThreadPoolExecutor(max_workers=CAPACITY_QUERY_CONCURRENCY) as executor:
+        futures = [
+            (bk_biz_ids, cap_key, executor.submit(_query, bk_biz_ids, series, cap_key))
+            for bk_biz_ids, series in chunks
+            for cap_key in ["used", "total"]
+        ]
+
+    # 按 (业务, 集群类型) 拆分查询结果，排除无效集群
+    cluster_stats: Dict[Tuple[int, str], Dict[str, Dict]] = defaultdict(lambda: defaultdict(dict))
+    failed_biz_ids: Set[int] = set()
+    for bk_biz_ids, cap_key, future in futures:
+        try:
+            data = future.result()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("query_cap error: %s, biz: %s -> %s", template_type, bk_biz_ids, e)
+            failed_biz_ids.update(bk_biz_ids)
             continue
-        cluster_cap_bytes[cluster]["total"] = used
 
-    return cluster_cap_bytes
+        for domain, value in data.items():
+            if domain not in domain_infos:
+                continue
+            cluster_stats[domain_infos[domain]][domain][cap_key] = value
+
+    return cluster_stats, failed_biz_ids
 
 
 @current_app.task
-def sync_cluster_stat_by_cluster_type(bk_biz_id, cluster_type):
+def sync_cluster_stat_by_template(template_type: str):
     """
-    按集群类型同步各集群容量状态
+    同步使用同一查询模板的所有集群容量状态
     """
 
-    logger.info("sync_cluster_stat_from_monitor started")
-    try:
-        cluster_stats = query_cluster_capacity(bk_biz_id, cluster_type)
-    except Exception as e:
-        logger.error("query_cluster_capacity error: %s -> %s", cluster_type, e)
-        return
-
-    # 计算使用率
-    for cluster, cap in cluster_stats.items():
-        # 兼容查不到数据的情况
-        if not ("used" in cap and "total" in cap):
-            continue
-        cap["in_use"] = round(cap["used"] * 100.0 / cap["total"], 2)
+    logger.info("sync_cluster_stat_by_template %s started", template_type)
+    start_time = time.time()
 
-    cache.set(f"{CACHE_CLUSTER_STATS}_{bk_biz_id}_{cluster_type}", json.dumps(cluster_stats))
+    cluster_types = [
+        cluster_type for cluster_type in ClusterType.get_values() if get_template_type(cluster_type) == template_type
+    ]
+    domain_infos: DomainInfos = {
+        domain: (bk_biz_id, cluster_type)
+        for domain, bk_biz_id, cluster_type in Cluster.objects.filter(cluster_type__in=cluster_types).values_list(
+            "immute_domain", "bk_biz_id", "cluster_type"
+        )
+    }
+    cluster_stats, failed_biz_ids = collect_cluster_capacity(template_type, domain_infos)
+
+    # 查询失败的业务保留上一次的容量，其余的 (业务, 集群类型) 全量增量同步，查不到数据的集群会被移除
+    biz_cluster_types = {info for info in domain_infos.values() if info[0] not in failed_biz_ids}
+    for bk_biz_id, cluster_type in biz_cluster_types:
+        stats = cluster_stats.get((bk_biz_id, cluster_type), {})
+        # 计算使用率
+        for cluster, cap in stats.items():
+            # 兼容查不到数据的情况
+            if not ("used" in cap and "total" in cap) or not cap["total"]:
+                continue
+            cap["in_use"] = round(cap["used"] * 100.0 / cap["total"], 2)
+
+        # 只写入容量有变化的集群
+        ClusterStats.sync_stats(bk_biz_id, cluster_type, stats)
+
+    CAPACITY_SYNC_CLUSTERS.labels(template=template_type).inc(len(domain_infos))
+    CAPACITY_SYNC_SECONDS.labels(template=template_type).observe(time.time() - start_time)
+    logger.info(
+        "sync_cluster_stat_by_template %s finished, clusters: %s, failed biz: %s, cost: %.2fs",
+        template_type,
+        len(domain_infos),
+        failed_biz_ids,
+        time.time() - start_time,
+    )
 
 
 @register_periodic_task(run_every=crontab(hour="*/1", minute=0))
 def sync_cluster_stat_from_monitor():
     """
-    同步各集群容量状态
+    同步各集群容量状态，每个查询模板一个任务，同一模板的所有业务合并查询
     """
 
     logger.info("sync_cluster_stat_from_monitor started")
-    biz_cluster_types = Cluster.objects.values_list("bk_biz_id", "cluster_type").distinct()
-
-    count = len(biz_cluster_types)
-    for index, (bk_biz_id, cluster_type) in enumerate(biz_cluster_types):
-        countdown = calculate_countdown(count=count, index=index, duration=1 * TimeUnit.HOUR)
-        logger.info(
-            "{}_{} sync_cluster_stat_from_monitor will be run after {} seconds.".format(
-                bk_biz_id, cluster_type, countdown
-            )
-        )
-        sync_cluster_stat_by_cluster_type.apply_async(
-            kwargs={"bk_biz_id": bk_biz_id, "cluster_type": cluster_type}, countdown=countdown
-        )
+    cluster_types = Cluster.objects.values_list("cluster_type", flat=True).distinct()
+    # 只同步有容量查询模板的集群类型
+    template_types = sorted(
+        {
+            get_template_type(cluster_type)
+            for cluster_type in cluster_types
+            if "used" in QUERY_TEMPLATE.get(get_template_type(cluster_type), {})
+        }
+    )
+
+    count = len(template_types)
+    for index, template_type in enumerate(template_types):
+        countdown = calculate_countdown(count=count, index=index, duration=10 * TimeUnit.MINUTE)
+        logger.info("{} sync_cluster_stat_from_monitor will be run after {} seconds.".format(template_type, countdown))
+        sync_cluster_stat_by_template.apply_async(kwargs={"template_type": template_type}, countdown=countdown)
+
+
+@register_periodic_task(run_every=crontab(minute=30, hour=3))
+def clean_cluster_stat_history():
+    """
+    清理过期的集群容量历史记录
+    """
+    deleted = ClusterStatsHistory.clean_expired(CLUSTER_STATS_HISTORY_RETENTION_DAYS)
+    logger.info("clean_cluster_stat_history finished, deleted: %s", deleted)
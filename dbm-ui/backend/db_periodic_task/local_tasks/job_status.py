@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from backend.db_periodic_task.local_tasks import register_periodic_task
+from backend.flow.utils.job_status_poller import job_status_poller
+
+# 轮询周期(s)，与 job 任务的最小查询间隔一致，每次只处理到期的任务后立即退出
+JOB_STATUS_POLL_INTERVAL = 5
+
+
+@register_periodic_task(run_every=JOB_STATUS_POLL_INTERVAL)
+def poll_job_instance_status():
+    """集中轮询 job 任务状态，任务结束后唤醒对应的流程节点"""
+    job_status_poller.run()
@@ -9,42 +9,9 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
 from typing import Dict, List
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
-
-
-def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> List[Dict]:
-    """
-    从日志平台获取对应采集项的日志
-    @param collector: 采集项名称
-    @param start_time: 开始时间
-    @param end_time: 结束时间
-    @param query_string: 过滤条件
-    """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-    return backup_logs
+from backend.components.bklog.handler import BKLogHandler
 
 
 class ClusterBackup:
@@ -65,10 +32,11 @@ class ClusterBackup:
         :param end_time: 结束时间
         """
         backup_files = []
-        backup_logs = _get_log_from_bklog(
+        backup_logs = BKLogHandler.iter_logs(
             collector="mysql_dbbackup_result",
             start_time=start_time,
             end_time=end_time,
+            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
             # query_string=f'log: "cluster_id: {self.cluster_id}"',
             query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
@@ -104,7 +72,7 @@ class ClusterBackup:
         :param end_time: 结束时间
         """
         binlogs = []
-        backup_logs = _get_log_from_bklog(
+        backup_logs = BKLogHandler.iter_logs(
             collector="mysql_binlog_result",
             start_time=start_time,
             end_time=end_time,
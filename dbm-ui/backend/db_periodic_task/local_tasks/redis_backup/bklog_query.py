@@ -9,51 +9,16 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
 import logging
 from typing import Dict, List
 
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
+from backend.components.bklog.handler import BKLogHandler
 
 logger = logging.getLogger("root")
 
 
-def _get_log_from_bklog(
-    collector: str, start_time: datetime.datetime, end_time: datetime.datetime, query_string: str = "*"
-) -> List[Dict]:
-    """
-    从日志平台获取对应采集项的日志
-    @param collector: 采集项名称
-    @param start_time: 开始时间
-    @param end_time: 结束时间
-    @param query_string: 过滤条件
-    """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-    return backup_logs
-
-
 class ClusterBackup:
     """
     集群前一天备份信息，
@@ -71,19 +36,17 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        backup_files = []
         # status = "to_backup_system_success"
-        backup_logs = _get_log_from_bklog(
+        backup_logs = BKLogHandler.iter_logs(
             collector="redis_fullbackup_result",
             start_time=start_time,
             end_time=end_time,
             query_string=f"domain: {self.cluster_domain}",
             # query_string=f"domain: {self.cluster_domain} AND status: {status}",
         )
-        if not backup_logs:
+        backup_files = [self.convert_to_backup_system_format(bklog) for bklog in backup_logs]
+        if not backup_files:
             logger.error(_("无法查找到在时间范围内{}-{}，集群{}的全备份日志").format(start_time, end_time, self.cluster_domain))
-        for bklog in backup_logs:
-            backup_files.append(self.convert_to_backup_system_format(bklog))
         return backup_files
 
     def query_binlog_from_bklog(
@@ -102,8 +65,7 @@ class ClusterBackup:
         :param host_ip: 过滤的主机IP
         :param port: 端口
         """
-        binlogs = []
-        backup_logs = _get_log_from_bklog(
+        backup_logs = BKLogHandler.iter_logs(
             collector="redis_binlog_backup_result",
             start_time=start_time,
             end_time=end_time,
@@ -111,10 +73,9 @@ class ClusterBackup:
             # 这里redis备份没有上传cluster_id ,通过域名查询
             query_string=f"domain: {self.cluster_domain} AND server_ip: {host_ip} AND server_port: {port} ",
         )
-        if not backup_logs:
+        binlogs = [self.convert_to_backup_system_format(bklog) for bklog in backup_logs]
+        if not binlogs:
             logger.error(_("无法查找到在时间范围内{}-{}，集群{}的binlog备份日志").format(start_time, end_time, self.cluster_domain))
-        for bklog in backup_logs:
-            binlogs.append(self.convert_to_backup_system_format(bklog))
         return binlogs
 
     @staticmethod
@@ -15,8 +15,9 @@ from backend.db_services.taskflow import task as TaskFlow
 from backend.ticket.tasks.ticket_tasks import TicketTask
 
 
-@register_periodic_task(run_every=5)
+@register_periodic_task(run_every=60)
 def auto_retry_exclusive_inner_flow():
+    # 互斥的inner flow由集群上的flow结束时释放，这里只做兜底
     TicketTask.retry_exclusive_inner_flow()
 
 
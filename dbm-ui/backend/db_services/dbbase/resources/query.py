@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import abc
+import itertools
 from typing import Any, Callable, Dict, List, Tuple, Union
 
 import attr
@@ -472,45 +473,55 @@ class ListRetrieveResource(BaseListRetrieveResource):
             Prefetch("clusterentry_set", to_attr="entries"),
             "tag_set",
         )
-        cluster_ids = list(cluster_queryset.values_list("id", flat=True))
-
-        # 获取集群与访问入口的映射
-        cluster_entry_map = ClusterEntry.get_cluster_entry_map(cluster_ids)
-
-        # 获取DB模块的映射信息
-        db_module_names_map = {
-            module.db_module_id: module.db_module_name
-            for module in DBModule.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cls.cluster_types)
-        }
-
-        # 获取集群操作记录的映射关系
-        cluster_operate_records_map = ClusterOperateRecord.get_cluster_records_map(cluster_ids)
-
-        # 获取云区域信息和业务信息
-        cloud_info = ResourceQueryHelper.search_cc_cloud(get_cache=True)
-        biz_info = AppCache.objects.get(bk_biz_id=bk_biz_id)
+        # 直接求值当前页，集群ID从结果中获取，不再额外发起查询
+        page_clusters: List[Cluster] = list(cluster_queryset)
+        enrichment = cls._fetch_cluster_enrichment(bk_biz_id, page_clusters)
 
         # 将集群的查询结果序列化为集群字典信息
         clusters: List[Dict[str, Any]] = []
-        for cluster in cluster_queryset:
+        for cluster in page_clusters:
             cluster_info = cls._to_cluster_representation(
                 cluster=cluster,
                 cluster_entry=[
                     {"cluster_entry_type": entry.cluster_entry_type, "entry": entry.entry, "role": entry.role}
                     for entry in cluster.entries
                 ],
-                db_module_names_map=db_module_names_map,
-                cluster_entry_map=cluster_entry_map,
-                cluster_operate_records_map=cluster_operate_records_map,
-                cloud_info=cloud_info,
-                biz_info=biz_info,
-                cluster_stats_map=Cluster.get_cluster_stats(bk_biz_id, cls.cluster_types),
+                **enrichment,
                 **kwargs,
             )
             clusters.append(cluster_info)
 
         return ResourceList(count=count, data=clusters)
 
+    @classmethod
+    def _fetch_cluster_enrichment(cls, bk_biz_id: int, clusters: List[Cluster]) -> Dict[str, Any]:
+        """
+        批量获取集群列表渲染所需的关联信息，每类关联信息只获取一次，供当前页的所有集群复用
+        返回的字典会作为关键字参数透传给 _to_cluster_representation
+        @param bk_biz_id: 业务ID
+        @param clusters: 当前页的集群，需预取 entries
+        """
+        cluster_ids = [cluster.id for cluster in clusters]
+        return {
+            # 集群与访问入口的映射，复用预取的 entries
+            "cluster_entry_map": ClusterEntry.build_cluster_entry_map(
+                itertools.chain.from_iterable(cluster.entries for cluster in clusters)
+            ),
+            # DB模块的映射信息
+            "db_module_names_map": dict(
+                DBModule.objects.filter(bk_biz_id=bk_biz_id, cluster_type__in=cls.cluster_types).values_list(
+                    "db_module_id", "db_module_name"
+                )
+            ),
+            # 集群操作记录的映射关系
+            "cluster_operate_records_map": ClusterOperateRecord.get_cluster_records_map(cluster_ids),
+            # 云区域信息和业务信息
+            "cloud_info": ResourceQueryHelper.search_cc_cloud(get_cache=True),
+            "biz_info": AppCache.objects.get(bk_biz_id=bk_biz_id),
+            # 集群容量信息
+            "cluster_stats_map": Cluster.get_cluster_stats([cluster.immute_domain for cluster in clusters]),
+        }
+
     @classmethod
     def _to_cluster_representation(
         cls,
@@ -12,6 +12,7 @@ from enum import Enum
 from typing import Dict
 
 from django.utils.translation import ugettext as _
+from django.utils.translation import ugettext_lazy
 
 from backend.utils import env
 from backend.utils.basic import choices_to_namedtuple, tuple_choices
@@ -155,3 +156,23 @@ DIRTY_MODULE = "dirty.module"
 
 # 操作系统代码与操作系统类型映射
 BK_OS_CODE__TYPE = {BkOsTypeCode.LINUX: BkOsType.LINUX, BkOsTypeCode.WINDOWS: BkOsType.WINDOWS}
+
+
+class CCWatchResource(str, StructuredEnum):
+    """CMDB 资源监听的资源类型"""
+
+    HOST = EnumField("host", ugettext_lazy("主机"))
+    HOST_RELATION = EnumField("host_relation", ugettext_lazy("主机关系"))
+
+
+# CMDB 本地镜像的最大延迟(s)，事件监听超过该时间未推进时镜像不可用，回退到直接查询 CMDB
+CC_MIRROR_MAX_LAG = 5 * 60
+# 单次监听最多拉取的事件轮数，避免积压过多时单次任务执行过久
+CC_WATCH_MAX_ROUNDS = 20
+# 监听请求临时失败时的重试次数和退避间隔(s)，间隔按重试次数翻倍
+CC_WATCH_RETRY_TIMES = 3
+CC_WATCH_RETRY_INTERVAL = 1
+# 对账时在加锁前拉取重放事件，加锁后游标仍有推进则重新拉取，超过该次数时放弃本次对账
+CC_RECONCILE_REPLAY_ATTEMPTS = 3
+# 镜像业务的全量对账周期(s)
+CC_MIRROR_RECONCILE_INTERVAL = 60 * 60
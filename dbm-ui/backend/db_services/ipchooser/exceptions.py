@@ -27,3 +27,9 @@ class TopoNotExistsError(IpChooserBaseException):
     MESSAGE_TPL = _("业务【bk_biz_id: {bk_biz_id}】拓扑不存在")
     MESSAGE = _("业务拓扑不存在")
     ERROR_CODE = 2
+
+
+class UnsupportedFilterError(IpChooserBaseException):
+    MESSAGE_TPL = _("主机过滤条件【{rule}】不支持在本地镜像中查询")
+    MESSAGE = _("主机过滤条件不支持在本地镜像中查询")
+    ERROR_CODE = 3
@@ -59,7 +59,7 @@ class HostHandler:
         # 获取主机信息
         if bk_biz_id:
             params.update(bk_biz_id=bk_biz_id)
-            resp = CCApi.list_biz_hosts(params, use_admin=True)
+            resp = ResourceQueryHelper.list_biz_hosts(params)
         else:
             resp = CCApi.list_hosts_without_biz(params, use_admin=True)
 
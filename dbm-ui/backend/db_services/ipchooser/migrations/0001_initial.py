@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+# Generated by Django 3.2.19 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="CCHostMirror",
+            fields=[
+                ("bk_host_id", models.BigIntegerField(primary_key=True, serialize=False, verbose_name="主机ID")),
+                ("bk_biz_id", models.IntegerField(db_index=True, verbose_name="业务ID")),
+                ("bk_cloud_id", models.IntegerField(default=0, verbose_name="云区域ID")),
+                ("bk_host_innerip", models.CharField(default="", max_length=128, verbose_name="内网IP")),
+                ("bk_host_innerip_v6", models.CharField(default="", max_length=256, verbose_name="内网IPv6")),
+                ("bk_host_name", models.CharField(default="", max_length=255, verbose_name="主机名")),
+                ("bk_os_type", models.CharField(default="", max_length=32, verbose_name="操作系统类型")),
+                ("bk_agent_id", models.CharField(default="", max_length=128, verbose_name="Agent ID")),
+                ("detail", models.JSONField(default=dict, verbose_name="主机详情(CMDB 默认返回字段)")),
+            ],
+            options={
+                "verbose_name": "CMDB 主机镜像",
+                "verbose_name_plural": "CMDB 主机镜像",
+            },
+        ),
+        migrations.CreateModel(
+            name="CCHostTopoMirror",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bk_host_id", models.BigIntegerField(db_index=True, verbose_name="主机ID")),
+                ("bk_biz_id", models.IntegerField(verbose_name="业务ID")),
+                ("bk_set_id", models.BigIntegerField(verbose_name="集群ID")),
+                ("bk_module_id", models.BigIntegerField(verbose_name="模块ID")),
+            ],
+            options={
+                "verbose_name": "CMDB 主机拓扑关系镜像",
+                "verbose_name_plural": "CMDB 主机拓扑关系镜像",
+                "unique_together": {("bk_host_id", "bk_module_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="CCMirrorBiz",
+            fields=[
+                ("bk_biz_id", models.IntegerField(primary_key=True, serialize=False, verbose_name="业务ID")),
+                ("synced_at", models.DateTimeField(verbose_name="最近一次全量同步时间")),
+                ("host_count", models.IntegerField(default=0, verbose_name="主机数")),
+            ],
+            options={
+                "verbose_name": "CMDB 镜像业务",
+                "verbose_name_plural": "CMDB 镜像业务",
+            },
+        ),
+        migrations.CreateModel(
+            name="CCWatchCursor",
+            fields=[
+                (
+                    "resource",
+                    models.CharField(
+                        choices=[("host", "主机"), ("host_relation", "主机关系")],
+                        max_length=32,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="资源类型",
+                    ),
+                ),
+                ("cursor", models.CharField(default="", max_length=512, verbose_name="事件游标")),
+                ("watched_at", models.DateTimeField(null=True, verbose_name="最近一次监听成功的时间")),
+                ("reset_at", models.DateTimeField(null=True, verbose_name="游标重置时间，此前同步的数据可能丢失了事件")),
+            ],
+            options={
+                "verbose_name": "CMDB 资源监听游标",
+                "verbose_name_plural": "CMDB 资源监听游标",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="cchostmirror",
+            index=models.Index(fields=["bk_biz_id", "bk_host_innerip"], name="ipchooser_c_bk_biz__ec27a7_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cchosttopomirror",
+            index=models.Index(fields=["bk_biz_id", "bk_module_id"], name="ipchooser_c_bk_biz__fec4a5_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cchosttopomirror",
+            index=models.Index(fields=["bk_biz_id", "bk_set_id"], name="ipchooser_c_bk_biz__fa8c39_idx"),
+        ),
+    ]
@@ -8,8 +8,11 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
 from backend.db_services.ipchooser import constants
-from backend.db_services.ipchooser.constants import IDLE_HOST_MODULE
+from backend.db_services.ipchooser.constants import IDLE_HOST_MODULE, CCWatchResource
 from backend.db_services.ipchooser.handlers.base import BaseHandler
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 
@@ -79,3 +82,65 @@ class TopoCacheManager:
             return None
 
         return idle_topo["child"][0]
+
+
+class CCHostMirror(models.Model):
+    """CMDB 主机的本地镜像，由资源监听事件增量更新，并定期全量对账"""
+
+    bk_host_id = models.BigIntegerField(_("主机ID"), primary_key=True)
+    bk_biz_id = models.IntegerField(_("业务ID"), db_index=True)
+    bk_cloud_id = models.IntegerField(_("云区域ID"), default=0)
+    bk_host_innerip = models.CharField(_("内网IP"), max_length=128, default="")
+    bk_host_innerip_v6 = models.CharField(_("内网IPv6"), max_length=256, default="")
+    bk_host_name = models.CharField(_("主机名"), max_length=255, default="")
+    bk_os_type = models.CharField(_("操作系统类型"), max_length=32, default="")
+    bk_agent_id = models.CharField(_("Agent ID"), max_length=128, default="")
+    detail = models.JSONField(_("主机详情(CMDB 默认返回字段)"), default=dict)
+
+    class Meta:
+        verbose_name = _("CMDB 主机镜像")
+        verbose_name_plural = _("CMDB 主机镜像")
+        indexes = [models.Index(fields=["bk_biz_id", "bk_host_innerip"])]
+
+
+class CCHostTopoMirror(models.Model):
+    """CMDB 主机与拓扑关系的本地镜像"""
+
+    bk_host_id = models.BigIntegerField(_("主机ID"), db_index=True)
+    bk_biz_id = models.IntegerField(_("业务ID"))
+    bk_set_id = models.BigIntegerField(_("集群ID"))
+    bk_module_id = models.BigIntegerField(_("模块ID"))
+
+    class Meta:
+        verbose_name = _("CMDB 主机拓扑关系镜像")
+        verbose_name_plural = _("CMDB 主机拓扑关系镜像")
+        unique_together = ("bk_host_id", "bk_module_id")
+        indexes = [
+            models.Index(fields=["bk_biz_id", "bk_module_id"]),
+            models.Index(fields=["bk_biz_id", "bk_set_id"]),
+        ]
+
+
+class CCMirrorBiz(models.Model):
+    """已镜像的业务，只有全量同步过的业务才会应用主机关系事件"""
+
+    bk_biz_id = models.IntegerField(_("业务ID"), primary_key=True)
+    synced_at = models.DateTimeField(_("最近一次全量同步时间"))
+    host_count = models.IntegerField(_("主机数"), default=0)
+
+    class Meta:
+        verbose_name = _("CMDB 镜像业务")
+        verbose_name_plural = _("CMDB 镜像业务")
+
+
+class CCWatchCursor(models.Model):
+    """CMDB 资源监听的游标"""
+
+    resource = models.CharField(_("资源类型"), max_length=32, primary_key=True, choices=CCWatchResource.get_choices())
+    cursor = models.CharField(_("事件游标"), max_length=512, default="")
+    watched_at = models.DateTimeField(_("最近一次监听成功的时间"), null=True)
+    reset_at = models.DateTimeField(_("游标重置时间，此前同步的数据可能丢失了事件"), null=True)
+
+    class Meta:
+        verbose_name = _("CMDB 资源监听游标")
+        verbose_name_plural = _("CMDB 资源监听游标")
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional
+
+from prometheus_client import Counter
+
+from backend import env
+from backend.components import CCApi
+from backend.components.bknodeman.client import BKNodeManApi
+from backend.utils.batch_request import QUERY_CMDB_LIMIT
+from backend.utils.redis import RedisConn
+
+from ..constants import ScopeType
+from ..models import CCHostMirror
+from ..tools.cc_mirror_sync import chunks
+from .cc_mirror import CCMirrorQuery
+
+logger = logging.getLogger("app")
+
+AGENT_STATUS_REQUESTS = Counter(
+    "dbm_agent_status_requests_total", "主机 Agent 状态查询次数，result: hit/coalesced/miss", ["result"]
+)
+
+# 单次 NodeMan 查询的最大主机数
+AGENT_STATUS_BATCH_SIZE = 1000
+# 合并查询的等待窗口(s)，窗口内并发请求未命中的主机合并到同一批查询
+AGENT_STATUS_BATCH_WINDOW = 0.01
+# 等待合并查询结果的超时时间(s)
+AGENT_STATUS_LOAD_TIMEOUT = 60
+# 最近多久内访问过的业务视为热点业务(s)
+AGENT_STATUS_HOT_BIZ_WINDOW = 10 * 60
+# 后台刷新的周期(s)，刷新写入的缓存需要覆盖到下一次刷新
+AGENT_STATUS_REFRESH_INTERVAL = 60
+
+
+class AgentStatusCache:
+    """
+    主机 Agent 状态缓存
+    - 按主机ID缓存 NodeMan 返回的 Agent 状态，缓存值为 "业务ID:状态"，命中时同样可以记录热点业务
+    - 未命中的主机交给进程内的合并器：已在查询中的主机直接等待其结果，新主机在短暂窗口内攒批，
+      由创建批次的请求按最大批次查询 NodeMan，每个请求只负责自己创建的批次
+    - 开启后台刷新时，定期按 CMDB 镜像刷新热点业务全部主机的状态，翻页等场景直接命中缓存
+    """
+
+    def __init__(
+        self,
+        redis=RedisConn,
+        nodeman_api=BKNodeManApi,
+        cc_api=CCApi,
+        key_prefix: str = "dbm:agent_status",
+        batch_window: float = AGENT_STATUS_BATCH_WINDOW,
+    ):
+        self.redis = redis
+        self.nodeman_api = nodeman_api
+        self.cc_api = cc_api
+        self.key_prefix = key_prefix
+        self.hot_biz_key = f"{key_prefix}:hot_biz"
+        self.batch_window = batch_window
+
+        self._lock = threading.Lock()
+        # 等待查询或正在查询的主机 -> 查询结果
+        self._inflight: Dict[int, Future] = {}
+        # 攒批中的批次：主机 -> 业务ID，由创建该批次的调用负责查询
+        self._collecting: Optional[Dict[int, int]] = None
+
+    def _key(self, bk_host_id: int) -> str:
+        return f"{self.key_prefix}:{bk_host_id}"
+
+    def get_status(self, bk_host_ids: Iterable[int]) -> Dict[int, Optional[int]]:
+        """
+        获取主机的 Agent 状态，NodeMan 未返回的主机状态为 None
+        @param bk_host_ids: 主机ID列表
+        """
+        bk_host_ids = list(dict.fromkeys(bk_host_ids))
+        if not bk_host_ids:
+            return {}
+
+        status_map: Dict[int, Optional[int]] = {}
+        bk_biz_ids = set()
+        if env.AGENT_STATUS_CACHE_TIME:
+            for bk_host_id, value in zip(bk_host_ids, self.redis.mget([self._key(host) for host in bk_host_ids])):
+                if value:
+                    bk_biz_id, alive = value.split(":")
+                    status_map[bk_host_id] = int(alive)
+                    bk_biz_ids.add(int(bk_biz_id))
+            AGENT_STATUS_REQUESTS.labels(result="hit").inc(len(status_map))
+
+        missing_host_ids = [bk_host_id for bk_host_id in bk_host_ids if bk_host_id not in status_map]
+        if missing_host_ids:
+            host_id__biz_id = self.get_host_biz(missing_host_ids)
+            bk_biz_ids.update(host_id__biz_id.values())
+            status_map.update(self.load(host_id__biz_id))
+
+        self.record_hot_biz(bk_biz_ids)
+        return status_map
+
+    def get_host_biz(self, bk_host_ids: List[int]) -> Dict[int, int]:
+        host_id__biz_id = {}
+        for chunk in chunks(bk_host_ids, QUERY_CMDB_LIMIT):
+            for relation in self.cc_api.find_host_biz_relations({"bk_host_id": chunk}):
+                host_id__biz_id[relation["bk_host_id"]] = relation["bk_biz_id"]
+        return {bk_host_id: host_id__biz_id.get(bk_host_id, env.DBA_APP_BK_BIZ_ID) for bk_host_id in bk_host_ids}
+
+    def load(self, host_id__biz_id: Dict[int, int]) -> Dict[int, Optional[int]]:
+        """
+        合并查询未命中缓存的主机状态
+        新主机加入当前攒批中的批次，没有攒批中的批次时由本次调用创建批次并负责查询；已在查询中的主机只需等待结果
+        """
+        futures: Dict[int, Future] = {}
+        batch: Optional[Dict[int, int]] = None
+        with self._lock:
+            for bk_host_id, bk_biz_id in host_id__biz_id.items():
+                future = self._inflight.get(bk_host_id)
+                if future is None:
+                    future = self._inflight[bk_host_id] = Future()
+                    if self._collecting is None:
+                        self._collecting = batch = {}
+                    self._collecting[bk_host_id] = bk_biz_id
+                    AGENT_STATUS_REQUESTS.labels(result="miss").inc()
+                else:
+                    AGENT_STATUS_REQUESTS.labels(result="coalesced").inc()
+                futures[bk_host_id] = future
+
+        if batch is not None:
+            self._flush(batch)
+        return {bk_host_id: future.result(timeout=AGENT_STATUS_LOAD_TIMEOUT) for bk_host_id, future in futures.items()}
+
+    def _flush(self, batch: Dict[int, int]):
+        """
+        查询本次调用创建的批次，等待窗口结束后批次不再接收新主机，之后到达的主机由其调用方另起批次
+        无论查询是否异常，退出时批次内所有主机的等待者都会得到结果或异常
+        """
+        futures: Dict[int, Future] = {}
+        error: Optional[Exception] = None
+        try:
+            # 等待一个短暂的窗口，让并发请求的主机加入同一批查询
+            time.sleep(self.batch_window)
+            with self._lock:
+                self._collecting = None
+                futures = {bk_host_id: self._inflight[bk_host_id] for bk_host_id in batch}
+
+            for chunk in chunks(list(batch), AGENT_STATUS_BATCH_SIZE):
+                chunk_batch = {bk_host_id: batch[bk_host_id] for bk_host_id in chunk}
+                try:
+                    status_map, error = self.query_nodeman(chunk_batch), None
+                except Exception as err:  # pylint: disable=broad-except
+                    # 本批次的所有等待者都会收到该异常，不影响后续批次
+                    status_map, error = {}, err
+
+                self._release({bk_host_id: futures[bk_host_id] for bk_host_id in chunk})
+                for bk_host_id in chunk:
+                    if error:
+                        futures[bk_host_id].set_exception(error)
+                    else:
+                        futures[bk_host_id].set_result(status_map.get(bk_host_id))
+
+                if not error:
+                    try:
+                        self.save(chunk_batch, status_map, env.AGENT_STATUS_CACHE_TIME)
+                    except Exception as err:  # pylint: disable=broad-except
+                        logger.warning("[AgentStatusCache] save agent status failed: %s", err)
+        finally:
+            with self._lock:
+                if self._collecting is batch:
+                    self._collecting = None
+                # 窗口内异常退出时还未取出 future，此时批次内的主机仍在查询中列表
+                futures = {bk_host_id: futures.get(bk_host_id) or self._inflight[bk_host_id] for bk_host_id in batch}
+            self._release(futures)
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(error or RuntimeError("agent status query aborted"))
+
+    def _release(self, futures: Dict[int, Future]):
+        """将已完成查询的主机移出查询中列表，主机之后可能已经属于新的批次，只移除本批次的 future"""
+        with self._lock:
+            for bk_host_id, future in futures.items():
+                if self._inflight.get(bk_host_id) is future:
+                    self._inflight.pop(bk_host_id)
+
+    def query_nodeman(self, host_id__biz_id: Dict[int, int]) -> Dict[int, int]:
+        """查询 NodeMan 的 Agent 状态，返回 主机ID -> 是否存活(0/1)"""
+        host_list, scope_map = [], {}
+        for bk_host_id, bk_biz_id in host_id__biz_id.items():
+            scope = {"scope_type": ScopeType.BIZ.value, "scope_id": str(bk_biz_id)}
+            host_list.append({"host_id": bk_host_id, "meta": {**scope, "bk_biz_id": bk_biz_id}})
+            scope_map[bk_biz_id] = scope
+
+        params = {"host_list": host_list, "scope_list": list(scope_map.values())}
+        resp = self.nodeman_api.ipchooser_host_details(params, use_admin=True)
+        return {status["host_id"]: status["alive"] for status in resp}
+
+    def save(self, host_id__biz_id: Dict[int, int], status_map: Dict[int, int], cache_time: int):
+        if not cache_time:
+            return
+        pipe = self.redis.pipeline()
+        for bk_host_id, alive in status_map.items():
+            if bk_host_id in host_id__biz_id:
+                pipe.set(self._key(bk_host_id), f"{host_id__biz_id[bk_host_id]}:{alive}", ex=cache_time)
+        pipe.execute()
+
+    def record_hot_biz(self, bk_biz_ids: Iterable[int]):
+        if env.AGENT_STATUS_REFRESH_ENABLED and bk_biz_ids:
+            self.redis.zadd(self.hot_biz_key, {str(bk_biz_id): time.time() for bk_biz_id in bk_biz_ids})
+
+    def get_hot_biz_ids(self) -> List[int]:
+        active_after = time.time() - AGENT_STATUS_HOT_BIZ_WINDOW
+        self.redis.zremrangebyscore(self.hot_biz_key, "-inf", active_after)
+        return [int(bk_biz_id) for bk_biz_id in self.redis.zrangebyscore(self.hot_biz_key, active_after, "+inf")]
+
+    def refresh_hot_biz(self) -> Dict[int, int]:
+        """刷新热点业务全部主机的 Agent 状态，只刷新 CMDB 镜像可用的业务，返回 业务ID -> 刷新的主机数"""
+        refreshed = {}
+        for bk_biz_id in self.get_hot_biz_ids():
+            if not CCMirrorQuery.is_ready(bk_biz_id):
+                continue
+
+            bk_host_ids = CCHostMirror.objects.filter(bk_biz_id=bk_biz_id).values_list("bk_host_id", flat=True)
+            refreshed[bk_biz_id] = 0
+            for chunk in chunks(bk_host_ids.iterator(), AGENT_STATUS_BATCH_SIZE):
+                host_id__biz_id = {bk_host_id: bk_biz_id for bk_host_id in chunk}
+                try:
+                    status_map = self.query_nodeman(host_id__biz_id)
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.warning("[AgentStatusCache] refresh biz %s agent status failed: %s", bk_biz_id, err)
+                    break
+                self.save(host_id__biz_id, status_map, env.AGENT_STATUS_CACHE_TIME + AGENT_STATUS_REFRESH_INTERVAL)
+                refreshed[bk_biz_id] += len(status_map)
+        return refreshed
+
+    def clear(self, bk_host_ids: Iterable[int]):
+        keys = [self._key(bk_host_id) for bk_host_id in bk_host_ids]
+        if keys:
+            self.redis.delete(*keys)
+
+
+agent_status_cache = AgentStatusCache()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import typing
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from backend import env
+
+from ..constants import CC_MIRROR_MAX_LAG, CCWatchResource
+from ..exceptions import UnsupportedFilterError
+from ..models import CCHostMirror, CCHostTopoMirror, CCMirrorBiz, CCWatchCursor
+from ..tasks import reconcile_cc_mirror_biz
+from ..tools.cc_mirror_sync import MIRROR_HOST_FIELDS
+
+logger = logging.getLogger("app")
+
+# 业务全量同步任务的去重时间(s)，避免并发查询重复触发同步
+CC_MIRROR_RECONCILE_LOCK_TIMEOUT = 10 * 60
+
+
+class CCMirrorQuery:
+    """
+    从 CMDB 本地镜像中查询主机和拓扑关系，查询参数和返回格式与 CMDB 接口保持一致
+    镜像不可用或者查询条件不支持时，调用方需要回退到直接查询 CMDB
+    """
+
+    # CMDB 主机过滤字段 -> 镜像字段
+    FILTER_FIELDS = {
+        "bk_host_id": "bk_host_id",
+        "bk_cloud_id": "bk_cloud_id",
+        "bk_host_innerip": "bk_host_innerip",
+        "bk_host_innerip_v6": "bk_host_innerip_v6",
+        "bk_host_name": "bk_host_name",
+        "bk_os_type": "bk_os_type",
+        "bk_agent_id": "bk_agent_id",
+    }
+    # CMDB 过滤操作符 -> (查询后缀, 是否取反)
+    FILTER_OPERATORS = {
+        "equal": ("", False),
+        "not_equal": ("", True),
+        "in": ("__in", False),
+        "not_in": ("__in", True),
+        "contains": ("__icontains", False),
+    }
+    # list_biz_hosts 支持的查询参数
+    SUPPORTED_PARAMS = {"bk_biz_id", "bk_set_ids", "bk_module_ids", "host_property_filter", "fields", "page"}
+
+    @classmethod
+    def is_ready(cls, bk_biz_id: int) -> bool:
+        """
+        业务的镜像是否可用：事件监听在最大延迟内，且业务在最近一次游标重置后全量同步过
+        业务未同步或者需要重新同步时，触发异步全量同步
+        """
+        if not env.CC_MIRROR_ENABLED or not bk_biz_id:
+            return False
+
+        cursors = {cursor.resource: cursor for cursor in CCWatchCursor.objects.all()}
+        mirror_biz = CCMirrorBiz.objects.filter(bk_biz_id=bk_biz_id).first()
+        reset_at = [cursor.reset_at for cursor in cursors.values() if cursor.reset_at]
+        if not mirror_biz or (reset_at and mirror_biz.synced_at < max(reset_at)):
+            cls.trigger_reconcile(bk_biz_id)
+            return False
+
+        watched_after = timezone.now() - timedelta(seconds=CC_MIRROR_MAX_LAG)
+        for resource in CCWatchResource.get_values():
+            cursor = cursors.get(resource)
+            if not cursor or not cursor.watched_at or cursor.watched_at < watched_after:
+                return False
+        return True
+
+    @staticmethod
+    def trigger_reconcile(bk_biz_id: int):
+        lock_key = f"cc_mirror_reconcile:{bk_biz_id}"
+        if not cache.add(lock_key, 1, CC_MIRROR_RECONCILE_LOCK_TIMEOUT):
+            return
+        try:
+            reconcile_cc_mirror_biz.delay(bk_biz_id)
+        except Exception as err:  # pylint: disable=broad-except
+            # 同步任务下发失败不影响本次查询(回退到 CMDB)，释放锁以便下次重试
+            logger.warning("[CCMirrorQuery] trigger reconcile biz %s failed: %s", bk_biz_id, err)
+            cache.delete(lock_key)
+
+    @classmethod
+    def build_q(cls, host_filter: Dict) -> Q:
+        """
+        将 CMDB 的主机过滤规则转换为查询条件，支持 AND/OR 嵌套
+        @param host_filter: 过滤规则，格式同 CMDB host_property_filter
+        """
+        if "condition" in host_filter:
+            condition = host_filter["condition"]
+            if condition not in ["AND", "OR"]:
+                raise UnsupportedFilterError(context={"rule": host_filter})
+            q = Q()
+            for rule in host_filter.get("rules") or []:
+                q = q & cls.build_q(rule) if condition == "AND" else q | cls.build_q(rule)
+            return q
+
+        field, operator = host_filter.get("field"), host_filter.get("operator")
+        if field not in cls.FILTER_FIELDS or operator not in cls.FILTER_OPERATORS:
+            raise UnsupportedFilterError(context={"rule": host_filter})
+
+        lookup, negated = cls.FILTER_OPERATORS[operator]
+        q = Q(**{f"{cls.FILTER_FIELDS[field]}{lookup}": host_filter["value"]})
+        return ~q if negated else q
+
+    @classmethod
+    def list_biz_hosts(cls, params: Dict) -> Dict:
+        """
+        查询业务下的主机，参数和返回格式同 CMDB list_biz_hosts，返回 {"count": 总数, "info": 主机列表}
+        @param params: list_biz_hosts 的查询参数
+        """
+        unsupported_params = set(params) - cls.SUPPORTED_PARAMS
+        fields = params.get("fields") or MIRROR_HOST_FIELDS
+        unsupported_fields = set(fields) - set(MIRROR_HOST_FIELDS)
+        if unsupported_params or unsupported_fields:
+            raise UnsupportedFilterError(context={"rule": sorted(unsupported_params | unsupported_fields)})
+
+        bk_biz_id = params["bk_biz_id"]
+        hosts = CCHostMirror.objects.filter(bk_biz_id=bk_biz_id)
+        if params.get("bk_set_ids") or params.get("bk_module_ids"):
+            relations = CCHostTopoMirror.objects.filter(bk_biz_id=bk_biz_id)
+            if params.get("bk_set_ids"):
+                relations = relations.filter(bk_set_id__in=params["bk_set_ids"])
+            if params.get("bk_module_ids"):
+                relations = relations.filter(bk_module_id__in=params["bk_module_ids"])
+            hosts = hosts.filter(bk_host_id__in=relations.values("bk_host_id"))
+
+        host_property_filter = params.get("host_property_filter")
+        if host_property_filter and host_property_filter.get("rules"):
+            hosts = hosts.filter(cls.build_q(host_property_filter))
+
+        page = params.get("page") or {}
+        start, limit = page.get("start", 0), page.get("limit")
+        sort = page.get("sort") or "bk_host_id"
+        if sort.lstrip("-") not in cls.FILTER_FIELDS:
+            raise UnsupportedFilterError(context={"rule": sort})
+
+        count = hosts.count()
+        hosts = hosts.order_by(sort, "bk_host_id").values_list("detail", flat=True)
+        hosts = hosts[start : start + limit] if limit else hosts[start:]
+        return {"count": count, "info": [{field: host.get(field) for field in fields} for host in hosts]}
+
+    @staticmethod
+    def get_host_ids_gby_module_id(bk_biz_id: int) -> Dict[int, List[int]]:
+        host_ids_gby_module_id: typing.DefaultDict[int, List[int]] = defaultdict(list)
+        relations = CCHostTopoMirror.objects.filter(bk_biz_id=bk_biz_id).values_list("bk_module_id", "bk_host_id")
+        for bk_module_id, bk_host_id in relations.iterator():
+            host_ids_gby_module_id[bk_module_id].append(bk_host_id)
+        return dict(host_ids_gby_module_id)
@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import itertools
 import json
 import logging
 import typing
@@ -17,11 +18,9 @@ from typing import Any, Dict, List, Union
 from django.core.cache import cache
 from django.utils.translation import ugettext as _
 
-from backend import env
 from backend.bk_web.constants import CACHE_1D
 from backend.components import CCApi
-from backend.components.bknodeman.client import BKNodeManApi
-from backend.utils.batch_request import batch_request
+from backend.utils.batch_request import batch_request, iter_batch_request
 from backend.utils.cache import func_cache_decorator
 
 from .. import constants, exceptions, types
@@ -124,15 +123,38 @@ class ResourceQueryHelper:
         return internal_topo
 
     @staticmethod
-    def fetch_host_topo_relations(bk_biz_id: int) -> typing.List[typing.Dict]:
-        host_topo_relations: typing.List[typing.Dict] = batch_request(
+    def iter_host_topo_relations(bk_biz_id: int) -> typing.Iterator[typing.List[typing.Dict]]:
+        """按页流式获取业务的主机拓扑关系，页的产出顺序不保证"""
+        yield from iter_batch_request(
             func=CCApi.find_host_topo_relation,
             params={"bk_biz_id": bk_biz_id, "no_request": True},
             get_data=lambda x: x["data"],
             use_admin=True,
         )
+
+    @staticmethod
+    def fetch_host_topo_relations(bk_biz_id: int) -> typing.List[typing.Dict]:
+        host_topo_relations: typing.List[typing.Dict] = list(
+            itertools.chain.from_iterable(ResourceQueryHelper.iter_host_topo_relations(bk_biz_id))
+        )
         return host_topo_relations
 
+    @staticmethod
+    def list_biz_hosts(params: typing.Dict) -> typing.Dict:
+        """
+        查询业务下的主机，CMDB 本地镜像可用时从镜像查询，镜像不可用或者查询条件不支持时查询 CMDB
+        :param params: list_biz_hosts 的查询参数
+        """
+        from .cc_mirror import CCMirrorQuery
+
+        if CCMirrorQuery.is_ready(params["bk_biz_id"]):
+            try:
+                return CCMirrorQuery.list_biz_hosts(params)
+            except exceptions.UnsupportedFilterError as err:
+                logger.info("query hosts from cc mirror failed, fallback to cc: %s", err)
+
+        return CCApi.list_biz_hosts(params, use_admin=True)
+
     @staticmethod
     def query_cc_hosts(
         tree_node: types.TreeNode,
@@ -189,7 +211,7 @@ class ResourceQueryHelper:
             params.update(bk_set_ids=[instance_id])
 
         # 获取主机信息
-        resp = CCApi.list_biz_hosts(params, use_admin=True)
+        resp = ResourceQueryHelper.list_biz_hosts(params)
 
         if resp["info"] and return_status:
             ResourceQueryHelper.fill_agent_status(resp["info"])
@@ -198,41 +220,15 @@ class ResourceQueryHelper:
 
     @staticmethod
     def query_agent_status_from_nodeman(cc_hosts, fill_key="status"):
-        """查询agent状态"""
-        host_list, host_map, scope_list = [], {}, []
-        # 构建bk_host_id对bk_biz_id的映射
-        bk_host_id_to_biz_id = {
-            item["bk_host_id"]: item["bk_biz_id"]
-            for item in CCApi.find_host_biz_relations({"bk_host_id": [host["bk_host_id"] for host in cc_hosts]})
-        }
-
-        for index, cc_host in enumerate(cc_hosts):
-            bk_host_id = cc_host["bk_host_id"]
-            bk_biz_id = bk_host_id_to_biz_id.get(bk_host_id, env.DBA_APP_BK_BIZ_ID)
-            # 构建meta数据
-            meta = {"scope_type": constants.ScopeType.BIZ.value, "scope_id": str(bk_biz_id), "bk_biz_id": bk_biz_id}
-            host_list.append({"host_id": bk_host_id, "meta": meta})
-
-            # 构建scope_list数据
-            meta_bak = meta.copy()
-            del meta_bak["bk_biz_id"]
-            scope_list.append(meta_bak)
-
-            # 使用index
-            host_map[str(bk_host_id)] = index
-
-        # 准备request参数
-        request_params = {
-            "host_list": host_list,
-            "scope_list": scope_list,
-        }
-        try:
-            status_map = BKNodeManApi.ipchooser_host_details(request_params, use_admin=True)
-            for status in status_map:
-                # agent在线状态，0为不在线，1为在线
-                cc_hosts[host_map[str(status["host_id"])]][fill_key] = status["alive"]
-        except KeyError as e:
-            logger.error("query_agent_one_status exception: %s", e)
+        """查询agent状态，按主机ID缓存，未命中缓存的主机合并后批量查询节点管理"""
+        from .agent_status import agent_status_cache
+
+        status_map = agent_status_cache.get_status([cc_host["bk_host_id"] for cc_host in cc_hosts])
+        for cc_host in cc_hosts:
+            # agent在线状态，0为不在线，1为在线
+            alive = status_map.get(cc_host["bk_host_id"])
+            if alive is not None:
+                cc_host[fill_key] = alive
 
     @staticmethod
     def fill_agent_status(cc_hosts, fill_key="status"):
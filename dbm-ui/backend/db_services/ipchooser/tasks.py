@@ -8,3 +8,16 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+
+from celery import shared_task
+
+from backend.db_services.ipchooser.tools.cc_mirror_sync import cc_mirror_syncer
+
+logger = logging.getLogger("celery")
+
+
+@shared_task
+def reconcile_cc_mirror_biz(bk_biz_id: int):
+    """全量同步业务的 CMDB 主机和拓扑关系镜像"""
+    cc_mirror_syncer.reconcile_biz(bk_biz_id)
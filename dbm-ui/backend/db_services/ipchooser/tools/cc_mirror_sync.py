@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import itertools
+import logging
+import time
+import typing
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from backend import env
+from backend.components import CCApi
+from backend.exceptions import ApiResultError
+from backend.utils.batch_request import QUERY_CMDB_LIMIT, iter_batch_request
+
+from ..constants import (
+    CC_MIRROR_RECONCILE_INTERVAL,
+    CC_RECONCILE_REPLAY_ATTEMPTS,
+    CC_WATCH_MAX_ROUNDS,
+    CC_WATCH_RETRY_INTERVAL,
+    CC_WATCH_RETRY_TIMES,
+    CCWatchResource,
+    CommonEnum,
+)
+from ..models import CCHostMirror, CCHostTopoMirror, CCMirrorBiz, CCWatchCursor
+
+logger = logging.getLogger("app")
+
+# 镜像主机保存的 CMDB 字段
+MIRROR_HOST_FIELDS = list(dict.fromkeys(CommonEnum.DEFAULT_HOST_FIELDS.value))
+# 主机拓扑关系监听的字段
+MIRROR_RELATION_FIELDS = ["bk_biz_id", "bk_set_id", "bk_module_id", "bk_host_id"]
+# 写入镜像的批次大小
+MIRROR_BATCH_SIZE = 1000
+
+
+def build_host_mirror(host: Dict, bk_biz_id: int) -> CCHostMirror:
+    return fill_host_mirror(CCHostMirror(bk_host_id=host["bk_host_id"], bk_biz_id=bk_biz_id), host)
+
+
+def fill_host_mirror(host_mirror: CCHostMirror, host: Dict) -> CCHostMirror:
+    """用 CMDB 的主机信息更新镜像，CMDB 未设置的字段可能返回 None"""
+    host_mirror.bk_cloud_id = host.get("bk_cloud_id") or 0
+    host_mirror.bk_host_innerip = host.get("bk_host_innerip") or ""
+    host_mirror.bk_host_innerip_v6 = host.get("bk_host_innerip_v6") or ""
+    host_mirror.bk_host_name = host.get("bk_host_name") or ""
+    host_mirror.bk_os_type = host.get("bk_os_type") or ""
+    host_mirror.bk_agent_id = host.get("bk_agent_id") or ""
+    host_mirror.detail = {field: host.get(field) for field in MIRROR_HOST_FIELDS}
+    return host_mirror
+
+
+def is_cursor_expired(err: Exception) -> bool:
+    """CMDB 是否因为游标失效而无法继续推送事件"""
+    return isinstance(err, ApiResultError) and str(err.code) in env.CC_WATCH_CURSOR_EXPIRED_CODES
+
+
+def chunks(items: Iterable, size: int = MIRROR_BATCH_SIZE) -> Iterable[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CCMirrorSyncer:
+    """
+    CMDB 主机和主机拓扑关系的本地镜像同步
+    - 通过 resource_watch 监听主机和主机关系的变更事件，按游标增量更新镜像
+    - 只有全量同步(对账)过的业务才会写入主机关系事件，业务首次查询时触发全量同步
+    - 游标过期(事件丢失)时从当前时间重新监听，并记录重置时间，此前同步的业务需要重新对账后才可用
+    """
+
+    def __init__(self, cc_api=CCApi):
+        self.cc_api = cc_api
+
+    def watch(self, resource: str) -> int:
+        """
+        拉取并应用资源的变更事件，返回应用的事件数
+        @param resource: 资源类型，见 CCWatchResource
+        """
+        cursor, __ = CCWatchCursor.objects.get_or_create(resource=resource)
+        apply_events, fields = self.get_event_handler(resource)
+
+        applied = 0
+        for __ in range(CC_WATCH_MAX_ROUNDS):
+            params = {"bk_resource": resource, "bk_fields": fields}
+            if cursor.cursor:
+                params["bk_cursor"] = cursor.cursor
+            else:
+                # 没有游标时只能从当前时间开始监听，此前的变更需要通过对账补齐
+                params["bk_start_from"] = int(time.time())
+                cursor.reset_at = timezone.now()
+
+            try:
+                resp = self.resource_watch(params)
+            except Exception as err:  # pylint: disable=broad-except
+                if is_cursor_expired(err):
+                    # CMDB 无法从游标继续推送事件，清空游标重新监听
+                    logger.warning("[CCMirrorSyncer] watch %s cursor expired, reset cursor: %s", resource, err)
+                    cursor.cursor, cursor.reset_at = "", timezone.now()
+                    cursor.save(update_fields=["cursor", "reset_at"])
+                else:
+                    # 临时性错误保留游标，下次监听时从该游标继续
+                    logger.warning("[CCMirrorSyncer] watch %s failed, retry in next round: %s", resource, err)
+                break
+
+            events = resp.get("bk_events") or []
+            # 没有新事件时 CMDB 只返回最新的游标，事件详情为空
+            details = [event for event in events if event.get("bk_detail")] if resp.get("bk_watched") else []
+            with transaction.atomic():
+                # 与对账互斥：对账写入快照并重放事件期间，不能应用新的事件
+                CCWatchCursor.objects.select_for_update().filter(resource=resource).first()
+                if details:
+                    apply_events(details)
+                if events:
+                    cursor.cursor = events[-1]["bk_cursor"]
+                cursor.watched_at = timezone.now()
+                cursor.save()
+            applied += len(details)
+
+            if not resp.get("bk_watched"):
+                break
+
+        return applied
+
+    def resource_watch(self, params: Dict) -> Dict:
+        """请求 CMDB 的 resource_watch，临时性错误退避后重试，游标失效的错误直接抛出"""
+        for attempt in range(CC_WATCH_RETRY_TIMES):
+            try:
+                return self.cc_api.resource_watch(params, use_admin=True)
+            except Exception as err:  # pylint: disable=broad-except
+                if is_cursor_expired(err) or attempt == CC_WATCH_RETRY_TIMES - 1:
+                    raise
+                logger.warning("[CCMirrorSyncer] resource_watch failed, attempt: %s, error: %s", attempt + 1, err)
+                time.sleep(CC_WATCH_RETRY_INTERVAL * 2**attempt)
+
+    def get_event_handler(self, resource: str) -> Tuple[Callable[[List[Dict]], None], List[str]]:
+        """获取资源事件的处理函数和监听字段"""
+        if resource == CCWatchResource.HOST.value:
+            return self.apply_host_events, MIRROR_HOST_FIELDS
+        return self.apply_relation_events, MIRROR_RELATION_FIELDS
+
+    def fetch_events(self, resource: str, start_cursor: str, end_cursor: str, start_from: int) -> List[Dict]:
+        """
+        拉取 start_cursor 之后、直到 end_cursor(包含)的事件详情，用于对账后重放
+        事件详情为变更后的完整数据，按顺序重放后与监听任务应用的结果一致
+        @param resource: 资源类型
+        @param start_cursor: 起始游标，为空时从 start_from 时间开始
+        @param end_cursor: 监听任务已应用到的游标
+        @param start_from: 起始时间戳
+        """
+        if not end_cursor or end_cursor == start_cursor:
+            return []
+
+        __, fields = self.get_event_handler(resource)
+        details, cursor = [], start_cursor
+        for __ in range(CC_WATCH_MAX_ROUNDS):
+            params = {"bk_resource": resource, "bk_fields": fields}
+            if cursor:
+                params["bk_cursor"] = cursor
+            else:
+                params["bk_start_from"] = start_from
+            resp = self.resource_watch(params)
+            events = resp.get("bk_events") or []
+            if not resp.get("bk_watched") or not events:
+                break
+
+            cursors = [event["bk_cursor"] for event in events]
+            if end_cursor in cursors:
+                events = events[: cursors.index(end_cursor) + 1]
+            details.extend(event for event in events if event.get("bk_detail"))
+
+            if events[-1]["bk_cursor"] == end_cursor:
+                break
+            cursor = events[-1]["bk_cursor"]
+
+        return details
+
+    def apply_host_events(self, events: List[Dict]):
+        """应用主机事件，只更新已镜像的主机，新主机在写入主机关系时补充"""
+        latest_events = {event["bk_detail"]["bk_host_id"]: event for event in events}
+        deleted_host_ids = [host_id for host_id, event in latest_events.items() if event["bk_event_type"] == "delete"]
+        hosts = {
+            host_id: event["bk_detail"]
+            for host_id, event in latest_events.items()
+            if event["bk_event_type"] != "delete"
+        }
+
+        CCHostMirror.objects.filter(bk_host_id__in=deleted_host_ids).delete()
+        CCHostTopoMirror.objects.filter(bk_host_id__in=deleted_host_ids).delete()
+
+        host_mirrors = CCHostMirror.objects.in_bulk(list(hosts))
+        for host_id, host_mirror in host_mirrors.items():
+            fill_host_mirror(host_mirror, hosts[host_id])
+        CCHostMirror.objects.bulk_update(
+            host_mirrors.values(),
+            fields=[
+                "bk_cloud_id",
+                "bk_host_innerip",
+                "bk_host_innerip_v6",
+                "bk_host_name",
+                "bk_os_type",
+                "bk_agent_id",
+                "detail",
+            ],
+            batch_size=MIRROR_BATCH_SIZE,
+        )
+
+    def apply_relation_events(self, events: List[Dict], known_hosts: Dict[int, Dict] = None):
+        """
+        应用主机关系事件，主机转移到未镜像的业务时从镜像中移除
+        @param events: 主机关系事件
+        @param known_hosts: 已经从 CMDB 拉取的主机信息，新转入镜像业务的主机优先从中获取
+        """
+        known_hosts = known_hosts or {}
+        latest_events: Dict[Tuple[int, int], Dict] = {}
+        for event in events:
+            detail = event["bk_detail"]
+            latest_events[(detail["bk_host_id"], detail["bk_module_id"])] = event
+
+        mirror_biz_ids = set(CCMirrorBiz.objects.values_list("bk_biz_id", flat=True))
+        deleted_relations, created_relations = [], []
+        for (host_id, module_id), event in latest_events.items():
+            if event["bk_event_type"] == "delete":
+                deleted_relations.append((host_id, module_id))
+            elif event["bk_detail"]["bk_biz_id"] in mirror_biz_ids:
+                created_relations.append(event["bk_detail"])
+
+        host_id__biz_id = {relation["bk_host_id"]: relation["bk_biz_id"] for relation in created_relations}
+        missing_host_ids = set(host_id__biz_id) - set(
+            CCHostMirror.objects.filter(bk_host_id__in=list(host_id__biz_id)).values_list("bk_host_id", flat=True)
+        )
+        # 新转入镜像业务的主机需要从 CMDB 补充主机信息
+        missing_hosts = [known_hosts[host_id] for host_id in missing_host_ids if host_id in known_hosts]
+        missing_host_ids -= set(known_hosts)
+        missing_hosts.extend(self.fetch_hosts(missing_host_ids) if missing_host_ids else [])
+
+        relation_filter = Q(pk__in=[])
+        for host_id, module_id in deleted_relations:
+            relation_filter |= Q(bk_host_id=host_id, bk_module_id=module_id)
+        CCHostTopoMirror.objects.filter(relation_filter).delete()
+        CCHostTopoMirror.objects.bulk_create(
+            [
+                CCHostTopoMirror(**{field: relation[field] for field in MIRROR_RELATION_FIELDS})
+                for relation in created_relations
+            ],
+            batch_size=MIRROR_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        # 主机在镜像业务之间转移时更新所属业务
+        moved_hosts = []
+        for host_mirror in CCHostMirror.objects.filter(bk_host_id__in=list(host_id__biz_id)):
+            if host_mirror.bk_biz_id != host_id__biz_id[host_mirror.bk_host_id]:
+                host_mirror.bk_biz_id = host_id__biz_id[host_mirror.bk_host_id]
+                moved_hosts.append(host_mirror)
+        CCHostMirror.objects.bulk_update(moved_hosts, fields=["bk_biz_id"], batch_size=MIRROR_BATCH_SIZE)
+        CCHostMirror.objects.bulk_create(
+            [build_host_mirror(host, host_id__biz_id[host["bk_host_id"]]) for host in missing_hosts],
+            batch_size=MIRROR_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        # 没有拓扑关系的主机已经转移到未镜像的业务
+        host_ids = {host_id for host_id, __ in latest_events}
+        related_host_ids = set(
+            CCHostTopoMirror.objects.filter(bk_host_id__in=host_ids).values_list("bk_host_id", flat=True)
+        )
+        CCHostMirror.objects.filter(bk_host_id__in=host_ids - related_host_ids).delete()
+
+    def fetch_hosts(self, host_ids: typing.Collection[int]) -> List[Dict]:
+        hosts = []
+        for chunk in chunks(sorted(host_ids), QUERY_CMDB_LIMIT):
+            params = {
+                "fields": MIRROR_HOST_FIELDS,
+                "page": {"start": 0, "limit": len(chunk)},
+                "host_property_filter": {
+                    "condition": "AND",
+                    "rules": [{"field": "bk_host_id", "operator": "in", "value": chunk}],
+                },
+            }
+            hosts.extend(self.cc_api.list_hosts_without_biz(params, use_admin=True)["info"])
+        return hosts
+
+    def reconcile_biz(self, bk_biz_id: int) -> int:
+        """
+        全量同步业务的主机和主机关系，返回业务的主机数
+        拉取快照期间监听任务可能已经应用了更新的事件，写入快照时会被覆盖，
+        因此先记录监听游标，写入快照后重放该游标之后已应用的事件。
+        重放的事件在加锁前拉取，写入和重放期间锁住游标与监听任务互斥，加锁后游标仍有推进时重新拉取
+        同步时间记为开始拉取的时间
+        """
+        resources = CCWatchResource.get_values()
+        fetched_cursors = dict(CCWatchCursor.objects.filter(resource__in=resources).values_list("resource", "cursor"))
+        synced_at = timezone.now()
+        start_from = int(synced_at.timestamp())
+        hosts = list(
+            itertools.chain.from_iterable(
+                iter_batch_request(
+                    self.cc_api.list_biz_hosts,
+                    {"bk_biz_id": bk_biz_id, "fields": MIRROR_HOST_FIELDS},
+                    use_admin=True,
+                )
+            )
+        )
+        relations = list(
+            itertools.chain.from_iterable(
+                iter_batch_request(
+                    self.cc_api.find_host_topo_relation,
+                    {"bk_biz_id": bk_biz_id, "no_request": True},
+                    get_data=lambda x: x["data"],
+                    use_admin=True,
+                )
+            )
+        )
+        host_ids: Set[int] = {host["bk_host_id"] for host in hosts}
+        replay_events: Dict[str, List[Dict]] = {resource: [] for resource in resources}
+        transferred_hosts: Dict[int, Dict] = {}
+        for __ in range(CC_RECONCILE_REPLAY_ATTEMPTS):
+            # 拉取监听任务已应用的事件及转入该业务的主机信息，需要请求 CMDB，不能在持有游标锁时进行
+            end_cursors = dict(CCWatchCursor.objects.filter(resource__in=resources).values_list("resource", "cursor"))
+            for resource in resources:
+                replay_events[resource].extend(
+                    self.fetch_events(resource, fetched_cursors.get(resource), end_cursors.get(resource), start_from)
+                )
+                fetched_cursors[resource] = end_cursors.get(resource) or fetched_cursors.get(resource)
+            transferred_host_ids = (
+                {
+                    event["bk_detail"]["bk_host_id"]
+                    for event in replay_events[CCWatchResource.HOST_RELATION.value]
+                    if event["bk_detail"]["bk_biz_id"] == bk_biz_id
+                }
+                - host_ids
+                - set(transferred_hosts)
+            )
+            if transferred_host_ids:
+                transferred_hosts.update({host["bk_host_id"]: host for host in self.fetch_hosts(transferred_host_ids)})
+
+            with transaction.atomic():
+                locked_cursors = dict(
+                    CCWatchCursor.objects.select_for_update()
+                    .filter(resource__in=resources)
+                    .values_list("resource", "cursor")
+                )
+                if locked_cursors != end_cursors:
+                    continue
+                self._write_biz_snapshot(bk_biz_id, hosts, relations, synced_at, replay_events, transferred_hosts)
+                break
+        else:
+            # 监听任务持续推进，本次放弃写入，业务保持待对账状态，下次对账重试
+            logger.warning("[CCMirrorSyncer] reconcile biz %s skipped, watch cursors keep moving", bk_biz_id)
+            return 0
+
+        logger.info("[CCMirrorSyncer] reconcile biz %s, host count: %s", bk_biz_id, len(hosts))
+        return len(hosts)
+
+    def _write_biz_snapshot(
+        self,
+        bk_biz_id: int,
+        hosts: List[Dict],
+        relations: List[Dict],
+        synced_at: datetime,
+        replay_events: Dict[str, List[Dict]],
+        transferred_hosts: Dict[int, Dict],
+    ):
+        """写入业务的主机和主机关系快照，并重放快照之后监听任务已应用的事件，需要在持有游标锁的事务中调用"""
+        host_ids: Set[int] = {host["bk_host_id"] for host in hosts}
+        CCHostMirror.objects.filter(bk_biz_id=bk_biz_id).delete()
+        CCHostTopoMirror.objects.filter(bk_biz_id=bk_biz_id).delete()
+        # 从其他业务转入的主机
+        for chunk in chunks(sorted(host_ids)):
+            CCHostMirror.objects.filter(bk_host_id__in=chunk).delete()
+            CCHostTopoMirror.objects.filter(bk_host_id__in=chunk).delete()
+
+        CCHostMirror.objects.bulk_create(
+            [build_host_mirror(host, bk_biz_id) for host in hosts], batch_size=MIRROR_BATCH_SIZE
+        )
+        CCHostTopoMirror.objects.bulk_create(
+            [
+                CCHostTopoMirror(**{field: relation[field] for field in MIRROR_RELATION_FIELDS})
+                for relation in relations
+                if relation["bk_host_id"] in host_ids
+            ],
+            batch_size=MIRROR_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        CCMirrorBiz.objects.update_or_create(
+            bk_biz_id=bk_biz_id, defaults={"synced_at": synced_at, "host_count": len(hosts)}
+        )
+
+        # 先重放主机关系事件，转入该业务的主机会写入镜像，再重放这些主机的主机事件
+        relation_events = [
+            event
+            for event in replay_events[CCWatchResource.HOST_RELATION.value]
+            if event["bk_detail"]["bk_biz_id"] == bk_biz_id or event["bk_detail"]["bk_host_id"] in host_ids
+        ]
+        if relation_events:
+            self.apply_relation_events(relation_events, known_hosts=transferred_hosts)
+        related_host_ids = host_ids | set(
+            CCHostMirror.objects.filter(bk_biz_id=bk_biz_id).values_list("bk_host_id", flat=True)
+        )
+        host_events = [
+            event
+            for event in replay_events[CCWatchResource.HOST.value]
+            if event["bk_detail"]["bk_host_id"] in related_host_ids
+        ]
+        if host_events:
+            self.apply_host_events(host_events)
+
+    def get_stale_biz_ids(self) -> List[int]:
+        """获取需要重新对账的业务：超过对账周期，或者同步后游标发生过重置"""
+        stale_filter = Q(synced_at__lt=timezone.now() - timedelta(seconds=CC_MIRROR_RECONCILE_INTERVAL))
+        reset_at = [reset_at for reset_at in CCWatchCursor.objects.values_list("reset_at", flat=True) if reset_at]
+        if reset_at:
+            stale_filter |= Q(synced_at__lt=max(reset_at))
+        return list(CCMirrorBiz.objects.filter(stale_filter).values_list("bk_biz_id", flat=True))
+
+
+cc_mirror_syncer = CCMirrorSyncer()
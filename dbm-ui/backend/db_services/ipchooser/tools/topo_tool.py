@@ -18,6 +18,7 @@ from .. import constants, types
 from ..handlers.base import BaseHandler
 from ..models import TopoCacheManager
 from ..query import resource
+from ..query.cc_mirror import CCMirrorQuery
 
 logger = logging.getLogger("app")
 
@@ -41,22 +42,28 @@ class TopoTool:
         return total_host_ids
 
     @classmethod
-    def get_topo_tree_with_count(cls, bk_biz_id: int, return_all: bool = True) -> types.TreeNode:
-        topo_tree: types.TreeNode = resource.ResourceQueryHelper.get_topo_tree(bk_biz_id, return_all=return_all)
-
-        # 这个接口较慢，缓存5min
-        cache_key = f"host_topo_relations:{bk_biz_id}"
-        host_topo_relations: typing.List[typing.Dict] = cache.get(cache_key)
-        if not host_topo_relations:
-            host_topo_relations = resource.ResourceQueryHelper.fetch_host_topo_relations(bk_biz_id)
-            cache.set(cache_key, host_topo_relations, cls.CACHE_5MIN)
+    def get_host_ids_gby_module_id(cls, bk_biz_id: int) -> typing.Dict[int, typing.List[int]]:
+        """获取模块到主机的映射，CMDB 本地镜像可用时直接从镜像聚合"""
+        if CCMirrorQuery.is_ready(bk_biz_id):
+            return CCMirrorQuery.get_host_ids_gby_module_id(bk_biz_id)
 
-        host_ids_gby_module_id: typing.Dict[int, typing.List[int]] = defaultdict(list)
-        for host_topo_relation in host_topo_relations:
-            bk_host_id: int = host_topo_relation["bk_host_id"]
+        # 这个接口较慢，缓存5min。按页流式聚合，只缓存模块到主机的映射，不在内存中保留完整的拓扑关系列表
+        cache_key = f"host_ids_gby_module_id:{bk_biz_id}"
+        host_ids_gby_module_id: typing.Dict[int, typing.List[int]] = cache.get(cache_key)
+        if not host_ids_gby_module_id:
+            host_ids_gby_module_id = defaultdict(list)
+            for host_topo_relations in resource.ResourceQueryHelper.iter_host_topo_relations(bk_biz_id):
+                for host_topo_relation in host_topo_relations:
+                    # 暂不统计非缓存数据，遇到不一致的情况需要触发缓存更新
+                    host_ids_gby_module_id[host_topo_relation["bk_module_id"]].append(host_topo_relation["bk_host_id"])
+            host_ids_gby_module_id = dict(host_ids_gby_module_id)
+            cache.set(cache_key, host_ids_gby_module_id, cls.CACHE_5MIN)
+        return host_ids_gby_module_id
 
-            # 暂不统计非缓存数据，遇到不一致的情况需要触发缓存更新
-            host_ids_gby_module_id[host_topo_relation["bk_module_id"]].append(bk_host_id)
+    @classmethod
+    def get_topo_tree_with_count(cls, bk_biz_id: int, return_all: bool = True) -> types.TreeNode:
+        topo_tree: types.TreeNode = resource.ResourceQueryHelper.get_topo_tree(bk_biz_id, return_all=return_all)
+        host_ids_gby_module_id = cls.get_host_ids_gby_module_id(bk_biz_id)
         cls.fill_host_count_to_tree([topo_tree], host_ids_gby_module_id)
 
         topo_tree.update({"meta": BaseHandler.get_meta_data(bk_biz_id)})
@@ -26,3 +26,34 @@ class ResourceType(str, StructuredEnum):
 class FilterType(str, StructuredEnum):
     CONTAINS = EnumField("CONTAINS", _("模糊"))
     EXACT = EnumField("EXACT", _("精确"))
+
+
+class SearchStatus(str, StructuredEnum):
+    SUCCEEDED = EnumField("SUCCEEDED", _("成功"))
+    FAILED = EnumField("FAILED", _("失败"))
+    TIMEOUT = EnumField("TIMEOUT", _("超时"))
+
+
+# 各资源类型的查询时间预算(s)，超时的类型返回空结果，不影响其他类型
+QUICK_SEARCH_DEFAULT_TIMEOUT = 5
+QUICK_SEARCH_TIMEOUTS = {
+    # 资源池需要调用外部接口，耗时不稳定
+    ResourceType.RESOURCE_POOL.value: 3,
+}
+
+
+class SearchIndexType(str, StructuredEnum):
+    CLUSTER_NAME = EnumField("cluster_name", _("集群名/别名"))
+    CLUSTER_DOMAIN = EnumField("cluster_domain", _("集群域名"))
+    STORAGE_INSTANCE = EnumField("storage_instance", _("存储实例"))
+    PROXY_INSTANCE = EnumField("proxy_instance", _("接入层实例"))
+    MACHINE = EnumField("machine", _("主机"))
+    TASK = EnumField("task", _("任务"))
+    TICKET = EnumField("ticket", _("单号"))
+
+
+# 只需要前缀匹配的索引类型(单号为递增数字)，每个值只保存一行，不展开后缀
+PREFIX_ONLY_INDEX_TYPES = [SearchIndexType.TICKET]
+
+# 单次索引重建时每批处理的对象数
+SEARCH_INDEX_BATCH_SIZE = 1000
@@ -8,19 +8,39 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, connections
 from django.db.models import CharField, F, Q, Value
 from django.db.models.functions import Concat
 from django.forms import model_to_dict
+from django.utils import translation
 
 from backend.components.dbresource.client import DBResourceApi
+from backend.core.translation.context import RespectsLanguage
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
-from backend.db_services.quick_search.constants import FilterType, ResourceType
+from backend.db_services.quick_search.constants import (
+    QUICK_SEARCH_DEFAULT_TIMEOUT,
+    QUICK_SEARCH_TIMEOUTS,
+    FilterType,
+    ResourceType,
+    SearchIndexType,
+    SearchStatus,
+)
+from backend.db_services.quick_search.indexer import QuickSearchIndexer
 from backend.flow.models import FlowTree
 from backend.ticket.constants import TicketType
 from backend.ticket.models import Ticket
+from backend.utils.local import inject_request
 from backend.utils.string import split_str_to_list
 
+logger = logging.getLogger("root")
+
 
 class QSearchHandler(object):
     def __init__(self, bk_biz_ids=None, db_types=None, resource_types=None, filter_type=None, limit=None):
@@ -36,70 +56,126 @@ class QSearchHandler(object):
             for db_type in self.db_types:
                 self.cluster_types.extend(ClusterType.db_type_to_cluster_types(db_type))
 
-    def search(self, keyword: str):
-        result = {}
+    @property
+    def is_exact(self):
+        return self.filter_type == FilterType.EXACT.value
+
+    def get_filter_funcs(self) -> Dict[str, Callable]:
         target_resource_types = self.resource_types or ResourceType.get_values()
+        filter_funcs = {}
         for target_resource_type in target_resource_types:
             filter_func = getattr(self, f"filter_{target_resource_type}", None)
             if callable(filter_func):
-                keyword_list = split_str_to_list(keyword)
-                result[target_resource_type] = filter_func(keyword_list)
+                filter_funcs[target_resource_type] = filter_func
+        return filter_funcs
 
-        return result
+    def search(self, keyword: str):
+        """查询全部资源类型，超时或者查询失败的类型返回空列表"""
+        results = {event["resource_type"]: event["data"] for event in self.iter_search(keyword)}
+        return {resource_type: results[resource_type] for resource_type in self.get_filter_funcs()}
 
-    def generate_filter_for_str(self, filter_key, keyword_list):
+    def iter_search(self, keyword: str) -> Iterator[Dict]:
         """
-        为字符串类型生成过滤函数
+        并发查询各资源类型，按完成的先后顺序逐个返回结果
+        每个结果的格式为 {"resource_type": 资源类型, "status": 查询状态, "data": 查询结果}
+        调用时即提交查询任务，返回的迭代器可以在请求上下文之外(如流式响应中)消费
         """
-        if self.filter_type == FilterType.EXACT.value:
-            qs = Q(**{f"{filter_key}__in": keyword_list})
-        else:
-            qs = Q()
-            for keyword in keyword_list:
-                qs |= Q(**{f"{filter_key}__icontains": keyword})
-        return qs
+        keyword_list = split_str_to_list(keyword)
+        filter_funcs = self.get_filter_funcs()
+
+        # 调用方处于事务中时，其他线程的数据库连接看不到未提交的数据，只能串行查询
+        if len(filter_funcs) <= 1 or connection.in_atomic_block:
+            return self._iter_serially(filter_funcs, keyword_list)
+
+        # 各资源类型的查询互不依赖，并发执行
+        executor = ThreadPoolExecutor(max_workers=min(len(filter_funcs), settings.CONCURRENT_NUMBER))
+        run_filter = RespectsLanguage(language=translation.get_language())(inject_request(self._run_filter))
+        now = time.time()
+        futures = {
+            executor.submit(run_filter, func, keyword_list): (
+                resource_type,
+                now + QUICK_SEARCH_TIMEOUTS.get(resource_type, QUICK_SEARCH_DEFAULT_TIMEOUT),
+            )
+            for resource_type, func in filter_funcs.items()
+        }
+        return self._iter_concurrently(executor, futures)
 
-    def generate_filter_for_domain(self, filter_key, keyword_list):
-        """
-        为域名类型生成过滤函数
-        """
-        qs = Q()
-        for keyword in keyword_list:
-            try:
-                domain, _ = keyword.split(":")
-            except ValueError:
-                domain, _ = keyword, None
+    @staticmethod
+    def _make_event(resource_type: str, status: str, data: Optional[List] = None) -> Dict:
+        return {"resource_type": resource_type, "status": status, "data": data or []}
 
-            domain_filter_key = filter_key
-            if self.filter_type == FilterType.EXACT.value:
-                qs |= Q(**{f"{domain_filter_key}": domain})
-            else:
-                qs |= Q(**{f"{domain_filter_key}__icontains": domain})
-        return qs
+    def _iter_serially(self, filter_funcs: Dict[str, Callable], keyword_list: List[str]) -> Iterator[Dict]:
+        for resource_type, func in filter_funcs.items():
+            try:
+                yield self._make_event(resource_type, SearchStatus.SUCCEEDED.value, func(keyword_list))
+            except Exception as err:  # pylint: disable=broad-except
+                logger.exception("[quick_search] search %s failed: %s", resource_type, err)
+                yield self._make_event(resource_type, SearchStatus.FAILED.value)
+
+    def _iter_concurrently(self, executor: ThreadPoolExecutor, futures: Dict[Future, Tuple[str, float]]):
+        pending = set(futures)
+        try:
+            while pending:
+                done, __ = wait(
+                    pending,
+                    timeout=max(min(futures[future][1] for future in pending) - time.time(), 0),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    resource_type, __ = futures[future]
+                    if future.exception():
+                        logger.error("[quick_search] search %s failed: %s", resource_type, future.exception())
+                        yield self._make_event(resource_type, SearchStatus.FAILED.value)
+                    else:
+                        yield self._make_event(resource_type, SearchStatus.SUCCEEDED.value, future.result())
+
+                pending -= done
+                # 超出时间预算的类型直接返回空结果，不再等待
+                for future in [future for future in pending if futures[future][1] <= time.time()]:
+                    logger.warning("[quick_search] search %s timeout, skip it", futures[future][0])
+                    pending.remove(future)
+                    yield self._make_event(futures[future][0], SearchStatus.TIMEOUT.value)
+        finally:
+            # 不等待超时的任务结束，未开始的任务直接取消
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run_filter(filter_func: Callable, keyword_list: List[str]):
+        try:
+            return filter_func(keyword_list)
+        finally:
+            # 关闭工作线程自己创建的数据库连接，避免连接泄露
+            connections.close_all()
+
+    def lookup(self, index_type: str, keyword_list: List[str], with_cluster_type: bool = True, **kwargs) -> List[str]:
+        """在搜索索引中查询匹配的对象ID"""
+        return QuickSearchIndexer.lookup(
+            index_type,
+            keyword_list,
+            exact=self.is_exact,
+            bk_biz_ids=self.bk_biz_ids,
+            cluster_types=self.cluster_types if with_cluster_type else None,
+            limit=self.limit,
+            **kwargs,
+        )
 
-    def generate_filter_for_ip_port(self, filter_key, keyword_list):
+    def generate_filter_for_ip_port(self, keyword_list):
         """
-        为ip:port实例生成过滤函数
+        为ip:port实例生成索引的过滤条件，实例的索引值为 ip:port
         """
         qs = Q()
         for keyword in keyword_list:
-            try:
-                ip, port = keyword.split(":")
-            except ValueError:
-                ip, port = keyword, None
-
-            ip_filter_key = filter_key
-            port_filter_key = "port"
+            ip, __, port = keyword.lower().partition(":")
             if port:
-                qs |= Q(**{ip_filter_key: ip, port_filter_key: port})
-                if self.filter_type == FilterType.CONTAINS.value:
-                    qs |= Q(**{"ip_port__contains": keyword})
+                if self.is_exact:
+                    qs |= Q(suffix=f"{ip}:{port}", value=f"{ip}:{port}")
                 else:
-                    qs |= Q(**{ip_filter_key: ip, port_filter_key: port})
+                    qs |= Q(suffix__istartswith=f"{ip}:{port}")
+            elif self.is_exact:
+                qs |= Q(suffix__istartswith=f"{ip}:", value__istartswith=f"{ip}:")
             else:
-                if self.filter_type == FilterType.CONTAINS.value:
-                    ip_filter_key += "__contains"
-                qs |= Q(**{ip_filter_key: ip})
+                # 后缀中还有冒号，说明关键字匹配的是 ip 部分，而不是端口
+                qs |= Q(suffix__istartswith=ip, suffix__contains=":")
         return qs
 
     def common_filter(self, objs, return_type="list", fields=None, limit=None):
@@ -120,24 +196,26 @@ class QSearchHandler(object):
 
     def filter_cluster_name(self, keyword_list: list):
         """过滤集群名"""
-        qs = self.generate_filter_for_str("name", keyword_list)
-        objs = Cluster.objects.filter(qs)
+        cluster_ids = self.lookup(SearchIndexType.CLUSTER_NAME.value, keyword_list)
+        objs = Cluster.objects.filter(id__in=cluster_ids)
         return self.common_filter(objs)
 
     def filter_cluster_domain(self, keyword_list: list):
         """过滤集群域名"""
-        qs = self.generate_filter_for_domain("immute_domain", keyword_list)
-        objs = Cluster.objects.filter(qs)
+        # 忽略关键字中的端口
+        domains = [keyword.split(":")[0] for keyword in keyword_list]
+        cluster_ids = self.lookup(SearchIndexType.CLUSTER_DOMAIN.value, domains)
+        objs = Cluster.objects.filter(id__in=cluster_ids)
         return self.common_filter(objs)
 
     def filter_instance(self, keyword_list: list):
         """过滤实例"""
-        qs = self.generate_filter_for_ip_port("machine__ip", keyword_list)
-        if self.bk_biz_ids:
-            qs = Q(bk_biz_id__in=self.bk_biz_ids) & qs
+        if not keyword_list:
+            return []
 
-        if self.db_types:
-            qs = Q(cluster_type__in=self.cluster_types) & qs
+        qs = self.generate_filter_for_ip_port(keyword_list)
+        storage_ids = self.lookup(SearchIndexType.STORAGE_INSTANCE.value, keyword_list, extra_q=qs)
+        proxy_ids = self.lookup(SearchIndexType.PROXY_INSTANCE.value, keyword_list, extra_q=qs)
 
         common_fields = {
             "cluster_id": F("cluster__id"),
@@ -156,12 +234,12 @@ class QSearchHandler(object):
         storage_objs = (
             StorageInstance.objects.prefetch_related("cluster", "machine")
             .annotate(role=F("instance_role"), **common_fields)
-            .filter(qs)
+            .filter(id__in=storage_ids)
         )
         proxy_objs = (
             ProxyInstance.objects.prefetch_related("cluster", "machine")
             .annotate(role=F("access_layer"), **common_fields)
-            .filter(qs)
+            .filter(id__in=proxy_ids)
         )
         fields = [
             "id",
@@ -179,9 +257,12 @@ class QSearchHandler(object):
         return list(storage_objs[: self.limit].values(*fields)) + list(proxy_objs[: self.limit].values(*fields))
 
     def filter_task(self, keyword_list: list):
-        """过滤任务"""
-        qs = self.generate_filter_for_str("root_id", keyword_list)
-        objs = FlowTree.objects.filter(qs)
+        """过滤任务，模糊搜索为任务ID的子串匹配"""
+        if self.is_exact:
+            root_ids = keyword_list
+        else:
+            root_ids = self.lookup(SearchIndexType.TASK.value, keyword_list, with_cluster_type=False)
+        objs = FlowTree.objects.filter(root_id__in=root_ids)
 
         if self.bk_biz_ids:
             objs = objs.filter(bk_biz_id__in=self.bk_biz_ids)
@@ -199,14 +280,10 @@ class QSearchHandler(object):
     def filter_machine(self, keyword_list: list):
         """过滤主机"""
         bk_host_ids = [int(keyword) for keyword in keyword_list if isinstance(keyword, int) or keyword.isdigit()]
-        if self.filter_type == FilterType.EXACT.value:
-            qs = Q(ip__in=keyword_list)
-            if bk_host_ids:
-                qs = qs | Q(bk_host_id__in=bk_host_ids)
-        else:
-            qs = Q()
-            for keyword in keyword_list:
-                qs |= Q(ip__contains=keyword)
+        matched_host_ids = [int(bk_host_id) for bk_host_id in self.lookup(SearchIndexType.MACHINE.value, keyword_list)]
+        qs = Q(bk_host_id__in=matched_host_ids)
+        if self.is_exact and bk_host_ids:
+            qs = qs | Q(bk_host_id__in=bk_host_ids)
 
         if self.bk_biz_ids:
             qs = qs & Q(bk_biz_id__in=self.bk_biz_ids)
@@ -244,17 +321,15 @@ class QSearchHandler(object):
         return machines
 
     def filter_ticket(self, keyword_list: list):
-        """过滤单据，单号为递增数字，采用startswith过滤"""
+        """过滤单据，单号为递增数字，采用前缀匹配"""
         ticket_ids = [int(keyword) for keyword in keyword_list if isinstance(keyword, int) or keyword.isdigit()]
         if not ticket_ids:
             return []
 
-        if self.filter_type == FilterType.EXACT.value:
-            qs = Q(id__in=ticket_ids)
-        else:
-            qs = Q()
-            for ticket_id in ticket_ids:
-                qs = qs | Q(id__startswith=ticket_id)
+        if not self.is_exact:
+            keywords = [str(ticket_id) for ticket_id in ticket_ids]
+            ticket_ids = self.lookup(SearchIndexType.TICKET.value, keywords, with_cluster_type=False)
+        qs = Q(id__in=ticket_ids)
 
         if self.bk_biz_ids:
             qs = qs & Q(bk_biz_id__in=self.bk_biz_ids)
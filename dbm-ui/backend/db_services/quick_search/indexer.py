@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.db import models, transaction
+from django.db.models import Q
+
+from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+from backend.db_services.quick_search.constants import (
+    PREFIX_ONLY_INDEX_TYPES,
+    SEARCH_INDEX_BATCH_SIZE,
+    SearchIndexType,
+)
+from backend.db_services.quick_search.models import QuickSearchIndex
+from backend.flow.models import FlowTree
+from backend.ticket.models import Ticket
+
+logger = logging.getLogger("root")
+
+# 索引条目：(索引类型, 对象ID, 业务ID, 集群类型, 索引值)，索引类型使用枚举值，便于与查询结果比较
+IndexEntry = Tuple[str, str, int, str, str]
+
+
+def build_cluster_entries(cluster: Cluster) -> List[IndexEntry]:
+    object_id = str(cluster.id)
+    entries = [
+        (SearchIndexType.CLUSTER_NAME.value, object_id, cluster.bk_biz_id, cluster.cluster_type, name)
+        for name in {cluster.name, cluster.alias}
+    ]
+    entries.append(
+        (
+            SearchIndexType.CLUSTER_DOMAIN.value,
+            object_id,
+            cluster.bk_biz_id,
+            cluster.cluster_type,
+            cluster.immute_domain,
+        )
+    )
+    return entries
+
+
+def build_instance_entries(instance: models.Model) -> List[IndexEntry]:
+    index_type = (
+        SearchIndexType.STORAGE_INSTANCE.value
+        if isinstance(instance, StorageInstance)
+        else SearchIndexType.PROXY_INSTANCE.value
+    )
+    ip_port = f"{instance.machine.ip}:{instance.port}"
+    return [(index_type, str(instance.id), instance.bk_biz_id, instance.cluster_type, ip_port)]
+
+
+def build_machine_entries(machine: Machine) -> List[IndexEntry]:
+    return [
+        (SearchIndexType.MACHINE.value, str(machine.bk_host_id), machine.bk_biz_id, machine.cluster_type, machine.ip)
+    ]
+
+
+def build_flow_tree_entries(flow_tree: FlowTree) -> List[IndexEntry]:
+    return [(SearchIndexType.TASK.value, flow_tree.root_id, flow_tree.bk_biz_id, "", flow_tree.root_id)]
+
+
+def build_ticket_entries(ticket: Ticket) -> List[IndexEntry]:
+    return [(SearchIndexType.TICKET.value, str(ticket.id), ticket.bk_biz_id, "", str(ticket.id))]
+
+
+class QuickSearchIndexer:
+    """
+    全局搜索索引的维护与查询
+    - 对象变更时通过 signal 增量更新索引，存量数据由数据迁移初始化
+    - queryset.update/bulk_create/bulk_update 不会触发 signal，修改索引字段的批量写入需要主动更新索引：
+      主机批量创建(db_meta.api.machine)发送 machines_created，集群转移业务调用 update_clusters，
+      其他绕过 signal 的场景可以通过 rebuild 重建
+    - 查询时每个关键字只需要一次走索引的前缀匹配，再按对象ID回表
+    """
+
+    # model -> (索引条目构造函数, 该 model 涉及的索引类型, 重建时的 queryset 优化)
+    BUILDERS = {
+        Cluster: (
+            build_cluster_entries,
+            [SearchIndexType.CLUSTER_NAME.value, SearchIndexType.CLUSTER_DOMAIN.value],
+            [],
+        ),
+        StorageInstance: (build_instance_entries, [SearchIndexType.STORAGE_INSTANCE.value], ["machine"]),
+        ProxyInstance: (build_instance_entries, [SearchIndexType.PROXY_INSTANCE.value], ["machine"]),
+        Machine: (build_machine_entries, [SearchIndexType.MACHINE.value], []),
+        FlowTree: (build_flow_tree_entries, [SearchIndexType.TASK.value], []),
+        Ticket: (build_ticket_entries, [SearchIndexType.TICKET.value], []),
+    }
+
+    @staticmethod
+    def get_suffixes(index_type: str, value: str) -> List[str]:
+        """获取索引值需要保存的后缀，值已转为小写"""
+        if index_type in PREFIX_ONLY_INDEX_TYPES:
+            return [value]
+        return [value[i:] for i in range(len(value))]
+
+    @classmethod
+    def build_rows(cls, entries: Iterable[IndexEntry]) -> List[QuickSearchIndex]:
+        rows = []
+        for index_type, object_id, bk_biz_id, cluster_type, value in entries:
+            value = (value or "").lower()
+            if not value:
+                continue
+            rows.extend(
+                QuickSearchIndex(
+                    index_type=index_type,
+                    object_id=object_id,
+                    bk_biz_id=bk_biz_id or 0,
+                    cluster_type=cluster_type or "",
+                    value=value,
+                    suffix=suffix,
+                )
+                for suffix in cls.get_suffixes(index_type, value)
+            )
+        return rows
+
+    @classmethod
+    def get_entries(cls, objs: Iterable[models.Model]) -> Tuple[List[IndexEntry], Dict[str, Set[str]]]:
+        """获取对象的索引条目，以及每种索引类型涉及的对象ID"""
+        entries, object_ids = [], defaultdict(set)
+        for obj in objs:
+            build_entries, index_types, __ = cls.BUILDERS[type(obj)]
+            entries.extend(build_entries(obj))
+            for index_type in index_types:
+                object_ids[index_type].add(str(obj.pk))
+        return entries, object_ids
+
+    @staticmethod
+    def _filter_object_ids(object_ids: Dict[str, Set[str]]) -> Q:
+        qs = Q(pk__in=[])
+        for index_type, ids in object_ids.items():
+            qs |= Q(index_type=index_type, object_id__in=ids)
+        return qs
+
+    @classmethod
+    def update(cls, objs: Iterable[models.Model]):
+        """
+        更新对象的索引，索引值、业务和集群类型都没有变化的对象会跳过
+        @param objs: 同一类型或者不同类型的对象列表
+        """
+        entries, object_ids = cls.get_entries(objs)
+        if not object_ids:
+            return
+
+        existing = set(
+            QuickSearchIndex.objects.filter(cls._filter_object_ids(object_ids))
+            .values_list("index_type", "object_id", "bk_biz_id", "cluster_type", "value")
+            .distinct()
+        )
+        expected = {
+            (index_type, object_id, bk_biz_id or 0, cluster_type or "", (value or "").lower())
+            for index_type, object_id, bk_biz_id, cluster_type, value in entries
+            if value
+        }
+        # 按对象比较索引条目，只重建发生变化的对象
+        changed_ids = defaultdict(set)
+        for index_type, object_id, *__ in existing ^ expected:
+            changed_ids[index_type].add(object_id)
+        if not changed_ids:
+            return
+
+        with transaction.atomic():
+            QuickSearchIndex.objects.filter(cls._filter_object_ids(changed_ids)).delete()
+            QuickSearchIndex.objects.bulk_create(
+                cls.build_rows(entry for entry in entries if entry[1] in changed_ids[entry[0]]),
+                batch_size=SEARCH_INDEX_BATCH_SIZE,
+            )
+
+    @classmethod
+    def update_clusters(cls, clusters: Iterable[Cluster]):
+        """
+        更新集群及其实例、主机的索引，用于 queryset.update 等不会触发 signal 的批量变更(如集群转移业务)
+        @param clusters: 集群列表或 queryset
+        """
+        cluster_ids = [cluster.id for cluster in clusters]
+        objs: List[models.Model] = list(Cluster.objects.filter(id__in=cluster_ids))
+        for instance_model in [StorageInstance, ProxyInstance]:
+            objs.extend(instance_model.objects.filter(cluster__id__in=cluster_ids).select_related("machine"))
+        objs.extend(
+            Machine.objects.filter(
+                Q(storageinstance__cluster__id__in=cluster_ids) | Q(proxyinstance__cluster__id__in=cluster_ids)
+            ).distinct()
+        )
+        cls.update(objs)
+
+    @classmethod
+    def delete(cls, objs: Iterable[models.Model]):
+        __, object_ids = cls.get_entries(objs)
+        if object_ids:
+            QuickSearchIndex.objects.filter(cls._filter_object_ids(object_ids)).delete()
+
+    @classmethod
+    def rebuild(cls, model: Type[models.Model], batch_size: int = SEARCH_INDEX_BATCH_SIZE) -> int:
+        """
+        全量重建某个 model 的索引，返回处理的对象数
+        @param model: 需要重建的 model
+        @param batch_size: 每批处理的对象数
+        """
+        __, index_types, select_related = cls.BUILDERS[model]
+        QuickSearchIndex.objects.filter(index_type__in=index_types).delete()
+
+        queryset = model.objects.select_related(*select_related).order_by("pk")
+        count, last_pk = 0, None
+        while True:
+            batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+            objs = list(batch[:batch_size])
+            if not objs:
+                break
+            entries, __ = cls.get_entries(objs)
+            QuickSearchIndex.objects.bulk_create(cls.build_rows(entries), batch_size=SEARCH_INDEX_BATCH_SIZE)
+            count, last_pk = count + len(objs), objs[-1].pk
+            logger.info("[QuickSearchIndexer] rebuild %s index, processed: %s", model.__name__, count)
+        return count
+
+    @staticmethod
+    def lookup(
+        index_type: str,
+        keywords: List[str],
+        exact: bool = False,
+        bk_biz_ids: Optional[List[int]] = None,
+        cluster_types: Optional[List[str]] = None,
+        limit: int = 10,
+        extra_q: Optional[Q] = None,
+    ) -> List[str]:
+        """
+        按关键字查询匹配的对象ID
+        @param index_type: 索引类型
+        @param keywords: 关键字列表
+        @param exact: 是否精确匹配，否则为子串匹配(前缀类型为前缀匹配)
+        @param bk_biz_ids: 业务过滤
+        @param cluster_types: 集群类型过滤
+        @param limit: 返回的对象数上限
+        @param extra_q: 额外的过滤条件，默认为关键字的匹配条件
+        """
+        keywords = [keyword.lower() for keyword in keywords if keyword]
+        if extra_q is None:
+            if not keywords:
+                return []
+            if exact:
+                extra_q = Q(suffix__in=keywords, value__in=keywords)
+            else:
+                extra_q = Q()
+                for keyword in keywords:
+                    extra_q |= Q(suffix__istartswith=keyword)
+
+        objs = QuickSearchIndex.objects.filter(extra_q, index_type=index_type)
+        if bk_biz_ids:
+            objs = objs.filter(bk_biz_id__in=bk_biz_ids)
+        if cluster_types:
+            objs = objs.filter(cluster_type__in=cluster_types)
+        return list(objs.values_list("object_id", flat=True).distinct()[:limit])
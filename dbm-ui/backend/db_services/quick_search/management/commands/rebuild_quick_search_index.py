@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.db_services.quick_search.constants import SEARCH_INDEX_BATCH_SIZE
+from backend.db_services.quick_search.indexer import QuickSearchIndexer
+
+
+class Command(BaseCommand):
+    help = "rebuild quick search index, for initialization or data imported without signals."
+
+    def add_arguments(self, parser):
+        models = [model.__name__ for model in QuickSearchIndexer.BUILDERS]
+        parser.add_argument("--models", nargs="*", choices=models, default=models, help="models to rebuild")
+        parser.add_argument("--batch-size", type=int, default=SEARCH_INDEX_BATCH_SIZE, help="objects per batch")
+
+    def handle(self, *args, **options):
+        for model in QuickSearchIndexer.BUILDERS:
+            if model.__name__ not in options["models"]:
+                continue
+            count = QuickSearchIndexer.rebuild(model, batch_size=options["batch_size"])
+            self.stdout.write(f"rebuild quick search index for {model.__name__} finished, object count: {count}")
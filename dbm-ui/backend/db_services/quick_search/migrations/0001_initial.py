@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+# Generated by Django 3.2.19 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="QuickSearchIndex",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "index_type",
+                    models.CharField(
+                        choices=[
+                            ("cluster_name", "集群名/别名"),
+                            ("cluster_domain", "集群域名"),
+                            ("storage_instance", "存储实例"),
+                            ("proxy_instance", "接入层实例"),
+                            ("machine", "主机"),
+                            ("task", "任务"),
+                            ("ticket", "单号"),
+                        ],
+                        max_length=32,
+                        verbose_name="索引类型",
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=64, verbose_name="对象ID")),
+                ("bk_biz_id", models.IntegerField(default=0, verbose_name="业务ID")),
+                ("cluster_type", models.CharField(default="", max_length=64, verbose_name="集群类型")),
+                ("value", models.CharField(max_length=255, verbose_name="索引值(小写)")),
+                ("suffix", models.CharField(max_length=255, verbose_name="索引值后缀(小写)")),
+            ],
+            options={
+                "verbose_name": "全局搜索索引",
+                "verbose_name_plural": "全局搜索索引",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="quicksearchindex",
+            index=models.Index(fields=["index_type", "suffix"], name="quick_searc_index_t_31770b_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="quicksearchindex",
+            index=models.Index(fields=["index_type", "object_id"], name="quick_searc_index_t_ac2392_idx"),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+# Generated by Django 3.2.19 on 2026-10-18 12:00
+
+from django.db import migrations
+
+BACKFILL_BATCH_SIZE = 1000
+# 只需要前缀匹配的索引类型，每个值只保存一行
+PREFIX_ONLY_INDEX_TYPES = ["ticket"]
+
+
+def cluster_entries(cluster):
+    entries = [
+        ("cluster_name", cluster.id, cluster.bk_biz_id, cluster.cluster_type, name)
+        for name in {cluster.name, cluster.alias}
+    ]
+    entries.append(("cluster_domain", cluster.id, cluster.bk_biz_id, cluster.cluster_type, cluster.immute_domain))
+    return entries
+
+
+def instance_entries(index_type):
+    def build(instance):
+        ip_port = f"{instance.machine.ip}:{instance.port}"
+        return [(index_type, instance.id, instance.bk_biz_id, instance.cluster_type, ip_port)]
+
+    return build
+
+
+def machine_entries(machine):
+    return [("machine", machine.bk_host_id, machine.bk_biz_id, machine.cluster_type, machine.ip)]
+
+
+def flow_tree_entries(flow_tree):
+    return [("task", flow_tree.root_id, flow_tree.bk_biz_id, "", flow_tree.root_id)]
+
+
+def ticket_entries(ticket):
+    return [("ticket", ticket.id, ticket.bk_biz_id, "", str(ticket.id))]
+
+
+def build_rows(QuickSearchIndex, entries):
+    rows = []
+    for index_type, object_id, bk_biz_id, cluster_type, value in entries:
+        value = (value or "").lower()
+        if not value:
+            continue
+        suffixes = [value] if index_type in PREFIX_ONLY_INDEX_TYPES else [value[i:] for i in range(len(value))]
+        rows.extend(
+            QuickSearchIndex(
+                index_type=index_type,
+                object_id=str(object_id),
+                bk_biz_id=bk_biz_id or 0,
+                cluster_type=cluster_type or "",
+                value=value,
+                suffix=suffix,
+            )
+            for suffix in suffixes
+        )
+    return rows
+
+
+def backfill_quick_search_index(apps, schema_editor):
+    QuickSearchIndex = apps.get_model("quick_search", "QuickSearchIndex")
+    # 全量初始化存量数据的索引，之后由 signal 增量维护
+    QuickSearchIndex.objects.all().delete()
+
+    # (app, model, 索引条目构造函数, select_related)，规则与 QuickSearchIndexer 保持一致
+    sources = [
+        ("db_meta", "Cluster", cluster_entries, []),
+        ("db_meta", "StorageInstance", instance_entries("storage_instance"), ["machine"]),
+        ("db_meta", "ProxyInstance", instance_entries("proxy_instance"), ["machine"]),
+        ("db_meta", "Machine", machine_entries, []),
+        ("flow", "FlowTree", flow_tree_entries, []),
+        ("ticket", "Ticket", ticket_entries, []),
+    ]
+    for app_label, model_name, build_entries, select_related in sources:
+        objs = apps.get_model(app_label, model_name).objects.select_related(*select_related).order_by("pk")
+        rows = []
+        for obj in objs.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            rows.extend(build_rows(QuickSearchIndex, build_entries(obj)))
+            if len(rows) >= BACKFILL_BATCH_SIZE:
+                QuickSearchIndex.objects.bulk_create(rows, batch_size=BACKFILL_BATCH_SIZE)
+                rows = []
+        QuickSearchIndex.objects.bulk_create(rows, batch_size=BACKFILL_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quick_search", "0001_initial"),
+        ("db_meta", "0043_clusterstats_clusterstatshistory"),
+        ("flow", "0004_alter_flowtree_index_together"),
+        ("ticket", "0013_backfill_ticket_resource_relations"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_quick_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from backend.db_services.quick_search.constants import SearchIndexType
+
+
+class QuickSearchIndex(models.Model):
+    """
+    全局搜索索引表
+    每个被索引的值展开为它的全部后缀，子串匹配转化为后缀的前缀匹配(suffix LIKE 'keyword%')，可以走索引
+    只需要前缀匹配的类型(任务ID、单号)只保存值本身
+    """
+
+    index_type = models.CharField(_("索引类型"), max_length=32, choices=SearchIndexType.get_choices())
+    object_id = models.CharField(_("对象ID"), max_length=64)
+    bk_biz_id = models.IntegerField(_("业务ID"), default=0)
+    cluster_type = models.CharField(_("集群类型"), max_length=64, default="")
+    value = models.CharField(_("索引值(小写)"), max_length=255)
+    suffix = models.CharField(_("索引值后缀(小写)"), max_length=255)
+
+    class Meta:
+        verbose_name = _("全局搜索索引")
+        verbose_name_plural = _("全局搜索索引")
+        indexes = [
+            models.Index(fields=["index_type", "suffix"]),
+            models.Index(fields=["index_type", "object_id"]),
+        ]
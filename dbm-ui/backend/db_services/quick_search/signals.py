@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+from backend.db_meta.signals import machines_created
+from backend.db_services.quick_search.indexer import QuickSearchIndexer
+from backend.flow.models import FlowTree
+from backend.ticket.models import Ticket
+
+logger = logging.getLogger("root")
+
+# 影响索引内容的字段，update_fields 与之没有交集时不需要更新索引
+# 注意：queryset.update/bulk_create/bulk_update 不会触发 signal，修改这些字段的批量写入需要主动更新索引，
+# 目前有：db_meta.api.machine 批量创建主机(machines_created)，集群转移业务(QuickSearchIndexer.update_clusters)
+INDEXED_FIELDS = {
+    Cluster: {"name", "alias", "immute_domain", "bk_biz_id", "cluster_type"},
+    StorageInstance: {"port", "machine", "machine_id", "bk_biz_id", "cluster_type"},
+    ProxyInstance: {"port", "machine", "machine_id", "bk_biz_id", "cluster_type"},
+    Machine: {"ip", "bk_biz_id", "cluster_type"},
+}
+
+# 创建后索引值不会再变化的 model，只在创建时写入索引
+CREATE_ONLY_MODELS = [FlowTree, Ticket]
+
+
+def update_search_index(sender, instance, created=False, update_fields=None, **kwargs):
+    """对象保存后更新全局搜索索引，索引失败不影响业务流程"""
+    if sender in CREATE_ONLY_MODELS and not created:
+        return
+    if update_fields and not INDEXED_FIELDS.get(sender, set()) & set(update_fields):
+        return
+
+    try:
+        objs = [instance]
+        # 主机IP变化时，主机上的实例索引需要一起更新
+        if sender == Machine and not created:
+            objs.extend(instance.storageinstance_set.select_related("machine"))
+            objs.extend(instance.proxyinstance_set.select_related("machine"))
+        # 放在 savepoint 中执行，索引失败时不影响外层事务
+        with transaction.atomic():
+            QuickSearchIndexer.update(objs)
+    except Exception as err:  # pylint: disable=broad-except
+        logger.exception("[quick_search] update search index for %s(%s) failed: %s", sender, instance.pk, err)
+
+
+def delete_search_index(sender, instance, **kwargs):
+    try:
+        with transaction.atomic():
+            QuickSearchIndexer.delete([instance])
+    except Exception as err:  # pylint: disable=broad-except
+        logger.exception("[quick_search] delete search index for %s(%s) failed: %s", sender, instance.pk, err)
+
+
+def update_machines_search_index(sender, machines, **kwargs):
+    """批量创建主机不会触发 post_save，需要单独更新索引"""
+    try:
+        with transaction.atomic():
+            QuickSearchIndexer.update(machines)
+    except Exception as err:  # pylint: disable=broad-except
+        logger.exception("[quick_search] update search index for machines failed: %s", err)
+
+
+def connect_search_index_signals():
+    for model in [Cluster, StorageInstance, ProxyInstance, Machine, FlowTree, Ticket]:
+        post_save.connect(update_search_index, sender=model)
+        post_delete.connect(delete_search_index, sender=model)
+    machines_created.connect(update_machines_search_index)
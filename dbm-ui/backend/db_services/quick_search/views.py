@@ -8,8 +8,12 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import json
 import logging
+from typing import Dict
 
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.utils.translation import ugettext_lazy as _
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -23,6 +27,14 @@ logger = logging.getLogger("root")
 SWAGGER_TAG = [_("全局搜索")]
 
 
+def format_ndjson(event: Dict) -> bytes:
+    return f"{json.dumps(event, cls=DjangoJSONEncoder)}\n".encode()
+
+
+def format_sse(event: Dict) -> bytes:
+    return f"event: {event['resource_type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n".encode()
+
+
 class QuickSearchViewSet(viewsets.SystemViewSet):
     default_permission_class = []
     serializer_class = QuickSearchSerializer
@@ -38,3 +50,29 @@ class QuickSearchViewSet(viewsets.SystemViewSet):
         keyword = params.pop("keyword")
         result = QSearchHandler(**params).search(keyword)
         return Response(result)
+
+    @common_swagger_auto_schema(
+        operation_summary=_("[quick_search] 流式快速查询"),
+        request_body=QuickSearchSerializer(),
+        tags=[SWAGGER_TAG],
+    )
+    @action(methods=["POST"], detail=False, serializer_class=QuickSearchSerializer)
+    def stream_search(self, request, *args, **kwargs):
+        """
+        按资源类型逐个返回查询结果，每完成一个类型输出一条消息：
+        {"resource_type": 资源类型, "status": SUCCEEDED/FAILED/TIMEOUT, "data": [...]}
+        默认为 NDJSON 格式，请求头 Accept 为 text/event-stream 时使用 SSE 格式
+        """
+        params = self.params_validate(self.get_serializer_class())
+        keyword = params.pop("keyword")
+        events = QSearchHandler(**params).iter_search(keyword)
+
+        if "text/event-stream" in request.META.get("HTTP_ACCEPT", ""):
+            content, content_type = (format_sse(event) for event in events), "text/event-stream"
+        else:
+            content, content_type = (format_ndjson(event) for event in events), "application/x-ndjson"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Cache-Control"] = "no-cache"
+        # 关闭网关的响应缓冲，保证每个类型的结果实时送达
+        response["X-Accel-Buffering"] = "no"
+        return response
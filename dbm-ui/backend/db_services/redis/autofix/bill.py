@@ -117,6 +117,7 @@ def create_ticket(cluster: RedisAutofixCore, cluster_ids: list, redis_proxies: l
         builder = BuilderFactory.create_builder(ticket)
         builder.patch_ticket_detail()
         builder.init_ticket_flows()
+        builder.init_ticket_relations()
         TicketFlowManager(ticket=ticket).run_next_flow()
     except Exception as e:
         cluster.deal_status = AutofixStatus.AF_FAIL.value
@@ -44,6 +44,10 @@ class FlowTaskSerializer(serializers.ModelSerializer):
         return calculate_cost_time(obj.updated_at, obj.created_at)
 
 
+class FlowTaskRetrieveSerializer(serializers.Serializer):
+    since = serializers.IntegerField(help_text=_("上次获取到的版本号，传入时只返回此后状态变化的节点"), required=False)
+
+
 class NodeSerializer(serializers.Serializer):
     node_id = serializers.CharField(help_text=_("节点ID"))
 
@@ -12,18 +12,21 @@ import logging
 
 from django.http import HttpResponse
 from django.utils.translation import ugettext as _
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from backend import env
 from backend.bk_web import viewsets
 from backend.bk_web.swagger import common_swagger_auto_schema
+from backend.core.status_stream.handlers import StatusStreamHandler
 from backend.db_services.dbbase.constants import IpSource
 from backend.db_services.taskflow.handlers import TaskFlowHandler
 from backend.db_services.taskflow.serializers import (
     BatchRetryNodesSerializer,
     CallbackNodeSerializer,
     DownloadExcelSerializer,
+    FlowTaskRetrieveSerializer,
     FlowTaskSerializer,
     NodeSerializer,
     VersionSerializer,
@@ -32,6 +35,7 @@ from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowTree
 from backend.flow.plugins.components.collections.common.base_service import BaseService
+from backend.flow.utils.pipeline_state_log import pipeline_state_log
 from backend.iam_app.dataclass.actions import ActionEnum
 from backend.iam_app.dataclass.resources import ResourceEnum
 from backend.iam_app.handlers.drf_perm.base import DBManagePermission
@@ -61,6 +65,10 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
     default_permission_class = [TaskFlowPermission([ActionEnum.FLOW_DETAIL], ResourceEnum.TASKFLOW)]
 
     def get_queryset(self):
+        if self.action == self.retrieve.__name__:
+            # 流程树由 BambooEngine 单独获取，详情不需要加载
+            return super().get_queryset().defer("tree")
+
         if self.action != self.list.__name__:
             return super().get_queryset()
 
@@ -92,11 +100,39 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
 
     @common_swagger_auto_schema(
         operation_summary=_("任务详情"),
+        operation_description=_(
+            "返回流程树，响应头 ETag 为当前版本号，携带 If-None-Match 且未变化时返回 304；"
+            "携带 since 时额外返回 incremental 和 version，incremental 为 true 时只返回此后状态变化的节点(nodes)，"
+            "无法增量计算时 incremental 为 false 并返回完整的流程树"
+        ),
+        query_serializer=FlowTaskRetrieveSerializer(),
         tags=[SWAGGER_TAG],
     )
     def retrieve(self, requests, *args, **kwargs):
         root_id = kwargs["root_id"]
-        tree_states = BambooEngine(root_id=root_id).get_pipeline_tree_states()
+        since = self.params_validate(FlowTaskRetrieveSerializer).get("since")
+
+        # 先获取版本号再计算状态，计算期间发生的变化会在下次刷新时返回
+        engine = BambooEngine(root_id=root_id)
+        version, changed_nodes = pipeline_state_log.get_version(root_id), None
+        if since is not None:
+            version, changed_nodes = pipeline_state_log.get_changes(root_id, since)
+
+        etag = f'"{version}"' if version else None
+        if etag and requests.META.get("HTTP_IF_NONE_MATCH") == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        # 不携带 since 时保持原有的响应结构，版本号通过 ETag 返回
+        if since is None:
+            tree_states = engine.get_pipeline_tree_states()
+        elif changed_nodes is not None:
+            tree_states = {
+                "incremental": True,
+                "nodes": engine.get_pipeline_node_states(changed_nodes),
+                "version": version,
+            }
+        else:
+            tree_states = {"incremental": False, **engine.get_pipeline_tree_states(), "version": version}
 
         flow_info = super().retrieve(requests, *args, **kwargs)
         try:
@@ -117,7 +153,18 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
             # 如果没找到flow或者相关bk_host_id参数，则忽略
             logger.info("can not find related host, root_id: {} Exception: {} ".format(root_id, e))
 
-        return Response({"flow_info": flow_info.data, **tree_states})
+        headers = {"ETag": etag} if etag else None
+        return Response({"flow_info": flow_info.data, **tree_states}, headers=headers)
+
+    @common_swagger_auto_schema(
+        operation_summary=_("获取任务状态推送的订阅凭证"),
+        operation_description=_("使用返回的 url 建立 SSE 连接，接收流程及节点的状态变化，收到变化后可携带 since 增量刷新流程树"),
+        tags=[SWAGGER_TAG],
+    )
+    @action(methods=["GET"], detail=True)
+    def status_stream_token(self, requests, *args, **kwargs):
+        channels = [StatusStreamHandler.flow_channel(kwargs["root_id"])]
+        return Response(StatusStreamHandler.create_token(requests.user.username, channels))
 
     @common_swagger_auto_schema(
         operation_summary=_("撤销流程"),
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.db_meta.utils import refresh_cluster_access_ports
+
+
+class Command(BaseCommand):
+    help = "backfill or verify the denormalized cluster access_port against instance meta."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bk_biz_id", type=int, default=None, help="only handle clusters of this business")
+        parser.add_argument("--cluster_types", nargs="*", default=None, help="only handle clusters of these types")
+        parser.add_argument("--batch_size", type=int, default=500, help="clusters computed per batch")
+        parser.add_argument("--verify", action="store_true", help="only report differences, do not write")
+
+    def handle(self, *args, **options):
+        diffs = refresh_cluster_access_ports(
+            bk_biz_id=options["bk_biz_id"],
+            cluster_types=options["cluster_types"],
+            batch_size=options["batch_size"],
+            verify=options["verify"],
+        )
+        for diff in diffs:
+            self.stdout.write(
+                f"cluster[{diff['cluster_id']}] {diff['immute_domain']}: "
+                f"stored access_port {diff['stored']}, computed {diff['computed']}"
+            )
+        action = "found" if options["verify"] else "fixed"
+        self.stdout.write(f"refresh cluster access ports finished, {action} {len(diffs)} differences")
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.db_meta.utils import refresh_cluster_status_flags
+
+
+class Command(BaseCommand):
+    help = "recompute cluster status flags from instance status, repair drift of denormalized status_flag_value."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bk_biz_id", type=int, default=None, help="only refresh clusters of this business")
+        parser.add_argument("--cluster_types", nargs="*", default=None, help="only refresh clusters of these types")
+        parser.add_argument("--batch_size", type=int, default=500, help="clusters recomputed per batch")
+
+    def handle(self, *args, **options):
+        changed_count = refresh_cluster_status_flags(
+            bk_biz_id=options["bk_biz_id"], cluster_types=options["cluster_types"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(f"refresh cluster status flags finished, changed count: {changed_count}")
@@ -45,6 +45,8 @@ CMDB_NEED_MONITOR_STATUS = get_type_env(key="CMDB_NEED_MONITOR_STATUS", _type=st
 
 # 蓝鲸全业务业务ID
 JOB_BLUEKING_BIZ_ID = get_type_env(key="JOB_BLUEKING_BIZ_ID", _type=int, default=9991001)
+# 是否由集中轮询器查询 job 任务状态，关闭后各个节点自行轮询
+JOB_STATUS_POLLER_ENABLED = get_type_env(key="JOB_STATUS_POLLER_ENABLED", _type=bool, default=True)
 
 # DBM 系统在 CMDB 中的业务ID
 DBA_APP_BK_BIZ_ID = get_type_env(key="DBA_APP_BK_BIZ_ID", _type=int)
@@ -174,3 +176,34 @@ MYSQL_CHATID = get_type_env(key="MYSQL_CHATID", _type=str, default="")
 # django DebugToolbar是否开启。开启后会对接口进行SQL分析和统计，将大幅度降低接口效率
 # 需要开启DEBUG_TOOL_BAR和DEBUG模式，DebugToolbar才会生效
 DEBUG_TOOL_BAR = get_type_env(key="DEBUG_TOOL_BAR", _type=bool, default=False)
+
+# DataAPI 连接池配置：每个 base 地址缓存的 host 连接池数量，单 host 最大长连接数，连接池满时是否阻塞等待及等待超时时间
+DATAAPI_POOL_CONNECTIONS = get_type_env(key="DATAAPI_POOL_CONNECTIONS", _type=int, default=10)
+DATAAPI_POOL_MAXSIZE = get_type_env(key="DATAAPI_POOL_MAXSIZE", _type=int, default=50)
+DATAAPI_POOL_BLOCK = get_type_env(key="DATAAPI_POOL_BLOCK", _type=bool, default=False)
+DATAAPI_POOL_TIMEOUT = get_type_env(key="DATAAPI_POOL_TIMEOUT", _type=int, default=10)
+# DataAPI 进程内 LRU 响应缓存的最大条目数
+DATAAPI_LOCAL_CACHE_MAXSIZE = get_type_env(key="DATAAPI_LOCAL_CACHE_MAXSIZE", _type=int, default=1000)
+
+# 是否开启接口资源消耗统计(SQL/DataAPI 次数和耗时、缓存命中率)
+REQUEST_STATS_ENABLED = get_type_env(key="REQUEST_STATS_ENABLED", _type=bool, default=True)
+
+# 状态推送的消息分发方式：redis(跨进程，通过 redis pub/sub 分发) / local(仅进程内分发，适用于单进程部署和测试)
+STATUS_STREAM_BROKER = get_type_env(key="STATUS_STREAM_BROKER", _type=str, default="redis")
+
+# 是否开启 CMDB 主机拓扑的本地镜像，开启后 ipchooser 优先从镜像中查询主机和拓扑关系
+CC_MIRROR_ENABLED = get_type_env(key="CC_MIRROR_ENABLED", _type=bool, default=True)
+# CMDB resource_watch 游标失效(事件已过期/事件链节点不存在)的错误码，只有这些错误会重置游标，其他错误退避后重试
+CC_WATCH_CURSOR_EXPIRED_CODES = get_type_env(
+    key="CC_WATCH_CURSOR_EXPIRED_CODES", _type=list, default=["1103007", "1103008"]
+)
+
+# 主机 Agent 状态的缓存时间(s)，为 0 时不缓存
+AGENT_STATUS_CACHE_TIME = get_type_env(key="AGENT_STATUS_CACHE_TIME", _type=int, default=30)
+# 是否开启热点业务 Agent 状态的后台刷新，刷新依赖 CMDB 本地镜像中的业务主机
+AGENT_STATUS_REFRESH_ENABLED = get_type_env(key="AGENT_STATUS_REFRESH_ENABLED", _type=bool, default=False)
+
+# 用户权限策略的缓存时间(s)，为 0 时不缓存。授权创建者权限时会主动失效，其他途径的授权在缓存过期后生效
+IAM_POLICY_CACHE_TIME = get_type_env(key="IAM_POLICY_CACHE_TIME", _type=int, default=60)
+# 非查看类动作(执行/管理/删除等)的策略缓存时间(s)，缩短权限回收后的生效延迟，为 0 时不缓存
+IAM_POLICY_SENSITIVE_CACHE_TIME = get_type_env(key="IAM_POLICY_SENSITIVE_CACHE_TIME", _type=int, default=10)
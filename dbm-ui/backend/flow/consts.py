@@ -139,6 +139,8 @@ FAILED_FORCIBLY_TERMINATED = 12
 
 SUCCESS_LIST = [SUCCESS, IGNORE_ERROR, SKIPPED, MANUAL_TERMINAL, SUCCESS_FORCIBLY_TERMINATED]
 FAILED_LIST = [FAILED, ABNORMAL_STATE, FAILED_FORCIBLY_TERMINATED]
+# JOB批量查询日志接口单次最多查询的IP数
+JOB_BATCH_LOG_IP_LIMIT = 500
 DBA_SYSTEM_USER = "mysql"
 DBA_ROOT_USER = "root"
 
@@ -8,7 +8,6 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
 from collections import defaultdict
 from typing import Any, Dict, List, Optional, Union
@@ -48,8 +47,7 @@ class BambooEngine:
         if not start:
             return None
         pipeline = builder.build_tree(start_elem=start, id=self.root_id, data=pipeline_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = self.hide_sensitive_data(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         tree = FlowTree.objects.create(
@@ -143,15 +141,14 @@ class BambooEngine:
                 elif StateType.SUSPENDED in child_status:
                     status_tree["state"] = StateType.SUSPENDED
 
-    def hide_sensitive_data(self, copy_data: Dict):
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
+    @classmethod
+    def hide_sensitive_data(cls, tree: Dict) -> Dict:
+        """隐藏pipeline中敏感数据：返回去掉所有层级 inputs 的新 dict，不修改也不深拷贝原 pipeline"""
+        return {
+            key: cls.hide_sensitive_data(value) if type(value) == dict else value
+            for key, value in tree.items()
+            if key != "inputs"
+        }
 
     def recursion_subprocess_status(
         self, activities: Dict, flow_node_maps: Dict, node_children_status: Dict[str, Dict[str, Union[str, List]]]
@@ -182,15 +179,20 @@ class BambooEngine:
                     status = states.REVOKED
                 activities[node_id]["status"] = status
 
+    @staticmethod
+    def format_flow_node_state(node: FlowNode) -> Dict[str, Any]:
+        return {
+            "status": StateType.EXPIRED if node.is_expired else node.status,
+            "created_at": int(datetime2timestamp(node.created_at)),
+            "started_at": int(datetime2timestamp(node.started_at)),
+            "updated_at": int(datetime2timestamp(node.updated_at)),
+            "hosts": node.hosts,
+        }
+
     def recursion_nodes_status(self, tree: Dict, flow_node_maps: Dict):
         for key, values in tree.items():
             if key in flow_node_maps:
-                node = flow_node_maps[key]
-                tree[key]["status"] = StateType.EXPIRED if node.is_expired else node.status
-                tree[key]["created_at"] = int(datetime2timestamp(node.created_at))
-                tree[key]["started_at"] = int(datetime2timestamp(node.started_at))
-                tree[key]["updated_at"] = int(datetime2timestamp(node.updated_at))
-                tree[key]["hosts"] = node.hosts
+                tree[key].update(self.format_flow_node_state(flow_node_maps[key]))
                 continue
 
             if isinstance(values, dict):
@@ -232,6 +234,62 @@ class BambooEngine:
         self.recursion_nodes_status(tree, flow_node_maps)
         return tree
 
+    def get_pipeline_node_states(self, node_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        获取指定节点的状态，用于流程树的增量刷新，计算规则与 get_pipeline_tree_states 一致
+        只查询变化的节点，不需要加载和遍历整棵流程树
+        @param node_ids: 需要获取状态的节点
+        """
+        node_states: Dict[str, Dict[str, Any]] = {}
+        for node in FlowNode.objects.filter(root_id=self.root_id, node_id__in=node_ids):
+            node_states[node.node_id] = self.format_flow_node_state(node)
+
+        # 其余的节点为子流程/网关/根节点，只有子流程需要计算状态
+        other_node_ids = [node_id for node_id in node_ids if node_id not in node_states and node_id != self.root_id]
+        if not other_node_ids:
+            return node_states
+
+        node_status, children_map = {}, defaultdict(list)
+        for state in BambooDjangoRuntime().get_state_by_root(self.root_id):
+            node_status[state.node_id] = state.name
+            children_map[state.parent_id].append(state.node_id)
+
+        # 有子节点的即为子流程，收集所有已执行的后代节点
+        subprocess_descendants = {}
+        for node_id in other_node_ids:
+            if not children_map.get(node_id):
+                continue
+            descendants, stack = [], list(children_map[node_id])
+            while stack:
+                child_id = stack.pop()
+                descendants.append(child_id)
+                stack.extend(children_map.get(child_id, []))
+            subprocess_descendants[node_id] = descendants
+
+        # 未执行的动作节点状态均为 CREATED，不影响子流程的状态
+        act_status = dict(
+            FlowNode.objects.filter(
+                root_id=self.root_id,
+                node_id__in={node_id for descendants in subprocess_descendants.values() for node_id in descendants},
+            ).values_list("node_id", "status")
+        )
+        for node_id, descendants in subprocess_descendants.items():
+            status = node_status[node_id]
+            children_status_list = [node_status[child_id] for child_id in children_map[node_id]]
+            if status == states.RUNNING and states.FAILED in children_status_list:
+                status = states.FAILED
+            elif status == states.RUNNING and states.REVOKED in children_status_list:
+                status = states.REVOKED
+
+            descendant_act_status = [act_status[child_id] for child_id in descendants if child_id in act_status]
+            if states.FAILED in descendant_act_status:
+                status = states.FAILED
+            elif states.REVOKED in descendant_act_status:
+                status = states.REVOKED
+            node_states[node_id] = {"status": status}
+
+        return node_states
+
     def get_pipeline_tree(self) -> Optional[Dict]:
         """获取流程树"""
         try:
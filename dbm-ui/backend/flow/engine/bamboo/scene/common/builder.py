@@ -8,9 +8,8 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from bamboo_engine import api, builder
 from bamboo_engine.builder import (
@@ -36,6 +35,8 @@ from backend.ticket.constants import TicketType
 
 logger = logging.getLogger("json")
 
+FLOW_NODE_BULK_BATCH_SIZE = 1000
+
 
 class Builder(object):
     """
@@ -76,6 +77,10 @@ class Builder(object):
         # 定义流程数据上下文参数trans_data
         self.rewritable_node_source_keys = []
 
+        # 流程构建过程中登记的待创建节点，子流程的节点在加入主流程时合并，主流程 run_pipeline 时一次性批量写入
+        # 构建失败时随 builder 一起丢弃，不会写入也不会残留
+        self.pending_flow_nodes: List[FlowNode] = []
+
         # 判断是否添加临时账号的流程逻辑
         if self.need_random_pass_cluster_ids:
             self.create_random_pass_act()
@@ -137,7 +142,7 @@ class Builder(object):
 
         self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-        FlowNode.objects.create(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id)
+        self.register_flow_node(act)
         if extend:
             self.pipe = self.pipe.extend(act)
         return act
@@ -150,7 +155,6 @@ class Builder(object):
         pg = ParallelGateway()
         cg = ConvergeGateway()
         acts = []
-        flow_node_list = []
 
         # 增加对传入的acts_list做合法判断
         if not isinstance(acts_list, list) or len(acts_list) == 0:
@@ -158,6 +162,7 @@ class Builder(object):
 
         for act_info in acts_list:
             if type(act_info) == SubProcess:
+                self.merge_flow_nodes(act_info)
                 acts.append(act_info)
                 continue
             act = ServiceActivity(name=act_info["act_name"], component_code=act_info["act_component_code"])
@@ -174,18 +179,36 @@ class Builder(object):
 
             self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-            flow_node_list.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
+            self.register_flow_node(act)
             acts.append(act)
 
-        FlowNode.objects.bulk_create(flow_node_list)
         self.pipe = self.pipe.extend(pg).connect(*acts).to(pg).converge(cg)
 
+    def register_flow_node(self, act: ServiceActivity):
+        """
+        登记活动节点，节点记录在 run_pipeline 时批量写入
+        @param act: 活动节点
+        """
+        self.pending_flow_nodes.append(FlowNode(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id))
+
+    def merge_flow_nodes(self, sub_flow: SubProcess):
+        """
+        合并子流程登记的节点
+        @param sub_flow: SubBuilder.build_sub_process 构建的子流程
+        """
+        self.pending_flow_nodes.extend(getattr(sub_flow, "pending_flow_nodes", []))
+
+    def flush_flow_nodes(self):
+        """批量写入当前流程(包括子流程)登记的节点，写入失败时同样清空"""
+        pending_nodes, self.pending_flow_nodes = self.pending_flow_nodes, []
+        FlowNode.objects.bulk_create(pending_nodes, batch_size=FLOW_NODE_BULK_BATCH_SIZE)
+
     def add_sub_pipeline(self, sub_flow):
         """
         add_sub_pipeline 方法： 为主流程加入子流程
         @param sub_flow: 子流程
         """
-
+        self.merge_flow_nodes(sub_flow)
         self.pipe = self.pipe.extend(sub_flow)
         # return self
 
@@ -198,6 +221,8 @@ class Builder(object):
         if not isinstance(sub_flow_list, list) or len(sub_flow_list) == 0:
             raise Exception(_("传入的sub_flow_list参数不合法，请检测"))
 
+        for sub_flow in sub_flow_list:
+            self.merge_flow_nodes(sub_flow)
         pg = ParallelGateway()
         cg = ConvergeGateway()
         self.pipe = self.pipe.extend(pg).connect(*sub_flow_list).to(pg).converge(cg)
@@ -219,8 +244,8 @@ class Builder(object):
         )
         self.pipe.extend(self.end_act)
         pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = self.hide_sensitive_data(pipeline)
+        self.flush_flow_nodes()
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         FlowTree.objects.create(
@@ -240,15 +265,16 @@ class Builder(object):
 
         return True
 
-    def hide_sensitive_data(self, copy_data: Optional[Dict]) -> Optional[Dict]:
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
+    @classmethod
+    def hide_sensitive_data(cls, tree: Optional[Dict]) -> Optional[Dict]:
+        """
+        隐藏pipeline中敏感数据：返回去掉所有层级 inputs 的新 dict，不修改也不深拷贝原 pipeline
+        """
+        return {
+            key: cls.hide_sensitive_data(value) if type(value) == dict else value
+            for key, value in tree.items()
+            if key != "inputs"
+        }
 
     @staticmethod
     def get_ip_list(ips: list) -> list:
@@ -274,7 +300,10 @@ class SubBuilder(Builder):
         # sub_data.inputs['${trans_data}'] = DataInput(type=Var.SPLICE, value='${trans_data}')
         sub_params = Params({"${trans_data}": Var(type=Var.SPLICE, value="${trans_data}")})
         self.pipe.extend(self.end_act)
-        return SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        sub_process = SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        # 子流程的节点随 SubProcess 传递，加入主流程时合并到主流程的 builder
+        sub_process.pending_flow_nodes = self.pending_flow_nodes
+        return sub_process
 
 
 class RewritableNode(RewritableNodeOutput):
@@ -8,15 +8,15 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import json
 import logging
-import re
 from abc import ABCMeta
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from bamboo_engine import states
+from django.conf import settings
 from django.utils import translation
 from django.utils.translation import ugettext as _
 from pipeline.core.flow.activity import Service, StaticIntervalGenerator
@@ -27,13 +27,37 @@ from backend.components.sops.client import BkSopsApi
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
 from backend.core.encrypt.handlers import AsymmetricHandler
 from backend.core.translation.constants import Language
-from backend.flow.consts import DEFAULT_FLOW_CACHE_EXPIRE_TIME, SUCCESS_LIST, WriteContextOpType
+from backend.flow.consts import (
+    DEFAULT_FLOW_CACHE_EXPIRE_TIME,
+    JOB_BATCH_LOG_IP_LIMIT,
+    SUCCESS_LIST,
+    WriteContextOpType,
+)
+from backend.flow.utils.job_status_poller import job_status_poller
 from backend.ticket.models import Flow
 from backend.utils.excel import ExcelHandler
 from backend.utils.redis import RedisConn
 
 logger = logging.getLogger("flow")
-cpl = re.compile("<ctx>(?P<context>.+?)</ctx>")  # 非贪婪模式，只匹配第一次出现的自定义tag
+CTX_BEGIN, CTX_END = "<ctx>", "</ctx>"
+
+
+def extract_log_context(log_content: str) -> Optional[str]:
+    """
+    提取日志中第一个同一行内的 <ctx>...</ctx> 自定义tag内容，与非贪婪正则 <ctx>(.+?)</ctx> 的结果一致
+    只按字符串查找扫描到第一个匹配的 tag 为止，避免对上百台机器的完整日志逐一做正则匹配
+    """
+    begin = log_content.find(CTX_BEGIN)
+    while begin != -1:
+        begin += len(CTX_BEGIN)
+        end = log_content.find(CTX_END, begin + 1)
+        if end == -1:
+            return None
+        line_end = log_content.find("\n", begin)
+        if line_end == -1 or line_end > end:
+            return log_content[begin:end]
+        begin = log_content.find(CTX_BEGIN, begin)
+    return None
 
 
 class ServiceLogMixin:
@@ -274,47 +298,120 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         }
         return JobApi.get_job_instance_ip_log({**payload, **ip_dict}, raw=True)
 
-    def __get_target_ip_context(
-        self,
-        job_instance_id: int,
-        step_instance_id: int,
-        ip_dict: dict,
-        data,
-        trans_data,
-        write_payload_var: str,
-        write_op: str,
-    ):
+    def execute(self, data, parent_data):
+        result = super().execute(data, parent_data)
+        # 自定义了 schedule 的节点保持原有的轮询逻辑
+        if result and env.JOB_STATUS_POLLER_ENABLED and type(self)._schedule is BkJobService._schedule:
+            self._register_status_poller(data)
+        return result
+
+    def _register_status_poller(self, data):
         """
-        对单个节点获取执行后log，并赋值给定义好流程上下文的trans_data
-        write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
+        将 job 任务注册到集中轮询器，节点转为回调模式，任务结束后由轮询器唤醒
         """
-        resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-        if not resp["result"]:
-            # 结果返回异常，则异常退出
-            return False
-        try:
-            # 以dict形式追加写入
-            result = json.loads(re.search(cpl, resp["data"]["log_content"]).group("context"))
-            if write_op == WriteContextOpType.APPEND.value:
-                context = copy.deepcopy(getattr(trans_data, write_payload_var))
-                ip = ip_dict["ip"]
-                if context:
-                    context[ip] = copy.deepcopy(result)
-                else:
-                    context = {ip: copy.deepcopy(result)}
+        ext_result = data.get_one_of_outputs("ext_result")
+        if not isinstance(ext_result, dict) or not ext_result.get("result"):
+            return
 
-                setattr(trans_data, write_payload_var, copy.deepcopy(context))
+        # 没有节点运行时信息(如组件单测)时无法回调唤醒，保持节点自行轮询
+        node_id, version = self.runtime_attrs.get("id"), self.runtime_attrs.get("version")
+        if not (node_id and version):
+            return
 
-            else:
-                # 默认覆盖写入
-                setattr(trans_data, write_payload_var, copy.deepcopy(result))
-            data.outputs["trans_data"] = trans_data
+        try:
+            job_status_poller.register(
+                job_instance_id=ext_result["data"]["job_instance_id"],
+                root_id=self.runtime_attrs.get("root_pipeline_id"),
+                node_id=node_id,
+                version=version,
+                service=self.__class__.__name__,
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            # 注册失败时节点继续自行轮询
+            self.log_warning(_("注册 job 状态轮询失败，节点自行轮询: {}").format(e))
+            return
 
-            return True
+        # 没有轮询间隔的节点为回调模式，唤醒多次失败或任务超过最长跟踪时间时由轮询器强制失败节点
+        self.interval = None
 
-        except Exception as e:
-            self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
-            return False
+    def __batch_log__(self, job_instance_id: int, step_instance_id: int, ip_dicts: List[Dict]) -> Dict[Tuple, str]:
+        """
+        批量获取多个 IP 的任务日志，返回 {(bk_cloud_id, ip): log_content}，获取失败的 IP 不在结果中
+        优先使用批量日志接口，接口异常或者结果缺失的 IP 再有限并发地逐个查询
+        """
+        payload = {
+            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": job_instance_id,
+            "step_instance_id": step_instance_id,
+        }
+
+        def _batch_get_log(ip_list: List[Dict]) -> List[Dict]:
+            try:
+                resp = JobApi.batch_get_job_instance_ip_log({**payload, "ip_list": ip_list}, raw=True)
+            except Exception as e:  # pylint: disable=broad-except
+                self.log_warning(_("批量获取任务日志失败: {}").format(e))
+                return []
+            if not resp["result"]:
+                return []
+            return (resp["data"] or {}).get("script_task_logs") or []
+
+        def _get_log(ip_dict: Dict) -> Optional[str]:
+            try:
+                resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
+            except Exception as e:  # pylint: disable=broad-except
+                self.log_warning(_("获取任务日志失败，ip:[{}]: {}").format(ip_dict["ip"], e))
+                return None
+            return resp["data"]["log_content"] if resp.get("result") else None
+
+        ip_list = [{"bk_cloud_id": int(ip_dict["bk_cloud_id"]), "ip": ip_dict["ip"]} for ip_dict in ip_dicts]
+        ip_chunks = [
+            ip_list[index : index + JOB_BATCH_LOG_IP_LIMIT] for index in range(0, len(ip_list), JOB_BATCH_LOG_IP_LIMIT)
+        ]
+
+        logs: Dict[Tuple, str] = {}
+        with ThreadPoolExecutor(max_workers=settings.CONCURRENT_NUMBER) as executor:
+            for task_logs in executor.map(_batch_get_log, ip_chunks):
+                for task_log in task_logs:
+                    logs[(int(task_log["bk_cloud_id"]), task_log["ip"])] = task_log.get("log_content") or ""
+
+            missing_ips = [ip_dict for ip_dict in ip_list if (ip_dict["bk_cloud_id"], ip_dict["ip"]) not in logs]
+            for ip_dict, log_content in zip(missing_ips, executor.map(_get_log, missing_ips)):
+                if log_content is not None:
+                    logs[(ip_dict["bk_cloud_id"], ip_dict["ip"])] = log_content
+
+        return logs
+
+    def __write_context(self, ip_dicts: List[Dict], logs: Dict[Tuple, str], trans_data, write_payload_var, write_op):
+        """
+        从各个 IP 的日志中提取上下文，一次性写入流程上下文 trans_data.{write_payload_var}
+        write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
+        返回提取失败的 IP 列表
+        """
+        results, failed_ips = [], []
+        for ip_dict in ip_dicts:
+            log_content = logs.get((int(ip_dict["bk_cloud_id"]), ip_dict["ip"]))
+            context = extract_log_context(log_content) if log_content is not None else None
+            if context is None:
+                failed_ips.append(ip_dict["ip"])
+                continue
+            try:
+                results.append((ip_dict["ip"], json.loads(context)))
+            except ValueError as e:
+                self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
+                failed_ips.append(ip_dict["ip"])
+
+        if not results:
+            return failed_ips
+
+        # 提取出的结果都是新反序列化的对象，不需要再拷贝
+        if write_op == WriteContextOpType.APPEND.value:
+            context = dict(getattr(trans_data, write_payload_var) or {})
+            context.update(results)
+        else:
+            # 覆盖写入，多个 IP 时以最后一个 IP 的结果为准
+            context = results[-1][1]
+        setattr(trans_data, write_payload_var, context)
+        return failed_ips
 
     def _schedule(self, data, parent_data, callback_data=None) -> bool:
         ext_result = data.get_one_of_outputs("ext_result")
@@ -341,7 +438,11 @@ class BkJobService(BaseService, metaclass=ABCMeta):
             return False
 
         job_instance_id = ext_result["data"]["job_instance_id"]
-        resp = self.__status__(job_instance_id)
+        # 由集中轮询器唤醒的节点，直接使用轮询器保存的任务状态
+        resp = None
+        if env.JOB_STATUS_POLLER_ENABLED:
+            resp = job_status_poller.get_result(job_instance_id)
+        resp = resp or self.__status__(job_instance_id)
 
         # 获取任务状态：
         # """
@@ -377,10 +478,11 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
             # 转载job脚本节点报错日志，兼容多IP执行场景的日志输出
             if ip_dicts:
+                logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
                 for ip_dict in ip_dicts:
-                    resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-                    if resp.get("result"):
-                        self.log_error(f"{ip_dict}:{resp['data']['log_content']}")
+                    log_content = logs.get((int(ip_dict["bk_cloud_id"]), ip_dict["ip"]))
+                    if log_content is not None:
+                        self.log_error(f"{ip_dict}:{log_content}")
 
             self.finish_schedule()
             return False
@@ -396,21 +498,19 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         # 追加写入是特殊行为，如果想IP日志结果都写入，可以选择追加写入，上下文变成list，每个元素是{"ip":"log"} WriteContextOpType.APPEND
         self.log_info(_("[{}]该节点需要获取执行后日志，赋值到流程上下文").format(node_name))
 
-        is_false = False
-        for ip_dict in ip_dicts:
-            if not self.__get_target_ip_context(
-                job_instance_id=job_instance_id,
-                step_instance_id=step_instance_id,
-                ip_dict=ip_dict,
-                data=data,
-                trans_data=trans_data,
-                write_payload_var=write_payload_var,
-                write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
-            ):
-                self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip_dict["ip"]))
-                is_false = True
-
-        if is_false:
+        logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
+        failed_ips = self.__write_context(
+            ip_dicts=ip_dicts,
+            logs=logs,
+            trans_data=trans_data,
+            write_payload_var=write_payload_var,
+            write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
+        )
+        data.outputs["trans_data"] = trans_data
+        for ip in failed_ips:
+            self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip))
+
+        if failed_ips:
             self.finish_schedule()
             return False
 
@@ -17,6 +17,7 @@ from pipeline.component_framework.component import Component
 
 from backend.components.dns.client import DnsApi
 from backend.db_meta.models import Cluster, Machine, ProxyInstance, StorageInstance
+from backend.db_services.quick_search.indexer import QuickSearchIndexer
 from backend.flow.plugins.components.collections.common.base_service import BaseService
 
 logger = logging.getLogger("flow")
@@ -45,6 +46,12 @@ class TransferClusterMetaToOtherBiz(BaseService):
             Machine.objects.filter(storageinstance__cluster__immute_domain__in=cluster_domain_list).update(
                 bk_biz_id=target_biz_id
             )
+
+        # 批量 update 不会触发 signal，需要主动更新全局搜索索引中的业务，索引失败不影响元数据转移
+        try:
+            QuickSearchIndexer.update_clusters(Cluster.objects.filter(immute_domain__in=cluster_domain_list))
+        except Exception as e:  # pylint: disable=broad-except
+            self.log_warning(f"update quick search index failed: {e}")
         self.log_info("transfer cluster meta to other biz success")
         return True
 
@@ -49,6 +49,7 @@ class RedisTicketService(BaseService):
         builder = BuilderFactory.create_builder(ticket)
         builder.patch_ticket_detail()
         builder.init_ticket_flows()
+        builder.init_ticket_relations()
         TicketFlowManager(ticket=ticket).run_next_flow()
 
         self.log_info("succ create ticket for cluster {} : {}".format(kwargs["immute_domain"], ticket))
@@ -13,10 +13,13 @@ import logging
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 
+from backend.core.status_stream.constants import StatusEventType
+from backend.core.status_stream.handlers import StatusStreamHandler
 from backend.db_dirty.handlers import DBDirtyMachineHandler
 from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
+from backend.flow.utils.pipeline_state_log import pipeline_state_log
 from backend.ticket.constants import FlowCallbackType, FlowMsgType, FlowType, TicketFlowStatus
 from backend.ticket.flow_manager.inner import InnerFlow
 from backend.ticket.flow_manager.manager import TicketFlowManager
@@ -26,6 +29,15 @@ from backend.ticket.tasks.ticket_tasks import send_msg_for_flow
 logger = logging.getLogger("flow")
 
 
+def record_state_change(root_id, node_ids):
+    """记录节点状态变化，用于流程树的增量刷新，记录失败不能影响流程的流转，返回新的版本号"""
+    try:
+        return pipeline_state_log.record(root_id, node_ids)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning(_("【状态信号捕获】记录节点状态变化失败 root_id={}, 错误信息{}").format(root_id, e))
+        return None
+
+
 def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *args, **kwargs):
     engine = BambooEngine(root_id=root_id)
     pipeline_states = engine.get_pipeline_states().data
@@ -39,6 +51,18 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
     FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(
         version_id=version, status=to_state, updated_at=now
     )
+    # 记录节点状态变化，用于流程树的增量刷新，并推送给订阅了该流程的客户端
+    changed_nodes = pipeline_state_log.get_changed_nodes(node_id, root_id, pipeline_states)
+    StatusStreamHandler.publish_on_commit(
+        channels=[StatusStreamHandler.flow_channel(root_id)],
+        event_type=StatusEventType.FLOW_NODE,
+        root_id=root_id,
+        node_id=node_id,
+        status=to_state,
+        changed_nodes=changed_nodes,
+        version=record_state_change(root_id, changed_nodes),
+    )
+
     try:
         tree = FlowTree.objects.get(root_id=root_id)
     except FlowTree.DoesNotExist:
@@ -68,6 +92,17 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
             # 更新flow tree和inner flow的状态
             tree.updated_at, tree.status = now, target_tree_status
             tree.save()
+            # 流程状态也随增量刷新返回，更新后需要再次递增版本号；没有关联单据的流程只推送到流程频道
+            channels = [StatusStreamHandler.flow_channel(root_id)]
+            if tree.uid:
+                channels.append(StatusStreamHandler.ticket_channel(tree.uid))
+            StatusStreamHandler.publish_on_commit(
+                channels=channels,
+                event_type=StatusEventType.FLOW_TREE,
+                root_id=root_id,
+                status=target_tree_status,
+                version=record_state_change(root_id, [root_id]),
+            )
             DBDirtyMachineHandler.handle_dirty_machine(tree.uid, root_id, origin_tree_status, target_tree_status)
             callback_ticket(tree.uid, root_id)
         except Exception as e:  # pylint: disable=broad-except
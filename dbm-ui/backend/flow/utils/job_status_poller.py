@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from bamboo_engine import api, states
+from pipeline.eri.runtime import BambooDjangoRuntime
+from prometheus_client import Counter, Histogram
+
+from backend import env
+from backend.components import JobApi
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+JOB_POLLER_QUERIES = Counter("dbm_job_poller_queries_total", "Job 状态集中轮询的查询次数", ["result"])
+JOB_POLLER_WAKEUPS = Counter("dbm_job_poller_wakeups_total", "Job 任务结束后回调唤醒节点的次数", ["result"])
+JOB_POLLER_TICK_SECONDS = Histogram("dbm_job_poller_tick_seconds", "单轮 Job 状态批量查询的耗时")
+JOB_POLLER_JOB_SECONDS = Histogram(
+    "dbm_job_poller_job_seconds", "Job 任务从注册到结束的耗时", buckets=(5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+# 轮询间隔的上下限(s)
+JOB_POLL_MIN_INTERVAL = 5
+JOB_POLL_MAX_INTERVAL = 60
+# 轮询间隔为已运行时间的比例
+JOB_POLL_BACKOFF_RATIO = 0.2
+# 预计耗时按节点类型的历史耗时做指数平滑，该值为最新一次耗时的权重
+JOB_DURATION_EWMA_ALPHA = 0.3
+# 唤醒节点失败的重试间隔(s)和次数，节点可能还未进入等待回调的状态
+JOB_WAKEUP_RETRY_INTERVAL = 3
+JOB_WAKEUP_MAX_RETRIES = 20
+# 任务的最长跟踪时间(s)，超出后不再轮询
+JOB_POLL_MAX_AGE = 7 * 24 * 60 * 60
+# 任务状态结果的保留时间(s)
+JOB_RESULT_EXPIRE = 24 * 60 * 60
+# 单轮最多处理的任务数和查询并发数
+JOB_POLL_BATCH_SIZE = 500
+JOB_POLL_CONCURRENCY = 10
+# 单次轮询任务的最长处理时间(s)，到期任务较多时分多轮处理
+JOB_POLL_MAX_RUN_SECONDS = 30
+
+
+def wake_up_node(node_id: str, version: str, data: Dict) -> bool:
+    """通过 bamboo 回调接口唤醒等待中的节点"""
+    result = api.callback(runtime=BambooDjangoRuntime(), node_id=node_id, version=version, data=data)
+    if not result.result:
+        logger.warning("[JobStatusPoller] callback node %s(%s) failed: %s", node_id, version, result.message)
+    return result.result
+
+
+def fail_node(node_id: str, version: str, ex_data: str) -> bool:
+    """强制失败等待回调的节点，节点已重新执行(版本变化)或不在运行中时不处理"""
+    runtime = BambooDjangoRuntime()
+    state = runtime.get_state(node_id)
+    if state.version != version or state.name != states.RUNNING:
+        logger.info("[JobStatusPoller] node %s(%s) is not waiting, skip fail, state: %s", node_id, version, state.name)
+        return False
+
+    result = api.forced_fail_activity(runtime=runtime, node_id=node_id, ex_data=ex_data)
+    if not result.result:
+        logger.warning("[JobStatusPoller] fail node %s(%s) failed: %s", node_id, version, result.message)
+    return result.result
+
+
+class JobStatusPoller:
+    """
+    Job 任务状态集中轮询器
+    - BkJobService 节点执行后注册 job_instance_id，节点转为回调模式，不再各自定时查询 Job
+    - 由单个 worker 批量查询到期任务的状态，轮询间隔随已运行时间退避，并参考该类节点的历史耗时在预计完成时查询
+    - 任务结束后保存状态结果，并通过 bamboo 回调唤醒节点，节点在 schedule 中直接读取结果
+    - 多次唤醒失败或超过最长跟踪时间的任务，强制失败对应节点，避免节点一直等待回调
+    队列为 redis 有序集合，score 为下一次查询的时间戳；任务信息保存在 hash 中
+    """
+
+    def __init__(
+        self,
+        redis=RedisConn,
+        job_api=JobApi,
+        waker: Callable[[str, str, Dict], bool] = wake_up_node,
+        failer: Callable[[str, str, str], bool] = fail_node,
+        key_prefix: str = "dbm:job_status_poller",
+    ):
+        self.redis = redis
+        self.job_api = job_api
+        self.waker = waker
+        self.failer = failer
+        self.queue_key = f"{key_prefix}:queue"
+        self.meta_key = f"{key_prefix}:meta"
+        self.duration_key = f"{key_prefix}:duration"
+        self.result_key = f"{key_prefix}:result"
+        self.lock_key = f"{key_prefix}:lock"
+
+    def register(self, job_instance_id: Union[int, str], root_id: str, node_id: str, version: str, service: str):
+        """
+        注册需要轮询的 job 任务
+        @param job_instance_id: job 任务ID
+        @param root_id: 流程ID
+        @param node_id: 节点ID
+        @param version: 节点执行版本，回调时需要
+        @param service: 节点类型，用于统计预计耗时
+        """
+        now = time.time()
+        meta = {"root_id": root_id, "node_id": node_id, "version": version, "service": service, "register_at": now}
+        pipe = self.redis.pipeline()
+        pipe.hset(self.meta_key, str(job_instance_id), json.dumps(meta))
+        pipe.zadd(self.queue_key, {str(job_instance_id): now + JOB_POLL_MIN_INTERVAL})
+        pipe.execute()
+
+    def get_result(self, job_instance_id: Union[int, str]) -> Optional[Dict]:
+        """获取轮询器保存的任务状态，任务未结束时返回 None"""
+        result = self.redis.get(f"{self.result_key}:{job_instance_id}")
+        return json.loads(result) if result else None
+
+    def get_expected_durations(self) -> Dict[str, float]:
+        """获取各类节点的预计耗时"""
+        return {service: float(duration) for service, duration in self.redis.hgetall(self.duration_key).items()}
+
+    def update_expected_duration(self, expected_durations: Dict[str, float], service: str, duration: float):
+        expected = expected_durations.get(service)
+        if expected is not None:
+            duration = expected * (1 - JOB_DURATION_EWMA_ALPHA) + duration * JOB_DURATION_EWMA_ALPHA
+        expected_durations[service] = round(duration, 2)
+        self.redis.hset(self.duration_key, service, expected_durations[service])
+
+    @staticmethod
+    def get_poll_interval(elapsed: float, expected: Optional[float] = None) -> float:
+        """
+        计算下一次查询的间隔
+        @param elapsed: 任务已运行时间
+        @param expected: 该类节点的预计耗时
+        """
+        # 间隔随已运行时间增长，等待的额外时延不超过已运行时间的 JOB_POLL_BACKOFF_RATIO
+        interval = elapsed * JOB_POLL_BACKOFF_RATIO
+        if expected and elapsed < expected:
+            # 不越过预计完成时间，在任务最可能结束的时刻附近查询
+            interval = min(interval, expected - elapsed)
+        return min(max(interval, JOB_POLL_MIN_INTERVAL), JOB_POLL_MAX_INTERVAL)
+
+    def query_status(self, job_instance_id: str) -> Optional[Dict]:
+        payload = {
+            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+            "job_instance_id": int(job_instance_id),
+            "return_ip_result": True,
+        }
+        try:
+            resp = self.job_api.get_job_instance_status(payload, raw=True)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning("[JobStatusPoller] query job %s status failed: %s", job_instance_id, err)
+            resp = None
+        JOB_POLLER_QUERIES.labels(result=bool(resp and resp["result"])).inc()
+        return resp
+
+    def _forget(self, pipe, job_instance_id: str):
+        pipe.zrem(self.queue_key, job_instance_id)
+        pipe.hdel(self.meta_key, job_instance_id)
+
+    def _fail(self, pipe, job_instance_id: str, meta: Dict, reason: str):
+        """停止跟踪任务并强制失败节点，节点失败后可由用户重试"""
+        logger.error("[JobStatusPoller] job %s %s, fail node, meta: %s", job_instance_id, reason, meta)
+        try:
+            self.failer(meta["node_id"], meta["version"], f"job {job_instance_id} {reason}")
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning("[JobStatusPoller] fail node %s failed: %s", meta["node_id"], err)
+        self._forget(pipe, job_instance_id)
+
+    def _wake(self, pipe, job_instance_id: str, meta: Dict, now: float) -> bool:
+        try:
+            woken = self.waker(meta["node_id"], meta["version"], {"job_instance_id": int(job_instance_id)})
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning("[JobStatusPoller] wake up node %s failed: %s", meta["node_id"], err)
+            woken = False
+        JOB_POLLER_WAKEUPS.labels(result=woken).inc()
+
+        retries = meta.get("wakeup_retries", 0)
+        if woken:
+            self._forget(pipe, job_instance_id)
+            return True
+        if retries >= JOB_WAKEUP_MAX_RETRIES:
+            self._fail(pipe, job_instance_id, meta, "finished but wake up node failed")
+            return False
+
+        # 节点可能还未进入等待回调的状态，稍后重试
+        meta.update(finished=True, wakeup_retries=retries + 1)
+        pipe.hset(self.meta_key, job_instance_id, json.dumps(meta))
+        pipe.zadd(self.queue_key, {job_instance_id: now + JOB_WAKEUP_RETRY_INTERVAL})
+        return False
+
+    def poll_once(self, now: float = None, batch_size: int = JOB_POLL_BATCH_SIZE) -> Dict[str, int]:
+        """
+        处理一轮到期的任务：批量查询状态，结束的任务唤醒节点，未结束的任务重新计算下一次查询时间
+        返回本轮的统计：polled 到期任务数，queried 查询数，finished 结束数，woken 唤醒数
+        """
+        now = now or time.time()
+        stats = {"polled": 0, "queried": 0, "finished": 0, "woken": 0}
+        job_ids: List[str] = self.redis.zrangebyscore(self.queue_key, "-inf", now, start=0, num=batch_size)
+        if not job_ids:
+            return stats
+
+        start_time = time.time()
+        stats["polled"] = len(job_ids)
+        metas = {
+            job_id: json.loads(meta) if meta else None
+            for job_id, meta in zip(job_ids, self.redis.hmget(self.meta_key, job_ids))
+        }
+        # 已结束但唤醒失败的任务不需要再查询
+        query_ids = [job_id for job_id, meta in metas.items() if meta and not meta.get("finished")]
+        with ThreadPoolExecutor(max_workers=JOB_POLL_CONCURRENCY) as executor:
+            resps = dict(zip(query_ids, executor.map(self.query_status, query_ids)))
+        stats["queried"] = len(query_ids)
+
+        expected_durations = self.get_expected_durations()
+        pipe = self.redis.pipeline()
+        for job_id, meta in metas.items():
+            if not meta:
+                self._forget(pipe, job_id)
+                continue
+
+            elapsed = now - meta["register_at"]
+            resp = resps.get(job_id)
+            if resp and resp["result"] and resp["data"]["finished"]:
+                stats["finished"] += 1
+                # 唤醒前需要先写入结果，节点被唤醒后会立即读取
+                self.redis.set(f"{self.result_key}:{job_id}", json.dumps(resp), ex=JOB_RESULT_EXPIRE)
+                self.update_expected_duration(expected_durations, meta["service"], elapsed)
+                JOB_POLLER_JOB_SECONDS.observe(elapsed)
+                meta["finished"] = True
+
+            if meta.get("finished"):
+                stats["woken"] += self._wake(pipe, job_id, meta, now)
+            elif elapsed > JOB_POLL_MAX_AGE:
+                self._fail(pipe, job_id, meta, "exceed max polling age")
+            else:
+                interval = self.get_poll_interval(elapsed, expected_durations.get(meta["service"]))
+                pipe.zadd(self.queue_key, {job_id: now + interval})
+        pipe.execute()
+
+        JOB_POLLER_TICK_SECONDS.observe(time.time() - start_time)
+        return stats
+
+    def run(self, max_duration: float = JOB_POLL_MAX_RUN_SECONDS):
+        """
+        处理当前到期的任务，处理完或超过 max_duration 后退出，由周期任务高频触发，不长时间占用 worker
+        同一时刻只有一个 worker 在轮询
+        @param max_duration: 最长处理时间
+        """
+        if not self.redis.set(self.lock_key, 1, nx=True, ex=int(max_duration) + JOB_POLL_MAX_INTERVAL):
+            logger.info("[JobStatusPoller] another worker is polling, skip")
+            return
+
+        try:
+            deadline = time.time() + max_duration
+            # 到期任务超过单轮上限时继续处理下一轮
+            while self.poll_once()["polled"] >= JOB_POLL_BATCH_SIZE and time.time() < deadline:
+                pass
+        finally:
+            self.redis.delete(self.lock_key)
+
+
+job_status_poller = JobStatusPoller()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+# 变更记录的保留时间(s)，每次写入时续期，过期后客户端需要重新拉取全量流程树
+PIPELINE_STATE_LOG_EXPIRE = 24 * 60 * 60
+
+# 原子地递增版本号并记录变更节点，保证读取到的版本号对应的变更都已经写入
+# KEYS[1]: 版本信息 hash, KEYS[2]: 变更节点有序集合
+# ARGV[1]: 初始版本号, ARGV[2]: 过期时间, ARGV[3...]: 变更节点
+RECORD_SCRIPT = """
+redis.call('HSETNX', KEYS[1], 'base', ARGV[1])
+redis.call('HSETNX', KEYS[1], 'version', ARGV[1])
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[2], version, ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return version
+"""
+
+
+class PipelineStateLog:
+    """
+    流程节点状态变更记录，用于流程树的增量刷新
+    - 每个流程维护一个单调递增的版本号，节点状态变化时版本号加一，并记录节点最后一次变化的版本号
+    - 客户端携带上次拿到的版本号，只需要获取此后发生变化的节点
+    - 版本号的初始值取当前毫秒时间戳，记录过期后重建的版本号一定大于旧的版本号，旧游标不会被误判为未变化
+    """
+
+    def __init__(self, redis=RedisConn, key_prefix: str = "dbm:pipeline_state_log"):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self._record_script = redis.register_script(RECORD_SCRIPT)
+
+    def _keys(self, root_id: str) -> Tuple[str, str]:
+        return f"{self.key_prefix}:{root_id}:version", f"{self.key_prefix}:{root_id}:changes"
+
+    def record(self, root_id: str, node_ids: List[str]) -> int:
+        """
+        记录节点状态变化，返回新的版本号
+        @param root_id: 流程ID
+        @param node_ids: 状态发生变化的节点
+        """
+        return self._record_script(
+            keys=self._keys(root_id), args=[int(time.time() * 1000), PIPELINE_STATE_LOG_EXPIRE, *node_ids]
+        )
+
+    def get_version(self, root_id: str) -> Optional[int]:
+        """获取流程当前的版本号，没有变更记录时返回 None"""
+        version = self.redis.hget(self._keys(root_id)[0], "version")
+        return int(version) if version else None
+
+    def get_changes(self, root_id: str, since: int) -> Tuple[Optional[int], Optional[List[str]]]:
+        """
+        获取版本号 since 之后发生变化的节点，返回 (当前版本号, 变化的节点)
+        变更记录已过期或者不完整，无法计算增量时，变化的节点返回 None
+        """
+        version_key, changes_key = self._keys(root_id)
+        # 在事务中读取，保证版本号和变更节点是一致的
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hmget(version_key, ["base", "version"])
+        pipe.zrangebyscore(changes_key, f"({since}", "+inf")
+        (base, version), node_ids = pipe.execute()
+        if not version:
+            return None, None
+
+        base, version = int(base), int(version)
+        # 游标早于记录的起始版本(记录曾经过期)，或者来自其他的记录，无法计算增量
+        if since < base or since > version:
+            return version, None
+        return version, node_ids
+
+    def clear(self, root_id: str):
+        self.redis.delete(*self._keys(root_id))
+
+    @staticmethod
+    def get_changed_nodes(node_id: str, root_id: str, pipeline_states: Dict) -> List[str]:
+        """
+        获取节点状态变化后需要刷新的节点：节点自身和所有的父流程节点
+        子流程的展示状态取决于子节点的状态，子节点变化时子流程也需要刷新
+        @param node_id: 状态发生变化的节点
+        @param root_id: 流程ID
+        @param pipeline_states: bamboo get_pipeline_states 的结果(children 展开)
+        """
+        children = pipeline_states.get(root_id, {}).get("children", {})
+        node_ids = [node_id]
+        parent_id = children.get(node_id, {}).get("parent_id")
+        while parent_id and parent_id != root_id and parent_id not in node_ids:
+            node_ids.append(parent_id)
+            parent_id = children.get(parent_id, {}).get("parent_id")
+        return node_ids
+
+
+pipeline_state_log = PipelineStateLog()
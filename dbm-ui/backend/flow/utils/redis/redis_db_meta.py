@@ -621,9 +621,9 @@ class RedisDBMeta(object):
         """"""
         with atomic():
             for slave_info in self.cluster["old_slaves"]:
-                StorageInstance.objects.filter(machine__ip=slave_info["ip"], port__in=slave_info["ports"]).update(
-                    status=InstanceStatus.UNAVAILABLE
-                )
+                storages = StorageInstance.objects.filter(machine__ip=slave_info["ip"], port__in=slave_info["ports"])
+                storages.update(status=InstanceStatus.UNAVAILABLE)
+                Cluster.refresh_status_flags(Cluster.objects.filter(storageinstance__in=storages).distinct())
                 logger.info(
                     "update old_slave {} ports: {} status to UNAVAILABLE".format(slave_info["ip"], slave_info["ports"])
                 )
@@ -687,13 +687,19 @@ class RedisDBMeta(object):
         with atomic():
             machine_obj = Machine.objects.get(ip=self.cluster["meta_update_ip"])
             if machine_obj.access_layer == AccessLayer.PROXY.value:
-                ProxyInstance.objects.filter(
+                proxies = ProxyInstance.objects.filter(
                     machine__ip=self.cluster["meta_update_ip"], port__in=self.cluster["meta_update_ports"]
-                ).update(status=self.cluster["meta_update_status"])
+                )
+                proxies.update(status=self.cluster["meta_update_status"])
+                clusters = Cluster.objects.filter(proxyinstance__in=proxies)
             else:
-                StorageInstance.objects.filter(
+                storages = StorageInstance.objects.filter(
                     machine__ip=self.cluster["meta_update_ip"], port__in=self.cluster["meta_update_ports"]
-                ).update(status=self.cluster["meta_update_status"])
+                )
+                storages.update(status=self.cluster["meta_update_status"])
+                clusters = Cluster.objects.filter(storageinstance__in=storages)
+            # queryset.update 不会触发信号，需要主动刷新集群状态
+            Cluster.refresh_status_flags(clusters.distinct())
         return True
 
     def instances_failover_4_scene(self) -> bool:
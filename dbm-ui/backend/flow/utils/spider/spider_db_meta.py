@@ -269,11 +269,14 @@ class SpiderDBMeta(object):
             TenDBClusterMigrateRemoteDb.add_storage_tuple(
                 cluster_id=self.cluster["cluster_id"], storage=new_slave_to_old_master
             )
-            StorageInstance.objects.filter(
+            storages = StorageInstance.objects.filter(
                 machine__ip=self.cluster["new_slave_ip"],
                 machine__bk_cloud_id=self.cluster["bk_cloud_id"],
                 port=self.cluster["new_slave_port"],
-            ).update(status=InstanceStatus.RUNNING.value)
+            )
+            storages.update(status=InstanceStatus.RUNNING.value)
+            # queryset.update 不会触发信号，需要主动刷新集群状态
+            Cluster.refresh_status_flags(Cluster.objects.filter(storageinstance__in=storages).distinct())
             # slave_storages = StorageInstance.objects.filter(machine__ip=self.cluster["new_slave_port"],
             # machine__bk_cloud_id=self.cluster["bk_cloud_id"])
             # for slave_storage in slave_storages:
@@ -284,9 +287,15 @@ class SpiderDBMeta(object):
         StorageInstance.objects.filter(id__in=self.cluster["storage_ids"]).update(
             status=self.cluster["storage_status"]
         )
+        Cluster.refresh_status_flags(
+            Cluster.objects.filter(storageinstance__id__in=self.cluster["storage_ids"]).distinct()
+        )
 
     def tendb_modify_proxy_status(self):
         ProxyInstance.objects.filter(id__in=self.cluster["proxy_ids"]).update(status=self.cluster["proxy_status"])
+        Cluster.refresh_status_flags(
+            Cluster.objects.filter(proxyinstance__id__in=self.cluster["proxy_ids"]).distinct()
+        )
 
     def tendb_slave_recover_switch(self):
         for node in self.cluster["my_shards"].values():
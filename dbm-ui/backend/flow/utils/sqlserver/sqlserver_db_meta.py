@@ -130,11 +130,13 @@ class SqlserverDBMeta(object):
         """
         原地重建后，实例状态保持running状态
         """
-        StorageInstance.objects.filter(
+        storages = StorageInstance.objects.filter(
             machine__ip=self.global_data["slave_host"]["ip"],
             machine__bk_cloud_id=self.global_data["slave_host"]["bk_cloud_id"],
             port=self.global_data["port"],
-        ).update(status=InstanceStatus.RUNNING)
+        )
+        storages.update(status=InstanceStatus.RUNNING)
+        Cluster.refresh_status_flags(Cluster.objects.filter(storageinstance__in=storages).distinct())
 
     def rebuild_in_new_slave(self):
         """
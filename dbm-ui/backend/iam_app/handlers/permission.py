@@ -17,7 +17,7 @@ from typing import Any, Callable, Dict, List, Tuple, Union
 from blueapps.account.models import User
 from django.conf import settings
 from django.utils.translation import ugettext as _
-from iam import IAM, DummyIAM, MultiActionRequest, ObjectSet, Request, Resource, Subject, make_expression
+from iam import IAM, DummyIAM, MultiActionRequest, Request, Resource, Subject
 from iam.apply.models import (
     ActionWithoutResources,
     ActionWithResources,
@@ -36,6 +36,7 @@ from backend.env import BK_IAM_SYSTEM_ID
 from backend.iam_app.dataclass.actions import ActionEnum, ActionMeta, _all_actions
 from backend.iam_app.dataclass.resources import ResourceEnum, ResourceMeta, _all_resources
 from backend.iam_app.exceptions import ActionNotExistError, GetSystemInfoError, PermissionDeniedError
+from backend.iam_app.handlers.policy import PolicyEvaluator, build_obj_set, policy_cache, query_action_policies
 from backend.utils.local import local
 
 logger = logging.getLogger("root")
@@ -238,6 +239,36 @@ class Permission(object):
 
         return permission_list
 
+    def get_policy_evaluators(self, actions: List[Union[ActionMeta, str]]) -> Dict[str, PolicyEvaluator]:
+        """
+        获取用户在各动作上的策略表达式，策略优先从缓存中获取
+        :param actions: 动作列表
+        """
+
+        def fetch(action_ids: List[str]) -> Dict[str, Dict]:
+            # 不向权限中心传资源，获取用户在动作上的全部策略，由本地计算资源的权限
+            return query_action_policies(self._iam, self.make_multi_request(action_ids))
+
+        action_ids = [ActionEnum.get_action_by_id(action).id for action in actions]
+        return policy_cache.get_evaluators(self.username, action_ids, fetch)
+
+    def batch_eval_policies(
+        self, actions: List[Union[ActionMeta, str]], resources_list: List[List[Resource]]
+    ) -> Dict[str, Dict[str, bool]]:
+        """
+        使用缓存的策略表达式在本地批量计算本系统资源的权限，结果格式与 SDK 的 batch_resource_multi_actions_allowed 一致
+        :param actions: 待鉴权的动作列表
+        :param resources_list: 待鉴权的资源列表, 格式为[[resource1], [resources2], ...]
+        """
+        evaluators = self.get_policy_evaluators(actions)
+        batch_permission = {}
+        for resources in resources_list:
+            obj_set = build_obj_set(resources)
+            batch_permission[resources[0].id] = {
+                action_id: evaluator(obj_set) for action_id, evaluator in evaluators.items()
+            }
+        return batch_permission
+
     def batch_is_allowed(
         self,
         actions: List[Union[ActionMeta, str]],
@@ -264,7 +295,10 @@ class Permission(object):
         try:
             # TODO: 暂时屏蔽跨资源类型鉴权，SDK问题待排查
             if len(resources_list[0]) == 1 and self.check_resource_is_local(resources_list[0]):
-                batch_permission = self._iam.batch_resource_multi_actions_allowed(multi_request, resources_list)
+                if isinstance(self._iam, DummyIAM):
+                    batch_permission = self._iam.batch_resource_multi_actions_allowed(multi_request, resources_list)
+                else:
+                    batch_permission = self.batch_eval_policies(actions, resources_list)
             # 如果资源不属于本系统，则只能单次调用allowed
             else:
                 batch_permission = {}
@@ -299,29 +333,16 @@ class Permission(object):
         if env.BK_IAM_SKIP or self.is_superuser:
             return obj_list
 
-        # 获得策略数据
+        # 获得策略表达式，并根据表达式判断业务权限，查询或编译策略失败时按无权限处理
+        action = ActionEnum.get_action_by_id(action)
         try:
-            request = self.make_request(action=action)
-            policies = self._iam._do_policy_query(request)
+            evaluator = self.get_policy_evaluators([action])[action.id]
+            return [obj for obj in obj_list if evaluator({ResourceEnum.BUSINESS.id: {"id": str(obj)}})]
         except AuthAPIError as e:
             logger.exception(f"IAM AuthAPIError: {e}")
-            return []
-
-        if not policies:
-            return []
-
-        # 将策略数据生成表达式，并根据表达式判断业务权限
-        expression = make_expression(policies)
-        allow_biz_list = []
-        for obj in obj_list:
-            iam_obj = ObjectSet()
-            iam_obj.add_object(ResourceEnum.BUSINESS.id, {"id": str(obj)})
-
-            is_allowed = self._iam._eval_expr(expression, iam_obj)
-            if is_allowed:
-                allow_biz_list.append(obj)
-
-        return allow_biz_list
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception(f"IAM policy query failed: {e}")
+        return []
 
     def make_application(
         self, action_ids: List[str], resources_list: List[List[Resource]] = None, system_id: str = env.BK_IAM_SYSTEM_ID
@@ -450,6 +471,9 @@ class Permission(object):
 
             if raise_exception:
                 raise e
+        finally:
+            # 授权后创建者的策略发生了变化，需要失效缓存
+            policy_cache.invalidate(application["creator"])
 
         return grant_result
 
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import operator
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List
+
+from django.core.cache import cache
+from iam import IAM, MultiActionRequest
+from iam.eval.constants import OP
+from iam.eval.expression import field_value_convert
+from prometheus_client import Counter
+
+from backend import env
+from backend.iam_app.dataclass.actions import _all_actions
+
+logger = logging.getLogger("root")
+
+IAM_POLICY_CACHE_REQUESTS = Counter("dbm_iam_policy_cache_requests_total", "权限策略缓存访问次数，result: hit/miss", ["result"])
+
+# 编译后的策略表达式在进程内缓存的最大条数，相同内容的策略只编译一次
+IAM_POLICY_COMPILE_CACHE_SIZE = 1024
+
+# 使用默认缓存时间的动作类型，其他类型的动作权限被回收后需要尽快生效，使用 IAM_POLICY_SENSITIVE_CACHE_TIME
+IAM_POLICY_INSENSITIVE_ACTION_TYPES = ["view"]
+
+# 策略表达式：输入 {资源类型: 资源属性}，返回是否有权限
+PolicyEvaluator = Callable[[Dict[str, Dict]], bool]
+
+# 各操作符的计算方式，与 SDK(iam.eval.operators) 中的 calculate 保持一致
+BINARY_CALCULATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    OP.EQ: operator.eq,
+    OP.NOT_EQ: operator.ne,
+    OP.IN: lambda left, right: left in right,
+    OP.NOT_IN: lambda left, right: left not in right,
+    OP.CONTAINS: lambda left, right: right in left,
+    OP.NOT_CONTAINS: lambda left, right: right not in left,
+    OP.STARTS_WITH: lambda left, right: left.startswith(right),
+    OP.NOT_STARTS_WITH: lambda left, right: not left.startswith(right),
+    OP.ENDS_WITH: lambda left, right: left.endswith(right),
+    OP.NOT_ENDS_WITH: lambda left, right: not left.endswith(right),
+    OP.STRING_CONTAINS: lambda left, right: right in left,
+    OP.LT: operator.lt,
+    OP.LTE: operator.le,
+    OP.GT: operator.gt,
+    OP.GTE: operator.ge,
+}
+
+
+def _allow(obj_set: Dict[str, Dict]) -> bool:
+    return True
+
+
+def _deny(obj_set: Dict[str, Dict]) -> bool:
+    return False
+
+
+def _freeze(values: List) -> Any:
+    """in/not_in 的策略值转为集合，加快资源较多时的判断，存在不可哈希的值时保持原样"""
+    try:
+        return frozenset(values)
+    except TypeError:
+        return values
+
+
+def _compile_binary(op: str, field: str, value: Any) -> PolicyEvaluator:
+    if op == OP.ANY:
+        return _allow
+    if op not in BINARY_CALCULATORS:
+        raise ValueError("operator %s not supported" % op)
+
+    field, value = field_value_convert(op, field, value)
+    is_value_array = isinstance(value, (list, tuple))
+    is_contains = op in (OP.CONTAINS, OP.NOT_CONTAINS)
+    # in/not_in 的策略值必须为数组，其他操作符的策略值必须为单值，否则策略不会命中
+    if op in (OP.IN, OP.NOT_IN):
+        if not is_value_array:
+            return _deny
+        value = _freeze(value)
+    elif is_value_array:
+        return _deny
+
+    calculate = BINARY_CALCULATORS[op]
+    is_negative = op.startswith("not_")
+    parts = field.split(".")
+    if len(parts) != 2:
+        return lambda obj_set: calculate(None, value)
+    resource_type, attr_name = parts
+
+    def evaluate(obj_set: Dict[str, Dict]) -> bool:
+        obj = obj_set.get(resource_type)
+        # 资源类型不存在时属性为 None；资源属性缺失时抛出 KeyError，由外层按无权限处理
+        attr = None if obj is None else obj[attr_name]
+        is_attr_array = isinstance(attr, (list, tuple))
+        # contains/not_contains 的资源属性必须为数组，直接与策略值计算
+        if is_contains:
+            return is_attr_array and calculate(attr, value)
+        if not is_attr_array:
+            return calculate(attr, value)
+        # 属性为数组时：肯定操作符命中一个即可，否定操作符需要全部满足
+        if is_negative:
+            return all(calculate(item, value) for item in attr)
+        return any(calculate(item, value) for item in attr)
+
+    return evaluate
+
+
+def _compile(policy: Dict) -> PolicyEvaluator:
+    op = policy["op"]
+    if op in (OP.AND, OP.OR):
+        children = [_compile(content) for content in policy["content"]]
+        if op == OP.AND:
+            return lambda obj_set: all(child(obj_set) for child in children)
+        return lambda obj_set: any(child(obj_set) for child in children)
+    return _compile_binary(op, policy["field"], policy["value"])
+
+
+@lru_cache(maxsize=IAM_POLICY_COMPILE_CACHE_SIZE)
+def _compile_policy_json(policy_json: str) -> PolicyEvaluator:
+    evaluate = _compile(json.loads(policy_json))
+
+    def safe_evaluate(obj_set: Dict[str, Dict]) -> bool:
+        try:
+            return bool(evaluate(obj_set))
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(
+                "[iam_policy] eval policy failed, policy: %s, obj_set: %s, error: %s", policy_json, obj_set, err
+            )
+            return False
+
+    return safe_evaluate
+
+
+def compile_policy(policy: Dict) -> PolicyEvaluator:
+    """
+    将权限中心返回的策略编译为表达式，语义与 SDK 的 make_expression + eval 一致
+    资源属性不满足操作符要求(如缺失属性、类型不匹配)时按无权限处理
+    @param policy: 策略数据，为空表示没有任何权限
+    """
+    if not policy:
+        return _deny
+    return _compile_policy_json(json.dumps(policy, sort_keys=True))
+
+
+def query_action_policies(iam: IAM, multi_request: MultiActionRequest) -> Dict[str, Dict]:
+    """
+    不向权限中心传资源，查询用户在各动作上的全部策略，返回 {动作ID: 策略}，没有策略的动作不返回
+    NOTE: bk-iam SDK(1.3.6) 没有提供该能力的公开接口，这里调用私有方法 IAM._do_policy_query_by_actions，
+    其返回格式为 [{"action": {"id": 动作ID}, "condition": 策略}]，升级 SDK 时需要确认方法签名和返回格式是否变化
+    @param iam: IAM 客户端
+    @param multi_request: 多动作的鉴权请求
+    """
+    action_policies = iam._do_policy_query_by_actions(multi_request, with_resources=False)
+    return {policy["action"]["id"]: policy["condition"] for policy in action_policies or []}
+
+
+def build_obj_set(resources: List) -> Dict[str, Dict]:
+    """将资源实例转为表达式的输入，与 SDK 的 _build_object_set 一致，资源ID作为 id 属性"""
+    return {resource.type: {**(resource.attribute or {}), "id": resource.id} for resource in resources}
+
+
+class PolicyCache:
+    """
+    用户权限策略缓存
+    - 按 用户+动作 缓存权限中心返回的策略，列表页的鉴权只需要读取缓存，在本地计算每个资源的权限
+    - 授权创建者权限后主动失效该用户的缓存，其他途径的授权和回收在缓存过期后生效
+    - 非查看类动作使用更短的缓存时间，避免权限被回收后仍能长时间操作
+    """
+
+    def __init__(
+        self,
+        cache_time: int = env.IAM_POLICY_CACHE_TIME,
+        sensitive_cache_time: int = env.IAM_POLICY_SENSITIVE_CACHE_TIME,
+        key_prefix: str = "iam_policy",
+    ):
+        self.cache_time = cache_time
+        self.sensitive_cache_time = min(sensitive_cache_time, cache_time)
+        self.key_prefix = key_prefix
+
+    def get_cache_time(self, action_id: str) -> int:
+        """动作的策略缓存时间，未注册的动作按非查看类动作处理"""
+        action = _all_actions.get(action_id)
+        if action and action.type in IAM_POLICY_INSENSITIVE_ACTION_TYPES:
+            return self.cache_time
+        return self.sensitive_cache_time
+
+    def _key(self, username: str, action_id: str) -> str:
+        return f"{self.key_prefix}:{env.BK_IAM_SYSTEM_ID}:{username}:{action_id}"
+
+    def get_policies(
+        self, username: str, action_ids: List[str], fetch: Callable[[List[str]], Dict[str, Dict]]
+    ) -> Dict[str, Dict]:
+        """
+        获取用户在各动作上的策略，未命中缓存的动作合并为一次查询
+        @param username: 用户名
+        @param action_ids: 动作ID列表
+        @param fetch: 查询策略的函数，输入动作ID列表，返回 {动作ID: 策略}，没有策略的动作可以不返回
+        """
+        if not self.cache_time:
+            policies = fetch(action_ids)
+            return {action_id: policies.get(action_id) for action_id in action_ids}
+
+        keys = {action_id: self._key(username, action_id) for action_id in action_ids}
+        cached = cache.get_many(list(keys.values()))
+        # 缓存值包装为 {"policy": 策略}，以区分没有权限和未命中缓存
+        policies = {
+            action_id: cached[key]["policy"] for action_id, key in keys.items() if isinstance(cached.get(key), dict)
+        }
+        missing_action_ids = [action_id for action_id in action_ids if action_id not in policies]
+        IAM_POLICY_CACHE_REQUESTS.labels(result="hit").inc(len(policies))
+        if not missing_action_ids:
+            return policies
+
+        IAM_POLICY_CACHE_REQUESTS.labels(result="miss").inc(len(missing_action_ids))
+        fetched = fetch(missing_action_ids)
+        # 按缓存时间分组写入缓存，缓存时间为 0 的动作不缓存
+        cache_groups: Dict[int, Dict[str, Dict]] = defaultdict(dict)
+        for action_id in missing_action_ids:
+            policies[action_id] = fetched.get(action_id)
+            cache_groups[self.get_cache_time(action_id)][keys[action_id]] = {"policy": policies[action_id]}
+        for cache_time, values in cache_groups.items():
+            if cache_time:
+                cache.set_many(values, cache_time)
+        return policies
+
+    def get_evaluators(
+        self, username: str, action_ids: List[str], fetch: Callable[[List[str]], Dict[str, Dict]]
+    ) -> Dict[str, PolicyEvaluator]:
+        """获取用户在各动作上编译后的策略表达式，参数同 get_policies"""
+        policies = self.get_policies(username, action_ids, fetch)
+        return {action_id: compile_policy(policy) for action_id, policy in policies.items()}
+
+    def invalidate(self, username: str, action_ids: List[str] = None):
+        """
+        失效用户的策略缓存
+        @param username: 用户名
+        @param action_ids: 需要失效的动作，默认为全部动作
+        """
+        action_ids = action_ids or list(_all_actions.keys())
+        cache.delete_many([self._key(username, action_id) for action_id in action_ids])
+
+
+policy_cache = PolicyCache()
@@ -15,12 +15,18 @@ from unittest.mock import patch
 import pytest
 from blueapps.account.models import User
 from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from backend import env
+from backend.bk_web.middleware import RequestStatsMiddleware
 from backend.bk_web.models import ExternalUserMapping
+from backend.components.cache import CacheResult, record_cache_result
 from backend.tests.mock_data.components.dnconsole import DBConsoleApiMock
+from backend.utils.local import local
 
 logger = logging.getLogger("test")
 pytestmark = pytest.mark.django_db
@@ -84,3 +90,50 @@ class TestMiddleware:
         response = client.get("/ping", data={})
         assert response.content.decode("utf-8") == "pong"
         client.logout()
+
+
+class TestRequestStatsMiddleware:
+    """接口资源消耗统计中间件的测试样例"""
+
+    @staticmethod
+    def get_response(request):
+        local.request = request
+        request.resolver_match = ResolverMatch(lambda: None, (), {}, url_name="fake-view")
+        # 3 次 SQL，2 次 DataAPI，缓存命中 1 次、未命中 1 次
+        for _ in range(3):
+            list(User.objects.all())
+        request.dbm_stats.record_dataapi("CMDB", 0.1)
+        request.dbm_stats.record_dataapi("JOB", 0.2)
+        record_cache_result("CMDB", CacheResult.LOCAL_HIT)
+        record_cache_result("CMDB", CacheResult.MISS)
+        return HttpResponse("ok")
+
+    def test_request_stats(self):
+        request = RequestFactory().get("/fake/")
+        with patch.object(settings, "REQUEST_STATS_BUDGETS", {"default": {"sql_count": 100}}):
+            RequestStatsMiddleware(self.get_response)(request)
+
+        summary = request.dbm_stats.summary()
+        assert summary["sql_count"] == 3
+        assert summary["dataapi_count"] == 2
+        assert summary["dataapi_modules"]["JOB"]["count"] == 1
+        assert summary["cache_hit_ratio"] == 0.5
+
+    @patch("backend.bk_web.middleware.logger")
+    def test_request_over_budget(self, mock_logger):
+        request = RequestFactory().get("/fake/")
+        budgets = {"default": {"sql_count": 100, "dataapi_count": 10}, "fake-view": {"sql_count": 2}}
+        with patch.object(settings, "REQUEST_STATS_BUDGETS", budgets):
+            RequestStatsMiddleware(self.get_response)(request)
+
+        mock_logger.warning.assert_called_once()
+        log_info = json.loads(mock_logger.warning.call_args[0][1])
+        assert log_info["endpoint"] == "fake-view"
+        assert log_info["exceeded"] == ["sql_count"]
+
+    def test_request_stats_disabled(self):
+        request = RequestFactory().get("/fake/")
+        with patch.object(settings, "REQUEST_STATS_ENABLED", False):
+            response = RequestStatsMiddleware(lambda req: HttpResponse("ok"))(request)
+        assert response.status_code == status.HTTP_200_OK
+        assert not hasattr(request, "dbm_stats")
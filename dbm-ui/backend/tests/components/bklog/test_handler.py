@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import datetime
+from unittest.mock import patch
+
+from backend.components.bklog.handler import BKLogHandler
+from backend.tests.mock_data.components.bklog import BKLogScrollApiMock
+
+LOG_COUNT = 25000
+CLUSTER_COUNT = 7
+
+
+class TestBKLogHandler:
+    def test_iter_logs(self):
+        bklog_api = BKLogScrollApiMock(
+            [{"ClusterId": index % CLUSTER_COUNT, "LogIndex": index} for index in range(LOG_COUNT)]
+        )
+        now = datetime.datetime.now()
+        with patch("backend.components.bklog.handler.BKLogApi", bklog_api):
+            logs = BKLogHandler.iter_logs("test_collector", now - datetime.timedelta(days=1), now, page_size=3000)
+            cluster_logs = BKLogHandler.group_logs(key=lambda log: log["cluster_id"], logs=logs)
+
+        # 超出单次查询上限的日志也能全部读取，并且保持原有的顺序
+        assert sum(len(logs) for logs in cluster_logs.values()) == LOG_COUNT
+        assert sorted(cluster_logs.keys()) == list(range(CLUSTER_COUNT))
+        assert [log["log_index"] for log in cluster_logs[1][:3]] == [1, 1 + CLUSTER_COUNT, 1 + 2 * CLUSTER_COUNT]
+        assert len(bklog_api.search_params) == 1 and len(bklog_api.scroll_params) == LOG_COUNT // 3000
+
+    def test_iter_logs_raw(self):
+        bklog_api = BKLogScrollApiMock([{"cluster_id": 1, "masterIp": "127.0.0.1"}])
+        now = datetime.datetime.now()
+        with patch("backend.components.bklog.handler.BKLogApi", bklog_api):
+            logs = list(BKLogHandler.iter_logs("test_collector", now, now, snake_case=False))
+
+        assert logs == [{"cluster_id": 1, "masterIp": "127.0.0.1"}]
+        assert not bklog_api.scroll_params
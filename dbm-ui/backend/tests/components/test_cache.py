@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from django.utils.crypto import get_random_string
+
+from backend.components.cache import DataAPICache, LocalLRUCache, SingleFlight
+
+CONCURRENCY = 8
+
+
+class BlockingFetch:
+    """上游请求的 fake：阻塞到 release 后返回调用次数，或者抛出 error"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(timeout=10)
+        if self.error:
+            raise self.error
+        return {"version": self.calls}
+
+
+def run_concurrently(func, fetch: BlockingFetch):
+    """首个调用阻塞在上游请求时，发起其余的并发调用，全部进入等待后再放行上游请求"""
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        leader = executor.submit(func)
+        fetch.started.wait(timeout=10)
+        arrived = threading.Semaphore(0)
+
+        def follow():
+            arrived.release()
+            return func()
+
+        followers = [executor.submit(follow) for _ in range(CONCURRENCY - 1)]
+        for _ in followers:
+            arrived.acquire(timeout=10)
+        # 等待跟随者进入合并等待，只是为了让测试更稳定，断言不依赖耗时
+        time.sleep(0.1)
+        fetch.release.set()
+        return [leader, *followers]
+
+
+@pytest.fixture
+def dataapi_cache():
+    return DataAPICache(local_maxsize=16)
+
+
+@pytest.fixture
+def cache_key(dataapi_cache):
+    key = get_random_string(16)
+    yield key
+    dataapi_cache.delete(key)
+
+
+class TestLocalLRUCache:
+    def test_evict_least_recently_used(self):
+        lru = LocalLRUCache(maxsize=2)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        assert lru.get("a") == 1
+        lru.set("c", 3, 60)
+        assert (lru.get("a"), lru.get("b"), lru.get("c")) == (1, None, 3)
+
+    def test_expire(self):
+        lru = LocalLRUCache(maxsize=2)
+        lru.set("a", {"data": [1]}, 60)
+        # 读取的是反序列化的新对象，修改返回值不会污染缓存
+        lru.get("a")["data"].append(2)
+        assert lru.get("a") == {"data": [1]}
+
+        now = time.time()
+        with patch("backend.components.cache.time.time", return_value=now + 61):
+            assert lru.get("a") is None
+        assert lru.get("a") is None
+
+
+class TestSingleFlight:
+    def test_merge_concurrent_calls(self):
+        single_flight, fetch = SingleFlight(), BlockingFetch()
+        futures = run_concurrently(lambda: single_flight.do("key", fetch), fetch)
+        results = [future.result() for future in futures]
+        assert fetch.calls == 1
+        assert results == [({"version": 1}, False)] + [({"version": 1}, True)] * (CONCURRENCY - 1)
+        assert not single_flight.in_flight("key")
+
+    def test_propagate_leader_error(self):
+        single_flight, fetch = SingleFlight(), BlockingFetch(error=ValueError("upstream error"))
+        futures = run_concurrently(lambda: single_flight.do("key", fetch), fetch)
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+        assert fetch.calls == 1
+        assert not single_flight.in_flight("key")
+
+
+class TestDataAPICache:
+    def test_coalesce_miss(self, dataapi_cache, cache_key):
+        key, fetch = cache_key, BlockingFetch()
+        futures = run_concurrently(lambda: dataapi_cache.get_or_fetch(key, fetch, "test", cache_time=60), fetch)
+        assert [future.result() for future in futures] == [{"version": 1}] * CONCURRENCY
+        assert fetch.calls == 1
+
+        # 命中缓存后不再请求上游
+        assert dataapi_cache.get_or_fetch(key, fetch, "test", cache_time=60) == {"version": 1}
+        assert fetch.calls == 1
+
+    def test_serve_stale_while_refresh(self, dataapi_cache, cache_key):
+        key, fetch = cache_key, BlockingFetch()
+        fetch.release.set()
+        executor = ThreadPoolExecutor(max_workers=1)
+        kwargs = {"module": "test", "cache_time": 60, "stale_time": 60, "executor": executor}
+        assert dataapi_cache.get_or_fetch(key, fetch, **kwargs) == {"version": 1}
+
+        # 缓存过期后，刷新期间直接返回旧数据，并且只提交一次后台刷新
+        fetch.started.clear()
+        fetch.release.clear()
+        with patch("backend.components.cache.time.time", return_value=time.time() + 61):
+            assert dataapi_cache.get_or_fetch(key, fetch, **kwargs) == {"version": 1}
+            fetch.started.wait(timeout=10)
+            assert dataapi_cache.get_or_fetch(key, fetch, **kwargs) == {"version": 1}
+            fetch.release.set()
+            executor.shutdown(wait=True)
+
+        # 刷新完成后返回新数据
+        assert fetch.calls == 2
+        assert dataapi_cache.get_or_fetch(key, fetch, **kwargs) == {"version": 2}
+        assert fetch.calls == 2
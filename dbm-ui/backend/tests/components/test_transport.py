@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from backend.components.transport import SessionPool
+
+BASE = "http://127.0.0.1"
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """/login 返回 Set-Cookie，其他路径返回请求中携带的 Cookie"""
+
+    def do_GET(self):
+        body = b"" if self.path == "/login" else self.headers.get("Cookie", "").encode()
+        self.send_response(200)
+        if self.path == "/login":
+            self.send_header("Set-Cookie", "bk_token=leaked; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cookie_server():
+    server = HTTPServer(("127.0.0.1", 0), CookieHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestSessionPool:
+    def test_share_session_by_key(self):
+        pool = SessionPool()
+        session = pool.get_session(BASE)
+        assert pool.get_session(BASE) is session
+        assert pool.get_session(f"{BASE}:8080") is not session
+
+        # 需要客户端证书的 session 单独创建，证书只在创建时加载一次
+        cert_calls = []
+
+        def cert_loader():
+            cert_calls.append(1)
+            return "client.crt", "client.key"
+
+        ssl_session = pool.get_session(BASE, ssl=True, cert_loader=cert_loader)
+        assert ssl_session is not session
+        assert pool.get_session(BASE, ssl=True, cert_loader=cert_loader) is ssl_session
+        assert ssl_session.cert == ("client.crt", "client.key")
+        assert len(cert_calls) == 1
+        pool.clear()
+
+    def test_rebuild_after_fork(self):
+        pool = SessionPool()
+        session = pool.get_session(BASE)
+        with patch("backend.components.transport.os.getpid", return_value=pool._pid + 1):
+            forked_session = pool.get_session(BASE)
+            assert forked_session is not session
+            assert pool.get_session(BASE) is forked_session
+        pool.clear()
+
+    def test_not_persist_response_cookies(self, cookie_server):
+        pool = SessionPool()
+        session = pool.get_session(cookie_server)
+        assert session.get(f"{cookie_server}/login").cookies.get("bk_token") == "leaked"
+        assert not session.cookies
+
+        # 响应中的 cookies 不会带到下一次请求，请求级别的 cookies 不受影响
+        assert session.get(f"{cookie_server}/echo").text == ""
+        assert session.get(f"{cookie_server}/echo", cookies={"bk_token": "user"}).text == "bk_token=user"
+        pool.clear()
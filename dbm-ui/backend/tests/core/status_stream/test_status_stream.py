@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from backend.core.status_stream.asgi import StatusStreamApp, StatusStreamRouter
+from backend.core.status_stream.broker import LocalStatusBroker
+from backend.core.status_stream.constants import STATUS_STREAM_PATH, StatusEventType
+from backend.core.status_stream.handlers import StatusStreamHandler
+from backend.core.status_stream.hub import StatusStreamHub
+
+ROOT_ID = "test0status0stream"
+CONNECTION_COUNT = 200
+
+
+class FakeClient:
+    """模拟一个 SSE 连接，记录收到的消息"""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.messages = []
+        self.disconnected = asyncio.Event()
+
+    @property
+    def scope(self):
+        return {
+            "type": "http",
+            "path": STATUS_STREAM_PATH,
+            "method": "GET",
+            "query_string": f"token={self.token}".encode(),
+        }
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    @property
+    def status(self):
+        return self.messages[0]["status"]
+
+    @property
+    def events(self):
+        events = []
+        for message in self.messages[1:]:
+            for block in message.get("body", b"").decode().split("\n\n"):
+                data = [line[len("data: ") :] for line in block.split("\n") if line.startswith("data: ")]
+                events.extend(json.loads(d) for d in data)
+        return events
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class TestStatusStream:
+    def setup_method(self):
+        self.broker = LocalStatusBroker()
+        self.app = StatusStreamApp(hub=StatusStreamHub(broker=self.broker))
+
+    def publish(self, channel, **data):
+        # 模拟 celery worker 中的信号处理，在其他线程中发布
+        event = {"type": StatusEventType.FLOW_NODE.value, **data}
+        thread = threading.Thread(target=self.broker.publish, args=(channel, event))
+        thread.start()
+        thread.join()
+
+    def test_invalid_token(self):
+        client = FakeClient(token="invalid")
+        run(self.app(client.scope, client.receive, client.send))
+        assert client.status == 403
+
+    def test_fan_out(self):
+        flow_token = StatusStreamHandler.create_token("admin", [StatusStreamHandler.flow_channel(ROOT_ID)])["token"]
+        other_token = StatusStreamHandler.create_token("admin", [StatusStreamHandler.flow_channel("other")])["token"]
+        clients = [FakeClient(flow_token) for __ in range(CONNECTION_COUNT)] + [FakeClient(other_token)]
+
+        async def main():
+            tasks = [asyncio.ensure_future(self.app(c.scope, c.receive, c.send)) for c in clients]
+            await asyncio.sleep(0.1)
+            self.publish(StatusStreamHandler.flow_channel(ROOT_ID), node_id="node1", status="FINISHED")
+            await asyncio.sleep(0.1)
+            for client in clients:
+                client.disconnected.set()
+            await asyncio.gather(*tasks)
+
+        run(main())
+        # 一次发布分发给所有订阅了该流程的连接，其他连接不受影响
+        for client in clients[:-1]:
+            assert client.status == 200
+            assert [(e["node_id"], e["status"]) for e in client.events] == [("node1", "FINISHED")]
+        assert clients[-1].events == []
+
+    def test_router(self):
+        called = []
+
+        async def django_application(scope, receive, send):
+            called.append(scope["path"])
+
+        router = StatusStreamRouter(django_application, self.app)
+        client = FakeClient(token="invalid")
+        run(router({**client.scope, "path": "/apis/ticket/tickets/"}, client.receive, client.send))
+        run(router(client.scope, client.receive, client.send))
+        assert called == ["/apis/ticket/tickets/"] and client.status == 403
+
+    @patch("backend.core.status_stream.handlers.status_broker")
+    def test_publish(self, mocked_broker):
+        channel = StatusStreamHandler.ticket_channel(1)
+        StatusStreamHandler.publish([channel], StatusEventType.TICKET, ticket_id=1, status="SUCCEEDED")
+        published_channel, event = mocked_broker.publish.call_args[0]
+        assert published_channel == channel and event["type"] == "ticket" and event["status"] == "SUCCEEDED"
+
+        # 发布失败不影响调用方
+        mocked_broker.publish.side_effect = ConnectionError
+        StatusStreamHandler.publish([channel], StatusEventType.TICKET, ticket_id=1, status="FAILED")
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import importlib
+
+import pytest
+from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from backend.db_meta import models
+from backend.db_meta.enums import ClusterDBHAStatusFlags, ClusterStatus, InstanceStatus
+from backend.db_meta.utils import refresh_cluster_access_ports, refresh_cluster_status_flags
+from backend.tests.db_meta.api.dbha.test_apis import (  # noqa
+    TEST_PROXY_PORT1,
+    TEST_PROXY_PORT2,
+    TEST_STORAGE_PORT1,
+    dbha_fixture,
+)
+from backend.tests.mock_data.components import cc
+
+pytestmark = pytest.mark.django_db
+
+
+class TestClusterStatusFlag:
+    def test_status_flag_maintained_by_signal(self, dbha_fixture):  # noqa
+        cluster = models.Cluster.objects.first()
+        assert (
+            cluster.status_flag
+            == ClusterDBHAStatusFlags.ProxyUnavailable | ClusterDBHAStatusFlags.BackendSlaveUnavailable
+        )
+        assert cluster.status == ClusterStatus.ABNORMAL.value
+
+        # 修改实例状态后，冗余的状态标志位同步更新
+        storage = models.StorageInstance.objects.get(machine__ip=cc.NORMAL_IP2, port=TEST_STORAGE_PORT1)
+        storage.status = InstanceStatus.UNAVAILABLE.value
+        storage.save(update_fields=["status"])
+
+        cluster.refresh_from_db()
+        assert cluster.status_flag & ClusterDBHAStatusFlags.BackendMasterUnavailable
+        assert cluster.status_flag == cluster.compute_status_flag()
+        assert "BackendMasterUnavailable" in cluster.status_flag_text
+
+    def test_read_status_flag_without_query(self, dbha_fixture):  # noqa
+        clusters = list(models.Cluster.objects.all())
+        with CaptureQueriesContext(connection) as ctx:
+            for cluster in clusters:
+                assert cluster.status_flag == cluster.status_flag_value
+                assert cluster.status_flag_text
+        assert len(ctx.captured_queries) == 0
+
+    def test_refresh_after_queryset_update(self, dbha_fixture):  # noqa
+        # queryset.update 不触发信号，需要主动刷新
+        models.ProxyInstance.objects.update(status=InstanceStatus.RUNNING.value)
+        models.StorageInstance.objects.update(status=InstanceStatus.RUNNING.value)
+        cluster = models.Cluster.objects.first()
+        assert cluster.status_flag != 0
+
+        changed_clusters = models.Cluster.refresh_status_flags(models.Cluster.objects.all())
+        assert [c.id for c in changed_clusters] == [cluster.id]
+
+        cluster.refresh_from_db()
+        assert cluster.status_flag == 0
+        assert cluster.status == ClusterStatus.NORMAL.value
+
+    def test_bulk_compute_query_count(self, dbha_fixture):  # noqa
+        clusters = list(models.Cluster.objects.all())
+        with CaptureQueriesContext(connection) as ctx:
+            models.Cluster.bulk_compute_status_flags(clusters)
+        assert len(ctx.captured_queries) == 2
+
+    def test_repair_drift(self, dbha_fixture):  # noqa
+        models.Cluster.objects.update(status_flag_value=0, status=ClusterStatus.NORMAL.value)
+        assert refresh_cluster_status_flags(batch_size=1) == 1
+        # 已经一致的集群不会重复写入
+        assert refresh_cluster_status_flags() == 0
+
+        cluster = models.Cluster.objects.first()
+        assert cluster.status_flag == cluster.compute_status_flag()
+        assert cluster.status == ClusterStatus.ABNORMAL.value
+
+    def test_migration_backfill(self, dbha_fixture):  # noqa
+        migration = importlib.import_module("backend.db_meta.migrations.0041_cluster_status_flag_value")
+        models.Cluster.objects.update(status_flag_value=0, status=ClusterStatus.NORMAL.value)
+
+        migration.backfill_status_flag_value(apps, None)
+        cluster = models.Cluster.objects.first()
+        assert cluster.status_flag == cluster.compute_status_flag()
+        assert cluster.status == ClusterStatus.ABNORMAL.value
+
+
+class TestClusterAccessPort:
+    def test_access_port_maintained_by_signal(self, dbha_fixture):  # noqa
+        cluster = models.Cluster.objects.first()
+        assert cluster.access_port == TEST_PROXY_PORT1
+
+        # 移除集群关联的 proxy 后访问端口同步更新
+        cluster.proxyinstance_set.remove(models.ProxyInstance.objects.get(port=TEST_PROXY_PORT1))
+        cluster.refresh_from_db()
+        assert cluster.access_port == TEST_PROXY_PORT2
+
+    def test_access_port_follow_instance_save(self, dbha_fixture):  # noqa
+        proxy = models.ProxyInstance.objects.get(port=TEST_PROXY_PORT1)
+        proxy.port = TEST_PROXY_PORT1 + 1000
+        proxy.save(update_fields=["port"])
+        assert models.Cluster.objects.first().access_port == TEST_PROXY_PORT1 + 1000
+
+    def test_migration_backfill(self, dbha_fixture):  # noqa
+        migration = importlib.import_module("backend.db_meta.migrations.0042_cluster_access_port")
+        models.Cluster.objects.update(access_port=0)
+
+        migration.backfill_access_port(apps, None)
+        cluster = models.Cluster.objects.first()
+        assert cluster.access_port == cluster.compute_access_port() == TEST_PROXY_PORT1
+
+    def test_stale_cluster_save_keep_access_port(self, dbha_fixture):  # noqa
+        stale_cluster = models.Cluster.objects.first()
+        proxy = models.ProxyInstance.objects.get(port=TEST_PROXY_PORT1)
+        proxy.cluster.remove(stale_cluster)
+
+        # 过期的集群对象全量保存时，不会覆盖信号中刷新的冗余字段
+        stale_cluster.alias = "alias"
+        stale_cluster.save()
+        cluster = models.Cluster.objects.get(id=stale_cluster.id)
+        assert cluster.alias == "alias"
+        assert cluster.access_port == TEST_PROXY_PORT2
+
+    def test_save_deleted_and_deferred_cluster(self, dbha_fixture):  # noqa
+        # 只加载部分字段的集群保存时，不会加载延迟字段
+        cluster = models.Cluster.objects.only("id", "alias").first()
+        cluster.alias = "alias"
+        with CaptureQueriesContext(connection) as ctx:
+            cluster.save()
+        assert len(ctx.captured_queries) == 1
+        assert models.Cluster.objects.get(id=cluster.id).alias == "alias"
+
+        # 集群记录已被删除时，与默认行为一致重新插入
+        cluster = models.Cluster.objects.create(name="deleted", bk_biz_id=cluster.bk_biz_id)
+        models.Cluster.objects.filter(id=cluster.id).delete()
+        cluster.save()
+        assert models.Cluster.objects.filter(id=cluster.id).exists()
+
+    def test_backfill_and_verify(self, dbha_fixture):  # noqa
+        models.Cluster.objects.update(access_port=0)
+
+        diffs = refresh_cluster_access_ports(verify=True)
+        assert [(diff["stored"], diff["computed"]) for diff in diffs] == [(0, TEST_PROXY_PORT1)]
+        assert models.Cluster.objects.first().access_port == 0
+
+        assert len(refresh_cluster_access_ports(batch_size=1)) == 1
+        assert models.Cluster.objects.first().access_port == TEST_PROXY_PORT1
+        assert refresh_cluster_access_ports(verify=True) == []
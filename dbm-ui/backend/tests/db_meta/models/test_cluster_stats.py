@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import ClusterStats, ClusterStatsHistory
+from backend.tests.mock_data import constant
+
+pytestmark = pytest.mark.django_db
+
+DOMAIN1 = "gamedb.test1.blueking.db"
+DOMAIN2 = "gamedb.test2.blueking.db"
+
+
+class TestClusterStats:
+    @staticmethod
+    def _sync(cluster_stats):
+        return ClusterStats.sync_stats(constant.BK_BIZ_ID, ClusterType.TenDBHA.value, cluster_stats)
+
+    def test_sync_only_writes_delta(self):
+        assert self._sync({DOMAIN1: {"used": 10, "total": 100, "in_use": 10.0}, DOMAIN2: {"used": 1}}) == {
+            "created": 2,
+            "updated": 0,
+            "deleted": 0,
+        }
+        # 容量没有变化的集群不会重复写入，也不会追加历史
+        assert self._sync({DOMAIN1: {"used": 10.0, "total": 100, "in_use": 10.0}, DOMAIN2: {"used": 2}}) == {
+            "created": 0,
+            "updated": 1,
+            "deleted": 0,
+        }
+        assert ClusterStatsHistory.objects.filter(immute_domain=DOMAIN1).count() == 1
+        assert ClusterStatsHistory.objects.filter(immute_domain=DOMAIN2).count() == 2
+
+        # 本次没有容量数据的集群被移除
+        assert self._sync({DOMAIN1: {"used": 10, "total": 100, "in_use": 10.0}})["deleted"] == 1
+
+    def test_get_stats_map(self):
+        self._sync({DOMAIN1: {"used": 10, "total": 100, "in_use": 10.0}, DOMAIN2: {"used": 1}})
+        assert ClusterStats.get_stats_map([DOMAIN1, DOMAIN2, "not.exist.db"]) == {
+            DOMAIN1: {"used": 10, "total": 100, "in_use": 10.0},
+            DOMAIN2: {"used": 1},
+        }
+
+    def test_trend_and_retention(self):
+        self._sync({DOMAIN1: {"used": 10}})
+        self._sync({DOMAIN1: {"used": 20}})
+        ClusterStatsHistory.objects.filter(used=10).update(create_at=timezone.now() - timedelta(days=10))
+
+        trend = ClusterStatsHistory.get_trend(DOMAIN1, start_time=timezone.now() - timedelta(days=1))
+        # 开始时间之前最后一个变化点作为趋势起点
+        assert [point["used"] for point in trend] == [10, 20]
+
+        assert ClusterStatsHistory.clean_expired(retention_days=7) == 1
+        assert [point["used"] for point in ClusterStatsHistory.get_trend(DOMAIN1, trend[0]["time"])] == [20]
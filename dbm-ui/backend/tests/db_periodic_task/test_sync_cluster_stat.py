@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import Cluster, ClusterStats
+from backend.db_periodic_task.local_tasks.db_meta import sync_cluster_stat
+from backend.tests.mock_data.components.bkmonitor import BKMonitorV3FakeApi
+
+pytestmark = pytest.mark.django_db
+
+BIZ_COUNT = 30
+CLUSTERS_PER_BIZ = 2
+
+
+@pytest.fixture
+def biz_domains():
+    biz_domains = {
+        bk_biz_id: [f"gamedb.test{index}.{bk_biz_id}.db" for index in range(CLUSTERS_PER_BIZ)]
+        for bk_biz_id in range(1, BIZ_COUNT + 1)
+    }
+    Cluster.objects.bulk_create(
+        [
+            Cluster(name=domain, bk_biz_id=bk_biz_id, cluster_type=ClusterType.TenDBHA.value, immute_domain=domain)
+            for bk_biz_id, domains in biz_domains.items()
+            for domain in domains
+        ]
+    )
+    return biz_domains
+
+
+def _sync(fake_api: BKMonitorV3FakeApi, **constants):
+    constants = {"CAPACITY_QUERY_RATE": 1000, **constants}
+    with patch.object(sync_cluster_stat, "BKMonitorV3Api", fake_api), patch.multiple(sync_cluster_stat, **constants):
+        sync_cluster_stat.sync_cluster_stat_by_template(ClusterType.TenDBHA.value)
+
+
+class TestSyncClusterStat:
+    def test_one_query_per_template(self, biz_domains):
+        fake_api = BKMonitorV3FakeApi(biz_domains)
+        _sync(fake_api)
+
+        # 所有业务合并为一次 used 查询和一次 total 查询，而不是每个业务两次
+        assert len(fake_api.queries) == 2
+        assert ClusterStats.objects.count() == BIZ_COUNT * CLUSTERS_PER_BIZ
+        domain = biz_domains[1][0]
+        assert ClusterStats.get_stats_map([domain]) == {domain: {"used": 10, "total": 100, "in_use": 10.0}}
+
+    def test_chunk_and_partial_failure(self, biz_domains):
+        _sync(BKMonitorV3FakeApi(biz_domains))
+
+        # 每次查询最多合并 10 个业务，业务 1 所在的分组查询失败，保留上一次的容量
+        fake_api = BKMonitorV3FakeApi(biz_domains, used=20, failed_biz_ids=[1])
+        _sync(fake_api, CAPACITY_QUERY_MAX_BIZ=10)
+        assert len(fake_api.queries) == 6
+
+        stats_map = ClusterStats.get_stats_map([domain for domains in biz_domains.values() for domain in domains])
+        assert {stats_map[domain]["used"] for domain in biz_domains[1] + biz_domains[10]} == {10}
+        assert {stats_map[domain]["used"] for domain in biz_domains[11] + biz_domains[30]} == {20}
+
+    def test_parallel_queries(self, biz_domains):
+        fake_api = BKMonitorV3FakeApi(biz_domains, latency=0.05)
+        _sync(fake_api, CAPACITY_QUERY_MAX_BIZ=5, CAPACITY_QUERY_CONCURRENCY=3)
+
+        # 6 个分组共 12 次查询(逐业务串行时为每个业务 2 次)，并发执行且不超过并发上限
+        assert len(fake_api.queries) == 12
+        assert 1 < fake_api.max_inflight <= 3
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_services.ipchooser.models import CCHostMirror
+from backend.db_services.ipchooser.query.agent_status import AgentStatusCache
+from backend.db_services.ipchooser.query.cc_mirror import CCMirrorQuery
+from backend.exceptions import ApiRequestError
+from backend.tests.mock_data import constant
+from backend.tests.mock_data.components.cc import CCApiMock
+from backend.tests.mock_data.components.nodeman import NodemanApiFake
+from backend.utils.redis import RedisConn
+
+pytestmark = pytest.mark.django_db
+
+HOST_IDS = list(range(1, 21))
+
+
+@pytest.fixture
+def cache_factory():
+    caches = []
+
+    def factory(nodeman_api, batch_window=0):
+        status_cache = AgentStatusCache(
+            redis=RedisConn,
+            nodeman_api=nodeman_api,
+            cc_api=CCApiMock(),
+            key_prefix="dbm:test:agent_status",
+            batch_window=batch_window,
+        )
+        status_cache.clear(HOST_IDS)
+        caches.append(status_cache)
+        return status_cache
+
+    yield factory
+    for status_cache in caches:
+        status_cache.clear(HOST_IDS)
+        RedisConn.delete(status_cache.hot_biz_key)
+
+
+class TestAgentStatusCache:
+    def test_cache_hit(self, cache_factory):
+        nodeman_api = NodemanApiFake()
+        status_cache = cache_factory(nodeman_api)
+
+        assert status_cache.get_status([1, 2, 3, 2]) == {1: 0, 2: 1, 3: 0}
+        assert status_cache.get_status([2, 3, 4]) == {2: 1, 3: 0, 4: 1}
+        # 命中缓存的主机不再查询
+        assert nodeman_api.queried_host_ids == [[1, 2, 3], [4]]
+
+    def test_coalesce_concurrent_requests(self, cache_factory):
+        nodeman_api = NodemanApiFake(delay=0.05)
+        status_cache = cache_factory(nodeman_api, batch_window=0.05)
+
+        # 5 个并发请求，请求的主机两两重叠
+        requests = [HOST_IDS[i : i + 8] for i in range(0, 20, 4) if HOST_IDS[i : i + 8]]
+        with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            results = list(executor.map(status_cache.get_status, requests))
+
+        for host_ids, result in zip(requests, results):
+            assert result == {host_id: int(host_id % 2 == 0) for host_id in host_ids}
+        # 每个主机只查询一次，并发请求合并为少数几次查询
+        queried_host_ids = list(itertools.chain.from_iterable(nodeman_api.queried_host_ids))
+        assert sorted(queried_host_ids) == HOST_IDS
+        assert len(nodeman_api.queried_host_ids) < len(requests)
+
+    def test_query_failed(self, cache_factory):
+        status_cache = cache_factory(NodemanApiFake(error=ApiRequestError()))
+        with pytest.raises(ApiRequestError):
+            status_cache.get_status([1, 2])
+
+        # 失败的结果不会缓存，恢复后重新查询
+        status_cache.nodeman_api = NodemanApiFake()
+        assert status_cache.get_status([1, 2]) == {1: 0, 2: 1}
+
+    def test_flush_aborted(self, cache_factory):
+        status_cache = cache_factory(NodemanApiFake())
+        with patch("backend.db_services.ipchooser.query.agent_status.time.sleep", side_effect=RuntimeError("aborted")):
+            with pytest.raises(RuntimeError):
+                status_cache.get_status([1, 2])
+
+        # 批次异常退出后不会残留查询中的主机，后续请求可以重新发起查询
+        assert not status_cache._inflight and status_cache._collecting is None
+        assert status_cache.get_status([1, 2]) == {1: 0, 2: 1}
+
+    def test_refresh_hot_biz(self, cache_factory):
+        nodeman_api = NodemanApiFake()
+        status_cache = cache_factory(nodeman_api)
+        CCHostMirror.objects.bulk_create(
+            [CCHostMirror(bk_host_id=host_id, bk_biz_id=constant.BK_BIZ_ID) for host_id in HOST_IDS]
+        )
+
+        with patch("backend.env.AGENT_STATUS_REFRESH_ENABLED", True), patch.object(
+            CCMirrorQuery, "is_ready", return_value=True
+        ):
+            # 主机1 的业务来自 CMDB 的主机业务关系
+            status_cache.get_status([1])
+            assert status_cache.refresh_hot_biz() == {constant.BK_BIZ_ID: len(HOST_IDS)}
+
+        nodeman_api.queried_host_ids = []
+        assert status_cache.get_status(HOST_IDS) == {host_id: int(host_id % 2 == 0) for host_id in HOST_IDS}
+        assert nodeman_api.queried_host_ids == []
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_services.ipchooser.constants import CC_WATCH_RETRY_TIMES, CCWatchResource
+from backend.db_services.ipchooser.exceptions import UnsupportedFilterError
+from backend.db_services.ipchooser.models import CCHostMirror, CCHostTopoMirror, CCWatchCursor
+from backend.db_services.ipchooser.query.cc_mirror import CCMirrorQuery
+from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
+from backend.db_services.ipchooser.tools.cc_mirror_sync import CCMirrorSyncer
+from backend.tests.mock_data import constant
+from backend.tests.mock_data.components.cc import FakeCCEventStream
+
+pytestmark = pytest.mark.django_db
+
+OTHER_BIZ_ID = constant.BK_BIZ_ID + 1
+
+
+@pytest.fixture
+def cc_stream():
+    stream = FakeCCEventStream()
+    stream.add_host(1, constant.BK_BIZ_ID, bk_module_id=10, bk_host_name="db-1", bk_os_type="1")
+    stream.add_host(2, constant.BK_BIZ_ID, bk_module_id=10, bk_host_name="db-2", bk_os_type="1")
+    stream.add_host(3, constant.BK_BIZ_ID, bk_module_id=11, bk_host_name="proxy-3", bk_os_type="2")
+    return stream
+
+
+@pytest.fixture
+def syncer(cc_stream):
+    syncer = CCMirrorSyncer(cc_api=cc_stream)
+    for resource in CCWatchResource.get_values():
+        syncer.watch(resource)
+    syncer.reconcile_biz(constant.BK_BIZ_ID)
+    return syncer
+
+
+def watch_all(syncer):
+    return sum(syncer.watch(resource) for resource in CCWatchResource.get_values())
+
+
+class TestCCMirrorSyncer:
+    def test_reconcile(self, syncer):
+        assert set(CCHostMirror.objects.values_list("bk_host_id", flat=True)) == {1, 2, 3}
+        assert CCHostTopoMirror.objects.filter(bk_biz_id=constant.BK_BIZ_ID, bk_module_id=10).count() == 2
+        assert CCHostMirror.objects.get(bk_host_id=1).detail["bk_host_name"] == "db-1"
+
+    def test_apply_events(self, syncer, cc_stream):
+        cc_stream.update_host(1, bk_host_name="db-1-renamed")
+        cc_stream.add_host(4, constant.BK_BIZ_ID, bk_module_id=11, bk_host_name="proxy-4")
+        cc_stream.transfer_host(2, constant.BK_BIZ_ID, bk_module_id=11)
+        # 转移到未镜像的业务后从镜像中移除
+        cc_stream.transfer_host(3, OTHER_BIZ_ID, bk_module_id=20)
+        # 未镜像业务的主机不写入镜像
+        cc_stream.add_host(5, OTHER_BIZ_ID, bk_module_id=20)
+        cc_stream.delete_host(4)
+        cc_stream.add_host(6, constant.BK_BIZ_ID, bk_module_id=10)
+        assert watch_all(syncer) > 0
+
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "db-1-renamed"
+        assert set(CCHostMirror.objects.values_list("bk_host_id", flat=True)) == {1, 2, 6}
+        assert set(CCHostTopoMirror.objects.values_list("bk_host_id", "bk_module_id")) == {(1, 10), (2, 11), (6, 10)}
+        # 没有新事件时不再重复应用
+        assert watch_all(syncer) == 0
+
+    def test_reconcile_keep_newer_events(self, syncer, cc_stream):
+        list_biz_hosts = cc_stream.list_biz_hosts
+        changed = []
+
+        def list_biz_hosts_then_change(*args, **kwargs):
+            resp = list_biz_hosts(*args, **kwargs)
+            # 拉取快照后主机发生变更，监听任务先于对账写入应用了这些事件
+            if not changed:
+                changed.append(True)
+                cc_stream.update_host(1, bk_host_name="db-1-renamed")
+                cc_stream.transfer_host(2, OTHER_BIZ_ID, bk_module_id=20)
+                watch_all(syncer)
+            return resp
+
+        with patch.object(cc_stream, "list_biz_hosts", list_biz_hosts_then_change):
+            syncer.reconcile_biz(constant.BK_BIZ_ID)
+
+        # 对账快照不会覆盖监听任务已应用的更新事件
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "db-1-renamed"
+        assert set(CCHostMirror.objects.values_list("bk_host_id", flat=True)) == {1, 3}
+        assert not CCHostTopoMirror.objects.filter(bk_host_id=2).exists()
+
+    def test_reconcile_refetch_when_cursor_moved(self, syncer, cc_stream):
+        fetch_events = syncer.fetch_events
+        changed = []
+
+        def fetch_events_then_change(*args, **kwargs):
+            events = fetch_events(*args, **kwargs)
+            # 拉取重放事件后、锁住游标前，监听任务又应用了新的事件
+            if not changed:
+                changed.append(True)
+                cc_stream.update_host(1, bk_host_name="db-1-renamed")
+                watch_all(syncer)
+            return events
+
+        with patch.object(syncer, "fetch_events", side_effect=fetch_events_then_change) as mocked_fetch_events:
+            assert syncer.reconcile_biz(constant.BK_BIZ_ID) == 3
+
+        # 游标推进后重新拉取新增的事件再写入
+        assert mocked_fetch_events.call_count == 2 * len(CCWatchResource.get_values())
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "db-1-renamed"
+
+    @patch("backend.db_services.ipchooser.tools.cc_mirror_sync.time.sleep")
+    def test_transient_error_keep_cursor(self, mocked_sleep, syncer, cc_stream):
+        reset_at = dict(CCWatchCursor.objects.values_list("resource", "reset_at"))
+        cc_stream.update_host(1, bk_host_name="db-1-renamed")
+
+        # 重试后成功时正常应用事件
+        cc_stream.fail_times = CC_WATCH_RETRY_TIMES - 1
+        assert syncer.watch(CCWatchResource.HOST.value) == 1
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "db-1-renamed"
+
+        # 重试仍然失败时保留游标，镜像仍然可用，不需要重新对账
+        cc_stream.update_host(1, bk_host_name="db-1-renamed-again")
+        cc_stream.fail_times = CC_WATCH_RETRY_TIMES
+        assert syncer.watch(CCWatchResource.HOST.value) == 0
+        assert CCWatchCursor.objects.get(resource=CCWatchResource.HOST.value).cursor != ""
+        assert dict(CCWatchCursor.objects.values_list("resource", "reset_at")) == reset_at
+        assert syncer.get_stale_biz_ids() == []
+
+        assert syncer.watch(CCWatchResource.HOST.value) == 1
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "db-1-renamed-again"
+
+    def test_expired_cursor(self, syncer, cc_stream):
+        assert CCMirrorQuery.is_ready(constant.BK_BIZ_ID)
+
+        cc_stream.update_host(1, bk_host_name="missed")
+        cc_stream.expire_cursor()
+        with patch.object(CCMirrorQuery, "trigger_reconcile") as trigger_reconcile:
+            watch_all(syncer)
+            assert CCWatchCursor.objects.filter(cursor="").exists()
+            assert not CCMirrorQuery.is_ready(constant.BK_BIZ_ID)
+            trigger_reconcile.assert_called_once_with(constant.BK_BIZ_ID)
+
+        # 重新监听并对账后恢复可用
+        watch_all(syncer)
+        assert syncer.get_stale_biz_ids() == [constant.BK_BIZ_ID]
+        syncer.reconcile_biz(constant.BK_BIZ_ID)
+        assert CCMirrorQuery.is_ready(constant.BK_BIZ_ID)
+        assert CCHostMirror.objects.get(bk_host_id=1).bk_host_name == "missed"
+
+
+class TestCCMirrorQuery:
+    def test_list_biz_hosts(self, syncer):
+        params = {
+            "bk_biz_id": constant.BK_BIZ_ID,
+            "fields": ["bk_host_id", "bk_host_name"],
+            "page": {"start": 0, "limit": 10, "sort": "bk_host_innerip"},
+            "host_property_filter": {
+                "condition": "AND",
+                "rules": [
+                    {"field": "bk_os_type", "operator": "equal", "value": "1"},
+                    {
+                        "condition": "OR",
+                        "rules": [
+                            {"field": "bk_host_name", "operator": "contains", "value": "DB-1"},
+                            {"field": "bk_host_id", "operator": "in", "value": [2, 3]},
+                        ],
+                    },
+                ],
+            },
+        }
+        assert CCMirrorQuery.list_biz_hosts(params) == {
+            "count": 2,
+            "info": [{"bk_host_id": 1, "bk_host_name": "db-1"}, {"bk_host_id": 2, "bk_host_name": "db-2"}],
+        }
+
+        resp = CCMirrorQuery.list_biz_hosts({"bk_biz_id": constant.BK_BIZ_ID, "bk_module_ids": [11]})
+        assert [host["bk_host_id"] for host in resp["info"]] == [3]
+        host_ids_gby_module_id = CCMirrorQuery.get_host_ids_gby_module_id(constant.BK_BIZ_ID)
+        assert {module_id: sorted(host_ids) for module_id, host_ids in host_ids_gby_module_id.items()} == {
+            10: [1, 2],
+            11: [3],
+        }
+
+    def test_fallback_to_cc(self, syncer, cc_stream):
+        params = {
+            "bk_biz_id": constant.BK_BIZ_ID,
+            "fields": ["bk_host_id"],
+            "page": {"start": 0, "limit": 10},
+            "host_property_filter": {
+                "condition": "AND",
+                "rules": [{"field": "bk_host_outerip", "operator": "equal", "value": "127.0.0.1"}],
+            },
+        }
+        with pytest.raises(UnsupportedFilterError):
+            CCMirrorQuery.list_biz_hosts(params)
+
+        with patch("backend.db_services.ipchooser.query.resource.CCApi") as cc_api:
+            cc_api.list_biz_hosts.return_value = {"count": 0, "info": []}
+            assert ResourceQueryHelper.list_biz_hosts(params) == {"count": 0, "info": []}
+            cc_api.list_biz_hosts.assert_called_once()
+
+            # 镜像支持的查询不再访问 CMDB
+            params["host_property_filter"]["rules"][0]["field"] = "bk_host_innerip"
+            assert ResourceQueryHelper.list_biz_hosts(params) == {"count": 0, "info": []}
+            cc_api.list_biz_hosts.assert_called_once()
@@ -23,7 +23,8 @@ class TestInstanceHandler:
     @patch("backend.db_services.ipchooser.handlers.host_handler.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.query.resource.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.handlers.base.CCApi", CCApiMock())
-    @patch("backend.db_services.ipchooser.query.resource.BKNodeManApi", NodemanApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.cc_api", CCApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.nodeman_api", NodemanApiMock())
     def test_find_related_clusters_by_cluster_id(self, bk_biz_id, dbha_cluster):
         assert (
             len(
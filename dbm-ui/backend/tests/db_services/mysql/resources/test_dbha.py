@@ -33,7 +33,8 @@ class TestDBHAResources:
     @patch("backend.db_services.ipchooser.handlers.host_handler.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.query.resource.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.handlers.base.CCApi", CCApiMock())
-    @patch("backend.db_services.ipchooser.query.resource.BKNodeManApi", NodemanApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.cc_api", CCApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.nodeman_api", NodemanApiMock())
     @patch.object(views.DBHAViewSet, "get_permissions", lambda x: [])
     def test_list(self, dbha_cluster, bk_biz_id, dbha_master_ip, dbha_slave_ip, dbha_proxy_ip_list):
         request = factory.get(
@@ -57,7 +58,8 @@ class TestDBHAResources:
     @patch("backend.db_services.ipchooser.handlers.host_handler.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.query.resource.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.handlers.base.CCApi", CCApiMock())
-    @patch("backend.db_services.ipchooser.query.resource.BKNodeManApi", NodemanApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.cc_api", CCApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.nodeman_api", NodemanApiMock())
     @patch.object(views.DBHAViewSet, "get_permissions", lambda x: [])
     def test_list_by_ip(self, dbha_cluster, bk_biz_id, dbha_master_ip, dbha_slave_ip, dbha_proxy_ip_list):
         request = factory.get(
@@ -71,7 +73,8 @@ class TestDBHAResources:
     @patch("backend.db_services.ipchooser.handlers.host_handler.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.query.resource.CCApi", CCApiMock())
     @patch("backend.db_services.ipchooser.handlers.base.CCApi", CCApiMock())
-    @patch("backend.db_services.ipchooser.query.resource.BKNodeManApi", NodemanApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.cc_api", CCApiMock())
+    @patch("backend.db_services.ipchooser.query.agent_status.agent_status_cache.nodeman_api", NodemanApiMock())
     @patch.object(views.DBHAViewSet, "get_permissions", lambda x: [])
     def test_retrieve(self, dbha_cluster, bk_biz_id, dbha_master_ip, dbha_proxy_ip_list):
         request = factory.get(
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import ipaddress
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import get_random_string
+
+from backend.db_meta.enums import ClusterEntryType, ClusterType, InstanceInnerRole
+from backend.db_meta.models import AppCache, Cluster, ClusterEntry, StorageInstance
+from backend.db_meta.models.machine import Machine
+from backend.db_services.mysql.resources.tendbsingle.query import ListRetrieveResource
+from backend.tests.mock_data.components.cc import CCApiMock
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def dbsingle_clusters(bk_biz_id, dbsingle_module, create_city):
+    AppCache.objects.create(bk_biz_id=bk_biz_id, db_app_abbr="dba", bk_biz_name="dba")
+    clusters = []
+    for index in range(10):
+        cluster_name = get_random_string(6)
+        cluster = Cluster.objects.create(
+            name=cluster_name,
+            cluster_type=ClusterType.TenDBSingle,
+            immute_domain=f"gamedb.{cluster_name}.blueking.db",
+            bk_biz_id=bk_biz_id,
+            db_module_id=dbsingle_module.db_module_id,
+        )
+        ClusterEntry.objects.create(
+            cluster=cluster, cluster_entry_type=ClusterEntryType.DNS, entry=cluster.immute_domain
+        )
+        ip = f"127.0.1.{index}"
+        machine = Machine.objects.create(
+            ip=ip,
+            bk_city_id=21,
+            bk_biz_id=bk_biz_id,
+            db_module_id=dbsingle_module.db_module_id,
+            bk_host_id=int(ipaddress.IPv4Address(ip)),
+        )
+        inst = StorageInstance.objects.create(
+            machine=machine,
+            port=20000,
+            cluster_type=ClusterType.TenDBSingle,
+            instance_inner_role=InstanceInnerRole.ORPHAN,
+            bk_biz_id=bk_biz_id,
+            db_module_id=dbsingle_module.db_module_id,
+        )
+        inst.cluster.add(cluster)
+        clusters.append(cluster)
+    return clusters
+
+
+class TestListClusterQueries:
+    """集群列表的查询次数不应随分页大小增长"""
+
+    @staticmethod
+    def _list_clusters(bk_biz_id, limit):
+        with patch.object(cache, "get", wraps=cache.get) as cache_get, patch.object(
+            cache, "get_many", wraps=cache.get_many
+        ) as cache_get_many, CaptureQueriesContext(connection) as queries:
+            resources = ListRetrieveResource.list_clusters(bk_biz_id, {}, limit, 0)
+        return resources, len(queries), cache_get.call_count + cache_get_many.call_count
+
+    @patch("backend.db_services.ipchooser.query.resource.CCApi", CCApiMock())
+    def test_constant_queries(self, bk_biz_id, dbsingle_clusters):
+        small_page, small_queries, small_cache_gets = self._list_clusters(bk_biz_id, limit=1)
+        large_page, large_queries, large_cache_gets = self._list_clusters(bk_biz_id, limit=len(dbsingle_clusters))
+
+        assert len(small_page.data) == 1
+        assert len(large_page.data) == len(dbsingle_clusters)
+        assert all(cluster["master_domain"] for cluster in large_page.data)
+        assert small_queries == large_queries
+        assert small_cache_gets == large_cache_gets
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import importlib
+from unittest.mock import patch
+
+import pytest
+from django.apps import apps
+from django.core.management import call_command
+
+from backend.components.dbresource.client import DBResourceApi
+from backend.db_meta.models import BKCity, Cluster, Machine
+from backend.db_meta.signals import machines_created
+from backend.db_services.quick_search.constants import SearchIndexType
+from backend.db_services.quick_search.handlers import QSearchHandler
+from backend.db_services.quick_search.indexer import QuickSearchIndexer
+from backend.db_services.quick_search.models import QuickSearchIndex
+from backend.tests.mock_data import constant
+from backend.tests.mock_data.components import cc
+
+pytestmark = pytest.mark.django_db
+
+
+class TestQuickSearchIndexer:
+    def test_suffixes(self):
+        assert QuickSearchIndexer.get_suffixes(SearchIndexType.CLUSTER_DOMAIN.value, "a.db") == [
+            "a.db",
+            ".db",
+            "db",
+            "b",
+        ]
+        assert QuickSearchIndexer.get_suffixes(SearchIndexType.TICKET.value, "1024") == ["1024"]
+
+    def test_cluster_index_follow_signals(self, init_cluster):
+        lookup = QuickSearchIndexer.lookup
+        assert lookup(SearchIndexType.CLUSTER_DOMAIN.value, ["DB.COM"]) == [str(init_cluster.id)]
+        assert lookup(SearchIndexType.CLUSTER_DOMAIN.value, ["db.co"], exact=True) == []
+        assert lookup(SearchIndexType.CLUSTER_NAME.value, ["cluster"], bk_biz_ids=[constant.BK_BIZ_ID]) == [
+            str(init_cluster.id)
+        ]
+        assert lookup(SearchIndexType.CLUSTER_NAME.value, ["cluster"], bk_biz_ids=[1]) == []
+
+        # 别名同样可以搜索，改名后旧名称不再命中
+        init_cluster.name, init_cluster.alias = "renamed", "alias_name"
+        init_cluster.save(update_fields=["name", "alias"])
+        assert lookup(SearchIndexType.CLUSTER_NAME.value, ["fake_cluster"]) == []
+        assert lookup(SearchIndexType.CLUSTER_NAME.value, ["as_na"]) == [str(init_cluster.id)]
+
+        # 与索引无关的字段更新不会重建索引
+        with patch.object(QuickSearchIndexer, "update") as update_mock:
+            init_cluster.save(update_fields=["phase"])
+            update_mock.assert_not_called()
+
+        init_cluster.delete()
+        assert not QuickSearchIndex.objects.filter(object_id=str(init_cluster.id)).exists()
+
+    def test_instance_lookup(self, create_city, init_cluster, init_storage_instance):
+        handler = QSearchHandler(filter_type="CONTAINS")
+        # 不带端口的关键字只匹配 ip 部分
+        assert handler.filter_instance(["127.0.0"])
+        assert not handler.filter_instance([str(constant.INSTANCE_PORT)])
+        assert handler.filter_instance([f"0.1:{constant.INSTANCE_PORT}"])
+
+        handler = QSearchHandler(filter_type="EXACT")
+        assert handler.filter_instance([cc.NORMAL_IP])
+        assert handler.filter_instance([f"{cc.NORMAL_IP}:{constant.INSTANCE_PORT}"])
+        assert not handler.filter_instance(["127.0.0"])
+
+    def test_bulk_created_machines(self, create_city):
+        bk_city = BKCity.objects.first()
+        machines = [
+            Machine(ip=f"10.0.0.{i}", bk_biz_id=constant.BK_BIZ_ID, bk_host_id=1000 + i, bk_city=bk_city)
+            for i in range(3)
+        ]
+        Machine.objects.bulk_create(machines)
+        assert QuickSearchIndexer.lookup(SearchIndexType.MACHINE.value, ["10.0.0"]) == []
+
+        machines_created.send(sender=Machine, machines=machines)
+        assert sorted(QuickSearchIndexer.lookup(SearchIndexType.MACHINE.value, ["10.0.0"])) == ["1000", "1001", "1002"]
+
+    def test_rebuild(self, init_cluster, init_ticket, init_flow_tree):
+        QuickSearchIndex.objects.all().delete()
+        Cluster.objects.filter(id=init_cluster.id).update(alias="bulk_updated")
+        call_command("rebuild_quick_search_index", "--batch-size", "1")
+
+        assert QuickSearchIndexer.lookup(SearchIndexType.CLUSTER_NAME.value, ["bulk_up"]) == [str(init_cluster.id)]
+        assert QuickSearchIndexer.lookup(SearchIndexType.TICKET.value, [str(init_ticket.id)]) == [str(init_ticket.id)]
+        # 任务ID支持子串匹配
+        assert QuickSearchIndexer.lookup(SearchIndexType.TASK.value, [constant.TASK_ROOT_ID[1:7]]) == [
+            constant.TASK_ROOT_ID
+        ]
+
+    def test_migration_backfill(self, init_cluster, init_ticket, init_flow_tree):
+        migration = importlib.import_module(
+            "backend.db_services.quick_search.migrations.0002_backfill_quick_search_index"
+        )
+        QuickSearchIndex.objects.all().delete()
+
+        migration.backfill_quick_search_index(apps, None)
+        lookup = QuickSearchIndexer.lookup
+        assert lookup(SearchIndexType.CLUSTER_DOMAIN.value, ["db.com"]) == [str(init_cluster.id)]
+        assert lookup(SearchIndexType.TICKET.value, [str(init_ticket.id)]) == [str(init_ticket.id)]
+        assert lookup(SearchIndexType.TASK.value, [constant.TASK_ROOT_ID[1:7]]) == [constant.TASK_ROOT_ID]
+
+    def test_update_clusters(self, init_cluster):
+        # queryset.update 不会触发 signal，需要调用方主动刷新索引
+        Cluster.objects.filter(id=init_cluster.id).update(bk_biz_id=1)
+        assert QuickSearchIndexer.lookup(SearchIndexType.CLUSTER_NAME.value, ["cluster"], bk_biz_ids=[1]) == []
+
+        QuickSearchIndexer.update_clusters(Cluster.objects.filter(id=init_cluster.id))
+        assert QuickSearchIndexer.lookup(SearchIndexType.CLUSTER_NAME.value, ["cluster"], bk_biz_ids=[1]) == [
+            str(init_cluster.id)
+        ]
+
+
+@pytest.mark.django_db(transaction=True)
+@patch.object(DBResourceApi, "resource_list", lambda *args, **kwargs: {"count": 0, "details": []})
+def test_search_concurrently(init_cluster, init_flow_tree):
+    result = QSearchHandler(filter_type="CONTAINS").search(f"fake_clu,{constant.TASK_ROOT_ID[:8]}")
+    assert [cluster["id"] for cluster in result["cluster_name"]] == [init_cluster.id]
+    assert [task["root_id"] for task in result["task"]] == [constant.TASK_ROOT_ID]
+    assert result["resource_pool"] == []
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.components.dbresource.client import DBResourceApi
+from backend.db_services.quick_search.handlers import QSearchHandler
+from backend.db_services.quick_search.views import QuickSearchViewSet
+from backend.utils.pytest import AuthorizedAPIRequestFactory
+
+pytestmark = pytest.mark.django_db
+
+factory = AuthorizedAPIRequestFactory()
+
+STREAM_SEARCH_PARAMS = {
+    "bk_biz_ids": [],
+    "db_types": [],
+    "resource_types": ["cluster_name", "resource_pool"],
+    "filter_type": "CONTAINS",
+    "keyword": "fake_clu",
+}
+
+
+def slow_resource_list(*args, **kwargs):
+    time.sleep(1)
+    return {"count": 0, "details": [{"ip": "127.0.0.1"}]}
+
+
+def failed_resource_list(*args, **kwargs):
+    raise Exception("resource pool unavailable")
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentSearch:
+    @patch.object(DBResourceApi, "resource_list", slow_resource_list)
+    @patch.dict("backend.db_services.quick_search.handlers.QUICK_SEARCH_TIMEOUTS", {"resource_pool": 0.1})
+    def test_slow_resource_type_timeout(self, init_cluster):
+        start_time = time.time()
+        events = list(QSearchHandler(filter_type="CONTAINS").iter_search("fake_clu"))
+        assert time.time() - start_time < 1
+
+        statuses = {event["resource_type"]: event["status"] for event in events}
+        assert statuses["resource_pool"] == "TIMEOUT"
+        assert statuses["cluster_name"] == "SUCCEEDED"
+        # 超时的类型最后返回，不阻塞其他类型
+        assert events[-1]["resource_type"] == "resource_pool"
+
+    @patch.object(DBResourceApi, "resource_list", failed_resource_list)
+    def test_failed_resource_type(self, init_cluster):
+        result = QSearchHandler(filter_type="CONTAINS").search("fake_clu")
+        assert result["resource_pool"] == []
+        assert [cluster["id"] for cluster in result["cluster_name"]] == [init_cluster.id]
+        # 结果仍按资源类型的顺序返回
+        assert list(result)[0] == "cluster_name"
+
+
+class TestStreamSearchViewSet:
+    def _stream_search(self, **extra):
+        request = factory.post("/apis/quick_search/stream_search/", data=STREAM_SEARCH_PARAMS, format="json", **extra)
+        response = QuickSearchViewSet.as_view({"post": "stream_search"})(request)
+        assert response.status_code == 200
+        return response, b"".join(response.streaming_content).decode()
+
+    @patch.object(DBResourceApi, "resource_list", lambda *args, **kwargs: {"count": 0, "details": []})
+    def test_ndjson(self, init_cluster):
+        response, content = self._stream_search()
+        assert response["Content-Type"] == "application/x-ndjson"
+
+        events = {event["resource_type"]: event for event in map(json.loads, content.strip().split("\n"))}
+        assert events.keys() == {"cluster_name", "resource_pool"}
+        assert events["cluster_name"]["data"][0]["id"] == init_cluster.id
+
+    @patch.object(DBResourceApi, "resource_list", failed_resource_list)
+    def test_sse(self, init_cluster):
+        response, content = self._stream_search(HTTP_ACCEPT="text/event-stream")
+        assert response["Content-Type"] == "text/event-stream"
+
+        messages = [message.split("\n") for message in content.strip().split("\n\n")]
+        assert [message[0] for message in messages] == ["event: cluster_name", "event: resource_pool"]
+        assert json.loads(messages[1][1][len("data: ") :])["status"] == "FAILED"
@@ -19,6 +19,7 @@ from rest_framework.test import APIClient
 
 from backend.db_services.taskflow.views.flow import TaskFlowViewSet
 from backend.flow.models import FlowNode, FlowTree, StateType
+from backend.flow.utils.pipeline_state_log import pipeline_state_log
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.components.bklog import BKLogApiMock
 from backend.tests.mock_data.db_services import taskflow
@@ -90,3 +91,57 @@ class TestTaskflowApi:
         data = client.get(url, data={"node_id": self.node_id, "version_id": "1"}).data
 
         assert len(data) == 2
+
+
+@pytest.fixture
+def init_state_log():
+    pipeline_state_log.clear(taskflow.ROOT_ID)
+    yield
+    pipeline_state_log.clear(taskflow.ROOT_ID)
+
+
+class TestTaskflowIncrementalRetrieve:
+    """
+    测试流程树的增量刷新
+    """
+
+    url = f"/apis/taskflow/{taskflow.ROOT_ID}/"
+
+    @patch.object(TaskFlowViewSet, "permission_classes")
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_retrieve_not_modified(self, mocked_permission_classes, init_taskflow, init_state_log):
+        mocked_permission_classes.return_value = [AllowAny]
+
+        # 没有变更记录时返回全量的流程树，不返回 ETag；不携带 since 时保持原有的响应结构
+        resp = client.get(self.url)
+        assert "activities" in resp.data
+        assert "version" not in resp.data and "incremental" not in resp.data
+        assert "ETag" not in resp
+
+        version = pipeline_state_log.record(taskflow.ROOT_ID, [taskflow.NODE_ID])
+        resp = client.get(self.url)
+        assert "version" not in resp.data
+        assert resp["ETag"] == f'"{version}"'
+
+        resp = client.get(self.url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        assert resp.status_code == 304
+
+    @patch.object(TaskFlowViewSet, "permission_classes")
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    def test_retrieve_since(self, mocked_permission_classes, init_taskflow, init_state_log):
+        mocked_permission_classes.return_value = [AllowAny]
+
+        version = pipeline_state_log.record(taskflow.ROOT_ID, [taskflow.ROOT_ID])
+        data = client.get(self.url, data={"since": version}).data
+        assert data["incremental"] and data["nodes"] == {}
+
+        FlowNode.objects.filter(root_id=taskflow.ROOT_ID, node_id=taskflow.NODE_ID).update(status=StateType.FAILED)
+        pipeline_state_log.record(taskflow.ROOT_ID, [taskflow.NODE_ID])
+        data = client.get(self.url, data={"since": version}).data
+        assert data["incremental"] and data["version"] == version + 1
+        assert data["nodes"][taskflow.NODE_ID]["status"] == StateType.FAILED
+
+        # 游标早于变更记录，回退到全量的流程树
+        data = client.get(self.url, data={"since": version - 2}).data
+        assert not data["incremental"] and "activities" in data
+        assert data["version"] == version + 1
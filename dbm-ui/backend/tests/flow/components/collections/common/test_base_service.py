@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import re
+from dataclasses import dataclass
+from unittest.mock import patch
+
+import pytest
+from pipeline.core.data.base import DataObject
+
+from backend.flow.consts import WriteContextOpType
+from backend.flow.plugins.components.collections.common.base_service import BkJobService, extract_log_context
+from backend.tests.mock_data.components.job import JobApiFake
+
+pytestmark = pytest.mark.django_db
+
+IP_COUNT = 20
+
+
+@dataclass
+class FakeContext:
+    result: dict = None
+
+
+def make_ip_logs(ips):
+    return {ip: f'[INFO] start\n<ctx>{{"ip": "{ip}"}}</ctx>\n[INFO] done' for ip in ips}
+
+
+def run_schedule(job_api, ips, write_op=WriteContextOpType.APPEND.value, trans_data=None):
+    job_instance_id = job_api.create_job(duration=-1)
+    data = DataObject(
+        inputs={
+            "kwargs": {"node_name": "test", "bk_cloud_id": 0, "write_op": write_op},
+            "write_payload_var": "result",
+            "trans_data": trans_data or FakeContext(),
+        },
+        outputs={"ext_result": {"result": True, "data": {"job_instance_id": job_instance_id}}, "exec_ips": ips},
+    )
+    service = BkJobService()
+    with patch("backend.flow.plugins.components.collections.common.base_service.JobApi", job_api), patch(
+        "backend.flow.plugins.components.collections.common.base_service.job_status_poller.get_result",
+        return_value=None,
+    ):
+        result = service._schedule(data, DataObject(inputs={}))
+    return result, data.get_one_of_outputs("trans_data")
+
+
+class TestBkJobServiceLog:
+    def test_extract_log_context(self):
+        cpl = re.compile("<ctx>(?P<context>.+?)</ctx>")
+        logs = [
+            "<ctx>{}</ctx>",
+            "a\n<ctx>1</ctx><ctx>2</ctx>",
+            "<ctx>\n</ctx>\n<ctx>3</ctx>",
+            "<ctx></ctx>4</ctx>",
+            "<ctx>5",
+            "no context",
+        ]
+        for log in logs:
+            match = cpl.search(log)
+            assert extract_log_context(log) == (match.group("context") if match else None)
+
+    def test_append_context(self):
+        ips = [f"127.0.0.{index}" for index in range(IP_COUNT)]
+        # 批量接口缺失的 IP 逐个补查
+        job_api = JobApiFake(ip_logs=make_ip_logs(ips), batch_log_ips=set(ips[1:]))
+        result, trans_data = run_schedule(job_api, ips, trans_data=FakeContext(result={"127.0.0.100": {}}))
+
+        assert result
+        assert trans_data.result == {"127.0.0.100": {}, **{ip: {"ip": ip} for ip in ips}}
+        assert job_api.batch_log_queries == 1
+        assert job_api.ip_log_queries == 1
+
+    def test_rewrite_context_failed(self):
+        ips = ["127.0.0.1", "127.0.0.2"]
+        job_api = JobApiFake(ip_logs={**make_ip_logs(ips[:1]), ips[1]: "no context"})
+        result, trans_data = run_schedule(job_api, ips, write_op=WriteContextOpType.REWRITE.value)
+
+        assert not result
+        assert trans_data.result == {"ip": ips[0]}
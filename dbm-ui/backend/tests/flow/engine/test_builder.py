@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from backend.flow.engine.bamboo.scene.common.builder import Builder, SubBuilder
+from backend.flow.models import FlowNode, FlowTree
+from backend.ticket.constants import TicketType
+
+logger = logging.getLogger("test")
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "test0builder0benchmark"
+SUB_FLOW_COUNT = 1000
+# 每个子流程包含 1 个串行节点 + 4 个并行节点
+SUB_FLOW_ACT_COUNT = 5
+ACT_COMPONENT_CODE = "fake_component"
+
+
+def build_flow() -> Builder:
+    data = {
+        "uid": "1",
+        "ticket_type": TicketType.REDIS_CLUSTER_APPLY,
+        "bk_biz_id": 1,
+        "created_by": "admin",
+        "password": "sensitive",
+    }
+    pipeline = Builder(root_id=ROOT_ID, data=data)
+    sub_pipelines = []
+    for index in range(SUB_FLOW_COUNT):
+        sub_pipeline = SubBuilder(root_id=ROOT_ID, data=data)
+        sub_pipeline.add_act(act_name=f"act{index}", act_component_code=ACT_COMPONENT_CODE, kwargs={"index": index})
+        sub_pipeline.add_parallel_acts(
+            [
+                {"act_name": f"act{index}-{i}", "act_component_code": ACT_COMPONENT_CODE, "kwargs": {"index": index}}
+                for i in range(SUB_FLOW_ACT_COUNT - 1)
+            ]
+        )
+        sub_pipelines.append(sub_pipeline.build_sub_process(sub_name=f"sub{index}"))
+    pipeline.add_parallel_sub_pipeline(sub_flow_list=sub_pipelines)
+    return pipeline
+
+
+class TestBuilder:
+    @patch("backend.flow.engine.bamboo.scene.common.builder.api.run_pipeline", MagicMock())
+    def test_benchmark_build_flow(self, django_assert_max_num_queries):
+        node_count = SUB_FLOW_COUNT * SUB_FLOW_ACT_COUNT
+
+        start_time = time.time()
+        pipeline = build_flow()
+        # 构建过程中不再逐个写入节点
+        assert not FlowNode.objects.filter(root_id=ROOT_ID).exists()
+        build_cost = time.time() - start_time
+
+        start_time = time.time()
+        # 节点按 batch_size 分批插入 + FlowTree 写入
+        with django_assert_max_num_queries(node_count // 1000 + 5):
+            assert pipeline.run_pipeline()
+        run_cost = time.time() - start_time
+        logger.info("build %s nodes cost %.2fs, run_pipeline cost %.2fs", node_count, build_cost, run_cost)
+
+        assert FlowNode.objects.filter(root_id=ROOT_ID).count() == node_count
+        tree = FlowTree.objects.get(root_id=ROOT_ID).tree
+        assert len(tree["activities"]) == SUB_FLOW_COUNT
+        assert "inputs" not in tree["data"]
+        assert "sensitive" not in str(tree)
+
+    def test_hide_sensitive_data(self):
+        tree = {"inputs": {"password": "x"}, "activities": {"a": {"inputs": 1, "name": "a"}}, "list": [1]}
+        insensitive_tree = Builder.hide_sensitive_data(tree)
+        assert insensitive_tree == {"activities": {"a": {"name": "a"}}, "list": [1]}
+        # 原 pipeline 保持不变
+        assert tree["inputs"] == {"password": "x"} and tree["activities"]["a"]["inputs"] == 1
+
+    @patch("backend.flow.engine.bamboo.scene.common.builder.api.run_pipeline", MagicMock())
+    def test_discard_flow_nodes_on_build_failure(self):
+        data = {"uid": "1", "ticket_type": TicketType.REDIS_CLUSTER_APPLY, "bk_biz_id": 1, "created_by": "admin"}
+        # 构建中途失败的流程，登记的节点随 builder 丢弃
+        failed_pipeline = Builder(root_id=ROOT_ID, data=data)
+        failed_sub_pipeline = SubBuilder(root_id=ROOT_ID, data=data)
+        failed_sub_pipeline.add_act(act_name="failed", act_component_code=ACT_COMPONENT_CODE, kwargs={})
+        with pytest.raises(Exception):
+            failed_pipeline.add_parallel_sub_pipeline(sub_flow_list=[])
+
+        # 相同 root_id 重新构建时只写入本次流程的节点，包括嵌套子流程的节点
+        pipeline = Builder(root_id=ROOT_ID, data=data)
+        inner_sub_pipeline = SubBuilder(root_id=ROOT_ID, data=data)
+        inner_sub_pipeline.add_act(act_name="inner", act_component_code=ACT_COMPONENT_CODE, kwargs={})
+        sub_pipeline = SubBuilder(root_id=ROOT_ID, data=data)
+        sub_pipeline.add_act(act_name="outer", act_component_code=ACT_COMPONENT_CODE, kwargs={})
+        sub_pipeline.add_sub_pipeline(inner_sub_pipeline.build_sub_process(sub_name="inner"))
+        pipeline.add_sub_pipeline(sub_pipeline.build_sub_process(sub_name="outer"))
+        pipeline.add_act(act_name="main", act_component_code=ACT_COMPONENT_CODE, kwargs={})
+        assert pipeline.run_pipeline()
+
+        assert FlowNode.objects.filter(root_id=ROOT_ID).count() == 3
+        assert not pipeline.pending_flow_nodes
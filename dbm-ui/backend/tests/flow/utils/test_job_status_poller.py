@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import pytest
+
+from backend.flow.utils.job_status_poller import (
+    JOB_POLL_MAX_AGE,
+    JOB_POLL_MAX_INTERVAL,
+    JOB_POLL_MIN_INTERVAL,
+    JOB_WAKEUP_MAX_RETRIES,
+    JOB_WAKEUP_RETRY_INTERVAL,
+    JobStatusPoller,
+)
+from backend.tests.mock_data.components.job import JOB_SUCCESS_STATUS, JobApiFake
+from backend.utils.redis import RedisConn
+
+JOB_COUNT = 50
+JOB_DURATION = 600
+# 原有的节点轮询间隔
+STATIC_INTERVAL = 5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class FakeWaker:
+    """记录被唤醒的节点，前 fail_times 次唤醒失败"""
+
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.woken_nodes = []
+
+    def __call__(self, node_id, version, data):
+        if self.fail_times:
+            self.fail_times -= 1
+            return False
+        self.woken_nodes.append(node_id)
+        return True
+
+
+class FakeFailer:
+    """记录被强制失败的节点"""
+
+    def __init__(self):
+        self.failed_nodes = []
+
+    def __call__(self, node_id, version, ex_data):
+        self.failed_nodes.append(node_id)
+        return True
+
+
+@pytest.fixture
+def poller_factory():
+    key_prefix = "dbm:test:job_status_poller"
+
+    def factory(job_api, waker, failer=None):
+        return JobStatusPoller(
+            redis=RedisConn, job_api=job_api, waker=waker, failer=failer or FakeFailer(), key_prefix=key_prefix
+        )
+
+    yield factory
+    keys = RedisConn.keys(f"{key_prefix}:*")
+    if keys:
+        RedisConn.delete(*keys)
+
+
+def run_until(poller, clock, end):
+    while clock.now < end:
+        clock.now += 1
+        poller.poll_once(now=clock.now)
+
+
+class TestJobStatusPoller:
+    def test_poll_interval(self):
+        assert JobStatusPoller.get_poll_interval(0) == JOB_POLL_MIN_INTERVAL
+        assert JobStatusPoller.get_poll_interval(3600) == JOB_POLL_MAX_INTERVAL
+        assert JOB_POLL_MIN_INTERVAL < JobStatusPoller.get_poll_interval(100) < JOB_POLL_MAX_INTERVAL
+        # 不越过预计完成时间
+        assert JobStatusPoller.get_poll_interval(298, expected=300) == JOB_POLL_MIN_INTERVAL
+        assert JobStatusPoller.get_poll_interval(200, expected=230) == 30
+
+    def test_poll_and_wake_up(self, poller_factory):
+        clock, waker = FakeClock(), FakeWaker()
+        job_api = JobApiFake(duration=JOB_DURATION, clock=clock)
+        poller = poller_factory(job_api, waker)
+
+        job_ids = [job_api.create_job() for _ in range(JOB_COUNT)]
+        for job_id in job_ids:
+            poller.register(job_id, root_id="root", node_id=f"node{job_id}", version="v1", service="FakeService")
+
+        run_until(poller, clock, clock.now + JOB_DURATION - 1)
+        assert not waker.woken_nodes
+
+        run_until(poller, clock, clock.now + JOB_POLL_MAX_INTERVAL + 1)
+        assert sorted(waker.woken_nodes) == sorted(f"node{job_id}" for job_id in job_ids)
+        assert poller.get_result(job_ids[0])["data"]["job_instance"]["status"] == JOB_SUCCESS_STATUS
+        assert not RedisConn.zcard(poller.queue_key)
+        assert poller.get_expected_durations()["FakeService"] >= JOB_DURATION
+
+        # 相比每个节点固定间隔轮询，查询次数大幅减少
+        assert job_api.status_queries < JOB_COUNT * JOB_DURATION / STATIC_INTERVAL / 3
+
+    def test_wake_up_retry(self, poller_factory):
+        clock, waker = FakeClock(), FakeWaker(fail_times=2)
+        job_api = JobApiFake(duration=1, clock=clock)
+        poller = poller_factory(job_api, waker)
+
+        job_id = job_api.create_job()
+        poller.register(job_id, root_id="root", node_id="node", version="v1", service="FakeService")
+        run_until(poller, clock, clock.now + JOB_POLL_MIN_INTERVAL + JOB_WAKEUP_RETRY_INTERVAL * 2 + 1)
+
+        assert waker.woken_nodes == ["node"]
+        # 唤醒重试时不再重复查询任务状态
+        assert job_api.status_queries == 1
+
+    def test_fail_node_after_wake_up_give_up(self, poller_factory):
+        clock, waker, failer = FakeClock(), FakeWaker(fail_times=JOB_WAKEUP_MAX_RETRIES + 1), FakeFailer()
+        job_api = JobApiFake(duration=1, clock=clock)
+        poller = poller_factory(job_api, waker, failer)
+
+        job_id = job_api.create_job()
+        poller.register(job_id, root_id="root", node_id="node", version="v1", service="FakeService")
+        run_until(
+            poller, clock, clock.now + JOB_POLL_MIN_INTERVAL + JOB_WAKEUP_RETRY_INTERVAL * JOB_WAKEUP_MAX_RETRIES + 1
+        )
+
+        # 唤醒多次失败后强制失败节点，不再跟踪
+        assert not waker.woken_nodes
+        assert failer.failed_nodes == ["node"]
+        assert not RedisConn.zcard(poller.queue_key)
+
+    def test_fail_node_exceed_max_age(self, poller_factory):
+        clock, waker, failer = FakeClock(), FakeWaker(), FakeFailer()
+        job_api = JobApiFake(duration=JOB_POLL_MAX_AGE * 2, clock=clock)
+        poller = poller_factory(job_api, waker, failer)
+
+        job_id = job_api.create_job()
+        poller.register(job_id, root_id="root", node_id="node", version="v1", service="FakeService")
+        clock.now += JOB_POLL_MAX_AGE + 1
+        poller.poll_once(now=clock.now)
+
+        assert failer.failed_nodes == ["node"]
+        assert not RedisConn.zcard(poller.queue_key)
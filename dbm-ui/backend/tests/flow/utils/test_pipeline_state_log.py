@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import pytest
+
+from backend.flow.utils.pipeline_state_log import PipelineStateLog
+from backend.utils.redis import RedisConn
+
+ROOT_ID = "test0pipeline0state0log"
+
+
+@pytest.fixture
+def state_log():
+    state_log = PipelineStateLog(redis=RedisConn, key_prefix="dbm:test:pipeline_state_log")
+    state_log.clear(ROOT_ID)
+    yield state_log
+    state_log.clear(ROOT_ID)
+
+
+class TestPipelineStateLog:
+    def test_get_changes(self, state_log):
+        assert state_log.get_version(ROOT_ID) is None
+        assert state_log.get_changes(ROOT_ID, 0) == (None, None)
+
+        v1 = state_log.record(ROOT_ID, ["act1", "sub1"])
+        v2 = state_log.record(ROOT_ID, ["act2", "sub1"])
+        assert v2 == v1 + 1 == state_log.get_version(ROOT_ID)
+
+        version, node_ids = state_log.get_changes(ROOT_ID, v1)
+        assert version == v2 and sorted(node_ids) == ["act2", "sub1"]
+        assert state_log.get_changes(ROOT_ID, v2) == (v2, [])
+        # 游标超出记录的范围时无法计算增量
+        assert state_log.get_changes(ROOT_ID, v2 + 1) == (v2, None)
+        assert state_log.get_changes(ROOT_ID, v1 - 2) == (v2, None)
+
+    def test_version_after_expired(self, state_log):
+        version = state_log.record(ROOT_ID, ["act1"])
+        # 记录过期重建后，旧游标不会被当作没有变化
+        state_log.clear(ROOT_ID)
+        time.sleep(0.01)
+        new_version = state_log.record(ROOT_ID, ["act2"])
+        assert new_version > version
+        assert state_log.get_changes(ROOT_ID, version) == (new_version, None)
+
+    def test_get_changed_nodes(self):
+        pipeline_states = {
+            ROOT_ID: {
+                "children": {
+                    "sub1": {"parent_id": ROOT_ID},
+                    "sub2": {"parent_id": "sub1"},
+                    "act1": {"parent_id": "sub2"},
+                    "act2": {"parent_id": ROOT_ID},
+                }
+            }
+        }
+        assert PipelineStateLog.get_changed_nodes("act1", ROOT_ID, pipeline_states) == ["act1", "sub2", "sub1"]
+        assert PipelineStateLog.get_changed_nodes("act2", ROOT_ID, pipeline_states) == ["act2"]
+        assert PipelineStateLog.get_changed_nodes(ROOT_ID, ROOT_ID, pipeline_states) == [ROOT_ID]
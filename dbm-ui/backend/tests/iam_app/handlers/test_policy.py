@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from django.utils.crypto import get_random_string
+from iam import Resource
+
+from backend import env
+from backend.iam_app.dataclass.actions import ActionEnum
+from backend.iam_app.dataclass.resources import ResourceEnum
+from backend.iam_app.handlers.permission import Permission
+from backend.iam_app.handlers.policy import compile_policy, policy_cache
+from backend.tests.mock_data.iam_app.iam import FakeIAM
+
+pytestmark = pytest.mark.django_db
+
+ACTIONS = [ActionEnum.MYSQL_VIEW, ActionEnum.MYSQL_ENABLE_DISABLE]
+
+
+def make_cluster(cluster_id: int, bk_biz_id: int, creator: str = "admin") -> Resource:
+    attribute = {"creator": creator, "_bk_iam_path_": f"/{ResourceEnum.BUSINESS.id},{bk_biz_id}/"}
+    return Resource(env.BK_IAM_SYSTEM_ID, ResourceEnum.MYSQL.id, str(cluster_id), attribute)
+
+
+@pytest.fixture
+def permission_factory():
+    usernames = []
+
+    def factory(iam: FakeIAM) -> Permission:
+        username = get_random_string(10)
+        usernames.append(username)
+        permission = Permission(username=username)
+        permission._iam = iam
+        return permission
+
+    yield factory
+    for username in usernames:
+        policy_cache.invalidate(username)
+
+
+class TestCompilePolicy:
+    @pytest.mark.parametrize(
+        "policy, obj_set, expected",
+        [
+            ({}, {"mysql": {"id": "1"}}, False),
+            ({"op": "any", "field": "mysql.id", "value": []}, {}, True),
+            ({"op": "eq", "field": "mysql.id", "value": "1"}, {"mysql": {"id": "1"}}, True),
+            ({"op": "in", "field": "mysql.id", "value": ["1", "2"]}, {"mysql": {"id": "3"}}, False),
+            # in 的策略值必须为数组
+            ({"op": "in", "field": "mysql.id", "value": "1"}, {"mysql": {"id": "1"}}, False),
+            # 属性为数组时，肯定操作符命中一个即可，否定操作符需要全部满足
+            ({"op": "eq", "field": "mysql.tag", "value": "a"}, {"mysql": {"tag": ["a", "b"]}}, True),
+            ({"op": "not_eq", "field": "mysql.tag", "value": "a"}, {"mysql": {"tag": ["a", "b"]}}, False),
+            ({"op": "contains", "field": "mysql.tag", "value": "b"}, {"mysql": {"tag": ["a", "b"]}}, True),
+            ({"op": "contains", "field": "mysql.tag", "value": "b"}, {"mysql": {"tag": "b"}}, False),
+            # 拓扑路径的通配会去掉末尾的 *
+            (
+                {"op": "starts_with", "field": "mysql._bk_iam_path_", "value": "/biz,1/mysql,*/"},
+                {"mysql": {"_bk_iam_path_": "/biz,1/mysql,2/"}},
+                True,
+            ),
+            ({"op": "starts_with", "field": "mysql.creator", "value": "ad"}, {"mysql": {"id": "1"}}, False),
+            (
+                {
+                    "op": "OR",
+                    "content": [
+                        {"op": "eq", "field": "mysql.creator", "value": "tester"},
+                        {
+                            "op": "AND",
+                            "content": [
+                                {"op": "gte", "field": "mysql.id", "value": 10},
+                                {"op": "not_in", "field": "mysql.id", "value": [12]},
+                            ],
+                        },
+                    ],
+                },
+                {"mysql": {"id": 11, "creator": "admin"}},
+                True,
+            ),
+        ],
+    )
+    def test_eval(self, policy, obj_set, expected):
+        assert compile_policy(policy)(obj_set) == expected
+
+    def test_compile_once(self):
+        policy = {"op": "in", "field": "mysql.id", "value": ["1", "2"]}
+        assert compile_policy(policy) is compile_policy(dict(policy))
+
+    def test_unsupported_operator(self):
+        with pytest.raises(ValueError):
+            compile_policy({"op": "unknown", "field": "mysql.id", "value": "1"})
+
+
+class TestPolicyCache:
+    def test_batch_is_allowed(self, permission_factory):
+        iam = FakeIAM()
+        permission = permission_factory(iam)
+        path_policy = {"op": "starts_with", "field": "mysql._bk_iam_path_", "value": "/biz,1/"}
+        iam.set_policy(permission.username, ActionEnum.MYSQL_VIEW.id, path_policy)
+
+        resources_list = [[make_cluster(cluster_id, cluster_id % 2)] for cluster_id in range(1, 5)]
+        assert permission.batch_is_allowed(ACTIONS, resources_list) == {
+            str(cluster_id): {
+                ActionEnum.MYSQL_VIEW.id: cluster_id % 2 == 1,
+                ActionEnum.MYSQL_ENABLE_DISABLE.id: False,
+            }
+            for cluster_id in range(1, 5)
+        }
+
+        # 翻页时直接使用缓存的策略，不再查询权限中心
+        resources_list = [[make_cluster(cluster_id, 1)] for cluster_id in range(5, 10)]
+        result = permission.batch_is_allowed(ACTIONS, resources_list)
+        assert all(perms[ActionEnum.MYSQL_VIEW.id] for perms in result.values())
+        assert iam.policy_queries == 1
+
+    def test_policy_query(self, permission_factory):
+        iam = FakeIAM()
+        permission = permission_factory(iam)
+        biz_policy = {"op": "in", "field": "biz.id", "value": ["1", "3"]}
+        iam.set_policy(permission.username, ActionEnum.MYSQL_VIEW.id, biz_policy)
+
+        assert permission.policy_query(ActionEnum.MYSQL_VIEW, [1, 2, 3]) == [1, 3]
+        assert permission.policy_query(ActionEnum.MYSQL_VIEW.id, [2, 3]) == [3]
+        assert iam.policy_queries == 1
+
+    def test_policy_query_deny_on_error(self, permission_factory):
+        iam = FakeIAM()
+        permission = permission_factory(iam)
+        # 不支持的操作符编译失败，按无权限处理
+        iam.set_policy(
+            permission.username, ActionEnum.MYSQL_VIEW.id, {"op": "unknown", "field": "biz.id", "value": "1"}
+        )
+        assert permission.policy_query(ActionEnum.MYSQL_VIEW, [1, 2, 3]) == []
+
+    def test_sensitive_cache_time(self, permission_factory, monkeypatch):
+        """非查看类动作使用更短的缓存时间，缓存时间为 0 时每次都查询权限中心，回收权限后立即生效"""
+        monkeypatch.setattr(policy_cache, "sensitive_cache_time", 0)
+        assert policy_cache.get_cache_time(ActionEnum.MYSQL_VIEW.id) == policy_cache.cache_time
+        assert policy_cache.get_cache_time(ActionEnum.MYSQL_ENABLE_DISABLE.id) == 0
+
+        iam = FakeIAM()
+        permission = permission_factory(iam)
+        for action in ACTIONS:
+            iam.set_policy(permission.username, action.id, {"op": "any", "field": "mysql.id", "value": []})
+        resources_list = [[make_cluster(1, 1)]]
+        assert all(permission.batch_is_allowed(ACTIONS, resources_list)["1"].values())
+
+        iam.policies[permission.username].clear()
+        assert permission.batch_is_allowed(ACTIONS, resources_list)["1"] == {
+            ActionEnum.MYSQL_VIEW.id: True,
+            ActionEnum.MYSQL_ENABLE_DISABLE.id: False,
+        }
+        assert iam.policy_queries == 2
+
+    def test_invalidate_on_grant(self, permission_factory):
+        iam = FakeIAM(creator_actions=[ActionEnum.MYSQL_VIEW.id])
+        permission = permission_factory(iam)
+        resources_list = [[make_cluster(1, 1, creator=permission.username)]]
+        assert not permission.batch_is_allowed(ACTIONS, resources_list)["1"][ActionEnum.MYSQL_VIEW.id]
+
+        permission.grant_creator_actions(resources_list[0][0])
+        assert permission.batch_is_allowed(ACTIONS, resources_list)["1"][ActionEnum.MYSQL_VIEW.id]
+        assert iam.policy_queries == 2
+
+    def test_benchmark_list_view(self, permission_factory):
+        """模拟权限中心的查询耗时，多次翻页只有首次需要查询权限中心，耗时只计入一次查询"""
+        iam = FakeIAM(delay=0.05)
+        permission = permission_factory(iam)
+        policy = {"op": "in", "field": "mysql.id", "value": [str(cluster_id) for cluster_id in range(0, 1000, 2)]}
+        for action in ACTIONS:
+            iam.set_policy(permission.username, action.id, policy)
+
+        for page in range(20):
+            resources_list = [[make_cluster(page * 50 + index, 1)] for index in range(50)]
+            result = permission.batch_is_allowed(ACTIONS, resources_list)
+            assert result[str(page * 50)][ActionEnum.MYSQL_VIEW.id]
+            assert not result[str(page * 50 + 1)][ActionEnum.MYSQL_ENABLE_DISABLE.id]
+
+        assert iam.policy_queries == 1
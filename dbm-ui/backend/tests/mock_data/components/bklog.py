@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import json
 
 LOG_DATA = {
     "result": True,
@@ -116,3 +117,32 @@ class BKLogApiMock(object):
     def list_collectors(cls, *args, **kwargs):
         data = BK_LOG_LIST_COLLECTOR_DATA
         return data["data"]
+
+
+class BKLogScrollApiMock(object):
+    """
+    支持 scroll 分页的 bklog 接口 mock，非 scroll 查询最多返回 10000 条
+    """
+
+    MAX_RESULT_WINDOW = 10000
+
+    def __init__(self, logs):
+        self.logs = logs
+        self.search_params = []
+        self.scroll_params = []
+
+    def _page(self, start, size, scroll):
+        hits = [{"_source": {"log": json.dumps(log)}} for log in self.logs[start : start + size]]
+        resp = {"hits": {"hits": hits, "total": len(self.logs)}}
+        if scroll:
+            resp["_scroll_id"] = f"{start + size}:{size}"
+        return resp
+
+    def esquery_search(self, params, *args, **kwargs):
+        self.search_params.append(params)
+        return self._page(params["start"], min(params["size"], self.MAX_RESULT_WINDOW), params.get("scroll"))
+
+    def esquery_scroll(self, params, *args, **kwargs):
+        self.scroll_params.append(params)
+        start, size = map(int, params["scroll_id"].split(":"))
+        return self._page(start, size, params["scroll"])
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import re
+import threading
+import time
+from typing import Dict, List
+
+
+class BKMonitorV3FakeApi:
+    """
+    本地模拟的监控平台 unify_query，按 PromQL 中的 appid 过滤返回集群容量，用于容量同步的测试和压测
+    每个集群的已用容量固定为 used，总容量固定为 total
+    """
+
+    def __init__(self, biz_domains: Dict[int, List[str]], used=10, total=100, latency=0, failed_biz_ids=None):
+        self.biz_domains = biz_domains
+        self.used, self.total = used, total
+        self.latency = latency
+        self.failed_biz_ids = set(failed_biz_ids or [])
+        self.queries: List[str] = []
+        # 同时在途的查询数，用于检查并发度
+        self.inflight = self.max_inflight = 0
+        self._lock = threading.Lock()
+
+    def unify_query(self, params):
+        promql = params["query_configs"][0]["promql"]
+        with self._lock:
+            self.queries.append(promql)
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return self._query(promql, params)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def _query(self, promql, params):
+        bk_biz_ids = [int(bk_biz_id) for bk_biz_id in re.search(r'appid=~"([^"]*)"', promql).group(1).split("|")]
+        if self.failed_biz_ids & set(bk_biz_ids):
+            raise Exception("unify_query timeout")
+
+        value = self.used if "used" in promql else self.total
+        series = [
+            {"dimensions": {"cluster_domain": domain}, "datapoints": [[value, int(time.time() * 1000)]]}
+            for bk_biz_id in bk_biz_ids
+            for domain in self.biz_domains.get(bk_biz_id, [])
+        ]
+        return {"series": series[: params["slimit"]]}
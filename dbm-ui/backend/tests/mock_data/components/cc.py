@@ -10,7 +10,9 @@ specific language governing permissions and limitations under the License.
 """
 import copy
 
+from backend import env
 from backend.components import CCApi
+from backend.exceptions import ApiResultError
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.utils import raw_response
 
@@ -266,3 +268,103 @@ class CCApiMock:
         if kwargs.get("raw"):
             return {"result": True}
         return
+
+
+class FakeCCEventStream:
+    """
+    模拟 CMDB 的主机、主机关系数据和 resource_watch 事件流
+    每次变更同时修改数据并追加事件，游标为事件序号，expire_cursor 后旧游标不可用
+    fail_times 大于 0 时，resource_watch 模拟 CMDB 的临时性错误
+    """
+
+    def __init__(self):
+        self.hosts = {}
+        self.relations = {}
+        self.events = []
+        self.expired_before = 0
+        self.fail_times = 0
+
+    def _append_event(self, resource, event_type, detail):
+        self.events.append(
+            {
+                "bk_cursor": str(len(self.events) + 1),
+                "bk_resource": resource,
+                "bk_event_type": event_type,
+                "bk_detail": copy.deepcopy(detail),
+            }
+        )
+
+    def add_host(self, bk_host_id, bk_biz_id, bk_module_id, bk_set_id=constant.BK_SET_ID, **host):
+        host.update(bk_host_id=bk_host_id)
+        host.setdefault("bk_cloud_id", 0)
+        host.setdefault("bk_host_innerip", f"127.0.1.{bk_host_id}")
+        self.hosts[bk_host_id] = host
+        self._append_event("host", "create", host)
+        self.transfer_host(bk_host_id, bk_biz_id, bk_module_id, bk_set_id)
+
+    def update_host(self, bk_host_id, **host):
+        self.hosts[bk_host_id].update(host)
+        self._append_event("host", "update", self.hosts[bk_host_id])
+
+    def transfer_host(self, bk_host_id, bk_biz_id, bk_module_id, bk_set_id=constant.BK_SET_ID):
+        old_relation = self.relations.get(bk_host_id)
+        if old_relation:
+            self._append_event("host_relation", "delete", old_relation)
+        self.relations[bk_host_id] = {
+            "bk_host_id": bk_host_id,
+            "bk_biz_id": bk_biz_id,
+            "bk_set_id": bk_set_id,
+            "bk_module_id": bk_module_id,
+        }
+        self._append_event("host_relation", "create", self.relations[bk_host_id])
+
+    def delete_host(self, bk_host_id):
+        self._append_event("host_relation", "delete", self.relations.pop(bk_host_id))
+        self._append_event("host", "delete", self.hosts.pop(bk_host_id))
+
+    def expire_cursor(self):
+        self.expired_before = len(self.events)
+
+    def resource_watch(self, params, *args, **kwargs):
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ApiResultError("internal error", code=1199000)
+        if "bk_cursor" in params:
+            start = int(params["bk_cursor"])
+            if start < self.expired_before:
+                raise ApiResultError("cursor expired", code=env.CC_WATCH_CURSOR_EXPIRED_CODES[0])
+        else:
+            start = len(self.events)
+
+        events = [event for event in self.events[start:] if event["bk_resource"] == params["bk_resource"]]
+        if not events:
+            # 没有新事件时只返回最新的游标
+            return {"bk_watched": False, "bk_events": [{"bk_cursor": str(len(self.events)), "bk_detail": None}]}
+        return {"bk_watched": True, "bk_events": events}
+
+    def _list_hosts(self, params, host_ids):
+        rules = params.get("host_property_filter", {}).get("rules") or []
+        for rule in rules:
+            if rule["field"] == "bk_host_id" and rule["operator"] == "in":
+                host_ids = [host_id for host_id in host_ids if host_id in rule["value"]]
+        page = params["page"]
+        hosts = [copy.deepcopy(self.hosts[host_id]) for host_id in sorted(host_ids)]
+        return {"count": len(hosts), "info": hosts[page["start"] : page["start"] + page["limit"]]}
+
+    def list_biz_hosts(self, params, *args, **kwargs):
+        host_ids = [
+            host_id for host_id, relation in self.relations.items() if relation["bk_biz_id"] == params["bk_biz_id"]
+        ]
+        return self._list_hosts(params, host_ids)
+
+    def list_hosts_without_biz(self, params, *args, **kwargs):
+        return self._list_hosts(params, list(self.hosts))
+
+    def find_host_topo_relation(self, params, *args, **kwargs):
+        relations = [
+            copy.deepcopy(relation)
+            for relation in self.relations.values()
+            if relation["bk_biz_id"] == params["bk_biz_id"]
+        ]
+        page = params["page"]
+        return {"count": len(relations), "data": relations[page["start"] : page["start"] + page["limit"]]}
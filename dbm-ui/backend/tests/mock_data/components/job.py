@@ -8,9 +8,13 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import threading
+import time
+from typing import Callable, Dict, Set, Tuple
 
 JOB_INSTANCE_ID = 10000
 STEP_INSTANCE_ID = 10001
+JOB_RUNNING_STATUS = 2
 JOB_SUCCESS_STATUS = 3
 
 
@@ -56,3 +60,79 @@ class JobApiMock(object):
             "step_instance_id": STEP_INSTANCE_ID,
         }
         return {**cls.base_info, "data": data}
+
+
+class JobApiFake:
+    """
+    本地模拟的 job 平台：任务在提交 duration 秒后执行成功，并记录状态查询次数，用于 job 状态轮询的测试和压测
+    clock 为当前时间的获取函数，测试中可以替换为模拟时钟
+    """
+
+    def __init__(
+        self,
+        duration: float = 10,
+        clock: Callable[[], float] = time.time,
+        latency: float = 0,
+        ip_logs: Dict[str, str] = None,
+        batch_log_ips: Set[str] = None,
+    ):
+        self.duration = duration
+        self.clock = clock
+        self.latency = latency
+        # ip -> 任务日志，batch_log_ips 为批量日志接口能返回的 IP，为 None 时表示全部可以返回
+        self.ip_logs = ip_logs or {}
+        self.batch_log_ips = batch_log_ips
+        self.status_queries = 0
+        self.batch_log_queries = 0
+        self.ip_log_queries = 0
+        # job_instance_id -> (开始时间, 耗时)
+        self.jobs: Dict[int, Tuple[float, float]] = {}
+        self._next_id = JOB_INSTANCE_ID
+        self._lock = threading.Lock()
+
+    def create_job(self, duration: float = None) -> int:
+        with self._lock:
+            self._next_id += 1
+            self.jobs[self._next_id] = (self.clock(), duration or self.duration)
+            return self._next_id
+
+    def fast_execute_script(self, payload, raw=True):
+        data = {
+            "job_instance_name": f"API Quick execution script{payload['bk_biz_id']}",
+            "job_instance_id": self.create_job(),
+            "step_instance_id": STEP_INSTANCE_ID,
+        }
+        return {**JobApiMock.base_info, "data": data}
+
+    def get_job_instance_status(self, payload, raw=True):
+        with self._lock:
+            self.status_queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        start_time, duration = self.jobs[payload["job_instance_id"]]
+        finished = self.clock() - start_time >= duration
+        status = JOB_SUCCESS_STATUS if finished else JOB_RUNNING_STATUS
+        data = {
+            "finished": finished,
+            "job_instance": {"job_instance_id": payload["job_instance_id"], "status": status},
+            "step_instance_list": [{"status": status, "step_instance_id": STEP_INSTANCE_ID}],
+        }
+        return {**JobApiMock.base_info, "data": data}
+
+    def batch_get_job_instance_ip_log(self, payload, raw=True):
+        with self._lock:
+            self.batch_log_queries += 1
+        script_task_logs = [
+            {**host, "log_content": self.ip_logs[host["ip"]]}
+            for host in payload["ip_list"]
+            if host["ip"] in self.ip_logs and (self.batch_log_ips is None or host["ip"] in self.batch_log_ips)
+        ]
+        return {**JobApiMock.base_info, "data": {"script_task_logs": script_task_logs}}
+
+    def get_job_instance_ip_log(self, payload, raw=True):
+        with self._lock:
+            self.ip_log_queries += 1
+        if payload["ip"] not in self.ip_logs:
+            return {**JobApiMock.base_info, "result": False, "data": None}
+        return {**JobApiMock.base_info, "data": {"ip": payload["ip"], "log_content": self.ip_logs[payload["ip"]]}}
@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import time
 
 
 class NodemanApiMock(object):
@@ -17,3 +18,22 @@ class NodemanApiMock(object):
 
     def ipchooser_host_details(self, *args, **kwargs):
         return {}
+
+
+class NodemanApiFake(object):
+    """
+    记录调用的 nodeman 接口，主机ID为偶数的 Agent 存活
+    """
+
+    def __init__(self, delay=0, error=None):
+        self.delay = delay
+        self.error = error
+        self.queried_host_ids = []
+
+    def ipchooser_host_details(self, params, *args, **kwargs):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        host_ids = [host["host_id"] for host in params["host_list"]]
+        self.queried_host_ids.append(host_ids)
+        return [{"host_id": host_id, "alive": int(host_id % 2 == 0)} for host_id in host_ids]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from iam import MultiActionRequest
+
+
+class FakeIAM:
+    """
+    权限中心的 fake 后端：按 用户+动作 返回预设的策略，并记录策略查询次数，用于测试和压测策略缓存
+    授权创建者权限时，为创建者在 creator_actions 上追加该资源实例的策略
+    """
+
+    def __init__(self, creator_actions: List[str] = None, delay: float = 0):
+        self.creator_actions = creator_actions or []
+        self.delay = delay
+        self.policies: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        self.policy_queries = 0
+        self.grants = []
+
+    def set_policy(self, username: str, action_id: str, policy: Dict):
+        self.policies[username][action_id] = policy
+
+    def _do_policy_query_by_actions(self, request: MultiActionRequest, with_resources=True):
+        self.policy_queries += 1
+        time.sleep(self.delay)
+        user_policies = self.policies[request.subject.id]
+        return [
+            {"action": {"id": action.id}, "condition": user_policies[action.id]}
+            for action in request.actions
+            if user_policies.get(action.id)
+        ]
+
+    def grant_resource_creator_actions(self, application: Dict, bk_token: str, bk_username: str):
+        self.grants.append(application)
+        instance_policy = {"op": "eq", "field": f"{application['type']}.id", "value": application["id"]}
+        for action_id in self.creator_actions:
+            policy = self.policies[application["creator"]].get(action_id)
+            if policy:
+                instance_policy = {"op": "OR", "content": [policy, instance_policy]}
+            self.set_policy(application["creator"], action_id, instance_policy)
+        return {"result": True}
+
+    def grant_resource_creator_action_attributes(self, application: Dict, bk_token: str, bk_username: str):
+        self.grants.append(application)
+        return {"result": True}
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+
+import pytest
+
+from backend.db_meta.exceptions import ClusterExclusiveOperateException
+from backend.db_meta.models import Cluster
+from backend.ticket.constants import (
+    EXCLUSIVE_TICKET_EXCEL_PATH,
+    EXCLUSIVE_TICKET_MATRIX_PATH,
+    FlowType,
+    TicketFlowStatus,
+    TicketStatus,
+    TicketType,
+)
+from backend.ticket.exclusive import ExclusiveTicketMatrix
+from backend.ticket.models import ClusterOperateRecord, Flow, Ticket
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+
+
+def create_running_record(cluster_id, ticket_type):
+    ticket = Ticket.objects.create(bk_biz_id=1, ticket_type=ticket_type, status=TicketStatus.RUNNING, remark="")
+    flow = Flow.objects.create(
+        ticket=ticket, flow_type=FlowType.INNER_FLOW, flow_obj_id=f"root_{ticket.id}", status=TicketFlowStatus.RUNNING
+    )
+    return ClusterOperateRecord.objects.create(cluster_id=cluster_id, ticket=ticket, flow=flow, creator="admin")
+
+
+class TestExclusiveTicketMatrix:
+    def test_compiled_matrix_is_up_to_date(self):
+        # 修改 exclusive_ticket.xlsx 后需要执行 compile_exclusive_ticket_matrix 重新编译
+        with open(EXCLUSIVE_TICKET_MATRIX_PATH) as f:
+            compiled = json.load(f)
+        assert compiled["excel_sha256"] == ExclusiveTicketMatrix.file_digest(EXCLUSIVE_TICKET_EXCEL_PATH)
+        assert compiled["matrix"] == ExclusiveTicketMatrix.from_excel().to_dict()
+
+    def test_load_outdated_matrix(self, tmp_path):
+        matrix_path = str(tmp_path / "exclusive_ticket.json")
+        with open(matrix_path, "w") as f:
+            json.dump({"excel_sha256": "outdated", "matrix": {}}, f)
+
+        # 编译结果与 excel 不一致时回退为解析 excel
+        exclusive_matrix = ExclusiveTicketMatrix.load(matrix_path=matrix_path)
+        assert exclusive_matrix.is_exclusive(TicketType.MYSQL_IMPORT_SQLFILE, TicketType.MYSQL_HA_FULL_BACKUP)
+
+        ExclusiveTicketMatrix.compile(matrix_path=matrix_path)
+        assert ExclusiveTicketMatrix.load(matrix_path=matrix_path).to_dict() == exclusive_matrix.to_dict()
+
+    def test_get_exclusive_operations(self, django_assert_num_queries):
+        exclusive_record = create_running_record(1, TicketType.MYSQL_HA_FULL_BACKUP)
+        create_running_record(2, TicketType.MYSQL_HA_DB_TABLE_BACKUP)
+
+        with django_assert_num_queries(1):
+            exclusive_operations = ClusterOperateRecord.objects.get_exclusive_operations(
+                TicketType.MYSQL_IMPORT_SQLFILE, [1, 2, 3]
+            )
+        assert list(exclusive_operations.keys()) == [1]
+        assert exclusive_operations[1][0]["exclusive_ticket"].id == exclusive_record.ticket_id
+        assert exclusive_operations[1][0]["root_id"] == exclusive_record.flow.flow_obj_id
+
+        # 重试自身单据时排除自身
+        assert not ClusterOperateRecord.objects.get_exclusive_operations(
+            TicketType.MYSQL_IMPORT_SQLFILE, [1], exclude_ticket_ids=[exclusive_record.ticket_id]
+        )
+        with pytest.raises(ClusterExclusiveOperateException):
+            Cluster.handle_exclusive_operations([3, 1], TicketType.MYSQL_IMPORT_SQLFILE)
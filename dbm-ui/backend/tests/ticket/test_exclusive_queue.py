@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.ticket.constants import FlowErrCode, FlowType, TicketFlowStatus, TicketStatus, TicketType
+from backend.ticket.exclusive_queue import ExclusiveWaitQueue
+from backend.ticket.flow_manager.inner import InnerFlow
+from backend.ticket.models import ClusterOperateRecord, Flow, Ticket
+from backend.ticket.tasks.ticket_tasks import TicketTask
+from backend.utils.redis import RedisConn
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def wait_queue():
+    wait_queue = ExclusiveWaitQueue(redis=RedisConn, key_prefix="dbm:test:exclusive_wait_queue")
+    wait_queue.clear()
+    with patch("backend.ticket.tasks.ticket_tasks.exclusive_wait_queue", wait_queue):
+        yield wait_queue
+    wait_queue.clear()
+
+
+def create_flow(status=TicketFlowStatus.RUNNING, err_code=None):
+    ticket = Ticket.objects.create(
+        bk_biz_id=1, ticket_type=TicketType.MYSQL_HA_FULL_BACKUP, status=TicketStatus.RUNNING, remark=""
+    )
+    return Flow.objects.create(
+        ticket=ticket, flow_type=FlowType.INNER_FLOW, flow_obj_id=f"root_{ticket.id}", status=status, err_code=err_code
+    )
+
+
+class TestExclusiveWaitQueue:
+    def test_release_in_fifo_order(self, wait_queue):
+        wait_queue.wait(3, [1], wait_at=30)
+        wait_queue.wait(1, [1, 2], wait_at=10)
+        wait_queue.wait(2, [2], wait_at=20)
+        assert wait_queue.get_waiting_cluster_ids() == {1, 2}
+        assert wait_queue.has_waiting_flows([1]) and not wait_queue.has_waiting_flows([3])
+
+        # 只释放集群1上等待的flow，同时等待集群2的flow也从集群2的队列中移除
+        assert wait_queue.release([1]) == [1, 3]
+        assert wait_queue.release([1]) == []
+        assert wait_queue.get_waiting_flow_ids() == {2}
+        assert wait_queue.release([2]) == [2]
+        assert not wait_queue.get_waiting_flow_ids()
+
+    def test_release_exclusive_inner_flow(self, wait_queue):
+        waiting_flows = [create_flow(err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR) for _ in range(3)]
+        for index, flow in enumerate(reversed(waiting_flows)):
+            wait_queue.wait(flow.id, [1], wait_at=index + 1)
+        # 已经被手动重试的flow不再重试
+        Flow.objects.filter(id=waiting_flows[1].id).update(err_code=None)
+
+        retried_flow_ids = []
+        with patch.object(InnerFlow, "retry", lambda self: retried_flow_ids.append(self.flow_obj.id)):
+            TicketTask.release_exclusive_inner_flow([1])
+        assert retried_flow_ids == [waiting_flows[2].id, waiting_flows[0].id]
+
+    def test_retry_exclusive_inner_flow(self, wait_queue):
+        # 集群2上仍有正在运行的inner flow，只释放空闲的集群1
+        running_flow = create_flow()
+        ClusterOperateRecord.objects.create(
+            cluster_id=2, flow=running_flow, ticket=running_flow.ticket, creator="admin"
+        )
+        idle_waiting_flow = create_flow(err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR)
+        busy_waiting_flow = create_flow(err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR)
+        wait_queue.wait(idle_waiting_flow.id, [1])
+        wait_queue.wait(busy_waiting_flow.id, [2])
+
+        retried_flow_ids = []
+        with patch.object(InnerFlow, "retry", lambda self: retried_flow_ids.append(self.flow_obj.id)):
+            TicketTask.retry_exclusive_inner_flow()
+        assert retried_flow_ids == [idle_waiting_flow.id]
+        assert wait_queue.get_waiting_flow_ids() == {busy_waiting_flow.id}
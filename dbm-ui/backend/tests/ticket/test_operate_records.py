@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.conf import settings
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIClient
+
+from backend.ticket.constants import TicketStatus, TicketType
+from backend.ticket.models import ClusterOperateRecord, Flow, InstanceOperateRecord, Ticket
+from backend.ticket.views import TicketViewSet
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+client = APIClient()
+client.login(username="admin")
+
+CLUSTER_ID = 1
+INSTANCE_ID = 1
+RECORD_COUNT = 2000
+
+
+@pytest.fixture(autouse=True)
+def set_empty_middleware():
+    with patch.object(settings, "MIDDLEWARE", []):
+        yield
+
+
+@pytest.fixture
+def operate_records():
+    Ticket.objects.bulk_create(
+        [
+            Ticket(bk_biz_id=1, ticket_type=TicketType.MYSQL_HA_FULL_BACKUP, status=TicketStatus.SUCCEEDED, remark="")
+            for _ in range(RECORD_COUNT)
+        ]
+    )
+    tickets = list(Ticket.objects.order_by("id"))
+    Flow.objects.bulk_create(
+        [Flow(ticket=ticket, flow_type="INNER_FLOW", flow_obj_id=str(ticket.id)) for ticket in tickets]
+    )
+    flows = list(Flow.objects.order_by("id"))
+    ClusterOperateRecord.objects.bulk_create(
+        [
+            ClusterOperateRecord(cluster_id=CLUSTER_ID, ticket=ticket, flow=flow, creator="admin")
+            for ticket, flow in zip(tickets, flows)
+        ]
+    )
+    InstanceOperateRecord.objects.bulk_create(
+        [
+            InstanceOperateRecord(instance_id=INSTANCE_ID, ticket=ticket, flow=flow, creator="admin")
+            for ticket, flow in zip(tickets, flows)
+        ]
+    )
+    yield
+
+
+@patch.object(TicketViewSet, "permission_classes", [AllowAny])
+@patch.object(TicketViewSet, "get_permissions", lambda x: [])
+class TestOperateRecords:
+    @pytest.mark.parametrize(
+        "url",
+        [
+            f"/apis/tickets/get_cluster_operate_records/?cluster_id={CLUSTER_ID}",
+            f"/apis/tickets/get_instance_operate_records/?instance_id={INSTANCE_ID}",
+        ],
+    )
+    def test_offset_pagination(self, url, operate_records, django_assert_max_num_queries):
+        # 分页在数据库完成：一次 count + 一次分页查询，与记录总数无关
+        with django_assert_max_num_queries(2):
+            resp = client.get(f"{url}&limit=10&offset=20")
+        data = resp.data
+        assert data["count"] == RECORD_COUNT
+        assert len(data["results"]) == 10
+        assert data["results"][0]["op_type"] == TicketType.get_choice_label(TicketType.MYSQL_HA_FULL_BACKUP)
+        assert data["results"][0]["op_status"] == TicketStatus.SUCCEEDED
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            f"/apis/tickets/get_cluster_operate_records/?cluster_id={CLUSTER_ID}",
+            f"/apis/tickets/get_instance_operate_records/?instance_id={INSTANCE_ID}",
+        ],
+    )
+    def test_cursor_pagination(self, url, operate_records, django_assert_max_num_queries):
+        ticket_ids, page_url = [], f"{url}&limit=500&cursor="
+        while page_url:
+            with django_assert_max_num_queries(1):
+                data = client.get(page_url).data
+            ticket_ids.extend(record["ticket_id"] for record in data["results"])
+            page_url = data["next"] and f"{url}&limit=500&cursor={parse_qs(urlparse(data['next']).query)['cursor'][0]}"
+
+        # 游标翻页不重复、不遗漏
+        assert len(ticket_ids) == len(set(ticket_ids)) == RECORD_COUNT
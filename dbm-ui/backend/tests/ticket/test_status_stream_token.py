@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend.ticket.views import TicketViewSet
+
+pytestmark = pytest.mark.django_db
+
+
+class TestStatusStreamToken:
+    @pytest.mark.parametrize("query, instance_ids", [({}, []), ({"ticket_ids": "1,,2"}, ["1", "2"])])
+    def test_permission_instance_ids(self, query, instance_ids):
+        view = TicketViewSet(action="status_stream_token")
+        request = Request(APIRequestFactory().get("/apis/tickets/status_stream_token/", query))
+        (permission,) = view.get_permissions()
+        # 缺少 ticket_ids 时不能在鉴权阶段抛出异常，交由参数校验返回 400
+        assert permission.get_instance_ids(request, view) == instance_ids
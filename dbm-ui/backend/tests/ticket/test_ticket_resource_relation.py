@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import importlib
+import logging
+import time
+
+import pytest
+from django.apps import apps
+
+from backend.ticket.constants import TicketResourceType, TicketStatus, TicketType
+from backend.ticket.exceptions import TicketDuplicationException
+from backend.ticket.handler import TicketHandler
+from backend.ticket.models import Ticket, TicketResourceRelation
+from backend.ticket.views import TicketViewSet
+
+pytestmark = pytest.mark.django_db
+logger = logging.getLogger("test")
+
+TICKET_TYPE = TicketType.MYSQL_HA_FULL_BACKUP
+CREATOR = "admin"
+RUNNING_TICKET_COUNT = 500
+
+
+def create_ticket(cluster_ids, status=TicketStatus.RUNNING, with_relations=True):
+    details = {"infos": [{"cluster_ids": cluster_ids}]}
+    ticket = Ticket.objects.create(
+        bk_biz_id=1, ticket_type=TICKET_TYPE, creator=CREATOR, status=status, remark="", details=details
+    )
+    if with_relations:
+        TicketResourceRelation.create_relations(ticket, {TicketResourceType.CLUSTER: cluster_ids})
+    return ticket
+
+
+class TestTicketResourceRelation:
+    def test_verify_duplicate_ticket(self):
+        create_ticket([1, 2])
+        create_ticket([3], status=TicketStatus.SUCCEEDED)
+        latest_ticket = create_ticket([2, 4])
+
+        # 没有交集，或者只与已结束的单据有交集
+        TicketViewSet()._verify_duplicate_ticket(TICKET_TYPE, {"infos": [{"cluster_ids": [3, 5]}]}, CREATOR)
+        TicketViewSet()._verify_duplicate_ticket(TICKET_TYPE, {"infos": [{"cluster_ids": [1]}]}, "other")
+
+        with pytest.raises(TicketDuplicationException) as err:
+            TicketViewSet()._verify_duplicate_ticket(TICKET_TYPE, {"infos": [{"cluster_ids": [2, 4, 6]}]}, CREATOR)
+        assert err.value.data["duplicate_ticket_id"] == latest_ticket.id
+        assert sorted(err.value.data["duplicate_cluster_ids"]) == [2, 4]
+
+    def test_benchmark_verify_duplicate_ticket(self, django_assert_max_num_queries):
+        for index in range(RUNNING_TICKET_COUNT):
+            create_ticket([index + 1000])
+
+        start_time = time.time()
+        # 与运行中单据的数量无关，只需要一次查询
+        with django_assert_max_num_queries(1):
+            TicketViewSet()._verify_duplicate_ticket(TICKET_TYPE, {"infos": [{"cluster_ids": [1, 2]}]}, CREATOR)
+        logger.info(
+            "verify duplicate ticket with %s running tickets cost %.4fs",
+            RUNNING_TICKET_COUNT,
+            time.time() - start_time,
+        )
+
+    def test_backfill(self):
+        tickets = [create_ticket([index + 1, index + 2], with_relations=False) for index in range(5)]
+        finished_ticket = create_ticket([100], status=TicketStatus.SUCCEEDED, with_relations=False)
+
+        # 按状态和单据ID范围处理，不会每次重新扫描没有关联资源的单据
+        assert TicketHandler.backfill_ticket_resource_relations(statuses=[TicketStatus.RUNNING], batch_size=2) == 5
+        assert not finished_ticket.resource_relations.exists()
+        assert TicketHandler.backfill_ticket_resource_relations(start_id=tickets[-1].id) == 1
+        assert finished_ticket.resource_relations.exists()
+
+        # 重复执行不会产生重复记录
+        TicketHandler.backfill_ticket_resource_relations(end_id=tickets[0].id)
+        relations = TicketResourceRelation.objects.filter(ticket=tickets[0], resource_type=TicketResourceType.CLUSTER)
+        assert sorted(relations.values_list("resource_id", flat=True)) == ["1", "2"]
+
+    def test_migration_backfill(self):
+        migration = importlib.import_module("backend.ticket.migrations.0013_backfill_ticket_resource_relations")
+        running_ticket = create_ticket([1, 2], with_relations=False)
+        failed_ticket = create_ticket([3], status=TicketStatus.FAILED, with_relations=False)
+        finished_ticket = create_ticket([4], status=TicketStatus.SUCCEEDED, with_relations=False)
+
+        # 未结束的单据补齐关联资源后即可参与重复单据校验，已结束的单据不处理
+        migration.backfill_unfinished_ticket_relations(apps, None)
+        assert running_ticket.resource_relations.count() == 2
+        assert failed_ticket.resource_relations.count() == 1
+        assert not finished_ticket.resource_relations.exists()
+        with pytest.raises(TicketDuplicationException):
+            TicketViewSet()._verify_duplicate_ticket(TICKET_TYPE, {"infos": [{"cluster_ids": [2]}]}, CREATOR)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import asyncio
+import threading
+
+from backend.utils.batch_request import abatch_request, batch_request, iter_batch_request
+
+
+class FakePagingApi:
+    """模拟 CMDB 的分页接口，记录请求过程中的最大并发数"""
+
+    def __init__(self, total: int):
+        self.hosts = [{"bk_host_id": host_id} for host_id in range(total)]
+        self.lock = threading.Lock()
+        self.inflight = self.max_inflight = 0
+
+    def __call__(self, params, **kwargs):
+        with self.lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            start, limit = params["page"]["start"], params["page"]["limit"]
+            return {"count": len(self.hosts), "info": self.hosts[start : start + limit]}
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+class TestAsyncBatchRequest:
+    def test_abatch_request(self):
+        api = FakePagingApi(total=1234)
+        data = asyncio.run(abatch_request(api, {"fields": ["bk_host_id"]}, limit=100))
+        assert data == api.hosts
+        assert data == batch_request(api, {"fields": ["bk_host_id"]}, limit=100)
+
+    def test_abatch_request_without_count(self):
+        api = FakePagingApi(total=250)
+        data = asyncio.run(abatch_request(api, {}, limit=100, get_count=None))
+        assert [host["bk_host_id"] for host in data] == list(range(250))
+
+
+class TestIterBatchRequest:
+    def test_iter_batch_request_in_order(self):
+        api = FakePagingApi(total=1234)
+        pages = list(iter_batch_request(api, {}, limit=100, in_order=True, max_inflight=3))
+        assert len(pages) == 13
+        assert [host for page in pages for host in page] == api.hosts
+        assert api.max_inflight <= 3
+
+    def test_iter_batch_request_completed_order(self):
+        api = FakePagingApi(total=1234)
+        pages = iter_batch_request(api, {}, limit=100, max_inflight=2)
+        host_ids = sorted(host["bk_host_id"] for page in pages for host in page)
+        assert host_ids == list(range(1234))
+
+    def test_iter_batch_request_early_exit(self):
+        api = FakePagingApi(total=1234)
+        pages = iter_batch_request(api, {}, limit=100, in_order=True, max_inflight=2)
+        assert next(pages) == api.hosts[:100]
+        pages.close()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from backend.utils.local import inject_request, local
+
+
+class TestInjectRequest:
+    def test_restore_request_after_call(self):
+        request = SimpleNamespace(request_id="origin", COOKIES={}, user=SimpleNamespace(username="tester"))
+        local.request = request
+        try:
+            func = inject_request(lambda: (local.request, local.request.request_id))
+        finally:
+            local.request = None
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # 子线程沿用原请求及其 request_id，执行完成后复用的线程不再持有该请求
+            assert executor.submit(func).result() == (request, "origin")
+            assert executor.submit(lambda: local.request).result() is None
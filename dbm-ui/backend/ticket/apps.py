@@ -25,17 +25,36 @@ def init_ticket_flow_config(sender, **kwargs):
         logger.warning(f"ticket_flow_config_init occur error, {err}")
 
 
+def preload_exclusive_ticket_matrix():
+    from backend.ticket.exclusive import get_exclusive_ticket_matrix
+
+    try:
+        get_exclusive_ticket_matrix()
+    except Exception as err:  # pylint: disable=broad-except:
+        logger.warning(f"preload exclusive ticket matrix occur error, {err}")
+
+
 class TicketConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend.ticket"
 
     def ready(self):
         from backend.ticket.builders import register_all_builders
-        from backend.ticket.models import Flow
-        from backend.ticket.signals import update_ticket_status
+        from backend.ticket.models import Flow, Ticket
+        from backend.ticket.signals import (
+            publish_flow_status,
+            publish_ticket_status,
+            release_exclusive_waiting_flows,
+            update_ticket_status,
+        )
         from backend.ticket.todos import register_all_todos
 
         register_all_builders()
         register_all_todos()
+        # 启动时加载互斥矩阵，避免在首次互斥检查时解析
+        preload_exclusive_ticket_matrix()
         post_migrate.connect(init_ticket_flow_config, sender=self)
         post_save.connect(update_ticket_status, sender=Flow)
+        post_save.connect(publish_flow_status, sender=Flow)
+        post_save.connect(release_exclusive_waiting_flows, sender=Flow)
+        post_save.connect(publish_ticket_status, sender=Ticket)
@@ -13,7 +13,7 @@ import importlib
 import json
 import logging
 import os
-from typing import Callable, Dict
+from typing import Callable, Dict, List
 
 from django.utils.translation import ugettext as _
 from rest_framework import serializers
@@ -24,8 +24,14 @@ from backend.configuration.models import DBAdministrator, SystemSettings
 from backend.db_meta.models import AppCache, Cluster
 from backend.db_services.dbbase.constants import IpSource
 from backend.iam_app.dataclass.actions import ActionEnum
-from backend.ticket.constants import TICKET_EXPIRE_DEFAULT_CONFIG, FlowRetryType, FlowType, TicketType
-from backend.ticket.models import Flow, Ticket, TicketFlowsConfig
+from backend.ticket.constants import (
+    TICKET_EXPIRE_DEFAULT_CONFIG,
+    FlowRetryType,
+    FlowType,
+    TicketResourceType,
+    TicketType,
+)
+from backend.ticket.models import Flow, Ticket, TicketFlowsConfig, TicketResourceRelation
 
 logger = logging.getLogger("root")
 
@@ -407,6 +413,21 @@ class TicketFlowBuilder:
         """自定义补充单据详情，留给子类实现"""
         pass
 
+    @classmethod
+    def get_relation_resources(cls, ticket_type: str, details: Dict) -> Dict[str, List]:
+        """单据关联的集群/实例，用于按资源查找单据(如重复单据校验)，子类可覆写"""
+        from backend.ticket.builders.common.base import fetch_cluster_ids, fetch_instance_ids
+
+        return {
+            TicketResourceType.CLUSTER: fetch_cluster_ids(details),
+            TicketResourceType.INSTANCE: fetch_instance_ids(details),
+        }
+
+    def init_ticket_relations(self):
+        """根据补充后的单据详情，写入单据关联的资源"""
+        resources = self.get_relation_resources(self.ticket.ticket_type, self.ticket.details)
+        TicketResourceRelation.create_relations(self.ticket, resources)
+
     def alarm_callback_to_ticket_detail(self):
         """告警回调转化为单据详情"""
         pass
@@ -32,7 +32,7 @@ from backend.flow.utils.mysql.db_table_filter import DbTableFilter
 from backend.flow.utils.mysql.db_table_filter.tools import contain_glob
 from backend.ticket import builders
 from backend.ticket.builders.common.constants import MAX_DOMAIN_LEN_LIMIT
-from backend.ticket.constants import TicketType
+from backend.ticket.constants import TicketResourceType, TicketType
 from backend.utils.basic import get_target_items_from_details
 
 
@@ -464,6 +464,11 @@ class InfluxdbTicketFlowBuilderPatchMixin(BigDataTicketFlowBuilderPatchMixin):
         """补充单据详情，用于重复单据去重判断"""
         super().patch_ticket_detail()
 
+    @classmethod
+    def get_relation_resources(cls, ticket_type, details):
+        # influxdb 以实例 ip 做重复单据判断
+        return {TicketResourceType.INSTANCE: cls.get_instances(ticket_type, details)}
+
 
 class MongoDBTicketFlowBuilderPatchMixin(BaseTicketFlowBuilderPatchMixin):
     pass
@@ -24,6 +24,13 @@ class InstanceType(str, StructuredEnum):
     PROXY = EnumField("proxy", _("proxy"))
 
 
+class TicketResourceType(str, StructuredEnum):
+    """单据关联的资源类型"""
+
+    CLUSTER = EnumField("cluster", _("集群"))
+    INSTANCE = EnumField("instance", _("实例"))
+
+
 class TodoType(str, StructuredEnum):
     """
     待办类型
@@ -109,6 +116,8 @@ BAMBOO_STATE__TICKET_STATE_MAP = {
 }
 
 EXCLUSIVE_TICKET_EXCEL_PATH = "backend/ticket/exclusive_ticket.xlsx"
+# 由互斥表编译生成的互斥矩阵，记录了源 excel 的哈希，excel 变更后需要重新编译
+EXCLUSIVE_TICKET_MATRIX_PATH = "backend/ticket/exclusive_ticket.json"
 
 
 class TicketEnumField(EnumField):
@@ -486,6 +495,7 @@ class FlowContext(str, StructuredEnum):
     """流程上下文枚举"""
 
     EXPIRE_TIME = EnumField("expire_time", _("超时时间"))
+    EXCLUSIVE_WAIT_AT = EnumField("exclusive_wait_at", _("首次进入互斥等待的时间"))
 
 
 class FlowTypeConfig(str, StructuredEnum):
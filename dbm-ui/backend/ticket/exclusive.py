@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_EXCEL_PATH, EXCLUSIVE_TICKET_MATRIX_PATH, TicketType
+from backend.utils.excel import ExcelHandler
+
+logger = logging.getLogger("root")
+
+
+class ExclusiveTicketMatrix:
+    """
+    单据执行互斥矩阵：matrix[单据类型] = 与之互斥的运行中单据类型集合
+    - 由 exclusive_ticket.xlsx 编译为 json，进程内只加载一次，查询为 O(1)
+    - json 中记录了 excel 的 sha256，excel 变更而未重新编译时，回退为直接解析 excel
+    """
+
+    def __init__(self, matrix: Dict[str, Iterable[str]]):
+        self.matrix: Dict[str, FrozenSet[str]] = {
+            ticket_type: frozenset(exclusive_types) for ticket_type, exclusive_types in matrix.items()
+        }
+
+    def get_exclusive_ticket_types(self, ticket_type: str) -> FrozenSet[str]:
+        """获取与单据类型互斥的单据类型"""
+        return self.matrix.get(ticket_type, frozenset())
+
+    def is_exclusive(self, ticket_type: str, active_ticket_type: str) -> bool:
+        """
+        判断单据类型与正在运行的单据类型是否互斥
+        @param ticket_type: 待执行的单据类型
+        @param active_ticket_type: 正在运行的单据类型
+        """
+        return active_ticket_type in self.get_exclusive_ticket_types(ticket_type)
+
+    def to_dict(self) -> Dict[str, list]:
+        return {ticket_type: sorted(exclusive_types) for ticket_type, exclusive_types in sorted(self.matrix.items())}
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @classmethod
+    def from_excel(cls, excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH) -> "ExclusiveTicketMatrix":
+        """解析互斥表，单元格为 N 表示列所在的单据类型与行所在的运行中单据类型互斥"""
+        matrix: Dict[str, set] = {}
+        for row_key, inner_dict in ExcelHandler.paser_matrix(excel_path).items():
+            ticket_type = TicketType.get_choice_value(row_key)
+            exclusive_types = matrix.setdefault(ticket_type, set())
+            for col_key, value in inner_dict.items():
+                active_ticket_type = TicketType.get_choice_value(col_key)
+                # 表头按名称模糊匹配单据类型，多个表头可能对应同一单据类型，以最后出现的值为准
+                if value == "N":
+                    exclusive_types.add(active_ticket_type)
+                else:
+                    exclusive_types.discard(active_ticket_type)
+        return cls(matrix)
+
+    def dump(self, excel_digest: str, matrix_path: str = EXCLUSIVE_TICKET_MATRIX_PATH):
+        """
+        将互斥矩阵写入 json 文件
+        @param excel_digest: 源 excel 文件的 sha256
+        @param matrix_path: 输出路径
+        """
+        with open(matrix_path, "w") as f:
+            json.dump({"excel_sha256": excel_digest, "matrix": self.to_dict()}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    @classmethod
+    def compile(
+        cls, excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH, matrix_path: str = EXCLUSIVE_TICKET_MATRIX_PATH
+    ) -> "ExclusiveTicketMatrix":
+        """解析互斥表并编译为 json 文件"""
+        exclusive_matrix = cls.from_excel(excel_path)
+        exclusive_matrix.dump(cls.file_digest(excel_path), matrix_path)
+        return exclusive_matrix
+
+    @classmethod
+    def load(
+        cls, excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH, matrix_path: str = EXCLUSIVE_TICKET_MATRIX_PATH
+    ) -> "ExclusiveTicketMatrix":
+        """加载编译后的互斥矩阵，编译结果不存在或者与 excel 不一致时直接解析 excel"""
+        if os.path.exists(matrix_path):
+            with open(matrix_path) as f:
+                compiled = json.load(f)
+            if compiled.get("excel_sha256") == cls.file_digest(excel_path):
+                return cls(compiled["matrix"])
+
+        logger.warning(
+            "[ExclusiveTicketMatrix] %s is missing or outdated, parse %s instead. "
+            "Please run `python manage.py compile_exclusive_ticket_matrix`",
+            matrix_path,
+            excel_path,
+        )
+        return cls.from_excel(excel_path)
+
+
+@lru_cache(maxsize=None)
+def get_exclusive_ticket_matrix() -> ExclusiveTicketMatrix:
+    """获取进程内共享的互斥矩阵"""
+    return ExclusiveTicketMatrix.load()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import logging
+import time
+from typing import List, Set
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
+
+EXCLUSIVE_WAIT_FLOWS = Gauge("dbm_exclusive_wait_flows", "因执行互斥等待重试的 inner flow 数")
+EXCLUSIVE_WAIT_QUEUE_DEPTH = Histogram(
+    "dbm_exclusive_wait_queue_depth", "flow 进入等待时所在集群等待队列的长度", buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+EXCLUSIVE_WAIT_SECONDS = Histogram(
+    "dbm_exclusive_wait_seconds",
+    "flow 从进入互斥等待到被释放重试的耗时",
+    buckets=(5, 10, 30, 60, 300, 600, 1800, 3600, 4 * 3600, 24 * 3600),
+)
+EXCLUSIVE_WAIT_RELEASES = Counter(
+    "dbm_exclusive_wait_releases_total", "等待队列释放的 flow 数，trigger: event/reconcile", ["trigger"]
+)
+
+
+class ExclusiveReleaseTrigger:
+    # 互斥的 flow 结束后触发释放
+    EVENT = "event"
+    # 定时兜底检查发现集群已空闲后释放
+    RECONCILE = "reconcile"
+
+
+class ExclusiveWaitQueue:
+    """
+    执行互斥的等待队列，按集群维护等待中的 inner flow
+    - flow 因互斥失败时，进入所有与之互斥的集群的队列，score 为首次进入等待的时间
+    - 集群上正在运行的 inner flow 结束时，只释放该集群上等待的 flow，按 score 先进先出重试
+    - 释放后仍然互斥的 flow 会以原来的 score 重新入队，不会丢失排队位置
+    """
+
+    def __init__(self, redis=RedisConn, key_prefix: str = "dbm:exclusive_wait_queue"):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        # 等待中的 flow 信息: flow_id -> {"cluster_ids": [], "wait_at": 时间戳}
+        self.flows_key = f"{key_prefix}:flows"
+        # 存在等待 flow 的集群
+        self.clusters_key = f"{key_prefix}:clusters"
+
+    def _cluster_key(self, cluster_id: int) -> str:
+        return f"{self.key_prefix}:cluster:{cluster_id}"
+
+    def _update_metrics(self):
+        EXCLUSIVE_WAIT_FLOWS.set(self.redis.hlen(self.flows_key))
+
+    def wait(self, flow_id: int, cluster_ids: List[int], wait_at: float = None):
+        """
+        flow 进入集群的等待队列
+        @param flow_id: 互斥的 flow ID
+        @param cluster_ids: 存在互斥操作的集群
+        @param wait_at: 首次进入等待的时间，作为排队顺序
+        """
+        if not cluster_ids:
+            return
+
+        wait_at = wait_at or time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(self.flows_key, flow_id, json.dumps({"cluster_ids": cluster_ids, "wait_at": wait_at}))
+        pipe.sadd(self.clusters_key, *cluster_ids)
+        for cluster_id in cluster_ids:
+            pipe.zadd(self._cluster_key(cluster_id), {flow_id: wait_at})
+            pipe.zcard(self._cluster_key(cluster_id))
+        results = pipe.execute()
+
+        for depth in results[3::2]:
+            EXCLUSIVE_WAIT_QUEUE_DEPTH.observe(depth)
+        self._update_metrics()
+
+    def release(self, cluster_ids: List[int], trigger: str = ExclusiveReleaseTrigger.EVENT) -> List[int]:
+        """
+        释放集群上等待的 flow，返回按进入等待的先后排序的 flow ID
+        @param cluster_ids: 已经空闲的集群
+        @param trigger: 释放的触发方式，用于统计
+        """
+        if not cluster_ids:
+            return []
+
+        # 在事务中取出并删除队列，并发释放同一集群时，每个 flow 只会被释放一次
+        pipe = self.redis.pipeline(transaction=True)
+        for cluster_id in cluster_ids:
+            pipe.zrange(self._cluster_key(cluster_id), 0, -1, withscores=True)
+            pipe.delete(self._cluster_key(cluster_id))
+        pipe.srem(self.clusters_key, *cluster_ids)
+        results = pipe.execute()
+
+        flow_wait_at = {}
+        for members in results[:-1:2]:
+            for flow_id, wait_at in members:
+                flow_wait_at[flow_id] = min(wait_at, flow_wait_at.get(flow_id, wait_at))
+        if not flow_wait_at:
+            return []
+
+        flow_ids = sorted(flow_wait_at, key=lambda _id: flow_wait_at[_id])
+        # flow 可能同时在等待其他集群，释放后会重新检查互斥，因此从所有队列中移除
+        pipe = self.redis.pipeline()
+        for flow_id, flow_info in zip(flow_ids, self.redis.hmget(self.flows_key, flow_ids)):
+            for cluster_id in json.loads(flow_info)["cluster_ids"] if flow_info else []:
+                pipe.zrem(self._cluster_key(cluster_id), flow_id)
+        pipe.hdel(self.flows_key, *flow_ids)
+        pipe.execute()
+
+        now = time.time()
+        for flow_id in flow_ids:
+            EXCLUSIVE_WAIT_SECONDS.observe(now - flow_wait_at[flow_id])
+        EXCLUSIVE_WAIT_RELEASES.labels(trigger=trigger).inc(len(flow_ids))
+        self._update_metrics()
+        return [int(flow_id) for flow_id in flow_ids]
+
+    def has_waiting_flows(self, cluster_ids: List[int]) -> bool:
+        """集群上是否有等待的 flow"""
+        if not cluster_ids:
+            return False
+        return bool(self.redis.exists(*[self._cluster_key(cluster_id) for cluster_id in cluster_ids]))
+
+    def get_waiting_cluster_ids(self) -> Set[int]:
+        return {int(cluster_id) for cluster_id in self.redis.smembers(self.clusters_key)}
+
+    def get_waiting_flow_ids(self) -> Set[int]:
+        return {int(flow_id) for flow_id in self.redis.hkeys(self.flows_key)}
+
+    def clear(self):
+        cluster_keys = [self._cluster_key(cluster_id) for cluster_id in self.get_waiting_cluster_ids()]
+        self.redis.delete(self.flows_key, self.clusters_key, *cluster_keys)
+        self._update_metrics()
+
+
+exclusive_wait_queue = ExclusiveWaitQueue()
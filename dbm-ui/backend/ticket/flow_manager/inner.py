@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import importlib
 import logging
+import time
 from datetime import datetime
 from typing import Any, Dict, Union
 
@@ -23,7 +24,8 @@ from backend.flow.consts import StateType
 from backend.flow.models import FlowTree
 from backend.ticket import constants
 from backend.ticket.builders.common.base import fetch_cluster_ids
-from backend.ticket.constants import BAMBOO_STATE__TICKET_STATE_MAP, FlowCallbackType
+from backend.ticket.constants import BAMBOO_STATE__TICKET_STATE_MAP, FlowCallbackType, FlowContext, FlowErrCode
+from backend.ticket.exclusive_queue import exclusive_wait_queue
 from backend.ticket.flow_manager.base import BaseTicketFlow
 from backend.ticket.models import Flow
 from backend.utils.basic import generate_root_id
@@ -112,9 +114,31 @@ class InnerFlow(BaseTicketFlow):
             cluster_ids=cluster_ids, ticket_type=ticket_type, exclude_ticket_ids=[self.ticket.id]
         )
 
-    def handle_exclusive_error(self):
-        """处理执行互斥后重试的逻辑"""
-        pass
+    def handle_exclusive_error(self, err: ClusterExclusiveOperateException):
+        """
+        处理执行互斥后重试的逻辑：自动重试的flow进入互斥集群的等待队列，
+        集群上互斥的flow结束后再释放重试，不再定时重试所有互斥的flow
+        """
+        if self.flow_obj.err_code != FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+            return
+
+        # 以首次进入等待的时间排队，释放后仍然互斥时不会丢失排队位置
+        wait_at = self.flow_obj.context.get(FlowContext.EXCLUSIVE_WAIT_AT)
+        if not wait_at:
+            wait_at = self.flow_obj.context[FlowContext.EXCLUSIVE_WAIT_AT] = time.time()
+            self.flow_obj.save(update_fields=["context", "update_at"])
+
+        exclusive_cluster_ids = (err.data or {}).get("exclusive_cluster_ids") or fetch_cluster_ids(self.ticket.details)
+        try:
+            exclusive_wait_queue.wait(self.flow_obj.id, exclusive_cluster_ids, wait_at)
+        except Exception as wait_err:  # pylint: disable=broad-except
+            # 未能进入等待队列的flow由定时任务兜底重试
+            logger.warning(f"flow({self.flow_obj.id}) enter exclusive wait queue failed, {wait_err}")
+
+    def clear_exclusive_wait(self):
+        """flow执行成功后清理互斥等待的信息"""
+        if self.flow_obj.context.pop(FlowContext.EXCLUSIVE_WAIT_AT, None):
+            self.flow_obj.save(update_fields=["context", "update_at"])
 
     def callback(self, callback_type: FlowCallbackType) -> None:
         """
@@ -145,11 +169,14 @@ class InnerFlow(BaseTicketFlow):
             )
             # 处理互斥异常和非预期的异常
             self.run_error_status_handler(err)
+            if isinstance(err, ClusterExclusiveOperateException):
+                self.handle_exclusive_error(err)
             return
         else:
             # 记录inner flow的集群动作和实例动作
             self.create_cluster_operate_records()
             self.create_instance_operate_records()
+            self.clear_exclusive_wait()
 
     def _run(self) -> None:
         # 创建并执行后台任务流程
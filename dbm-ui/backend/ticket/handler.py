@@ -32,7 +32,7 @@ from backend.ticket.constants import (
     TicketType,
 )
 from backend.ticket.flow_manager.manager import TicketFlowManager
-from backend.ticket.models import Flow, Ticket, TicketFlowsConfig, Todo
+from backend.ticket.models import Flow, Ticket, TicketFlowsConfig, TicketResourceRelation, Todo
 from backend.ticket.todos import ActionType, TodoActorFactory
 
 logger = logging.getLogger("root")
@@ -267,3 +267,44 @@ class TicketHandler:
             # 用户终止 / 系统终止flow
             logger.info(_("操作人[{}]终止了单据[{}]").format(operator, ticket.id))
             cls.operate_flow(ticket.id, first_running_flow.id, func="revoke", operator=operator)
+
+    @classmethod
+    def backfill_ticket_resource_relations(
+        cls, statuses: List[str] = None, start_id: int = 0, end_id: int = None, batch_size: int = 500
+    ) -> int:
+        """
+        为存量单据补齐关联资源，按单据ID范围分批处理，已存在的关联记录会忽略，重复执行不会产生重复数据
+        新建单据在创建时写入关联资源，未结束的存量单据由数据迁移补齐，该方法只需按需处理指定范围的历史单据
+        @param statuses: 只处理这些状态的单据，为空则处理所有单据
+        @param start_id: 从该单据ID之后开始处理，用于中断后续跑
+        @param end_id: 处理到该单据ID为止(包含)，为空则处理到最新单据
+        @param batch_size: 每批处理的单据数
+        """
+        tickets = Ticket.objects.filter(id__gt=start_id).order_by("id")
+        if end_id:
+            tickets = tickets.filter(id__lte=end_id)
+        if statuses:
+            tickets = tickets.filter(status__in=statuses)
+
+        backfill_count, last_id = 0, start_id
+        while True:
+            batch = list(tickets.filter(id__gt=last_id).only("id", "ticket_type", "creator", "details")[:batch_size])
+            if not batch:
+                break
+
+            relations = []
+            for ticket in batch:
+                try:
+                    builder_cls = BuilderFactory.get_builder_cls(ticket.ticket_type)
+                    resources = builder_cls.get_relation_resources(ticket.ticket_type, ticket.details)
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.warning(_("单据[{}]解析关联资源失败，跳过: {}").format(ticket.id, err))
+                    continue
+                relations.extend(TicketResourceRelation.build_relations(ticket, resources))
+
+            TicketResourceRelation.objects.bulk_create(relations, batch_size=batch_size, ignore_conflicts=True)
+            backfill_count += len(batch)
+            last_id = batch[-1].id
+            logger.info(_("单据关联资源补齐进度: 已处理 {} 个单据，最后处理的单据ID: {}").format(backfill_count, last_id))
+
+        return backfill_count
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.ticket.handler import TicketHandler
+
+
+class Command(BaseCommand):
+    help = "backfill ticket resource relations (ticket <-> cluster/instance) for tickets created before the table existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--statuses", nargs="*", default=None, help="only backfill tickets of these statuses")
+        parser.add_argument("--start_id", type=int, default=0, help="backfill tickets after this id, for resuming")
+        parser.add_argument("--end_id", type=int, default=None, help="backfill tickets up to this id (inclusive)")
+        parser.add_argument("--batch_size", type=int, default=500, help="tickets processed per batch")
+
+    def handle(self, *args, **options):
+        backfill_count = TicketHandler.backfill_ticket_resource_relations(
+            statuses=options["statuses"],
+            start_id=options["start_id"],
+            end_id=options["end_id"],
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(f"backfill ticket resource relations finished, ticket count: {backfill_count}")
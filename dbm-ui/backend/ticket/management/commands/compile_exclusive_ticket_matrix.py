@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_EXCEL_PATH, EXCLUSIVE_TICKET_MATRIX_PATH
+from backend.ticket.exclusive import ExclusiveTicketMatrix
+
+
+class Command(BaseCommand):
+    help = "compile exclusive_ticket.xlsx into the json matrix loaded at runtime."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--excel", default=EXCLUSIVE_TICKET_EXCEL_PATH, help="exclusive ticket excel path")
+        parser.add_argument("--output", default=EXCLUSIVE_TICKET_MATRIX_PATH, help="compiled matrix output path")
+
+    def handle(self, *args, **options):
+        exclusive_matrix = ExclusiveTicketMatrix.compile(excel_path=options["excel"], matrix_path=options["output"])
+        self.stdout.write(
+            f"compile exclusive ticket matrix finished, ticket type count: {len(exclusive_matrix.matrix)}, "
+            f"output: {options['output']}"
+        )
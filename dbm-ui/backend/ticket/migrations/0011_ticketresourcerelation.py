@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from backend.ticket.constants import TicketType
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ticket", "0010_flow_context"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TicketResourceRelation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "ticket_type",
+                    models.CharField(choices=TicketType.get_choices(), max_length=64, verbose_name="单据类型"),
+                ),
+                ("creator", models.CharField(max_length=64, verbose_name="创建者")),
+                (
+                    "resource_type",
+                    models.CharField(
+                        choices=[("cluster", "集群"), ("instance", "实例")], max_length=32, verbose_name="资源类型"
+                    ),
+                ),
+                ("resource_id", models.CharField(max_length=64, verbose_name="资源ID")),
+                (
+                    "ticket",
+                    models.ForeignKey(
+                        help_text="关联工单",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resource_relations",
+                        to="ticket.ticket",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "单据关联资源(TicketResourceRelation)",
+                "verbose_name_plural": "单据关联资源(TicketResourceRelation)",
+                "unique_together": {("ticket", "resource_type", "resource_id")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="ticketresourcerelation",
+            index=models.Index(
+                fields=["resource_type", "resource_id", "ticket_type", "creator"],
+                name="ticket_tick_resourc_73efce_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ticket", "0011_ticketresourcerelation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="clusteroperaterecord",
+            index=models.Index(fields=["cluster_id", "create_at"], name="ticket_clus_cluster_c947ba_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="instanceoperaterecord",
+            index=models.Index(fields=["instance_id", "create_at"], name="ticket_inst_instanc_90666b_idx"),
+        ),
+    ]
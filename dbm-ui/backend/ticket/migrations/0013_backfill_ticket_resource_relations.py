@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+from django.db import migrations
+
+# 未结束的单据状态，失败的单据可以重试，同样需要参与重复单据校验
+UNFINISHED_TICKET_STATUSES = ["PENDING", "RUNNING", "FAILED"]
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_unfinished_ticket_relations(apps, schema_editor):
+    # 关联资源的解析规则分散在各单据类型的 builder 中，无法在迁移中固化，这里直接复用 builder 的解析
+    from backend.ticket.builders import BuilderFactory
+
+    Ticket = apps.get_model("ticket", "Ticket")
+    TicketResourceRelation = apps.get_model("ticket", "TicketResourceRelation")
+
+    tickets = Ticket.objects.filter(status__in=UNFINISHED_TICKET_STATUSES).order_by("id")
+    last_id = 0
+    while True:
+        batch = list(
+            tickets.filter(id__gt=last_id).only("id", "ticket_type", "creator", "details")[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        relations = []
+        for ticket in batch:
+            try:
+                builder_cls = BuilderFactory.get_builder_cls(ticket.ticket_type)
+                resources = builder_cls.get_relation_resources(ticket.ticket_type, ticket.details)
+            except Exception:  # pylint: disable=broad-except
+                continue
+            relations.extend(
+                TicketResourceRelation(
+                    ticket_id=ticket.id,
+                    ticket_type=ticket.ticket_type,
+                    creator=ticket.creator,
+                    resource_type=resource_type,
+                    resource_id=resource_id,
+                )
+                for resource_type, resource_ids in resources.items()
+                for resource_id in {str(resource_id) for resource_id in resource_ids}
+            )
+
+        TicketResourceRelation.objects.bulk_create(relations, batch_size=BACKFILL_BATCH_SIZE, ignore_conflicts=True)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ticket", "0012_operate_record_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unfinished_ticket_relations, migrations.RunPython.noop),
+    ]
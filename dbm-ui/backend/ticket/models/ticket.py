@@ -23,14 +23,14 @@ from backend.bk_web.models import AuditedModel
 from backend.configuration.constants import PLAT_BIZ_ID, DBType
 from backend.db_monitor.exceptions import AutofixException
 from backend.ticket.constants import (
-    EXCLUSIVE_TICKET_EXCEL_PATH,
     FlowRetryType,
     FlowType,
     TicketFlowStatus,
+    TicketResourceType,
     TicketStatus,
     TicketType,
 )
-from backend.utils.excel import ExcelHandler
+from backend.ticket.exclusive import get_exclusive_ticket_matrix
 from backend.utils.time import calculate_cost_time
 
 logger = logging.getLogger("root")
@@ -196,6 +196,7 @@ class Ticket(AuditedModel):
             builder = BuilderFactory.create_builder(ticket)
             builder.patch_ticket_detail()
             builder.init_ticket_flows()
+            builder.init_ticket_relations()
 
         if auto_execute:
             # 开始单据流程
@@ -227,6 +228,66 @@ class Ticket(AuditedModel):
             )
 
 
+class TicketResourceRelationManager(models.Manager):
+    def filter_running(self, ticket_type: str, creator: str, resource_type: str, resource_ids: List):
+        """查询同一用户同类型的运行中单据关联了哪些给定的资源"""
+        return self.filter(
+            resource_type=resource_type,
+            resource_id__in=[str(resource_id) for resource_id in resource_ids],
+            ticket_type=ticket_type,
+            creator=creator,
+            ticket__status=TicketStatus.RUNNING,
+        )
+
+
+class TicketResourceRelation(models.Model):
+    """
+    单据与集群/实例的关联关系，单据创建时根据单据详情生成
+    用于重复单据校验等需要按资源查找单据的场景，避免逐个解析单据的 details
+    """
+
+    ticket = models.ForeignKey(
+        "Ticket", help_text=_("关联工单"), related_name="resource_relations", on_delete=models.CASCADE
+    )
+    # 冗余单据类型和创建者，重复单据校验只需要查询本表的索引
+    ticket_type = models.CharField(_("单据类型"), choices=TicketType.get_choices(), max_length=LEN_NORMAL)
+    creator = models.CharField(_("创建者"), max_length=LEN_NORMAL)
+    resource_type = models.CharField(_("资源类型"), choices=TicketResourceType.get_choices(), max_length=LEN_SHORT)
+    # 集群ID/实例ID，实例可能为 ip 等字符串
+    resource_id = models.CharField(_("资源ID"), max_length=LEN_NORMAL)
+
+    objects = TicketResourceRelationManager()
+
+    class Meta:
+        verbose_name_plural = verbose_name = _("单据关联资源(TicketResourceRelation)")
+        unique_together = (("ticket", "resource_type", "resource_id"),)
+        indexes = [models.Index(fields=["resource_type", "resource_id", "ticket_type", "creator"])]
+
+    @classmethod
+    def build_relations(cls, ticket: "Ticket", resources: Dict[str, List]) -> List["TicketResourceRelation"]:
+        """
+        生成单据关联的资源记录
+        @param ticket: 单据
+        @param resources: 资源类型 -> 资源ID列表
+        """
+        return [
+            cls(
+                ticket=ticket,
+                ticket_type=ticket.ticket_type,
+                creator=ticket.creator,
+                resource_type=resource_type,
+                resource_id=resource_id,
+            )
+            for resource_type, resource_ids in resources.items()
+            for resource_id in {str(resource_id) for resource_id in resource_ids}
+        ]
+
+    @classmethod
+    def create_relations(cls, ticket: "Ticket", resources: Dict[str, List]):
+        """写入单据关联的资源"""
+        cls.objects.bulk_create(cls.build_relations(ticket, resources), ignore_conflicts=True)
+
+
 class TicketFlowsConfig(AuditedModel):
     """
     单据流程配置，暂时只可配置单据审批、人工确认
@@ -259,10 +320,14 @@ class ClusterOperateRecordManager(models.Manager):
 
     def filter_inner_actives(self, cluster_id, *args, **kwargs):
         """获取集群正在运行的inner flow的单据记录。此时认为集群会在互斥阶段"""
+        return self.filter_clusters_inner_actives([cluster_id], *args, **kwargs)
+
+    def filter_clusters_inner_actives(self, cluster_ids, *args, **kwargs):
+        """批量获取集群正在运行的inner flow的单据记录"""
         # 排除特定的单据，如自身单据重试排除自身
         exclude_ticket_ids = kwargs.pop("exclude_ticket_ids", [])
         return self.filter(
-            cluster_id=cluster_id,
+            cluster_id__in=cluster_ids,
             flow__flow_type=FlowType.INNER_FLOW,
             flow__status=TicketFlowStatus.RUNNING,
             *args,
@@ -273,35 +338,30 @@ class ClusterOperateRecordManager(models.Manager):
         """集群上的正在运行的操作列表"""
         return [r.summary for r in self.filter_actives(cluster_id, **kwargs)]
 
+    def get_exclusive_operations(self, ticket_type, cluster_ids, **kwargs) -> Dict[int, List[Dict]]:
+        """
+        批量查询当前单据类型与集群正在进行中的单据的互斥情况，一次查询返回所有集群的互斥操作
+        @param ticket_type: 当前单据类型
+        @param cluster_ids: 集群ID列表
+        """
+        # 互斥的单据类型直接作为查询条件，一次查询得到所有互斥的单据
+        exclusive_ticket_types = get_exclusive_ticket_matrix().get_exclusive_ticket_types(ticket_type)
+        if not exclusive_ticket_types or not cluster_ids:
+            return {}
+
+        active_records = self.filter_clusters_inner_actives(
+            cluster_ids, ticket__ticket_type__in=exclusive_ticket_types, **kwargs
+        ).select_related("ticket", "flow")
+        cluster_exclusive_operations: Dict[int, List[Dict]] = defaultdict(list)
+        for record in active_records:
+            cluster_exclusive_operations[record.cluster_id].append(
+                {"exclusive_ticket": record.ticket, "root_id": record.flow.flow_obj_id}
+            )
+        return cluster_exclusive_operations
+
     def has_exclusive_operations(self, ticket_type, cluster_id, **kwargs):
         """判断当前单据类型与集群正在进行中的单据是否互斥"""
-        active_tickets = self.filter_inner_actives(cluster_id, **kwargs)
-        exclusive_infos = []
-        for active_ticket in active_tickets:
-            try:
-                if self.exclusive_ticket_map[ticket_type][active_ticket.ticket.ticket_type]:
-                    exclusive_infos.append(
-                        {"exclusive_ticket": active_ticket.ticket, "root_id": active_ticket.flow.flow_obj_id}
-                    )
-            except KeyError:
-                pass
-
-        return exclusive_infos
-
-    @property
-    def exclusive_ticket_map(self):
-        if hasattr(self, "_exclusive_ticket_map"):
-            return self._exclusive_ticket_map
-
-        _exclusive_matrix = ExcelHandler.paser_matrix(EXCLUSIVE_TICKET_EXCEL_PATH)
-        _exclusive_ticket_map = defaultdict(dict)
-        for row_key, inner_dict in _exclusive_matrix.items():
-            for col_key, value in inner_dict.items():
-                row_key, col_key = TicketType.get_choice_value(row_key), TicketType.get_choice_value(col_key)
-                _exclusive_ticket_map[row_key][col_key] = value == "N"
-
-        setattr(self, "_exclusive_ticket_map", _exclusive_ticket_map)
-        return self._exclusive_ticket_map
+        return self.get_exclusive_operations(ticket_type, [cluster_id], **kwargs).get(cluster_id, [])
 
 
 class ClusterOperateRecord(AuditedModel):
@@ -318,14 +378,15 @@ class ClusterOperateRecord(AuditedModel):
     class Meta:
         # cluster_id, flow和ticket组成唯一性校验
         unique_together = (("cluster_id", "flow", "ticket"),)
+        indexes = [models.Index(fields=["cluster_id", "create_at"])]
 
     @property
     def summary(self):
         return {
             "operator": self.creator,
             "cluster_id": self.cluster_id,
-            "flow_id": self.flow.id,
-            "ticket_id": self.ticket.id,
+            "flow_id": self.flow_id,
+            "ticket_id": self.ticket_id,
             "ticket_type": self.ticket.ticket_type,
             "title": TicketType.get_choice_label(self.ticket.ticket_type),
             "status": self.ticket.status,
@@ -334,7 +395,7 @@ class ClusterOperateRecord(AuditedModel):
     @classmethod
     def get_cluster_records_map(cls, cluster_ids: List[int]):
         """获取集群与操作记录之间的映射关系"""
-        records = cls.objects.prefetch_related("ticket").filter(
+        records = cls.objects.select_related("ticket").filter(
             cluster_id__in=cluster_ids, ticket__status=TicketFlowStatus.RUNNING
         )
         cluster_operate_records_map: Dict[int, List] = defaultdict(list)
@@ -385,13 +446,16 @@ class InstanceOperateRecord(AuditedModel):
 
     objects = InstanceOperateRecordManager()
 
+    class Meta:
+        indexes = [models.Index(fields=["instance_id", "create_at"])]
+
     @property
     def summary(self):
         return {
             "operator": self.creator,
             "instance_id": self.instance_id,
-            "flow_id": self.flow.id,
-            "ticket_id": self.ticket.id,
+            "flow_id": self.flow_id,
+            "ticket_id": self.ticket_id,
             "ticket_type": self.ticket.ticket_type,
             "title": self.ticket.get_ticket_type_display(),
             "status": self.ticket.status,
@@ -21,6 +21,7 @@ from backend.components import CmsiApi
 from backend.configuration.constants import PLAT_BIZ_ID, DBType
 from backend.core.encrypt.constants import AsymmetricCipherConfigType
 from backend.core.encrypt.handlers import AsymmetricHandler
+from backend.core.status_stream.constants import STATUS_STREAM_MAX_CHANNELS
 from backend.ticket import mock_data
 from backend.ticket.builders import BuilderFactory
 from backend.ticket.constants import CountType, FlowType, TicketStatus, TicketType, TodoStatus
@@ -340,6 +341,16 @@ class ListTicketStatusSerializer(serializers.Serializer):
     ticket_ids = serializers.CharField(help_text=_("单据ID(逗号分割)"))
 
 
+class TicketStatusStreamSerializer(ListTicketStatusSerializer):
+    def validate_ticket_ids(self, value):
+        ticket_ids = [ticket_id for ticket_id in value.split(",") if ticket_id]
+        if not all(ticket_id.isdigit() for ticket_id in ticket_ids):
+            raise serializers.ValidationError(_("单据ID格式错误"))
+        if len(ticket_ids) > STATUS_STREAM_MAX_CHANNELS:
+            raise serializers.ValidationError(_("单次最多订阅{}个单据").format(STATUS_STREAM_MAX_CHANNELS))
+        return [int(ticket_id) for ticket_id in ticket_ids]
+
+
 class BatchApprovalSerializer(serializers.Serializer):
     is_approved = serializers.BooleanField(help_text=_("是否通过"))
     ticket_ids = serializers.ListField(help_text=_("单据id集合"))
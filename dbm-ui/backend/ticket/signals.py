@@ -8,8 +8,19 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import logging
+
+from django.db import transaction
+
+from backend.core.status_stream.constants import StatusEventType
+from backend.core.status_stream.handlers import StatusStreamHandler
+from backend.ticket.constants import FlowErrCode, FlowType, TicketFlowStatus
+from backend.ticket.exclusive_queue import exclusive_wait_queue
 from backend.ticket.flow_manager.manager import TicketFlowManager
-from backend.ticket.models import Flow
+from backend.ticket.models import ClusterOperateRecord, Flow, Ticket
+from backend.ticket.tasks.ticket_tasks import release_exclusive_inner_flow
+
+logger = logging.getLogger("root")
 
 
 def update_ticket_status(sender, instance: Flow, **kwargs):
@@ -19,3 +30,56 @@ def update_ticket_status(sender, instance: Flow, **kwargs):
     if not instance.pk:
         return
     TicketFlowManager(instance.ticket).update_ticket_status()
+
+
+def is_status_updated(update_fields) -> bool:
+    return update_fields is None or "status" in update_fields
+
+
+def publish_flow_status(sender, instance: Flow, created, update_fields=None, **kwargs):
+    """推送单据流程的状态变化"""
+    if created or not is_status_updated(update_fields):
+        return
+    StatusStreamHandler.publish_on_commit(
+        channels=[StatusStreamHandler.ticket_channel(instance.ticket_id)],
+        event_type=StatusEventType.TICKET_FLOW,
+        ticket_id=instance.ticket_id,
+        flow_id=instance.id,
+        flow_type=instance.flow_type,
+        flow_obj_id=instance.flow_obj_id,
+        status=instance.status,
+    )
+
+
+def publish_ticket_status(sender, instance: Ticket, created, update_fields=None, **kwargs):
+    """推送单据的状态变化"""
+    if created or not is_status_updated(update_fields):
+        return
+    StatusStreamHandler.publish_on_commit(
+        channels=[StatusStreamHandler.ticket_channel(instance.id)],
+        event_type=StatusEventType.TICKET,
+        ticket_id=instance.id,
+        status=instance.status,
+    )
+
+
+def release_exclusive_waiting_flows(sender, instance: Flow, created, update_fields=None, **kwargs):
+    """inner flow 结束后不再占用集群，释放集群上因互斥等待的 flow"""
+    if created or not is_status_updated(update_fields):
+        return
+    if instance.flow_type != FlowType.INNER_FLOW or instance.status == TicketFlowStatus.RUNNING:
+        return
+    # 因互斥失败的 flow 本身没有占用集群
+    if instance.err_code == FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+        return
+
+    cluster_ids = list(ClusterOperateRecord.objects.filter(flow_id=instance.id).values_list("cluster_id", flat=True))
+    try:
+        if not exclusive_wait_queue.has_waiting_flows(cluster_ids):
+            return
+    except Exception as err:  # pylint: disable=broad-except
+        # 释放失败时由定时任务兜底
+        logger.warning(f"check exclusive wait queue of clusters {cluster_ids} failed, {err}")
+        return
+
+    transaction.on_commit(lambda: release_exclusive_inner_flow.delay(cluster_ids))
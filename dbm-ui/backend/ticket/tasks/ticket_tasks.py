@@ -8,7 +8,6 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import json
 import logging
 import operator
 import textwrap
@@ -23,8 +22,8 @@ from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from backend import env
-from backend.components import BKLogApi, ItsmApi
+from backend.components import ItsmApi
+from backend.components.bklog.handler import BKLogHandler
 from backend.components.cmsi.handler import CmsiHandler
 from backend.configuration.constants import PLAT_BIZ_ID
 from backend.constants import DEFAULT_SYSTEM_USER
@@ -45,12 +44,16 @@ from backend.ticket.constants import (
     TodoType,
 )
 from backend.ticket.exceptions import TicketTaskTriggerException
+from backend.ticket.exclusive_queue import ExclusiveReleaseTrigger, exclusive_wait_queue
 from backend.ticket.flow_manager.inner import InnerFlow
-from backend.ticket.models.ticket import Flow, Ticket, TicketFlowsConfig
+from backend.ticket.models.ticket import ClusterOperateRecord, Flow, Ticket, TicketFlowsConfig
 from backend.utils.time import datetime2str
 
 logger = logging.getLogger("root")
 
+# 互斥flow未进入等待队列的判定时间(s)
+EXCLUSIVE_ORPHAN_FLOW_TIMEOUT = 60
+
 
 class TicketTask(object):
     """关联单据的异步任务集合类"""
@@ -67,18 +70,47 @@ class TicketTask(object):
         TicketFlowManager(ticket=self.ticket).run_next_flow()
 
     @classmethod
-    def retry_exclusive_inner_flow(cls) -> None:
-        """重试互斥错误的inner flow"""
-        to_retry_flows = Flow.objects.filter(err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR)
-        if not to_retry_flows:
+    def release_exclusive_inner_flow(
+        cls, cluster_ids: List[int], trigger: str = ExclusiveReleaseTrigger.EVENT
+    ) -> None:
+        """释放集群上因互斥等待的inner flow，按进入等待的先后顺序重试"""
+        flow_ids = exclusive_wait_queue.release(cluster_ids, trigger)
+        if not flow_ids:
             return
 
-        logger.info(
-            f"Automatically retry the mutually exclusive flow, "
-            f"there are still {to_retry_flows.count()} flows waiting to be retried...."
-        )
+        logger.info(f"clusters {cluster_ids} are released, retry the mutually exclusive flows {flow_ids}...")
+        flows = Flow.objects.select_related("ticket").in_bulk(flow_ids)
+        for flow_id in flow_ids:
+            flow = flows.get(flow_id)
+            # flow可能已经被手动重试或者终止
+            if not flow or flow.err_code != FlowErrCode.AUTO_EXCLUSIVE_ERROR:
+                continue
+            InnerFlow(flow_obj=flow).retry()
 
-        for flow in to_retry_flows:
+    @classmethod
+    def retry_exclusive_inner_flow(cls) -> None:
+        """
+        兜底重试互斥错误的inner flow，正常情况下由互斥的flow结束时释放(见 release_exclusive_inner_flow)
+        1. 等待队列中的集群已经没有正在运行的inner flow，说明释放事件丢失，直接释放
+        2. 不在等待队列中的互斥flow(如进入队列失败)，直接重试
+        """
+        waiting_cluster_ids = exclusive_wait_queue.get_waiting_cluster_ids()
+        if waiting_cluster_ids:
+            running_cluster_ids = set(
+                ClusterOperateRecord.objects.filter_clusters_inner_actives(waiting_cluster_ids)
+                .values_list("cluster_id", flat=True)
+                .distinct()
+            )
+            idle_cluster_ids = list(waiting_cluster_ids - running_cluster_ids)
+            cls.release_exclusive_inner_flow(idle_cluster_ids, trigger=ExclusiveReleaseTrigger.RECONCILE)
+
+        # 刚被释放的flow会在重试时更新时间，这里只处理一段时间内没有变化的flow，避免重复重试
+        orphan_flows = Flow.objects.filter(
+            err_code=FlowErrCode.AUTO_EXCLUSIVE_ERROR,
+            update_at__lt=timezone.now() - timedelta(seconds=EXCLUSIVE_ORPHAN_FLOW_TIMEOUT),
+        ).exclude(id__in=exclusive_wait_queue.get_waiting_flow_ids())
+        for flow in orphan_flows:
+            logger.info(f"flow({flow.id}) is not in exclusive wait queue, retry it directly...")
             InnerFlow(flow_obj=flow).retry()
 
     @classmethod
@@ -95,24 +127,15 @@ class TicketTask(object):
         # 例行时间校验默认间隔一天
         now = datetime.now(timezone.utc)
         start_time, end_time = now - timedelta(days=1), now
-        # TODO: 目前这个esquery_search最多支持10000条查询，后续可以改造成scroll进行查询
-        resp = BKLogApi.esquery_search(
-            {
-                "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.mysql_checksum_result",
-                "start_time": datetime2str(start_time),
-                "end_time": datetime2str(end_time),
-                "query_string": "*",
-                "start": 0,
-                "size": 10000,
-                "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-            }
+        # 以 scroll 流式读取校验日志，单次遍历根据集群ID聚合
+        checksum_logs = BKLogHandler.iter_logs(
+            collector="mysql_checksum_result",
+            start_time=start_time,
+            end_time=end_time,
+            snake_case=False,
+            use_admin=False,
         )
-
-        # 根据集群ID聚合日志
-        cluster__checksum_logs_map: Dict[int, List[Dict]] = defaultdict(list)
-        for hit in resp["hits"]["hits"]:
-            checksum_log = json.loads(hit["_source"]["log"])
-            cluster__checksum_logs_map[checksum_log["cluster_id"]].append(checksum_log)
+        cluster__checksum_logs_map = BKLogHandler.group_logs(key=lambda log: log["cluster_id"], logs=checksum_logs)
 
         # 为每个待修复的集群生成修复单据
         for cluster_id, checksum_logs in cluster__checksum_logs_map.items():
@@ -377,3 +400,9 @@ def send_msg_for_flow(
         }
     )
     CmsiHandler.send_msg(msg)
+
+
+@shared_task
+def release_exclusive_inner_flow(cluster_ids: List[int]):
+    """释放集群上因互斥等待的inner flow"""
+    TicketTask.release_exclusive_inner_flow(cluster_ids)
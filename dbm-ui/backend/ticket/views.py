@@ -24,8 +24,10 @@ from rest_framework.response import Response
 
 from backend import env
 from backend.bk_web import viewsets
+from backend.bk_web.pagination import AuditedCursorPagination
 from backend.bk_web.swagger import PaginatedResponseSwaggerAutoSchema, common_swagger_auto_schema
 from backend.configuration.models import DBAdministrator
+from backend.core.status_stream.handlers import StatusStreamHandler
 from backend.db_services.ipchooser.query.resource import ResourceQueryHelper
 from backend.iam_app.dataclass import ResourceEnum
 from backend.iam_app.dataclass.actions import ActionEnum
@@ -34,11 +36,11 @@ from backend.iam_app.handlers.drf_perm.cluster import ClusterDetailPermission, I
 from backend.iam_app.handlers.drf_perm.ticket import BatchApprovalPermission, create_ticket_permission
 from backend.iam_app.handlers.permission import Permission
 from backend.ticket.builders import BuilderFactory
-from backend.ticket.builders.common.base import InfluxdbTicketFlowBuilderPatchMixin, fetch_cluster_ids
 from backend.ticket.constants import (
     TODO_DONE_STATUS,
     CountType,
     OperateNodeActionType,
+    TicketResourceType,
     TicketStatus,
     TicketType,
     TodoStatus,
@@ -47,7 +49,14 @@ from backend.ticket.contexts import TicketContext
 from backend.ticket.exceptions import TicketDuplicationException
 from backend.ticket.flow_manager.manager import TicketFlowManager
 from backend.ticket.handler import TicketHandler
-from backend.ticket.models import ClusterOperateRecord, InstanceOperateRecord, Ticket, TicketFlowsConfig, Todo
+from backend.ticket.models import (
+    ClusterOperateRecord,
+    InstanceOperateRecord,
+    Ticket,
+    TicketFlowsConfig,
+    TicketResourceRelation,
+    Todo,
+)
 from backend.ticket.serializers import (
     BatchApprovalSerializer,
     BatchTodoOperateSerializer,
@@ -65,6 +74,7 @@ from backend.ticket.serializers import (
     TicketFlowDescribeSerializer,
     TicketFlowSerializer,
     TicketSerializer,
+    TicketStatusStreamSerializer,
     TicketTypeResponseSLZ,
     TicketTypeSLZ,
     TodoOperateSerializer,
@@ -112,6 +122,13 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         elif self.action in ["retrieve", "flows", "retry_flow", "revoke_flow", "process_todo"]:
             instance_getter = lambda request, view: [request.parser_context["kwargs"]["pk"]]  # noqa
             return [ResourceActionPermission([ActionEnum.TICKET_VIEW], ResourceEnum.TICKET, instance_getter)]
+        # 订阅单据状态推送，关联单据查看动作
+        elif self.action == "status_stream_token":
+            # 参数缺失时不关联资源，由接口参数校验返回错误
+            instance_getter = lambda request, view: [  # noqa
+                ticket_id for ticket_id in request.query_params.get("ticket_ids", "").split(",") if ticket_id
+            ]
+            return [ResourceActionPermission([ActionEnum.TICKET_VIEW], ResourceEnum.TICKET, instance_getter)]
         # 单据流程设置，关联单据流程设置动作
         elif self.action == "update_ticket_flow_config":
             instance_getter = lambda request, view: list(  # noqa
@@ -173,11 +190,11 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         return context
 
     def _verify_duplicate_ticket(self, ticket_type, details, user):
-        """校验是否重复提交"""
+        """校验是否重复提交：通过单据关联资源表查询同一用户同类型的运行中单据"""
+        builder_cls = BuilderFactory.get_builder_cls(ticket_type)
+        resources = builder_cls.get_relation_resources(ticket_type, details)
 
-        active_tickets = self.get_queryset().filter(ticket_type=ticket_type, status=TicketStatus.RUNNING, creator=user)
-
-        # influxdb 相关操作单独适配，这里暂时没有找到更好的写法，唯一的改进就是创建单据时，会提前提取出对比内容，比如instances
+        # influxdb 以实例判断重复，其他单据以集群判断重复
         if ticket_type in [
             TicketType.INFLUXDB_ENABLE,
             TicketType.INFLUXDB_DISABLE,
@@ -185,26 +202,57 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
             TicketType.INFLUXDB_DESTROY,
             TicketType.INFLUXDB_REPLACE,
         ]:
-            current_instances = InfluxdbTicketFlowBuilderPatchMixin.get_instances(ticket_type, details)
-            for ticket in active_tickets:
-                active_instances = ticket.details["instances"]
-                duplicate_ids = list(set(active_instances).intersection(current_instances))
-                if duplicate_ids:
-                    raise TicketDuplicationException(
-                        context=_("实例{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, ticket.id),
-                        data={"duplicate_instance_ids": duplicate_ids, "duplicate_ticket_id": ticket.id},
-                    )
+            resource_type, resource_ids = TicketResourceType.INSTANCE, resources[TicketResourceType.INSTANCE]
+        else:
+            resource_type, resource_ids = TicketResourceType.CLUSTER, resources[TicketResourceType.CLUSTER]
+        if not resource_ids:
             return
 
-        cluster_ids = fetch_cluster_ids(details=details)
-        for ticket in active_tickets:
-            active_cluster_ids = fetch_cluster_ids(details=ticket.details)
-            duplicate_ids = list(set(active_cluster_ids).intersection(cluster_ids))
-            if duplicate_ids:
-                raise TicketDuplicationException(
-                    context=_("集群{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, ticket.id),
-                    data={"duplicate_cluster_ids": duplicate_ids, "duplicate_ticket_id": ticket.id},
-                )
+        relations = TicketResourceRelation.objects.filter_running(ticket_type, user, resource_type, resource_ids)
+        duplicate_ticket_id, duplicate_ids = None, []
+        # 与之前逐个单据比较的行为保持一致，只提示最新的一个重复单据
+        for ticket_id, resource_id in relations.order_by("-ticket_id").values_list("ticket_id", "resource_id"):
+            if duplicate_ticket_id is None:
+                duplicate_ticket_id = ticket_id
+            if ticket_id == duplicate_ticket_id:
+                duplicate_ids.append(resource_id)
+        if not duplicate_ids:
+            return
+
+        if resource_type == TicketResourceType.INSTANCE:
+            raise TicketDuplicationException(
+                context=_("实例{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, duplicate_ticket_id),
+                data={"duplicate_instance_ids": duplicate_ids, "duplicate_ticket_id": duplicate_ticket_id},
+            )
+
+        duplicate_ids = [int(cluster_id) for cluster_id in duplicate_ids]
+        raise TicketDuplicationException(
+            context=_("集群{}已存在相同类型的单据[{}]正在运行，请确认是否重复提交").format(duplicate_ids, duplicate_ticket_id),
+            data={"duplicate_cluster_ids": duplicate_ids, "duplicate_ticket_id": duplicate_ticket_id},
+        )
+
+    def _paginate_operate_records(self, op_records):
+        """
+        集群/实例变更记录在数据库层分页，只查询需要展示的字段
+        传入 cursor 参数时使用游标分页，避免大偏移量翻页和 count 查询
+        """
+        op_records = op_records.values("create_at", "creator", "ticket_id", "ticket__ticket_type", "ticket__status")
+        if "cursor" in self.request.query_params:
+            paginator = AuditedCursorPagination()
+        else:
+            paginator, op_records = self.paginator, op_records.order_by("-create_at", "-id")
+
+        op_records_page = [
+            {
+                "create_at": record["create_at"],
+                "op_type": TicketType.get_choice_label(record["ticket__ticket_type"]),
+                "op_status": record["ticket__status"],
+                "ticket_id": record["ticket_id"],
+                "creator": record["creator"],
+            }
+            for record in paginator.paginate_queryset(op_records, self.request, view=self)
+        ]
+        return paginator.get_paginated_response(op_records_page)
 
     def perform_create(self, serializer):
         ticket_type = self.request.data["ticket_type"]
@@ -221,6 +269,7 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
             builder = BuilderFactory.create_builder(ticket)
             builder.patch_ticket_detail()
             builder.init_ticket_flows()
+            builder.init_ticket_relations()
 
         TicketFlowManager(ticket=ticket).run_next_flow()
 
@@ -274,6 +323,18 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         ticket_status_map = {ticket.id: ticket.status for ticket in Ticket.objects.filter(id__in=ticket_ids)}
         return Response(ticket_status_map)
 
+    @common_swagger_auto_schema(
+        operation_summary=_("获取单据状态推送的订阅凭证"),
+        operation_description=_("使用返回的 url 建立 SSE 连接，接收单据、单据流程及任务流程的状态变化，用于替代轮询单据状态"),
+        query_serializer=TicketStatusStreamSerializer(),
+        tags=[TICKET_TAG],
+    )
+    @action(methods=["GET"], detail=False, serializer_class=TicketStatusStreamSerializer, filter_fields=None)
+    def status_stream_token(self, request, *args, **kwargs):
+        ticket_ids = self.params_validate(self.get_serializer_class())["ticket_ids"]
+        channels = [StatusStreamHandler.ticket_channel(ticket_id) for ticket_id in ticket_ids]
+        return Response(StatusStreamHandler.create_token(request.user.username, channels))
+
     @common_swagger_auto_schema(
         operation_summary=_("创建单据"),
         responses={status.HTTP_200_OK: TicketSerializer(label=_("创建单据"))},
@@ -485,19 +546,8 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         if validated_data.get("op_status"):
             op_filters &= Q(ticket__status=validated_data.get("op_status"))
 
-        op_records = ClusterOperateRecord.objects.select_related("ticket").filter(op_filters).order_by("-create_at")
-        op_records_info = [
-            {
-                "create_at": record.create_at,
-                "op_type": TicketType.get_choice_label(record.ticket.ticket_type),
-                "op_status": record.ticket.status,
-                "ticket_id": record.ticket.id,
-                "creator": record.creator,
-            }
-            for record in op_records
-        ]
-        op_records_page = self.paginate_queryset(op_records_info)
-        return self.get_paginated_response(op_records_page)
+        op_records = ClusterOperateRecord.objects.filter(op_filters)
+        return self._paginate_operate_records(op_records)
 
     @common_swagger_auto_schema(
         operation_summary=_("查询集群实例变更单据事件"),
@@ -520,19 +570,8 @@ class TicketViewSet(viewsets.AuditedModelViewSet):
         if validated_data.get("op_status"):
             op_filters &= Q(ticket__status=validated_data.get("op_status"))
 
-        op_records = InstanceOperateRecord.objects.select_related("ticket").filter(op_filters).order_by("-create_at")
-        op_records_info = [
-            {
-                "create_at": record.create_at,
-                "op_type": TicketType.get_choice_label(record.ticket.ticket_type),
-                "op_status": record.ticket.status,
-                "ticket_id": record.ticket.id,
-                "creator": record.creator,
-            }
-            for record in op_records
-        ]
-        op_records_page = self.paginate_queryset(op_records_info)
-        return self.get_paginated_response(op_records_page)
+        op_records = InstanceOperateRecord.objects.filter(op_filters)
+        return self._paginate_operate_records(op_records)
 
     @swagger_auto_schema(
         operation_summary=_("查询可编辑单据流程描述"),
@@ -8,17 +8,21 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import functools
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from copy import deepcopy
 from multiprocessing.pool import ThreadPool
-from typing import Callable
+from typing import Deque
 
 import wrapt
 from django.conf import settings
 from django.utils.translation import get_language
 
+from backend.components.transport import upstream_executor_pool
 from backend.core.translation.context import RespectsLanguage
-from backend.utils.local import local
+from backend.utils.local import inject_request, local
 
 QUERY_CMDB_LIMIT = 500
 WRITE_CMDB_LIMIT = 500
@@ -26,16 +30,8 @@ QUERY_CMDB_MODULE_LIMIT = 500
 QUERY_CLOUD_LIMIT = 200
 QUERY_ITSM_LIMIT = 200
 
-
-def inject_request(func: Callable):
-    request = local.request
-
-    def inner(*args, **kwargs):
-        if request:
-            local.request = request
-        return func(*args, **kwargs)
-
-    return inner
+# 非 DataAPI 的请求函数在异步批量请求时使用的上游并发池
+DEFAULT_UPSTREAM = "default"
 
 
 def format_params(params, get_count, func, start_key, limit_key):
@@ -125,6 +121,90 @@ def batch_request(
     return data
 
 
+def iter_batch_request(
+    func,
+    params,
+    start_key="start",
+    limit_key="limit",
+    get_data=lambda x: x["info"],
+    get_count=lambda x: x["count"],
+    limit=QUERY_CMDB_LIMIT,
+    sort=None,
+    in_order=False,
+    max_inflight=None,
+    **kwargs
+):
+    """
+    流式并发请求接口，每完成一页就产出该页的数据，调用方可以边拉取边处理，无需等待全部分页返回
+    :param func: 请求方法
+    :param params: 请求参数
+    :param start_key: 分页起始key
+    :param limit_key: 分页最大数key
+    :param get_data: 获取数据函数
+    :param get_count: 获取总数函数，为空时只能顺序请求
+    :param limit: 一次请求数量
+    :param sort: 排序
+    :param in_order: 是否按分页顺序产出，否则按完成顺序产出
+    :param max_inflight: 最大在途请求数。调用方未消费的页也计入在途，以此实现背压，避免结果在内存中堆积
+    :return: 每页数据的生成器
+    """
+    if not get_count:
+        start = 0
+        while True:
+            request_params = {"page": {limit_key: limit, start_key: start}}
+            request_params.update(params)
+            result = get_data(func(request_params, **kwargs))
+            yield result
+            if len(result) < limit:
+                return
+            start += limit
+
+    count = get_count(func(dict(page={start_key: 0, limit_key: 1}, **params), **kwargs))
+
+    def _page_params():
+        for start in range(0, count, limit):
+            request_params = {"page": {limit_key: limit, start_key: start}}
+            if sort:
+                request_params["page"]["sort"] = sort
+            request_params.update(params)
+            yield request_params
+
+    # 复用上游在进程内共享的线程池，不为每次调用单独创建线程
+    executor = upstream_executor_pool.get_executor(getattr(func, "base", DEFAULT_UPSTREAM))
+    wrapped_func = RespectsLanguage(language=get_language())(inject_request(func))
+    max_inflight = max_inflight or settings.CONCURRENT_NUMBER
+
+    page_params = _page_params()
+    # 在途请求队列，保持提交顺序以支持按序产出
+    inflight: Deque[Future] = deque()
+
+    def _submit():
+        request_params = next(page_params, None)
+        if request_params is not None:
+            inflight.append(executor.submit(wrapped_func, request_params, **kwargs))
+
+    try:
+        for __ in range(max_inflight):
+            _submit()
+
+        while inflight:
+            if in_order:
+                future = inflight.popleft()
+            else:
+                done, __ = wait(inflight, return_when=FIRST_COMPLETED)
+                future = next(f for f in inflight if f in done)
+                inflight.remove(future)
+
+            result = get_data(future.result())
+            # 先补充下一页请求，再把当前页交给调用方处理
+            _submit()
+            yield result
+    finally:
+        # 调用方提前退出或者请求异常时，取消未开始的请求
+        for future in inflight:
+            future.cancel()
+
+
 def sync_batch_request(func, params, get_data=lambda x: x["info"], limit=500, start_key="start", limit_key="limit"):
     """
     同步请求接口
@@ -183,6 +263,87 @@ def request_multi_thread(func, params_list, get_data=lambda x: [], in_order=Fals
     return result
 
 
+def _to_async(func):
+    """
+    将请求方法转为协程函数：DataAPI 直接使用 acall(受上游并发限制)，其他同步函数提交到默认上游的线程池
+    """
+    if hasattr(func, "acall"):
+        return func.acall
+
+    async def inner(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        wrapped = RespectsLanguage(language=get_language())(inject_request(func))
+        executor = upstream_executor_pool.get_executor(DEFAULT_UPSTREAM)
+        return await loop.run_in_executor(executor, functools.partial(wrapped, *args, **kwargs))
+
+    return inner
+
+
+async def abatch_request(
+    func,
+    params,
+    start_key="start",
+    limit_key="limit",
+    get_data=lambda x: x["info"],
+    get_count=lambda x: x["count"],
+    limit=QUERY_CMDB_LIMIT,
+    sort=None,
+    split_params=False,
+    **kwargs
+):
+    """
+    batch_request 的异步版本，在事件循环中并发分页请求接口，参数同 batch_request
+    并发度由上游的全局限制器控制(参考 DataAPI.acall)，不会为每次调用单独创建线程池
+    同步代码中可通过 asyncio.run(abatch_request(...)) 调用
+    """
+    acall = _to_async(func)
+
+    # 如果该接口没有返回count参数，只能顺序请求
+    if not get_count:
+        data, start = [], 0
+        while True:
+            request_params = {"page": {limit_key: limit, start_key: start}}
+            request_params.update(params)
+            result = get_data(await acall(request_params, **kwargs))
+            data.extend(result)
+            if len(result) < limit:
+                return data
+            start += limit
+
+    async def _count(req_params):
+        return get_count(await acall(dict(page={start_key: 0, limit_key: 1}, **req_params), **kwargs))
+
+    # 拆分params适配bk_module_id大于500情况
+    request_params_list = [params]
+    if split_params:
+        params = deepcopy(params)
+        bk_module_ids = params.pop("bk_module_ids", [])
+        if bk_module_ids:
+            request_params_list = [
+                {**params, "bk_module_ids": bk_module_ids[s_index : s_index + QUERY_CMDB_MODULE_LIMIT]}
+                for s_index in range(0, len(bk_module_ids), QUERY_CMDB_MODULE_LIMIT)
+            ]
+        else:
+            request_params_list = [params]
+
+    counts = await asyncio.gather(*[_count(req_params) for req_params in request_params_list])
+
+    # 根据请求总数并发请求
+    tasks = []
+    for req_params, count in zip(request_params_list, counts):
+        for start in range(0, count, limit):
+            request_params = {"page": {limit_key: limit, start_key: start}}
+            if sort:
+                request_params["page"]["sort"] = sort
+            request_params.update(req_params)
+            tasks.append(acall(request_params, **kwargs))
+
+    data = []
+    for result in await asyncio.gather(*tasks):
+        data.extend(get_data(result))
+    return data
+
+
 def batch_decorator(
     batch=True,
     is_classmethod=False,
@@ -91,8 +91,16 @@ def inject_request(func: Callable):
         request = None
 
     def inner(*args, **kwargs):
-        if request:
-            activate_request(request)
-        return func(*args, **kwargs)
+        if not request:
+            return func(*args, **kwargs)
+
+        origin_request = local.request
+        # 沿用原请求的 request_id，避免子线程改写父请求的 request_id
+        activate_request(request, getattr(request, "request_id", None))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # 共享线程池中的线程会被复用，执行完成后需要恢复，避免后续任务沿用本次请求的用户身份
+            local.request = origin_request
 
     return inner
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from backend.utils.local import local
+
+
+class RequestStats:
+    """
+    单个请求的资源消耗统计：SQL 次数/耗时、DataAPI 次数/耗时(按模块)、DataAPI 缓存命中情况
+    统计对象挂载在 request 上，批量请求的子线程通过 inject_request 共享同一个对象，因此需要加锁
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.dataapi_count: Dict[str, int] = defaultdict(int)
+        self.dataapi_time: Dict[str, float] = defaultdict(float)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_sql(self, cost: float):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_time += cost
+
+    def record_dataapi(self, module: str, cost: float):
+        with self._lock:
+            self.dataapi_count[module] += 1
+            self.dataapi_time[module] += cost
+
+    def record_cache(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    @property
+    def duration(self) -> float:
+        return time.time() - self.start_time
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        total = self.cache_hits + self.cache_misses
+        return round(self.cache_hits / total, 4) if total else None
+
+    def summary(self) -> Dict:
+        return {
+            "duration": round(self.duration, 4),
+            "sql_count": self.sql_count,
+            "sql_time": round(self.sql_time, 4),
+            "dataapi_count": sum(self.dataapi_count.values()),
+            "dataapi_time": round(sum(self.dataapi_time.values()), 4),
+            "dataapi_modules": {
+                module: {"count": count, "time": round(self.dataapi_time[module], 4)}
+                for module, count in self.dataapi_count.items()
+            },
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_ratio": self.cache_hit_ratio,
+        }
+
+
+def get_request_stats() -> Optional[RequestStats]:
+    """获取当前请求的统计对象，后台任务或者未开启统计时返回 None"""
+    return getattr(local.request, "dbm_stats", None)
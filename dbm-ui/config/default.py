@@ -112,6 +112,7 @@ INSTALLED_APPS += (
     "backend.db_services.mysql.permission.clone",
     "backend.db_services.mysql.open_area",
     "backend.db_services.ipchooser",
+    "backend.db_services.quick_search",
     "backend.dbm_tools",
     "backend.db_proxy",
     "backend.db_monitor",
@@ -163,6 +164,8 @@ MIDDLEWARE = (
     # django国际化中间件
     "django.middleware.locale.LocaleMiddleware",
     "backend.bk_web.middleware.RequestProviderMiddleware",
+    # 接口资源消耗统计
+    "backend.bk_web.middleware.RequestStatsMiddleware",
 )
 
 AUTHENTICATION_BACKENDS = [
@@ -542,6 +545,23 @@ DEFAULT_FILE_STORAGE = STORAGE_TYPE_IMPORT_PATH_MAP[STORAGE_TYPE]
 # 并发数
 CONCURRENT_NUMBER = 10
 
+# DataAPI 连接池配置
+DATAAPI_POOL_CONNECTIONS = env.DATAAPI_POOL_CONNECTIONS
+DATAAPI_POOL_MAXSIZE = env.DATAAPI_POOL_MAXSIZE
+DATAAPI_POOL_BLOCK = env.DATAAPI_POOL_BLOCK
+DATAAPI_POOL_TIMEOUT = env.DATAAPI_POOL_TIMEOUT
+DATAAPI_LOCAL_CACHE_MAXSIZE = env.DATAAPI_LOCAL_CACHE_MAXSIZE
+# DataAPI 异步调用时，单个上游(按 base 地址区分)在进程内的最大并发数，未配置的上游取 CONCURRENT_NUMBER
+DATAAPI_UPSTREAM_CONCURRENCY: Dict[str, int] = {}
+
+# 接口资源消耗统计
+REQUEST_STATS_ENABLED = env.REQUEST_STATS_ENABLED
+# 接口资源消耗预算，key 为接口的 url view_name，default 为所有接口的默认预算，超出预算的请求会输出告警日志
+# 可配置的指标：duration(s)、sql_count、sql_time(s)、dataapi_count、dataapi_time(s)
+REQUEST_STATS_BUDGETS: Dict[str, Dict[str, float]] = {
+    "default": {"duration": 10, "sql_count": 200, "dataapi_count": 50},
+}
+
 # grafana代理配置
 BACKEND_DIR = os.path.join(BASE_DIR, "backend/bk_dataview")
 GRAFANA = {